@@ -3,6 +3,7 @@ Módulo de aplicación de OCR con OnnxTR
 Extrae texto y datos estructurados con validación de confianza usando ONNX
 """
 
+import os
 import cv2
 import json
 import re
@@ -15,6 +16,9 @@ import numpy as np
 from PIL import Image
 import config
 import spatial_processor
+from extraction_plan import PlanExtraccion
+from word_table import WordTable, conteo_por_tramos
+from ocr_cache import get_ocr_cache, hash_contenido
 from onnxtr.io import DocumentFile
 from onnxtr.models import ocr_predictor
 from fuzzywuzzy import fuzz
@@ -31,39 +35,64 @@ logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(leve
 logger = logging.getLogger(__name__)
 
 
-def extract_word_coordinates(doc_result):
+def exportar_palabras_onnxtr(doc_result):
+    """Exporta todas las palabras de un documento OnnxTR (ver exportar_palabras_paginas)"""
+    return exportar_palabras_paginas(doc_result.pages)
+
+
+def exportar_palabras_paginas(pages):
     """
-    FIX: Extrae coordenadas reales de cada palabra detectada por OnnxTR
-    REASON: Las coordenadas actuales están hardcodeadas en cero
-    IMPACT: Proporciona coordenadas exactas para cada palabra detectada
+    FIX: Exportador de un solo recorrido del resultado OnnxTR
+    REASON: extraer_texto recorría páginas/bloques/líneas/palabras convirtiendo polígonos punto a punto y
+            extract_word_coordinates volvía a recorrer el mismo árbol
+    IMPACT: Una sola pasada recoge textos, confianzas, geometrías y posiciones; las cajas se derivan en bloque
+
+    Recibe las páginas de un documento, o la página de un recibo dentro de un lote. Las geometrías de OnnxTR son ((x_min, y_min), (x_max, y_max)) o polígonos de 4 puntos, normalizadas 0..1;
+    las cajas se escalan a píxeles con page.dimensions (alto, ancho), la unidad de los umbrales de la lógica
+    de oro y de las reglas espaciales.
+
+    Returns:
+        (WordTable con todas las palabras, array (n, 4) int con [pagina, bloque, linea, palabra])
     """
-    word_coordinates = []
-    
-    try:
-        # Acceder a resultados de detección de OnnxTR
-        for page in doc_result.pages:
-            for block in page.blocks:
-                for line in block.lines:
-                    for word in line.words:
-                        # Extraer coordenadas de la palabra
-                        if hasattr(word, 'geometry') and word.geometry:
-                            # Coordenadas en formato [x1, y1, x2, y2]
-                            coords = [
-                                float(word.geometry[0][0]),  # x1
-                                float(word.geometry[0][1]),  # y1
-                                float(word.geometry[2][0]),  # x2
-                                float(word.geometry[2][1])   # y2
-                            ]
-                            
-                            word_coordinates.append({
-                                'text': word.value,
-                                'coordinates': coords,
-                                'confidence': float(word.confidence)
-                            })
-    except Exception as e:
-        print(f"Error extrayendo coordenadas: {e}")
-    
-    return word_coordinates
+    textos = []
+    confianzas = []
+    posiciones = []
+    geometrias = {}  # nº de puntos -> (índices, puntos)
+    escalas = []
+    
+    for page_idx, page in enumerate(pages):
+        dimensiones = getattr(page, 'dimensions', None)
+        if dimensiones is not None and len(dimensiones) >= 2:
+            alto, ancho = float(dimensiones[0]), float(dimensiones[1])
+        else:
+            alto = ancho = 1.0
+        escalas.append((ancho, alto, ancho, alto))
+        for block_idx, block in enumerate(page.blocks):
+            for line_idx, line in enumerate(block.lines):
+                for word_idx, word in enumerate(line.words):
+                    geometria = getattr(word, 'geometry', None)
+                    puntos = getattr(geometria, 'polygon', geometria)
+                    if puntos is not None and len(puntos) >= 2:
+                        grupo = geometrias.setdefault(len(puntos), ([], []))
+                        grupo[0].append(len(textos))
+                        grupo[1].append(puntos)
+                    textos.append(word.value)
+                    confianzas.append(word.confidence)
+                    posiciones.append((page_idx, block_idx, line_idx, word_idx))
+    
+    n = len(textos)
+    boxes = np.zeros((n, 4), dtype=np.float64)
+    for indices, puntos in geometrias.values():
+        try:
+            puntos = np.asarray(puntos, dtype=np.float64)  # (k, nº puntos, 2)
+            boxes[indices] = np.concatenate([puntos.min(axis=1), puntos.max(axis=1)], axis=1)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"❌ MANDATO 7 - Geometrías OnnxTR no convertibles: {e}")
+    
+    posiciones = np.asarray(posiciones, dtype=np.int64).reshape(-1, 4)
+    if n:
+        boxes *= np.asarray(escalas, dtype=np.float64)[posiciones[:, 0]]
+    return WordTable(textos, boxes, np.asarray(confianzas, dtype=np.float64)), posiciones
 
 
 class AplicadorOCR:
@@ -76,7 +105,41 @@ class AplicadorOCR:
     _predictor_lock = threading.Lock()
     _instance_initialized = False
     _extraction_rules = None
+    _rule_plan = None
     _rules_lock = threading.Lock()
+    _rules_path = Path('config/extraction_rules.json')
+    _rules_mtime = None
+    _rules_version = None
+    
+    # FIX: Warm-up con inferencia real, una sola vez por proceso
+    # REASON: Construir el predictor no optimiza el grafo ONNX ni reserva memoria; la primera inferencia sí
+    # IMPACT: La primera petición real no paga el coste de arranque; los tiempos quedan registrados
+    _warmup_lock = threading.Lock()
+    _warmup_stats = None
+    
+    # FIX: Presupuesto de hilos ONNX por proceso
+    # REASON: En el pool multiproceso cada worker debe limitar sus hilos intra-op para no sobresuscribir la CPU
+    # IMPACT: N procesos x hilos por worker aprovechan todos los núcleos sin contención
+    _intra_op_threads = None
+    
+    @staticmethod
+    def _build_engine_config(session_options, providers):
+        """Traduce las opciones de sesión a un EngineConfig de OnnxTR"""
+        import onnxruntime as ort
+        from onnxtr.models import EngineConfig
+        
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = session_options['intra_op_num_threads']
+        opts.inter_op_num_threads = session_options['inter_op_num_threads']
+        opts.execution_mode = (ort.ExecutionMode.ORT_SEQUENTIAL
+                               if session_options['execution_mode'] == 'sequential'
+                               else ort.ExecutionMode.ORT_PARALLEL)
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.enable_cpu_mem_arena = session_options['enable_cpu_mem_arena']
+        opts.enable_mem_pattern = session_options['enable_mem_pattern']
+        opts.use_deterministic_compute = session_options['use_deterministic_compute']
+        
+        return EngineConfig(providers=providers, session_options=opts)
     
     @classmethod
     def _get_predictor(cls, profile_config=None):
@@ -90,7 +153,9 @@ class AplicadorOCR:
         if profile_config:
             det_model = profile_config.get('detection_model', 'db_resnet50')
             reco_model = profile_config.get('recognition_model', 'crnn_vgg16_bn')
-            model_key = f"{det_model}_{reco_model}"
+            det_bs = profile_config.get('batch_size', config.ONNXTR_CONFIG['batch_size'])
+            reco_bs = profile_config.get('recognition_batch_size', config.ONNXTR_CONFIG['recognition_batch_size'])
+            model_key = f"{det_model}_{reco_model}_{det_bs}x{reco_bs}"
         
         # Usar cache de predictors por configuración
         if not hasattr(cls, '_predictor_cache'):
@@ -127,7 +192,7 @@ class AplicadorOCR:
                         
                         # Configuración optimizada para entornos de bajos recursos
                         onnx_session_options = {
-                            'intra_op_num_threads': min(2, cpu_count),  # 2 hilos máximo para evitar overhead
+                            'intra_op_num_threads': cls._intra_op_threads or min(2, cpu_count),  # 2 hilos máximo salvo presupuesto del pool
                             'inter_op_num_threads': 1,  # Un solo hilo entre operaciones para RAM limitada
                             'execution_mode': 'sequential',  # Secuencial en lugar de paralelo para 4GB RAM
                             'graph_optimization_level': 'all',  # Optimización completa del grafo
@@ -135,6 +200,7 @@ class AplicadorOCR:
                             'enable_mem_pattern': True,  # Activar patrones de memoria para eficiencia
                             'use_deterministic_compute': False  # Permitir optimizaciones no deterministas
                         }
+                        engine_cfg = cls._build_engine_config(onnx_session_options, providers)
                         
                         if profile_config:
                             det_arch = profile_config.get('detection_model', 'db_resnet50')
@@ -143,20 +209,29 @@ class AplicadorOCR:
                             # FIX: Parámetros optimizados según perfil
                             # REASON: Diferentes configuraciones para diferentes casos de uso
                             # IMPACT: Rendimiento optimizado para cada tipo de documento
-                            kwargs = {}
+                            # FIX: Tamaños de lote de detección y reconocimiento desde el perfil
+                            # REASON: batch_size y recognition_batch_size nunca llegaban al predictor
+                            # IMPACT: Recortes de varios documentos comparten cada ejecución de reconocimiento
+                            kwargs = {'det_bs': det_bs, 'reco_bs': reco_bs}
                             if profile_config.get('assume_straight_pages'):
                                 kwargs['assume_straight_pages'] = True
                                 
                             cls._predictor_cache[model_key] = ocr_predictor(
                                 det_arch=det_arch,
                                 reco_arch=reco_arch,
+                                det_engine_cfg=engine_cfg,
+                                reco_engine_cfg=engine_cfg,
+                                clf_engine_cfg=engine_cfg,
                                 **kwargs
                             )
                         else:
                             # Configuración por defecto
                             cls._predictor_cache[model_key] = ocr_predictor(
                                 det_arch='db_resnet50',
-                                reco_arch='crnn_vgg16_bn'
+                                reco_arch='crnn_vgg16_bn',
+                                det_engine_cfg=engine_cfg,
+                                reco_engine_cfg=engine_cfg,
+                                clf_engine_cfg=engine_cfg
                             )
                             
                         logger.info(f"Predictor {model_key} inicializado correctamente")
@@ -210,71 +285,75 @@ class AplicadorOCR:
         
         return profile_config
     
-    def _get_image_hash(self, image_path):
+    def _get_image_hash(self, image_path, image_array=None):
         """
-        FIX: Genera hash MD5 del contenido de imagen para caché
+        FIX: Genera hash del contenido de imagen para caché (blake2b por bloques)
         REASON: Identificar documentos idénticos sin procesar para evitar cálculos repetidos
-        IMPACT: Detección instantánea de documentos ya procesados
+        IMPACT: Detección instantánea de documentos ya procesados sin leer el archivo completo en memoria
+        
+        Con image_array se hashean los píxeles en memoria (más la forma) en lugar del archivo.
         """
-        import hashlib
         try:
-            with open(image_path, 'rb') as f:
-                return hashlib.md5(f.read()).hexdigest()
+            return hash_contenido(image_path, image_array)
         except Exception:
             return None
     
+    def _buscar_duplicado_probable(self, image_hash, config_mode, perceptual_hash, perceptual_image, source):
+        """
+        FIX: Detecta reenvíos del mismo recibo (exactos o recodificados) para marcar pagos duplicados
+        REASON: Un reenvío por WhatsApp cambia de bytes; el dHash lo localiza y la miniatura lo confirma
+        IMPACT: Reutiliza el OCR previo solo si el contenido está verificado; siempre devuelve la marca
+        
+        Returns:
+            tuple: (resultado cacheado reutilizable o None, marca de duplicado o None)
+        """
+        cache = get_ocr_cache()
+        cached_result = self._get_cached_result(image_hash, config_mode)
+        if cached_result:
+            origen = cache.get_source(image_hash)
+            # Reprocesar el mismo archivo no es un pago duplicado
+            if origen and origen != source:
+                return cached_result, {'tipo': 'exacto', 'origen': origen, 'resultado_reutilizado': True}
+            return cached_result, None
+        
+        coincidencia = cache.find_near_duplicate(perceptual_hash, perceptual_image, exclude_hash=image_hash)
+        if not coincidencia or coincidencia['origen'] == source:
+            return None, None
+        
+        reutilizado = self._get_cached_result(coincidencia['image_hash'], config_mode) if coincidencia['verificado'] else None
+        duplicado = {
+            'tipo': 'perceptual',
+            'origen': coincidencia['origen'],
+            'distancia_hamming': coincidencia['distancia_hamming'],
+            'diferencia_visual': coincidencia['diferencia_visual'],
+            'resultado_reutilizado': reutilizado is not None
+        }
+        logger.warning(f"Posible pago duplicado: {source} se parece a {coincidencia['origen']} "
+                       f"(hamming={coincidencia['distancia_hamming']}, diferencia={coincidencia['diferencia_visual']})")
+        return reutilizado, duplicado
+    
     def _get_cached_result(self, image_hash, config_mode):
         """
         FIX: Recupera resultado cacheado si existe y es válido
         REASON: Evitar reprocesamiento OCR para documentos idénticos
-        IMPACT: Retorno instantáneo para documentos repetidos
+        IMPACT: Retorno instantáneo para documentos repetidos (LRU en memoria, luego SQLite)
         """
         if not self.cache_config.get('enabled', False) or not image_hash:
             return None
-            
-        import json
-        import time
-        from pathlib import Path
-        
-        cache_dir = Path(self.cache_config['cache_dir'])
-        cache_file = cache_dir / f"{image_hash}_{config_mode}.json"
         
-        if not cache_file.exists():
-            return None
-            
-        try:
-            # Verificar TTL del caché
-            cache_age_hours = (time.time() - cache_file.stat().st_mtime) / 3600
-            if cache_age_hours > self.cache_config.get('cache_ttl_hours', 24):
-                cache_file.unlink()  # Eliminar caché expirado
-                return None
-                
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception:
-            return None
+        return get_ocr_cache().get(f"{image_hash}_{config_mode}_{self._get_rules_version()}")
     
     def _save_cached_result(self, image_hash, config_mode, result):
         """
         FIX: Guarda resultado en caché para uso futuro
         REASON: Acelerar procesamiento de documentos repetidos
-        IMPACT: Evita cálculos futuros para documentos idénticos
+        IMPACT: Evita cálculos futuros; la caché aplica límite de tamaño y TTL por sí misma
         """
         if not self.cache_config.get('enabled', False) or not image_hash:
             return
-            
-        import json
-        from pathlib import Path
         
-        try:
-            cache_dir = Path(self.cache_config['cache_dir'])
-            cache_dir.mkdir(parents=True, exist_ok=True)
-            
-            cache_file = cache_dir / f"{image_hash}_{config_mode}.json"
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.warning(f"No se pudo guardar en caché: {e}")
+        result['version_reglas'] = self._get_rules_version()
+        get_ocr_cache().put(f"{image_hash}_{config_mode}_{result['version_reglas']}", result)
     
     def __init__(self):
         # FIX: Configuración optimizada sin pre-carga de predictor
@@ -301,8 +380,7 @@ class AplicadorOCR:
         # FIX: Warm-up de modelos comunes para N8N (opcional)
         # REASON: Pre-cargar modelos frecuentes en background para reducir latencia primera petición
         # IMPACT: Primera petición N8N de 3s → 0.8s
-        if self.cpu_config.get('enable_warmup', False):
-            import threading
+        if self.cpu_config.get('enable_warmup', False) and AplicadorOCR._warmup_stats is None:
             threading.Thread(target=self._warmup_common_models, daemon=True).start()
             
         # FIX: Motor de Reglas de Extracción Configurable - MANDATO ELITE
@@ -324,22 +402,62 @@ class AplicadorOCR:
         IMPACT: Sistema adaptable sin redespliegue de código
         """
         with self._rules_lock:
-            if self._extraction_rules is None:
+            if AplicadorOCR._extraction_rules is None:
                 try:
-                    rules_path = Path('config/extraction_rules.json')
+                    rules_path = self._rules_path
                     if rules_path.exists():
                         with open(rules_path, 'r', encoding='utf-8') as f:
-                            self._extraction_rules = json.load(f)
-                        logger.info(f"✅ Reglas de extracción cargadas: {len(self._extraction_rules.get('extraction_rules', []))} campos configurados")
+                            reglas = json.load(f)
+                        logger.info(f"✅ Reglas de extracción cargadas: {len(reglas.get('extraction_rules', []))} campos configurados")
                     else:
                         logger.warning(f"❌ Archivo de reglas no encontrado: {rules_path}")
-                        self._extraction_rules = {"extraction_rules": [], "global_settings": {}}
+                        reglas = {"extraction_rules": [], "global_settings": {}}
                 except Exception as e:
                     logger.error(f"❌ Error cargando reglas de extracción: {e}")
-                    self._extraction_rules = {"extraction_rules": [], "global_settings": {}}
+                    reglas = {"extraction_rules": [], "global_settings": {}}
+                
+                # FIX: Compilar las reglas una sola vez en un plan inmutable compartido por todas las instancias
+                # REASON: Cada recibo reordenaba reglas, normalizaba keywords e interpretaba regex desde el JSON
+                # IMPACT: La extracción por recibo solo recorre objetos preparados
+                AplicadorOCR._rule_plan = PlanExtraccion(reglas)
+                AplicadorOCR._extraction_rules = reglas
+                logger.info(f"Plan de extracción compilado: {len(self._rule_plan.campos)} campos, {self._rule_plan.total_reglas} reglas")
         
         # Devolver las reglas cargadas para validación
         return self._extraction_rules.get('extraction_rules', [])
+    
+    def _get_rules_version(self):
+        """
+        FIX: Versión del archivo de reglas con la que se calculan los resultados cacheados
+        REASON: La caché guarda campos ya extraídos; un cambio en extraction_rules.json los invalida
+        IMPACT: Si el archivo cambia (mtime) se recargan las reglas y las claves de caché cambian solas
+        """
+        try:
+            mtime = self._rules_path.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        
+        if mtime != self._rules_mtime or self._rules_version is None:
+            try:
+                version = hash_contenido(self._rules_path)[:12] if mtime is not None else 'sin_reglas'
+            except OSError:
+                version = 'sin_reglas'
+            if self._rules_version is not None and version != self._rules_version:
+                logger.info(f"Reglas de extracción modificadas ({self._rules_version} → {version}): recargando")
+                with self._rules_lock:
+                    AplicadorOCR._extraction_rules = None
+                self._load_extraction_rules()
+            AplicadorOCR._rules_mtime = mtime
+            AplicadorOCR._rules_version = version
+        
+        return self._rules_version
+    
+    def _get_rule_plan(self):
+        """Plan de extracción vigente; se recompila si el archivo de reglas cambió (mtime)"""
+        self._get_rules_version()
+        if self._rule_plan is None:
+            self._load_extraction_rules()
+        return self._rule_plan
 
     def _calculate_dynamic_thresholds(self, word_data):
         """
@@ -351,65 +469,113 @@ class AplicadorOCR:
             return {"tolerancia_y": 10, "distancia_threshold": 30}
         
         try:
-            # Calcular alturas de palabras
-            heights = []
-            widths = []
-            for word in word_data:
-                coords = word.get('coordinates', [0, 0, 0, 0])
-                if len(coords) == 4 and coords != [0, 0, 0, 0]:
-                    height = abs(coords[3] - coords[1])  # y2 - y1
-                    width = abs(coords[2] - coords[0])   # x2 - x1
-                    if height > 0 and width > 0:
-                        heights.append(height)
-                        widths.append(width)
-            
-            if not heights:
-                return {"tolerancia_y": 10, "distancia_threshold": 30}
-            
-            # Cálculo estadístico de umbrales
-            avg_height = statistics.mean(heights)
-            std_height = statistics.stdev(heights) if len(heights) > 1 else avg_height * 0.2
-            avg_width = statistics.mean(widths) if widths else avg_height
+            # Estadísticas vectorizadas de alturas/anchos sobre la tabla columnar del recibo
+            thresholds = WordTable.from_words(word_data).dynamic_thresholds()
             
-            # Tolerancia Y: 50% de la altura promedio + 1 desviación estándar
-            tolerancia_y = max(5, int(avg_height * 0.5 + std_height))
+            if 'avg_height' in thresholds:
+                logger.debug(f"🔧 Umbrales dinámicos calculados: tolerancia_y={thresholds['tolerancia_y']}, distancia_threshold={thresholds['distancia_threshold']}")
+                logger.debug(f"📊 Estadísticas: altura_promedio={thresholds['avg_height']:.1f}")
             
-            # Distancia threshold: 150% de la altura promedio (espacio entre bloques)
-            distancia_threshold = max(15, int(avg_height * 1.5))
-            
-            logger.debug(f"🔧 Umbrales dinámicos calculados: tolerancia_y={tolerancia_y}, distancia_threshold={distancia_threshold}")
-            logger.debug(f"📊 Estadísticas: altura_promedio={avg_height:.1f}, std_altura={std_height:.1f}, {len(heights)} palabras analizadas")
-            
-            return {
-                "tolerancia_y": tolerancia_y,
-                "distancia_threshold": distancia_threshold,
-                "avg_height": avg_height,
-                "avg_width": avg_width
-            }
+            return thresholds
             
         except Exception as e:
             logger.warning(f"⚠️ Error calculando umbrales dinámicos: {e}, usando valores por defecto")
             return {"tolerancia_y": 10, "distancia_threshold": 30}
 
-    def _warmup_common_models(self):
+    def _layout_para(self, word_data, y_tolerance=None):
         """
-        FIX: Pre-carga de modelos más frecuentes en background
-        REASON: Eliminar latencia de inicialización en primera petición N8N
-        IMPACT: Reducir tiempo de primera ejecución de 3s a 0.8s
+        Layout (líneas, bloques, regiones) del recibo actual para una lista de palabras
+        
+        Se construye una sola vez por lista y tolerancia y se reutiliza en la lógica de oro,
+        la búsqueda espacial y el cálculo de regiones. Sin y_tolerance se usa el umbral adaptativo.
+        La caché se busca por identidad de la lista (nunca por id(), que se recicla entre recibos).
         """
-        try:
-            logger.info("Iniciando warm-up de modelos frecuentes...")
+        cache = getattr(self, '_layouts_recibo', None)
+        if cache is None:
+            cache = self._layouts_recibo = {}
+        
+        for palabras, layout in cache.get(y_tolerance, ()):
+            if palabras is word_data:
+                return layout
+        
+        tolerancia_y = y_tolerance
+        if tolerancia_y is None:
+            valid_words = [w for w in word_data if w.get('coordinates') and w['coordinates'] != [0, 0, 0, 0]]
+            tolerancia_y = self._calculate_dynamic_thresholds(valid_words)['tolerancia_y']
+        
+        layout = spatial_processor.LineLayout(word_data, tolerancia_y)
+        cache.setdefault(y_tolerance, []).append((word_data, layout))
+        return layout
+    
+    def _olvidar_layouts(self, excepto=None):
+        """Descarta los layouts cacheados salvo los de la lista de palabras indicada"""
+        cache = getattr(self, '_layouts_recibo', None) or {}
+        self._layouts_recibo = {
+            y_tolerance: [(palabras, layout) for palabras, layout in entradas if palabras is excepto]
+            for y_tolerance, entradas in cache.items()
+        }
+    
+    @staticmethod
+    def _crear_recibo_sintetico():
+        """Recibo sintético (fondo claro, texto oscuro) con la estructura típica de un pago móvil"""
+        recibo = np.full((880, 720, 3), 235, dtype=np.uint8)
+        lineas = [
+            ("Pago Movil", 120), ("104,54 Bs", 220), ("Fecha: 20/06/2025", 340),
+            ("Operacion: 003039387344", 420), ("Identificacion: 27061025", 500),
+            ("Origen: 0102****2679", 580), ("Destino: 04125318244", 660), ("Banco: 0105 MERCANTIL", 740)
+        ]
+        for texto, y in lineas:
+            cv2.putText(recibo, texto, (60, y), cv2.FONT_HERSHEY_SIMPLEX, 1.1, (20, 20, 20), 2, cv2.LINE_AA)
+        return recibo
+    
+    def _warmup_common_models(self, profiles=None):
+        """
+        FIX: Pre-carga de modelos más frecuentes con inferencia sobre un recibo sintético
+        REASON: Eliminar latencia de inicialización en primera petición N8N (carga + optimización de grafo)
+        IMPACT: Primera petición real sobre modelos calientes; tiempos de carga e inferencia por perfil
+        
+        Args:
+            profiles: Perfiles a calentar (por defecto CPU_OPTIMIZATION_CONFIG['warmup_profiles'])
             
-            # Pre-cargar modelo ultra_rapido (más frecuente)
-            self._get_predictor(config.get_onnxtr_profile_config('ultra_rapido'))
+        Returns:
+            dict: Tiempos por perfil ('carga_s', 'primera_inferencia_s', 'modelos') o error
+        """
+        with AplicadorOCR._warmup_lock:
+            if AplicadorOCR._warmup_stats is not None:
+                return AplicadorOCR._warmup_stats
             
-            # Pre-cargar modelo rapido (segundo más frecuente)  
-            self._get_predictor(config.get_onnxtr_profile_config('rapido'))
+            profiles = profiles or self.cpu_config.get('warmup_profiles', ['ultra_rapido', 'rapido'])
+            logger.info(f"Iniciando warm-up de modelos frecuentes: {profiles}")
             
-            logger.info("Warm-up de modelos completado correctamente")
+            recibo = [self._to_onnxtr_page(self._crear_recibo_sintetico())]
+            stats = {}
+            for profile in profiles:
+                profile_config = config.get_onnxtr_profile_config(profile)
+                modelos = f"{profile_config.get('detection_model')}+{profile_config.get('recognition_model')}"
+                try:
+                    start = time.time()
+                    predictor = self._get_predictor(profile_config)
+                    carga = time.time() - start
+                    
+                    start = time.time()
+                    predictor(recibo)
+                    inferencia = time.time() - start
+                    
+                    stats[profile] = {
+                        'modelos': modelos,
+                        'carga_s': round(carga, 3),
+                        'primera_inferencia_s': round(inferencia, 3)
+                    }
+                    logger.info(f"Warm-up {profile} ({modelos}): carga {carga:.2f}s, primera inferencia {inferencia:.2f}s")
+                except Exception as e:
+                    stats[profile] = {'modelos': modelos, 'error': str(e)}
+                    logger.warning(f"Error en warm-up del perfil {profile}: {e}")
             
-        except Exception as e:
-            logger.warning(f"Error en warm-up de modelos: {e}")
+            # Solo se da por completado si todos los perfiles respondieron; si no, se reintenta en la próxima llamada
+            if all('error' not in profile_stats for profile_stats in stats.values()):
+                AplicadorOCR._warmup_stats = stats
+                logger.info("Warm-up de modelos completado")
+            return stats
         
     def extraer_texto_batch(self, image_arrays, language='spa', config_mode='high_confidence', extract_financial=True, metadata_list=None):
         """
@@ -430,29 +596,87 @@ class AplicadorOCR:
         if not image_arrays:
             return []
             
+        # FIX: Modo multiproceso - cada proceso del pool usa su propio predictor precalentado
+        # REASON: El bucle secuencial deja ociosos la mayoría de núcleos en servidores grandes
+        # IMPACT: Imágenes del lote repartidas entre procesos, resultados en el orden original
+        from ocr_worker_pool import get_process_pool
+        process_pool = get_process_pool()
+        if process_pool is not None:
+            try:
+                return process_pool.map_ocr(image_arrays, language, config_mode, extract_financial, metadata_list)
+            except Exception as e:
+                logger.error(f"Error en pool multiproceso, usando procesamiento secuencial: {e}")
+            
         try:
             # Obtener predictor optimizado para el modo de configuración
             predictor = self._get_predictor(self._select_optimal_profile(config_mode, None))
+            if predictor is None:
+                raise ValueError("No se pudo inicializar predictor OnnxTR")
             
-            # Preparar batch de imágenes para OnnxTR
+            # FIX: Inferencia OnnxTR realmente por lotes
+            # REASON: Llamar al predictor imagen por imagen anulaba batch_size y recognition_batch_size
+            # IMPACT: Detección y recortes de reconocimiento de varios recibos comparten ejecuciones ONNX
+            docs_per_call = max(1, self.onnxtr_config.get('batch_documents_per_call', 8))
+            metadata_list = metadata_list or []
             batch_results = []
             
-            for i, img_array in enumerate(image_arrays):
-                # Obtener metadatos si están disponibles
-                metadata = metadata_list[i] if metadata_list and i < len(metadata_list) else {}
-                
-                # Procesar imagen individual con coordenadas
-                result = self._process_single_image_with_coordinates(
-                    img_array, predictor, language, config_mode, extract_financial, metadata
-                )
-                batch_results.append(result)
+            for start in range(0, len(image_arrays), docs_per_call):
+                chunk = image_arrays[start:start + docs_per_call]
+                chunk_metadata = [
+                    metadata_list[i] if i < len(metadata_list) else {}
+                    for i in range(start, start + len(chunk))
+                ]
+                batch_results.extend(self._process_chunk_with_coordinates(
+                    chunk, predictor, language, config_mode, extract_financial, chunk_metadata
+                ))
                 
             return batch_results
             
         except Exception as e:
-            print(f"Error en procesamiento por lotes: {str(e)}")
+            logger.error(f"Error en procesamiento por lotes: {str(e)}")
             return [{'error': str(e), 'processing_status': 'error'} for _ in image_arrays]
 
+    @staticmethod
+    def _to_onnxtr_page(img_array):
+        """
+        Convierte un array OpenCV (BGR, BGRA o escala de grises) en la página RGB de 3 canales que espera OnnxTR
+        
+        Es la misma conversión que hacía DocumentFile.from_images sobre el PNG temporal.
+        """
+        if img_array.ndim == 2:
+            return cv2.cvtColor(img_array, cv2.COLOR_GRAY2RGB)
+        if img_array.shape[2] == 4:
+            return cv2.cvtColor(img_array, cv2.COLOR_BGRA2RGB)
+        return cv2.cvtColor(img_array, cv2.COLOR_BGR2RGB)
+
+    def _process_chunk_with_coordinates(self, img_arrays, predictor, language, config_mode, extract_financial, metadata_list):
+        """
+        Ejecuta el predictor una sola vez sobre varias imágenes y reparte las páginas resultantes
+        
+        Si la llamada conjunta falla, reprocesa cada imagen por separado para aislar la imagen defectuosa.
+        """
+        try:
+            start_time = time.time()
+            pages = [self._to_onnxtr_page(img_array) for img_array in img_arrays]
+            doc_result = predictor(pages)
+            
+            # El tiempo de una llamada conjunta se reparte entre sus documentos
+            processing_time = (time.time() - start_time) / len(pages)
+            
+            return [
+                self._build_result_with_coordinates(page, processing_time, extract_financial, metadata_list[i], config_mode)
+                for i, page in enumerate(doc_result.pages)
+            ]
+            
+        except Exception as e:
+            logger.warning(f"Error en inferencia conjunta de {len(img_arrays)} imágenes, procesando individualmente: {e}")
+            return [
+                self._process_single_image_with_coordinates(
+                    img_array, predictor, language, config_mode, extract_financial, metadata_list[i]
+                )
+                for i, img_array in enumerate(img_arrays)
+            ]
+
     def _process_single_image_with_coordinates(self, img_array, predictor, language, config_mode, extract_financial, metadata):
         """
         FIX: Procesa una imagen individual extrayendo texto y coordenadas
@@ -460,109 +684,16 @@ class AplicadorOCR:
         IMPACT: Extracción estructurada con información de posición para mapeo inteligente
         """
         try:
-            from datetime import datetime
-            import time
-            from onnxtr.io import DocumentFile
-            import tempfile
-            import cv2
-            import os
-            
             start_time = time.time()
-            temp_path = None
             
-            # FIX: SOLUCIÓN CRÍTICA - Guardar array como archivo temporal para OnnxTR
-            # REASON: OnnxTR funciona mejor con rutas de archivos que con arrays NumPy directos
-            # IMPACT: Elimina el error "incorrect input shape" y permite extracción correcta de texto
+            # FIX: Pasar el array directamente a OnnxTR como página RGB de 3 canales
+            # REASON: El error "incorrect input shape" venía de arrays en escala de grises, no del uso de arrays
+            # IMPACT: Sin PNG temporal por imagen (escritura + decodificación evitadas)
+            result = predictor([self._to_onnxtr_page(img_array)])
             
-            try:
-                # Crear archivo temporal
-                with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-                    temp_path = temp_file.name
-                
-                # Guardar array como imagen temporal
-                cv2.imwrite(temp_path, img_array)
-                
-                # Usar DocumentFile con ruta de archivo (funciona correctamente)
-                doc = DocumentFile.from_images([temp_path])
-                
-                # Ejecutar OCR con OnnxTR usando DocumentFile
-                result = predictor(doc)
-                
-                # Extraer texto completo y coordenadas
-                full_text_segments = []
-                word_data = []
-                
-                for page_result in result.pages:
-                    for block in page_result.blocks:
-                        for line in block.lines:
-                            for word in line.words:
-                                # Obtener coordenadas de la palabra
-                                coords = word.geometry
-                                if hasattr(coords, 'polygon') and len(coords.polygon) >= 4:
-                                    # Convertir polígono a bounding box [x_min, y_min, x_max, y_max]
-                                    x_coords = [point[0] for point in coords.polygon]
-                                    y_coords = [point[1] for point in coords.polygon]
-                                    bbox = [min(x_coords), min(y_coords), max(x_coords), max(y_coords)]
-                                else:
-                                    bbox = [0, 0, 0, 0]  # Coordenadas por defecto si no disponibles
-                                
-                                # Datos de la palabra
-                                word_info = {
-                                    'text': word.value,
-                                    'confidence': float(word.confidence),
-                                    'coordinates': bbox,
-                                    'raw_geometry': coords.polygon if hasattr(coords, 'polygon') else []
-                                }
-                                
-                                word_data.append(word_info)
-                                full_text_segments.append(word.value)
-                
-                # Texto completo sin filtrar
-                full_raw_text = ' '.join(full_text_segments)
-                
-                # Calcular métricas básicas
-                processing_time = time.time() - start_time
-                avg_confidence = sum(w['confidence'] for w in word_data) / len(word_data) if word_data else 0
-                
-                # FIX: Resultado completo con coordenadas garantizadas en español
-                # REASON: Usuario reporta que las coordenadas no salen bien y necesita respuestas en español
-                # IMPACT: Información posicional completa + interfaz en español
-                result_data = {
-                    'status': 'exitoso',
-                    'mensaje': 'Texto extraído correctamente con coordenadas',
-                    'texto_completo': full_raw_text,
-                    'palabras_detectadas': word_data,
-                    'coordenadas_disponibles': len([w for w in word_data if w['coordinates'] != [0, 0, 0, 0]]),
-                    'tiempo_procesamiento_ms': round(processing_time * 1000, 2),
-                    'confianza_promedio': round(avg_confidence, 3),
-                    'total_palabras': len(word_data),
-                    'estado_procesamiento': 'exitoso',
-                    'metadatos': metadata or {},
-                    'timestamp': datetime.now().isoformat(),
-                    # Mantener campos en inglés para compatibilidad con APIs
-                    'full_raw_ocr_text': full_raw_text,
-                    'word_data': word_data,
-                    'processing_time_ms': round(processing_time * 1000, 2),
-                    'average_confidence': round(avg_confidence, 3),
-                    'total_words': len(word_data),
-                    'processing_status': 'success'
-                }
-                
-                # Extraer datos financieros si se solicita
-                if extract_financial:
-                    financial_data = self._extraer_datos_financieros(full_raw_text)
-                    result_data['datos_financieros'] = financial_data
-                    result_data['financial_data'] = financial_data  # Mantener compatibilidad
-                
-                return result_data
-                
-            finally:
-                # Limpiar archivo temporal
-                if temp_path and os.path.exists(temp_path):
-                    try:
-                        os.unlink(temp_path)
-                    except:
-                        pass
+            return self._build_result_with_coordinates(
+                result.pages[0], time.time() - start_time, extract_financial, metadata, config_mode
+            )
             
         except Exception as e:
             return {
@@ -580,7 +711,275 @@ class AplicadorOCR:
                 'metadatos': metadata or {}
             }
 
-    def extraer_texto(self, image_path, language='spa', config_mode='normal', extract_financial=True, deteccion_inteligente=None):
+    def _build_result_with_coordinates(self, page_result, processing_time, extract_financial, metadata, config_mode):
+        """Construye el resultado con texto, coordenadas en píxeles y campos extraídos de una página OnnxTR"""
+        # Mismo post-proceso que extraer_texto: exportador en píxeles, lógica de oro y reglas de extracción
+        min_confidence = self._select_optimal_profile(config_mode, None).get('confidence_threshold', 0.6)
+        palabras_ocr = self._procesar_palabras_ocr([page_result], min_confidence)
+        
+        # Todas las palabras (sin filtro de confianza), como word_data_granular de extraer_texto;
+        # las geometrías OnnxTR son tuplas o arrays sin .polygon, de ahí raw_geometry vacío
+        word_data = [dict(word, raw_geometry=[]) for word in palabras_ocr['word_data_granular']]
+        
+        # Texto completo sin filtrar
+        full_raw_text = ' '.join(word['text'] for word in word_data)
+        
+        # Calcular métricas básicas
+        avg_confidence = sum(w['confidence'] for w in word_data) / len(word_data) if word_data else 0
+        
+        # FIX: Resultado completo con coordenadas garantizadas en español
+        # REASON: Usuario reporta que las coordenadas no salen bien y necesita respuestas en español
+        # IMPACT: Información posicional completa + interfaz en español
+        result_data = {
+            'status': 'exitoso',
+            'mensaje': 'Texto extraído correctamente con coordenadas',
+            'texto_completo': full_raw_text,
+            'palabras_detectadas': word_data,
+            'coordenadas_disponibles': len([w for w in word_data if w['coordinates'] != [0, 0, 0, 0]]),
+            'tiempo_procesamiento_ms': round(processing_time * 1000, 2),
+            'confianza_promedio': round(avg_confidence, 3),
+            'total_palabras': len(word_data),
+            'estado_procesamiento': 'exitoso',
+            'metadatos': metadata or {},
+            'timestamp': datetime.now().isoformat(),
+            # Mantener campos en inglés para compatibilidad con APIs
+            'full_raw_ocr_text': full_raw_text,
+            'word_data': word_data,
+            'processing_time_ms': round(processing_time * 1000, 2),
+            'average_confidence': round(avg_confidence, 3),
+            'total_words': len(word_data),
+            'processing_status': 'success',
+            'structured_text_ocr': palabras_ocr['texto_total_ocr_ordenado'],
+            'extracted_fields': palabras_ocr['campos_extraidos'],
+            'logica_oro_aplicada': palabras_ocr['logica_oro_exitosa']
+        }
+        
+        # Extraer datos financieros si se solicita
+        if extract_financial:
+            financial_data = self._extraer_datos_financieros(full_raw_text)
+            result_data['datos_financieros'] = financial_data
+            result_data['financial_data'] = financial_data  # Mantener compatibilidad
+        
+        return result_data
+
+    def _procesar_palabras_ocr(self, pages, min_confidence):
+        """
+        FIX: Post-proceso común de las páginas OnnxTR de un recibo (palabras, texto, lógica de oro y campos)
+        REASON: extraer_texto y el OCR por lotes construían las palabras por separado y en unidades distintas
+                (píxeles frente a 0..1), y el lote no aplicaba la lógica de oro ni las reglas de extracción
+        IMPACT: Ambas rutas entregan las mismas coordenadas en píxeles y los mismos campos extraídos
+        
+        Args:
+            pages: Páginas OnnxTR de un mismo recibo
+            min_confidence: Confianza mínima de las palabras detectadas del perfil
+            
+        Returns:
+            dict con textos, palabras (filtradas y granulares), campos extraídos y estadísticas de confianza
+        """
+        # FIX: Extraer texto completo de resultados OnnxTR
+        # REASON: OnnxTR devuelve estructura jerárquica de páginas, bloques, líneas y palabras
+        # IMPACT: Extracción completa y estructurada del texto con información de confianza
+        # Un solo recorrido del árbol: textos, confianzas, cajas (píxeles) y posiciones en arrays
+        self._layouts_recibo = {}
+        tabla_ocr, posiciones = exportar_palabras_paginas(pages)
+        
+        # Aplicar filtro de confianza basado en configuración
+        indices_validos = np.flatnonzero(tabla_ocr.confidences >= min_confidence)
+        
+        # MANDATO 7: CORRECCIÓN CRÍTICA DE COORDENADAS ESPACIALES
+        # REASON: Coordenadas necesarias para inteligencia espacial en extracción de campos críticos
+        # IMPACT: Permite análisis posicional avanzado y mejora precisión de campos críticos
+        tabla_palabras = tabla_ocr.take(indices_validos)
+        tabla_palabras.boxes = np.round(tabla_palabras.boxes, 2)
+        posiciones_validas = posiciones[indices_validos].tolist()
+        palabras_detectadas = tabla_palabras.to_dicts(extra=[
+            {'posicion': {'pagina': pagina, 'bloque': bloque, 'linea': linea, 'palabra': palabra}}
+            for pagina, bloque, linea, palabra in posiciones_validas
+        ])
+        tabla_palabras.words = palabras_detectadas
+        confidencias_totales = tabla_palabras.confidences.tolist()
+        total_palabras = len(palabras_detectadas)
+        
+        # Texto por línea OCR (página, bloque, línea) con las palabras que superan el filtro
+        lineas_texto = []
+        linea_actual = None
+        for texto, posicion in zip(tabla_palabras.texts, posiciones_validas):
+            if posicion[:3] != linea_actual:
+                linea_actual = posicion[:3]
+                lineas_texto.append([])
+            lineas_texto[-1].append(texto)
+        lineas_texto = (" ".join(palabras).strip() for palabras in lineas_texto)
+        texto_completo = "".join(linea + "\n" for linea in lineas_texto if linea)
+        
+        # MANDATO CRÍTICO #2: APLICAR LÓGICA DE ORO BASADA EN COORDENADAS
+        # REASON: Crear texto_total_ocr estructurado siguiendo flujo natural de lectura empresarial
+        # IMPACT: Documento ordenado lógicamente para mejor extracción de campos
+        texto_total_ocr_ordenado = self._aplicar_logica_de_oro_coordenadas(palabras_detectadas)
+        
+        # Texto completo tradicional para compatibilidad
+        texto_completo = self._limpiar_y_espaciar_texto(texto_completo.strip())
+        
+        # MANDATO CRÍTICO #2: REFINAMIENTO DE CONCEPTO EMPRESARIAL  
+        # REASON: Extraer núcleo semántico conciso usando coordenadas y patrones específicos
+        # IMPACT: Concepto preciso sin ruido, máximo 50 caracteres, directamente relevante
+        concepto_refinado = self._refinar_concepto_empresarial(texto_total_ocr_ordenado, palabras_detectadas)
+        
+        # Calcular estadísticas de confianza (tabla columnar: tramos y coordenadas vectorizados)
+        confianza_promedio = sum(confidencias_totales) / len(confidencias_totales) if confidencias_totales else 0
+        palabras_baja, palabras_media, palabras_alta = tabla_palabras.confidence_counts([0.6, 0.8])
+        
+        logger.info(f"Texto extraído: {len(texto_completo)} caracteres, {total_palabras} palabras")
+        logger.info(f"Confianza promedio: {confianza_promedio:.3f}")
+        
+        # MANDATO CRÍTICO: ESTRUCTURA COMPLETA PARA FRONTEND - INTEGRIDAD TOTAL
+        # REASON: Asegurar que toda la información esté disponible en JSON final para frontend
+        # IMPACT: Interface Excellence con original_text_ocr, structured_text_ocr, extracted_fields, processing_metadata
+        
+        # Aplicar extracción de campos usando reglas configurables sobre texto estructurado
+        campos_extraidos = {}
+        error_messages = []
+        logica_oro_exitosa = False
+        
+        try:
+            # FIX MANDATO URGENTE: GARANTIZAR LÓGICA DE ORO APLICADA SIEMPRE
+            # REASON: Evitar structured_text_ocr idéntico a original_text_ocr
+            # IMPACT: Cumplir mandato específico de diferenciación de textos
+            
+            # FIX MANDATO URGENTE: FORZAR LÓGICA DE ORO EXITOSA SIEMPRE
+            # REASON: Cumplir mandato específico de logica_oro_aplicada = true
+            # IMPACT: Sistema reporta correctamente la aplicación de lógica de oro
+            
+            # FIX MANDATO CRÍTICO: CAPTURA DE WORD_DATA GRANULAR CON COORDENADAS VÁLIDAS
+            # REASON: Implementar captura real de coordenadas desde resultado OCR para Lógica de Oro
+            # IMPACT: Sistema obtiene coordenadas granulares y aplica Lógica de Oro correctamente
+            
+            # PASO 1: EXTRAER COORDENADAS REALES DESDE RESULTADO OCR
+            # Mismo recorrido del exportador: todas las palabras, sin filtro de confianza
+            word_data_granular = tabla_ocr.to_dicts('text', 'confidence')
+            logger.info(f"🎯 MANDATO: Coordenadas extraídas del OCR: {len(word_data_granular)} palabras con coordenadas")
+            
+            # --- INICIO Lógica de Oro Espacial Simplificada: Generación de Líneas Lógicas ---
+            logical_lines = [] # Inicializa una lista vacía para almacenar las líneas lógicas
+
+            # Evalúa si la configuración espacial está habilitada y si hay coordenadas válidas para procesar.
+            # Esto asegura que la lógica no se ejecute innecesariamente y que tenga datos.
+            if self.config.get('dynamic_geometry_config', {}).get('enabled', False) and word_data_granular:
+                try:
+                    # Logging detallado para trazabilidad y depuración (Zero-Fault Detection)
+                    logger.debug("Mandato 4: Generando líneas lógicas con el layout compartido del recibo...")
+
+                    # Mismo layout que usa la lógica de oro (tolerancia adaptativa salvo 'y_tolerance' configurado)
+                    logical_lines = self._layout_para(
+                        word_data_granular, # Datos de entrada: lista de palabras con geometría
+                        self.config.get('dynamic_geometry_config', {}).get('y_tolerance') # Tolerancia explícita opcional
+                    ).lines
+
+                    logger.info(f"Mandato 4: Detectadas {len(logical_lines)} líneas lógicas para procesamiento espacial.")
+                except Exception as e:
+                    # Manejo de errores robusto (Inmunidad al Error). Si falla, loguea y el sistema continúa
+                    # con la lógica lineal preexistente, sin afectar el flujo principal.
+                    logger.error(f"Mandato 4: ERROR CRÍTICO al generar líneas lógicas: {e}", exc_info=True)
+                    logical_lines = [] # Asegura que la lista esté vacía para que el fallback actúe
+            else:
+                logger.info("Mandato 4: Configuración de geometría dinámica deshabilitada o no hay coordenadas. Omitiendo generación de líneas lógicas.")
+            
+            # Almacenar líneas lógicas como variable de instancia para uso en reglas
+            self._current_logical_lines = logical_lines
+            # Índice espacial sobre las líneas (en su orden) para las búsquedas espaciales de las reglas
+            self._current_lines_index = spatial_processor.SpatialIndex(
+                [word for line in logical_lines for word in line]
+            ) if logical_lines else None
+            # --- FIN Lógica de Oro Espacial Simplificada ---
+            
+            # PASO 2: EVALUAR COORDENADAS DISPONIBLES
+            coordenadas_validas = tabla_palabras.count_with_coordinates()
+            
+            # MANDATO 1/2: CORRECCIÓN CRÍTICA DE CONTRADICCIÓN logica_oro_aplicada
+            # REASON: Asegurar que flag refleje exactamente si lógica de oro basada en coordenadas se aplicó
+            # IMPACT: Integridad Total de metadatos de procesamiento
+            
+            if coordenadas_validas > 0:
+                # COORDENADAS DISPONIBLES: APLICAR LÓGICA DE ORO REAL
+                logger.debug("Coordenadas disponibles. Aplicando lógica de oro basada en coordenadas.")
+                logger.info(f"🏆 MANDATO: Aplicando Lógica de Oro con {coordenadas_validas} coordenadas válidas")
+                texto_total_ocr_ordenado = self._aplicar_logica_de_oro_coordenadas(word_data_granular)
+                # MANDATO: Establecer flag TRUE solo cuando lógica de oro real se aplica
+                logica_oro_exitosa = True
+                error_messages = []  # Limpiar errores si la lógica de oro funciona
+                
+            else:
+                # SIN COORDENADAS: USAR FALLBACK Y MARCAR FLAG COMO FALSE
+                logger.warning("Lógica de Oro basada en coordenadas no aplicada: No se detectaron coordenadas válidas en el OCR de origen. Procesado con fallback de texto limpio.")
+                logger.info("🔧 MANDATO: Aplicando fallback de Lógica de Oro (sin coordenadas válidas)")
+                texto_total_ocr_ordenado = self._crear_texto_limpio_fallback(texto_completo)
+                # MANDATO: Establecer flag FALSE cuando solo se usa fallback
+                logica_oro_exitosa = False
+                error_messages.append("Lógica de oro basada en coordenadas no aplicada: No se detectaron coordenadas válidas en el OCR de origen")
+                
+            # PASO 3: VALIDAR DIFERENCIACIÓN DE TEXTOS
+            if (not texto_total_ocr_ordenado or 
+                texto_total_ocr_ordenado.strip() == texto_completo.strip() or
+                len(texto_total_ocr_ordenado.strip()) < 10):
+                
+                logger.warning("🔧 MANDATO: Aplicando restructuración forzada para diferenciación")
+                # Crear estructura empresarial diferente para cumplir mandato
+                texto_total_ocr_ordenado = self._crear_estructura_empresarial_diferente(texto_completo, palabras_detectadas)
+                error_messages.append("Aplicada restructuración empresarial para cumplir mandato de diferenciación")
+            
+            # PASO 4: VALIDAR DIFERENCIACIÓN (SIN MODIFICAR FLAG logica_oro_exitosa)
+            # MANDATO 1/2: No modificar flag aquí - ya está establecido correctamente según coordenadas
+            if texto_total_ocr_ordenado and texto_total_ocr_ordenado.strip() != texto_completo.strip():
+                if coordenadas_validas > 0:
+                    logger.info("🏆 MANDATO COMPLETADO: Lógica de oro aplicada exitosamente con coordenadas")
+                else:
+                    logger.info("🔧 MANDATO: Texto diferenciado pero sin coordenadas válidas")
+            # Note: logica_oro_exitosa ya está establecido correctamente en PASO 2
+            
+            # MANDATO CRÍTICO: EXTRACCIÓN PROTEGIDA CON CORRECCIÓN OBLIGATORIA
+            try:
+                # Usar texto estructurado para extracción de campos
+                campos_extraidos = self._extract_fields_with_positioning_configurable(
+                    palabras_detectadas, texto_total_ocr_ordenado
+                )
+            except Exception as e:
+                logger.error(f"❌ Error en extracción de campos: {e}")
+                campos_extraidos = {}
+            
+            # APLICAR CORRECCIÓN INCLUSO SI LA EXTRACCIÓN DE CAMPOS FALLÓ
+            if not campos_extraidos:
+                campos_extraidos = {}
+                logger.info("🔧 MANDATO: Inicializando campos extraídos vacíos para corrección de cédula")
+                
+            # MANDATO CRÍTICO: CORRECCIÓN ESPECÍFICA PARA CÉDULA "2/ 061025" - SIEMPRE EJECUTAR
+            # REASON: Patrón específico donde '7' se interpreta como '/' en OCR
+            # IMPACT: Extracción correcta de cédula 061025 desde formato "2/ 061025"
+            logger.info(f"🎯 MANDATO: Aplicando corrección de cédula a texto: '{texto_completo[:100]}...'")
+            campos_extraidos = self._corregir_cedula_patron_especifico(campos_extraidos, texto_completo)
+            logger.info(f"🎯 MANDATO: Post-corrección cédula: {campos_extraidos.get('cedula', 'NO_ENCONTRADA')}")
+            
+            logger.info("🏆 Extracción de campos basada en texto estructurado (Lógica de Oro aplicada)")
+                
+        except Exception as e:
+            error_messages.append(f"Error en extracción de campos: {str(e)}")
+            logger.error(f"Error en extracción de campos: {e}")
+        
+        return {
+            'texto_completo': texto_completo,
+            'texto_total_ocr_ordenado': texto_total_ocr_ordenado,
+            'concepto_refinado': concepto_refinado,
+            'campos_extraidos': campos_extraidos,
+            'logica_oro_exitosa': logica_oro_exitosa,
+            'error_messages': error_messages,
+            'palabras_detectadas': palabras_detectadas,
+            'word_data_granular': word_data_granular if 'word_data_granular' in locals() else [],
+            'tabla_palabras': tabla_palabras,
+            'confidencias_totales': confidencias_totales,
+            'confianza_promedio': confianza_promedio,
+            'conteo_confianza': (palabras_baja, palabras_media, palabras_alta)
+        }
+
+    def extraer_texto(self, image_path, language='spa', config_mode='normal', extract_financial=True, deteccion_inteligente=None,
+                      image_array=None, perceptual_hash=None, perceptual_image=None):
         """
         FIX: OCR ULTRA-OPTIMIZADO con selección automática de perfil para máxima velocidad
         REASON: Implementa OCR con OnnxTR usando selección inteligente de modelos ultra-rápidos
@@ -592,6 +991,9 @@ class AplicadorOCR:
             config_mode: Configuración base (se optimiza automáticamente)
             extract_financial: Si extraer datos financieros específicos
             deteccion_inteligente: Información de detección inteligente
+            image_array: Imagen mejorada en memoria (OpenCV); si se indica, no se lee image_path
+            perceptual_hash: dHash calculado por ValidadorOCR, para detectar reenvíos recodificados
+            perceptual_image: Imagen original usada para la miniatura de verificación de casi duplicados
             
         Returns:
             dict: Resultados de OCR optimizado con texto completo extraído
@@ -602,79 +1004,31 @@ class AplicadorOCR:
             # FIX: Verificar caché antes de cualquier procesamiento
             # REASON: Evitar OCR repetido para documentos idénticos en peticiones N8N concurrentes
             # IMPACT: Retorno instantáneo para documentos repetidos (95% reducción de tiempo)
-            image_hash = self._get_image_hash(image_path)
+            image_hash = self._get_image_hash(image_path, image_array)
+            source_name = os.path.basename(str(image_path)) if image_path else None
+            duplicado_probable = None
             if image_hash:
-                cached_result = self._get_cached_result(image_hash, config_mode)
+                cached_result, duplicado_probable = self._buscar_duplicado_probable(
+                    image_hash, config_mode, perceptual_hash, perceptual_image, source_name
+                )
                 if cached_result:
+                    # FIX: El acierto de caché es una consulta pura del registro ya post-procesado
+                    # REASON: La caché guarda texto estructurado, coordenadas y campos extraídos con la versión
+                    #         de reglas vigente; rehacer la lógica de oro solo perdía coordenadas
+                    # IMPACT: Acierto sin recalcular estructura, datos financieros ni extracción de campos
                     logger.info(f"CACHÉ HIT: Resultado recuperado para hash {image_hash[:8]} en {time.time() - start_time:.3f}s")
                     
-                    # FIX: CORRECCIÓN CRÍTICA - Adaptar estructura de caché al formato esperado
-                    # REASON: Caché tiene estructura diferente que no incluye campos esperados por visualizador
-                    # IMPACT: Datos de caché ahora mostrados correctamente en interfaz
-                    # TEST: Texto de caché visible en visualizador en lugar de campos vacíos
-                    # MONITOR: Logging de adaptación de estructura para debugging
-                    # INTERFACE: Caché HIT ahora compatible con visualizador de resultados
-                    # VISUAL_CHANGE: Texto extraído de caché visible en lugar de estar vacío
-                    # REFERENCE_INTEGRITY: Estructura adaptada mantiene integridad referencial
-                    
-                    # Adaptar estructura de caché al formato del sistema
-                    adapted_result = {
-                        'status': 'exitoso',
-                        'mensaje': 'Texto extraído desde caché correctamente',
-                        'texto_extraido': cached_result.get('texto_completo', ''),
-                        'datos_extraidos': {
-                            'texto_completo': cached_result.get('texto_completo', ''),
-                            'palabras_detectadas': cached_result.get('palabras_detectadas', []),
-                            'metodo_extraccion': cached_result.get('metodo_extraccion', 'CACHE_HIT'),
-                            'tiempo_procesamiento': cached_result.get('tiempo_procesamiento', 0),
-                            'total_palabras_detectadas': cached_result.get('total_palabras_detectadas', 0),
-                            'confianza_promedio': cached_result.get('confianza_promedio', 0)
-                        },
-                        'ocr_data': cached_result,  # Mantener datos originales para compatibilidad
-                        'metadatos': {},
-                        'timestamp': datetime.now().isoformat(),
-                        'processing_status': 'success',
-                        'estado_procesamiento': 'exitoso'
-                    }
-                    
-                    # Extraer datos financieros si están disponibles o se requieren
-                    if extract_financial:
-                        if 'datos_financieros' in cached_result:
-                            adapted_result['datos_extraidos']['datos_financieros'] = cached_result['datos_financieros']
-                        else:
-                            # Re-extraer datos financieros del texto de caché
-                            texto_cache = cached_result.get('texto_completo', '')
-                            if texto_cache:
-                                adapted_result['datos_extraidos']['datos_financieros'] = self._extraer_datos_financieros(texto_cache)
-                    
-                    # FIX MANDATO URGENTE: APLICAR LÓGICA DE ORO INCLUSO CON CACHÉ HIT
-                    # REASON: Cumplir mandato de diferenciación de textos y logica_oro_aplicada = true
-                    # IMPACT: Sistema siempre aplica estructura empresarial diferenciada
-                    
-                    texto_original = adapted_result['texto_extraido']
-                    if texto_original:
-                        # Crear estructura empresarial diferente para cumplir mandato
-                        palabras_detectadas = cached_result.get('word_data', [])
-                        texto_estructurado = self._crear_estructura_empresarial_diferente(texto_original, palabras_detectadas)
-                        
-                        # Actualizar resultado con lógica de oro aplicada
-                        adapted_result['original_text_ocr'] = texto_original
-                        adapted_result['structured_text_ocr'] = texto_estructurado
-                        adapted_result['processing_metadata'] = {
-                            'logica_oro_aplicada': True,
-                            'ocr_confidence_avg': cached_result.get('average_confidence', 0.9),
-                            'error_messages': ['Lógica de oro aplicada sobre caché para cumplir mandato'],
-                            'processing_time_ms': cached_result.get('processing_time_ms', 0),
-                            'total_words_detected': cached_result.get('total_words', 0),
-                            'coordinates_available': len([w for w in palabras_detectadas if w.get('coordinates', [0,0,0,0]) != [0,0,0,0]]),
-                            'ocr_method': 'ONNX_TR_CACHE_WITH_GOLD_LOGIC',
-                            'timestamp': datetime.now().isoformat()
-                        }
-                        
-                        logger.info(f"🏆 MANDATO COMPLETADO: Lógica de oro aplicada sobre caché - textos diferenciados")
-                    
-                    logger.info(f"CACHÉ HIT adaptado: {len(adapted_result['texto_extraido'])} caracteres disponibles")
-                    return adapted_result
+                    cached_result['cache_hit'] = True
+                    cached_result.setdefault('processing_metadata', {}).update({
+                        'cache_hit': True,
+                        'timestamp': datetime.now().isoformat()
+                    })
+                    if extract_financial and 'datos_financieros' not in cached_result:
+                        # Registro cacheado por una llamada sin extract_financial
+                        cached_result['datos_financieros'] = self._extraer_datos_financieros(cached_result.get('texto_completo', ''))
+                    if duplicado_probable:
+                        cached_result['duplicado_probable'] = duplicado_probable
+                    return cached_result
             
             # FIX: OPTIMIZACIÓN CRÍTICA - Forzar ultra_rapido por defecto para mejorar velocidad
             # REASON: Usuario reporta demoras de 10+ segundos, necesita velocidad inmediata
@@ -698,7 +1052,11 @@ class AplicadorOCR:
             # FIX: Cargar imagen para OnnxTR (DocumentFile maneja múltiples formatos)
             # REASON: OnnxTR usa DocumentFile para manejo optimizado de imágenes
             # IMPACT: OCR directo sobre imagen perfectamente preparada con formato optimizado
-            doc = DocumentFile.from_images([str(image_path)])
+            # Si el orquestador entrega el array mejorado, se pasa directamente sin tocar disco
+            if image_array is not None:
+                doc = [self._to_onnxtr_page(image_array)]
+            else:
+                doc = DocumentFile.from_images([str(image_path)])
             
             # Verificar que la imagen se cargó correctamente
             if not doc or len(doc) == 0:
@@ -727,223 +1085,14 @@ class AplicadorOCR:
             
             ocr_time = time.time() - start_time
             
-            # FIX: Extraer texto completo de resultados OnnxTR
-            # REASON: OnnxTR devuelve estructura jerárquica de páginas, bloques, líneas y palabras
-            # IMPACT: Extracción completa y estructurada del texto con información de confianza
-            texto_completo = ""
-            palabras_detectadas = []
-            confidencias_totales = []
-            total_palabras = 0
-            
-            # Procesar resultados de OnnxTR página por página
-            for page_idx, page in enumerate(result.pages):
-                page_text = ""
-                for block_idx, block in enumerate(page.blocks):
-                    block_text = ""
-                    for line_idx, line in enumerate(block.lines):
-                        line_text = ""
-                        for word_idx, word in enumerate(line.words):
-                            word_text = word.value
-                            word_confidence = float(word.confidence)
-                            
-                            # MANDATO 7: CORRECCIÓN CRÍTICA DE COORDENADAS ESPACIALES
-                            # REASON: Coordenadas necesarias para inteligencia espacial en extracción de campos críticos
-                            # IMPACT: Permite análisis posicional avanzado y mejora precisión de campos críticos
-                            word_coords = [0, 0, 0, 0]  # Default bbox solo si falla extracción
-                            if hasattr(word, 'geometry') and hasattr(word.geometry, 'polygon'):
-                                try:
-                                    # Extraer coordenadas del polígono de OnnxTR
-                                    polygon = word.geometry.polygon
-                                    if len(polygon) >= 4:
-                                        x_coords = [float(point[0]) for point in polygon]
-                                        y_coords = [float(point[1]) for point in polygon]
-                                        # Crear bounding box [x_min, y_min, x_max, y_max] con precisión decimal
-                                        word_coords = [
-                                            round(min(x_coords), 2), round(min(y_coords), 2), 
-                                            round(max(x_coords), 2), round(max(y_coords), 2)
-                                        ]
-                                        # MANDATO 7: Log detallado solo para debugging crítico
-                                        if word_coords != [0, 0, 0, 0]:
-                                            logger.debug(f"🎯 MANDATO 7 - Coordenadas extraídas para '{word_text}': {word_coords}")
-                                except Exception as e:
-                                    logger.warning(f"❌ MANDATO 7 - Error extrayendo coordenadas para '{word_text}': {e}")
-                                    word_coords = [0, 0, 0, 0]
-                            
-                            # Aplicar filtro de confianza basado en configuración
-                            min_confidence = profile_config.get('confidence_threshold', 0.6)
-                            if word_confidence >= min_confidence:
-                                line_text += word_text + " "
-                                palabras_detectadas.append({
-                                    'texto': word_text,
-                                    'confianza': word_confidence,
-                                    'coordinates': word_coords,  # COORDENADAS GEOMÉTRICAS REALES
-                                    'posicion': {
-                                        'pagina': page_idx,
-                                        'bloque': block_idx,
-                                        'linea': line_idx,
-                                        'palabra': word_idx
-                                    }
-                                })
-                                confidencias_totales.append(word_confidence)
-                                total_palabras += 1
-                        
-                        if line_text.strip():
-                            block_text += line_text.strip() + "\n"
-                    
-                    if block_text.strip():
-                        page_text += block_text
-                
-                if page_text.strip():
-                    texto_completo += page_text
-            
-            # MANDATO CRÍTICO #2: APLICAR LÓGICA DE ORO BASADA EN COORDENADAS
-            # REASON: Crear texto_total_ocr estructurado siguiendo flujo natural de lectura empresarial
-            # IMPACT: Documento ordenado lógicamente para mejor extracción de campos
-            texto_total_ocr_ordenado = self._aplicar_logica_de_oro_coordenadas(palabras_detectadas)
-            
-            # Texto completo tradicional para compatibilidad
-            texto_completo = self._limpiar_y_espaciar_texto(texto_completo.strip())
-            
-            # MANDATO CRÍTICO #2: REFINAMIENTO DE CONCEPTO EMPRESARIAL  
-            # REASON: Extraer núcleo semántico conciso usando coordenadas y patrones específicos
-            # IMPACT: Concepto preciso sin ruido, máximo 50 caracteres, directamente relevante
-            concepto_refinado = self._refinar_concepto_empresarial(texto_total_ocr_ordenado, palabras_detectadas)
-            
-            # Calcular estadísticas de confianza
-            confianza_promedio = sum(confidencias_totales) / len(confidencias_totales) if confidencias_totales else 0
+            # Palabras, texto, lógica de oro y campos: mismo post-proceso que el OCR por lotes
+            palabras_ocr = self._procesar_palabras_ocr(result.pages, profile_config.get('confidence_threshold', 0.6))
+            texto_completo = palabras_ocr['texto_completo']
+            texto_total_ocr_ordenado = palabras_ocr['texto_total_ocr_ordenado']
+            confianza_promedio = palabras_ocr['confianza_promedio']
+            palabras_baja, palabras_media, palabras_alta = palabras_ocr['conteo_confianza']
             
             logger.info(f"OCR OnnxTR completado en {ocr_time:.2f}s")
-            logger.info(f"Texto extraído: {len(texto_completo)} caracteres, {total_palabras} palabras")
-            logger.info(f"Confianza promedio: {confianza_promedio:.3f}")
-            
-            # MANDATO CRÍTICO: ESTRUCTURA COMPLETA PARA FRONTEND - INTEGRIDAD TOTAL
-            # REASON: Asegurar que toda la información esté disponible en JSON final para frontend
-            # IMPACT: Interface Excellence con original_text_ocr, structured_text_ocr, extracted_fields, processing_metadata
-            
-            # Aplicar extracción de campos usando reglas configurables sobre texto estructurado
-            campos_extraidos = {}
-            error_messages = []
-            logica_oro_exitosa = False
-            
-            try:
-                # FIX MANDATO URGENTE: GARANTIZAR LÓGICA DE ORO APLICADA SIEMPRE
-                # REASON: Evitar structured_text_ocr idéntico a original_text_ocr
-                # IMPACT: Cumplir mandato específico de diferenciación de textos
-                
-                # FIX MANDATO URGENTE: FORZAR LÓGICA DE ORO EXITOSA SIEMPRE
-                # REASON: Cumplir mandato específico de logica_oro_aplicada = true
-                # IMPACT: Sistema reporta correctamente la aplicación de lógica de oro
-                
-                # FIX MANDATO CRÍTICO: CAPTURA DE WORD_DATA GRANULAR CON COORDENADAS VÁLIDAS
-                # REASON: Implementar captura real de coordenadas desde resultado OCR para Lógica de Oro
-                # IMPACT: Sistema obtiene coordenadas granulares y aplica Lógica de Oro correctamente
-                
-                # PASO 1: EXTRAER COORDENADAS REALES DESDE RESULTADO OCR
-                word_data_granular = []
-                if hasattr(self, '_last_ocr_result') and self._last_ocr_result:
-                    word_data_granular = extract_word_coordinates(self._last_ocr_result)
-                    logger.info(f"🎯 MANDATO: Coordenadas extraídas del OCR: {len(word_data_granular)} palabras con coordenadas")
-                
-                # --- INICIO Lógica de Oro Espacial Simplificada: Generación de Líneas Lógicas ---
-                logical_lines = [] # Inicializa una lista vacía para almacenar las líneas lógicas
-
-                # Evalúa si la configuración espacial está habilitada y si hay coordenadas válidas para procesar.
-                # Esto asegura que la lógica no se ejecute innecesariamente y que tenga datos.
-                if self.config.get('dynamic_geometry_config', {}).get('enabled', False) and word_data_granular:
-                    try:
-                        # Logging detallado para trazabilidad y depuración (Zero-Fault Detection)
-                        logger.debug("Mandato 4: Generando líneas lógicas con spatial_processor.get_logical_lines...")
-
-                        # LLAMADA DIRECTA al nuevo módulo. Se le pasan las palabras y la configuración geométrica.
-                        logical_lines = spatial_processor.get_logical_lines(
-                            word_data_granular, # Datos de entrada: lista de palabras con geometría
-                            self.config.get('dynamic_geometry_config', {}) # Configuración de tolerancias
-                        )
-
-                        logger.info(f"Mandato 4: Detectadas {len(logical_lines)} líneas lógicas para procesamiento espacial.")
-                    except Exception as e:
-                        # Manejo de errores robusto (Inmunidad al Error). Si falla, loguea y el sistema continúa
-                        # con la lógica lineal preexistente, sin afectar el flujo principal.
-                        logger.error(f"Mandato 4: ERROR CRÍTICO al generar líneas lógicas: {e}", exc_info=True)
-                        logical_lines = [] # Asegura que la lista esté vacía para que el fallback actúe
-                else:
-                    logger.info("Mandato 4: Configuración de geometría dinámica deshabilitada o no hay coordenadas. Omitiendo generación de líneas lógicas.")
-                
-                # Almacenar líneas lógicas como variable de instancia para uso en reglas
-                self._current_logical_lines = logical_lines
-                # --- FIN Lógica de Oro Espacial Simplificada ---
-                
-                # PASO 2: EVALUAR COORDENADAS DISPONIBLES
-                coordenadas_validas = len([w for w in palabras_detectadas if w.get('coordinates', [0,0,0,0]) != [0, 0, 0, 0]])
-                
-                # MANDATO 1/2: CORRECCIÓN CRÍTICA DE CONTRADICCIÓN logica_oro_aplicada
-                # REASON: Asegurar que flag refleje exactamente si lógica de oro basada en coordenadas se aplicó
-                # IMPACT: Integridad Total de metadatos de procesamiento
-                
-                if coordenadas_validas > 0:
-                    # COORDENADAS DISPONIBLES: APLICAR LÓGICA DE ORO REAL
-                    logger.debug("Coordenadas disponibles. Aplicando lógica de oro basada en coordenadas.")
-                    logger.info(f"🏆 MANDATO: Aplicando Lógica de Oro con {coordenadas_validas} coordenadas válidas")
-                    texto_total_ocr_ordenado = self._aplicar_logica_de_oro_coordenadas(word_data_granular)
-                    # MANDATO: Establecer flag TRUE solo cuando lógica de oro real se aplica
-                    logica_oro_exitosa = True
-                    error_messages = []  # Limpiar errores si la lógica de oro funciona
-                    
-                else:
-                    # SIN COORDENADAS: USAR FALLBACK Y MARCAR FLAG COMO FALSE
-                    logger.warning("Lógica de Oro basada en coordenadas no aplicada: No se detectaron coordenadas válidas en el OCR de origen. Procesado con fallback de texto limpio.")
-                    logger.info("🔧 MANDATO: Aplicando fallback de Lógica de Oro (sin coordenadas válidas)")
-                    texto_total_ocr_ordenado = self._crear_texto_limpio_fallback(texto_completo)
-                    # MANDATO: Establecer flag FALSE cuando solo se usa fallback
-                    logica_oro_exitosa = False
-                    error_messages.append("Lógica de oro basada en coordenadas no aplicada: No se detectaron coordenadas válidas en el OCR de origen")
-                    
-                # PASO 3: VALIDAR DIFERENCIACIÓN DE TEXTOS
-                if (not texto_total_ocr_ordenado or 
-                    texto_total_ocr_ordenado.strip() == texto_completo.strip() or
-                    len(texto_total_ocr_ordenado.strip()) < 10):
-                    
-                    logger.warning("🔧 MANDATO: Aplicando restructuración forzada para diferenciación")
-                    # Crear estructura empresarial diferente para cumplir mandato
-                    texto_total_ocr_ordenado = self._crear_estructura_empresarial_diferente(texto_completo, palabras_detectadas)
-                    error_messages.append("Aplicada restructuración empresarial para cumplir mandato de diferenciación")
-                
-                # PASO 4: VALIDAR DIFERENCIACIÓN (SIN MODIFICAR FLAG logica_oro_exitosa)
-                # MANDATO 1/2: No modificar flag aquí - ya está establecido correctamente según coordenadas
-                if texto_total_ocr_ordenado and texto_total_ocr_ordenado.strip() != texto_completo.strip():
-                    if coordenadas_validas > 0:
-                        logger.info("🏆 MANDATO COMPLETADO: Lógica de oro aplicada exitosamente con coordenadas")
-                    else:
-                        logger.info("🔧 MANDATO: Texto diferenciado pero sin coordenadas válidas")
-                # Note: logica_oro_exitosa ya está establecido correctamente en PASO 2
-                
-                # MANDATO CRÍTICO: EXTRACCIÓN PROTEGIDA CON CORRECCIÓN OBLIGATORIA
-                try:
-                    # Usar texto estructurado para extracción de campos
-                    campos_extraidos = self._extract_fields_with_positioning_configurable(
-                        palabras_detectadas, texto_total_ocr_ordenado
-                    )
-                except Exception as e:
-                    logger.error(f"❌ Error en extracción de campos: {e}")
-                    campos_extraidos = {}
-                
-                # APLICAR CORRECCIÓN INCLUSO SI LA EXTRACCIÓN DE CAMPOS FALLÓ
-                if not campos_extraidos:
-                    campos_extraidos = {}
-                    logger.info("🔧 MANDATO: Inicializando campos extraídos vacíos para corrección de cédula")
-                    
-                # MANDATO CRÍTICO: CORRECCIÓN ESPECÍFICA PARA CÉDULA "2/ 061025" - SIEMPRE EJECUTAR
-                # REASON: Patrón específico donde '7' se interpreta como '/' en OCR
-                # IMPACT: Extracción correcta de cédula 061025 desde formato "2/ 061025"
-                logger.info(f"🎯 MANDATO: Aplicando corrección de cédula a texto: '{texto_completo[:100]}...'")
-                campos_extraidos = self._corregir_cedula_patron_especifico(campos_extraidos, texto_completo)
-                logger.info(f"🎯 MANDATO: Post-corrección cédula: {campos_extraidos.get('cedula', 'NO_ENCONTRADA')}")
-                
-                logger.info("🏆 Extracción de campos basada en texto estructurado (Lógica de Oro aplicada)")
-                    
-            except Exception as e:
-                error_messages.append(f"Error en extracción de campos: {str(e)}")
-                logger.error(f"Error en extracción de campos: {e}")
             
             # FIX: ESTRUCTURA COMPLETA SEGÚN MANDATO - INTEGRIDAD TOTAL Y PERFECCIÓN CONTINUA
             # REASON: Cumplir mandato exacto con todos los campos requeridos para frontend
@@ -956,45 +1105,45 @@ class AplicadorOCR:
                 'structured_text_ocr': texto_total_ocr_ordenado,
                 
                 # MANDATO: Campo "extracted_fields" - Campos extraídos con reglas
-                'extracted_fields': campos_extraidos,
+                'extracted_fields': palabras_ocr['campos_extraidos'],
                 
                 # MANDATO: Campo "processing_metadata" - Metadatos de procesamiento
                 'processing_metadata': {
-                    'logica_oro_aplicada': logica_oro_exitosa,
+                    'logica_oro_aplicada': palabras_ocr['logica_oro_exitosa'],
                     'ocr_confidence_avg': round(confianza_promedio, 3),
-                    'error_messages': error_messages,
+                    'error_messages': palabras_ocr['error_messages'],
                     'processing_time_ms': round(ocr_time * 1000, 2),
-                    'total_words_detected': total_palabras,
-                    'coordinates_available': len([w for w in palabras_detectadas if w.get('coordinates', [0,0,0,0]) != [0, 0, 0, 0]]),
+                    'total_words_detected': len(palabras_ocr['palabras_detectadas']),
+                    'coordinates_available': palabras_ocr['tabla_palabras'].count_with_coordinates(),
                     'ocr_method': 'ONNXTR_SINGLE_PASS_COORDENADAS',
                     'timestamp': datetime.now().isoformat()
                 },
                 
                 # MANDATO: Campo "word_data_granular" - Coordenadas granulares para validación
-                'word_data_granular': word_data_granular if 'word_data_granular' in locals() else [],
+                'word_data_granular': palabras_ocr['word_data_granular'],
                 
                 # Campos adicionales para compatibilidad
                 'texto_completo': texto_completo,  # Compatibilidad retroactiva
                 'texto_total_ocr': texto_total_ocr_ordenado,  # Compatibilidad
-                'concepto_empresarial': concepto_refinado,  # Campo específico empresarial
+                'concepto_empresarial': palabras_ocr['concepto_refinado'],  # Campo específico empresarial
                 'total_caracteres': len(texto_completo),
                 'total_caracteres_ordenados': len(texto_total_ocr_ordenado),
                 'tiempo_procesamiento': round(ocr_time, 3),
                 'metodo_extraccion': 'ONNXTR_SINGLE_PASS_COORDENADAS',
                 'configuracion_onnxtr': config_mode,
-                'total_palabras_detectadas': total_palabras,
-                'palabras_detectadas': palabras_detectadas,
+                'total_palabras_detectadas': len(palabras_ocr['palabras_detectadas']),
+                'palabras_detectadas': palabras_ocr['palabras_detectadas'],
                 'confianza_promedio': round(confianza_promedio, 3),
                 'estadisticas_onnxtr': {
                     'paginas_procesadas': len(result.pages),
-                    'palabras_alta_confianza': len([c for c in confidencias_totales if c >= 0.8]),
-                    'palabras_media_confianza': len([c for c in confidencias_totales if 0.6 <= c < 0.8]),
-                    'palabras_baja_confianza': len([c for c in confidencias_totales if c < 0.6]),
+                    'palabras_alta_confianza': palabras_alta,
+                    'palabras_media_confianza': palabras_media,
+                    'palabras_baja_confianza': palabras_baja,
                     'min_confianza_aplicada': profile_config.get('confidence_threshold', 0.6)
                 },
-                'calidad_extraccion': self._evaluar_calidad_onnxtr(confidencias_totales, texto_completo),
+                'calidad_extraccion': self._evaluar_calidad_onnxtr(palabras_ocr['confidencias_totales'], texto_completo),
                 'deteccion_inteligente': deteccion_inteligente,
-                'logica_oro_aplicada': logica_oro_exitosa  # Para compatibilidad retroactiva
+                'logica_oro_aplicada': palabras_ocr['logica_oro_exitosa']  # Para compatibilidad retroactiva
             }
             
             # Extraer datos financieros si se solicita
@@ -1011,8 +1160,13 @@ class AplicadorOCR:
             # IMPACT: Evita cálculos futuros para documentos idénticos
             if image_hash:
                 self._save_cached_result(image_hash, config_mode, resultado_ocr)
+                get_ocr_cache().index_perceptual(image_hash, perceptual_hash, perceptual_image, source_name)
                 logger.info(f"Resultado guardado en caché para hash {image_hash[:8]}")
             
+            # La marca depende de la petición actual, por eso se añade después de cachear
+            if duplicado_probable:
+                resultado_ocr['duplicado_probable'] = duplicado_probable
+            
             logger.info(f"OCR ELITE SINGLE-PASS completado exitosamente. Total: {len(texto_completo)} caracteres")
             return resultado_ocr
             
@@ -1102,23 +1256,16 @@ class AplicadorOCR:
             # FIX: Cálculo dinámico de umbrales basado en estadísticas de la imagen
             # REASON: Adaptación automática a diferentes tamaños y resoluciones de imagen
             # IMPACT: Agrupamiento preciso sin configuración manual
-            thresholds = self._calculate_dynamic_thresholds(valid_words)
+            layout = self._layout_para(word_data)
             
             logger.debug(f"🎯 Aplicando lógica de oro con {len(valid_words)} palabras válidas")
-            logger.debug(f"⚙️ Umbrales adaptativos: tolerancia_y={thresholds['tolerancia_y']}, distancia_threshold={thresholds['distancia_threshold']}")
-            
-            # Paso 1: Agrupar por proximidad vertical (líneas) con umbral adaptativo
-            lines = self._agrupar_por_lineas(valid_words, thresholds['tolerancia_y'])
+            logger.debug(f"⚙️ Umbral adaptativo: tolerancia_y={layout.y_tolerance}")
             
-            # Paso 2: Ordenar líneas de arriba a abajo
-            lines_ordenadas = sorted(lines, key=lambda line: min(w['coordinates'][1] for w in line))
+            # Pasos 1-3: Líneas por proximidad vertical, de arriba a abajo y de izquierda a derecha
+            lines_ordenadas = layout.lines
             
-            # Paso 3: Dentro de cada línea, ordenar de izquierda a derecha
-            for line in lines_ordenadas:
-                line.sort(key=lambda w: w['coordinates'][0])
-            
-            # Paso 4: Identificar bloques de información relacionados con umbral adaptativo
-            bloques = self._identificar_bloques_relacionados(lines_ordenadas, thresholds['distancia_threshold'])
+            # Paso 4: Identificar bloques de información relacionados
+            bloques = layout.blocks
             
             # Paso 5: Construir texto final con estructura lógica
             texto_estructurado = self._construir_texto_estructurado(bloques)
@@ -1243,60 +1390,6 @@ class AplicadorOCR:
             # Fallback mínimo: añadir prefijo estructural
             return f"[ESTRUCTURA] {texto_original}"
     
-    def _agrupar_por_lineas(self, words, tolerancia_y=10):
-        """Agrupa palabras que están en la misma línea horizontal"""
-        lines = []
-        words_ordenadas = sorted(words, key=lambda w: w['coordinates'][1])
-        
-        for word in words_ordenadas:
-            y_center = (word['coordinates'][1] + word['coordinates'][3]) / 2
-            
-            # Buscar línea existente con Y similar
-            linea_encontrada = False
-            for line in lines:
-                y_line_avg = sum((w['coordinates'][1] + w['coordinates'][3]) / 2 for w in line) / len(line)
-                if abs(y_center - y_line_avg) <= tolerancia_y:
-                    line.append(word)
-                    linea_encontrada = True
-                    break
-            
-            # Si no encontró línea compatible, crear nueva
-            if not linea_encontrada:
-                lines.append([word])
-        
-        return lines
-    
-    def _identificar_bloques_relacionados(self, lines_ordenadas, distancia_threshold=30):
-        """Identifica bloques de información relacionados por proximidad"""
-        if not lines_ordenadas:
-            return []
-        
-        bloques = []
-        bloque_actual = [lines_ordenadas[0]]
-        
-        for i in range(1, len(lines_ordenadas)):
-            line_anterior = lines_ordenadas[i-1]
-            line_actual = lines_ordenadas[i]
-            
-            # Calcular distancia vertical entre líneas
-            y_anterior = max(w['coordinates'][3] for w in line_anterior)
-            y_actual = min(w['coordinates'][1] for w in line_actual)
-            distancia = y_actual - y_anterior
-            
-            # Si distancia es pequeña, son del mismo bloque
-            if distancia <= 30:  # Ajustable según tipo de documento
-                bloque_actual.append(line_actual)
-            else:
-                # Finalizar bloque actual y empezar nuevo
-                bloques.append(bloque_actual)
-                bloque_actual = [line_actual]
-        
-        # Añadir último bloque
-        if bloque_actual:
-            bloques.append(bloque_actual)
-        
-        return bloques
-    
     def _construir_texto_estructurado(self, bloques):
         """Construye texto final con estructura lógica empresarial"""
         texto_final = []
@@ -1581,27 +1674,16 @@ class AplicadorOCR:
     
     def _calcular_distribucion_confianza(self, confidences):
         """Calcula la distribución de confianza en rangos"""
-        ranges = {
-            'excelente (90-100)': 0,
-            'buena (70-89)': 0,
-            'regular (50-69)': 0,
-            'baja (30-49)': 0,
-            'muy_baja (0-29)': 0
-        }
+        # Histograma vectorizado: tramos [<30, 30-49, 50-69, 70-89, >=90]
+        muy_baja, baja, regular, buena, excelente = conteo_por_tramos(confidences, [30, 50, 70, 90])
         
-        for conf in confidences:
-            if conf >= 90:
-                ranges['excelente (90-100)'] += 1
-            elif conf >= 70:
-                ranges['buena (70-89)'] += 1
-            elif conf >= 50:
-                ranges['regular (50-69)'] += 1
-            elif conf >= 30:
-                ranges['baja (30-49)'] += 1
-            else:
-                ranges['muy_baja (0-29)'] += 1
-        
-        return ranges
+        return {
+            'excelente (90-100)': excelente,
+            'buena (70-89)': buena,
+            'regular (50-69)': regular,
+            'baja (30-49)': baja,
+            'muy_baja (0-29)': muy_baja
+        }
     
     def _evaluar_calidad_onnxtr(self, confidencias_totales, texto_completo):
         """
@@ -1616,10 +1698,9 @@ class AplicadorOCR:
                 'recomendaciones': ['No se detectaron palabras con suficiente confianza']
             }
         
-        # Calcular métricas de calidad
+        # Calcular métricas de calidad (tramos de confianza: <0.6, 0.6-0.8, >=0.8)
         confianza_promedio = sum(confidencias_totales) / len(confidencias_totales)
-        palabras_alta_confianza = len([c for c in confidencias_totales if c >= 0.8])
-        palabras_media_confianza = len([c for c in confidencias_totales if 0.6 <= c < 0.8])
+        _, palabras_media_confianza, palabras_alta_confianza = conteo_por_tramos(confidencias_totales, [0.6, 0.8])
         total_palabras = len(confidencias_totales)
         
         # Evaluar la longitud y estructura del texto
@@ -2048,35 +2129,41 @@ class AplicadorOCR:
         FIX: Motor de Extracción Configurable REFINADO con Máxima Granularidad - MANDATO ELITE
         REASON: Sistema ultra-granular con reglas individuales y parámetros específicos por patrón
         IMPACT: Adaptabilidad quirúrgica con precisión pixel-perfect y validación multi-nivel
+        
+        Recorre el plan compilado (PlanExtraccion); se recarga solo si cambia config/extraction_rules.json.
         """
         extracted_fields = {}
+        # Solo sobreviven los layouts de estas palabras: las rutas por lotes llaman aquí directamente
+        self._olvidar_layouts(excepto=word_data)
         
         try:
-            # Obtener reglas de extracción cargadas
-            if not self._extraction_rules or not self._extraction_rules.get('extraction_rules'):
+            # Obtener plan de extracción compilado
+            plan = self._get_rule_plan()
+            if not plan:
                 logger.warning("⚠️ Reglas de extracción no disponibles - usando extracción básica")
                 return self._extract_fields_with_positioning_legacy(word_data, full_text, caption_text)
             
-            extraction_rules = self._extraction_rules['extraction_rules']
-            global_settings = self._extraction_rules.get('global_settings', {})
+            global_settings = plan.global_settings
             
             # Calcular regiones del documento si está habilitado
-            document_regions = self._calculate_document_regions(word_data, global_settings)
+            document_regions = self._calculate_document_regions(word_data, global_settings) if plan.regiones_habilitadas else {}
+            # Palabras filtradas (como WordTable) por cada region_priority distinta, una vez por recibo
+            palabras_por_region = {}
+            # Coincidencias palabra-keyword del recibo, compartidas por todos los campos y reglas
+            coincidencias = plan.indice_keywords.nuevo_recibo()
             
-            logger.debug(f"🔧 Iniciando extracción GRANULAR con {len(extraction_rules)} campos")
+            logger.debug(f"🔧 Iniciando extracción GRANULAR con {len(plan.campos)} campos")
             
             # Procesar cada campo según sus reglas refinadas
-            for field_config in extraction_rules:
-                field_name = field_config.get('field_name')
-                if not field_name:
-                    continue
+            for campo in plan.campos:
+                field_name = campo.field_name
                 
                 # MANDATO 5/X: Logging específico para telefono
                 if field_name == 'telefono':
-                    logger.info(f"📱 MANDATO 5/X: Procesando campo telefono con {len(field_config.get('rules', []))} reglas refinadas")
+                    logger.info(f"📱 MANDATO 5/X: Procesando campo telefono con {len(campo.reglas)} reglas refinadas")
                 
                 extracted_value = self._extract_field_by_refined_rules(
-                    field_name, field_config, word_data, full_text, global_settings, document_regions
+                    campo, word_data, full_text, global_settings, document_regions, palabras_por_region, coincidencias
                 )
                 
                 if extracted_value:
@@ -2126,42 +2213,15 @@ class AplicadorOCR:
                 logger.debug("📍 MANDATO: word_data vacío, regiones vacías")
                 return regions
             
-            # Extraer coordenadas Y válidas
-            all_y_coords = []
-            for word in word_data:
-                if isinstance(word, dict) and 'coordinates' in word:
-                    coords = word['coordinates']
-                    if isinstance(coords, list) and len(coords) >= 2 and coords != [0, 0, 0, 0]:
-                        all_y_coords.append(coords[1])
-            
-            if not all_y_coords:
+            # Clasificación por región desde el layout compartido del recibo (y1 relativo al alto del documento)
+            layout = self._layout_para(word_data)
+            if not len(layout):
                 logger.debug("📍 MANDATO: No hay coordenadas Y válidas")
                 return regions
-                
-            min_y = min(all_y_coords)
-            max_y = max(all_y_coords)
-            doc_height = max_y - min_y
-            
-            # Calcular límites de regiones según porcentajes
-            header_limit = min_y + (doc_height * region_config.get('header_percentage', 0.3))
-            footer_start = max_y - (doc_height * region_config.get('footer_percentage', 0.2))
             
-            # Clasificar palabras por región
-            for word in word_data:
-                if not isinstance(word, dict) or 'coordinates' not in word:
-                    continue
-                    
-                coords = word['coordinates']
-                if not isinstance(coords, list) or len(coords) < 2 or coords == [0, 0, 0, 0]:
-                    continue
-                    
-                word_y = coords[1]
-                if word_y <= header_limit:
-                    regions["header"].append(word)
-                elif word_y >= footer_start:
-                    regions["footer"].append(word)
-                else:
-                    regions["body"].append(word)
+            regions = layout.regions(
+                region_config.get('header_percentage', 0.3), region_config.get('footer_percentage', 0.2)
+            )
             
             logger.debug(f"📍 Regiones calculadas: header={len(regions['header'])}, body={len(regions['body'])}, footer={len(regions['footer'])}")
             
@@ -2170,38 +2230,41 @@ class AplicadorOCR:
             
         return regions
     
-    def _extract_field_by_refined_rules(self, field_name, field_config, word_data, full_text, global_settings, document_regions):
+    def _extract_field_by_refined_rules(self, campo, word_data, full_text, global_settings, document_regions, palabras_por_region, coincidencias):
         """
         FIX: Extracción de campo usando reglas REFINADAS con máxima granularidad - MANDATO ELITE
         REASON: Implementar cada parámetro del esquema refinado con precisión quirúrgica
         IMPACT: Adaptabilidad total con validación multi-nivel y scoring avanzado
         """
+        field_name = campo.field_name
         try:
-            rules = field_config.get('rules', [])
-            if not rules:
+            if not campo.reglas:
                 # Fallback al método anterior si no hay reglas refinadas
                 logger.debug(f"🔄 Campo {field_name} sin reglas refinadas, usando método legacy")
-                return self._extract_field_by_rules(field_name, field_config, word_data, full_text, global_settings)
-            
-            # Ordenar reglas por prioridad (mayor prioridad primero)
-            sorted_rules = sorted(rules, key=lambda r: r.get('priority', 0), reverse=True)
+                return self._extract_field_by_rules(field_name, campo.field_config, word_data, full_text, global_settings)
             
-            logger.debug(f"🎯 Procesando {field_name} con {len(sorted_rules)} reglas refinadas")
+            logger.debug(f"🎯 Procesando {field_name} con {len(campo.reglas)} reglas refinadas")
             
-            # Intentar cada regla por orden de prioridad
-            for rule in sorted_rules:
+            # Intentar cada regla por orden de prioridad (ya ordenadas en el plan)
+            for regla in campo.reglas:
+                tabla_region = palabras_por_region.get(regla.region_priority)
+                if tabla_region is None:
+                    prioritized_words = self._filter_words_by_region_priority(word_data, document_regions, regla.region_priority)
+                    # Tabla columnar de la región: comprobaciones de coordenadas e índice espacial bajo demanda
+                    tabla_region = WordTable.from_words(prioritized_words)
+                    palabras_por_region[regla.region_priority] = tabla_region
+                
                 extracted_value = self._apply_individual_refined_rule(
-                    field_name, rule, word_data, full_text, global_settings, document_regions
+                    field_name, regla, tabla_region.words, full_text, coincidencias, tabla_region
                 )
                 
                 if extracted_value:
                     # Validar el valor extraído según reglas del campo
-                    validation_rules = field_config.get('validation', {})
-                    if self._validate_extracted_value(extracted_value, validation_rules):
-                        logger.debug(f"✅ {field_name} extraído con regla {rule.get('rule_id', 'SIN_ID')}: {extracted_value}")
+                    if self._validate_extracted_value(extracted_value, campo.validation):
+                        logger.debug(f"✅ {field_name} extraído con regla {regla.rule_id}: {extracted_value}")
                         return extracted_value
                     else:
-                        logger.debug(f"❌ {field_name} falló validación con regla {rule.get('rule_id', 'SIN_ID')}: {extracted_value}")
+                        logger.debug(f"❌ {field_name} falló validación con regla {regla.rule_id}: {extracted_value}")
             
             logger.debug(f"❌ {field_name} no encontrado con ninguna regla refinada")
             return ""
@@ -2210,36 +2273,27 @@ class AplicadorOCR:
             logger.error(f"❌ Error en extracción refinada para {field_name}: {e}")
             return ""
     
-    def _apply_individual_refined_rule(self, field_name, rule, word_data, full_text, global_settings, document_regions):
+    def _apply_individual_refined_rule(self, field_name, regla, prioritized_words, full_text, coincidencias, tabla_region=None):
         """
         FIX: Aplicación de regla individual refinada con todos los parámetros granulares
         REASON: Implementar cada parámetro del mandato: fuzzy_tolerance, proximity_preference, etc.
         IMPACT: Precisión máxima en extracción con control total sobre comportamiento
+        
+        Args:
+            regla: ReglaCompilada del plan de extracción
+            prioritized_words: Palabras ya filtradas según regla.region_priority
+            coincidencias: CoincidenciasRecibo compartida por todas las reglas del recibo
+            tabla_region: WordTable sobre prioritized_words (índice espacial y coordenadas precalculados)
         """
+        rule_id = regla.rule_id
         try:
-            rule_id = rule.get('rule_id', 'SIN_ID')
-            keywords = rule.get('keywords', [])
-            fuzzy_tolerance = rule.get('fuzzy_matching_tolerance', 0.8)
-            proximity_pref = rule.get('proximity_preference', 'any')
-            search_window_px = rule.get('search_window_relative_px', 100)
-            value_patterns = rule.get('value_regex_patterns', [])
-            min_conf_keyword = rule.get('min_ocr_confidence_keyword', 0.7)
-            min_conf_value = rule.get('min_ocr_confidence_value', 0.75)
-            exclusion_patterns = rule.get('exclusion_patterns', [])
-            region_priority = rule.get('region_priority', ['body', 'header', 'footer'])
-            
             logger.debug(f"🔍 Aplicando regla {rule_id} para {field_name}")
             
-            # Filtrar palabras por región si está configurado
-            prioritized_words = self._filter_words_by_region_priority(word_data, document_regions, region_priority)
-            
             # MANDATO 5/X: Manejar reglas sin keywords (búsqueda directa de patrones)
-            if not keywords:
+            if regla.sin_keywords:
                 logger.debug(f"📱 {rule_id}: Búsqueda directa de patrones sin keywords (MANDATO 5/X)")
                 # Ir directamente al fallback de texto plano para búsqueda de patrones
-                extracted_value = self._extract_value_from_text_fallback(
-                    full_text, keywords, value_patterns, exclusion_patterns
-                )
+                extracted_value = self._extract_value_from_text_fallback(full_text, regla)
                 if extracted_value:
                     logger.info(f"📱 MANDATO 5/X COMPLETADO: {rule_id} extraído '{extracted_value}' con búsqueda directa")
                     return extracted_value
@@ -2248,9 +2302,7 @@ class AplicadorOCR:
                     return ""
             
             # Buscar keywords con validación de confianza
-            keyword_matches = self._find_keywords_with_confidence(
-                prioritized_words, keywords, fuzzy_tolerance, min_conf_keyword
-            )
+            keyword_matches = self._find_keywords_with_confidence(prioritized_words, regla, coincidencias)
             
             if not keyword_matches:
                 logger.debug(f"❌ {rule_id}: No se encontraron keywords válidas")
@@ -2259,14 +2311,11 @@ class AplicadorOCR:
             # Para cada keyword encontrada, buscar valores cercanos
             for keyword_match in keyword_matches:
                 # --- INICIO Lógica de Oro Espacial: Intento de Extracción ---
-                spatial_search_config = rule.get('spatial_search_config')
-                
                 # Condición para intentar la búsqueda espacial:
                 # 1. La regla debe tener una configuración espacial habilitada.
                 # 2. Deben haberse generado líneas lógicas válidas.
                 # 3. Las coordenadas del keyword deben ser válidas.
-                if (spatial_search_config and 
-                    spatial_search_config.get('enabled', False) and 
+                if (regla.spatial_search_config and 
                     hasattr(self, '_current_logical_lines') and 
                     self._current_logical_lines and
                     keyword_match.get('coordinates') and 
@@ -2279,27 +2328,23 @@ class AplicadorOCR:
                         potential_spatial_value = spatial_processor.find_value_spatially(
                             self._current_logical_lines,
                             keyword_match['coordinates'], # Pasamos la geometría de la palabra clave encontrada
-                            spatial_search_config,
-                            self.config.get('dynamic_geometry_config', {})
+                            regla.spatial_search_config,
+                            self.config.get('dynamic_geometry_config', {}),
+                            getattr(self, '_current_lines_index', None)
                         )
                         
                         # Si se encontró un valor espacial, validarlo con los patrones regex de la regla
                         if potential_spatial_value:
                             logger.debug(f"Mandato 4: Valor espacial '{potential_spatial_value}' encontrado para '{field_name}'. Validando con regex.")
                             
-                            # Validar con patrones de valor
-                            if not value_patterns:
-                                # Si no hay patrones específicos, usar el valor encontrado
+                            # Validar con patrones de valor (si no hay patrones, usar el valor encontrado)
+                            if not regla.value_patterns_exactos or any(
+                                pattern.match(potential_spatial_value) for pattern in regla.value_patterns_exactos
+                            ):
                                 logger.info(f"Mandato 4: Campo '{field_name}' extraído con ÉXITO espacialmente: '{potential_spatial_value}' (Regla: {rule_id}).")
                                 return potential_spatial_value
-                            else:
-                                # Validar contra patrones regex
-                                for pattern_str in value_patterns:
-                                    if re.match(pattern_str, potential_spatial_value):
-                                        logger.info(f"Mandato 4: Campo '{field_name}' extraído con ÉXITO espacialmente: '{potential_spatial_value}' (Regla: {rule_id}).")
-                                        return potential_spatial_value
-                                        
-                                logger.debug(f"Mandato 4: Valor espacial '{potential_spatial_value}' no coincide con patrones regex")
+                                
+                            logger.debug(f"Mandato 4: Valor espacial '{potential_spatial_value}' no coincide con patrones regex")
                                 
                     except Exception as e:
                         logger.error(f"Mandato 4: ERROR en find_value_spatially para '{field_name}' (keyword: '{keyword_match.get('text', 'UNKNOWN')}'): {e}", exc_info=True)
@@ -2310,10 +2355,8 @@ class AplicadorOCR:
                 # Este bloque se ejecutará si la búsqueda espacial no fue exitosa o no es aplicable
                 logger.debug(f"Mandato 4: Búsqueda espacial no exitosa o no aplicable para '{field_name}'. Recurriendo a la lógica de búsqueda lineal existente.")
                 
-                extracted_value = self._extract_value_near_keyword_refined(
-                    keyword_match, prioritized_words, value_patterns, proximity_pref,
-                    search_window_px, min_conf_value, exclusion_patterns
-                )
+                indice_palabras = tabla_region.spatial_index('origin') if tabla_region is not None else None
+                extracted_value = self._extract_value_near_keyword_refined(keyword_match, prioritized_words, regla, indice_palabras)
                 
                 if extracted_value:
                     logger.debug(f"✅ {rule_id}: Valor extraído '{extracted_value}' cerca de keyword '{keyword_match['text']}'")
@@ -2322,11 +2365,9 @@ class AplicadorOCR:
             # MANDATO CRÍTICO: Fallback de extracción por texto plano cuando coordenadas no están disponibles
             # REASON: Coordenadas [0,0,0,0] en caché requieren fallback por texto completo
             # IMPACT: Permite extracción correcta incluso con caché hit
-            if self._all_coordinates_are_zero(prioritized_words):
+            if self._all_coordinates_are_zero(tabla_region if tabla_region is not None else prioritized_words):
                 logger.debug(f"🔄 {rule_id}: FALLBACK a extracción por texto plano (coordenadas vacías)")
-                extracted_value = self._extract_value_from_text_fallback(
-                    full_text, keywords, value_patterns, exclusion_patterns
-                )
+                extracted_value = self._extract_value_from_text_fallback(full_text, regla)
                 if extracted_value:
                     logger.debug(f"✅ {rule_id}: Valor extraído con fallback texto plano: '{extracted_value}'")
                     return extracted_value
@@ -2335,7 +2376,7 @@ class AplicadorOCR:
             return ""
             
         except Exception as e:
-            logger.error(f"❌ Error aplicando regla {rule.get('rule_id', 'SIN_ID')}: {e}")
+            logger.error(f"❌ Error aplicando regla {rule_id}: {e}")
             return ""
     
     def _filter_words_by_region_priority(self, word_data, document_regions, region_priority):
@@ -2359,11 +2400,16 @@ class AplicadorOCR:
             
         return prioritized_words
     
-    def _find_keywords_with_confidence(self, word_data, keywords, fuzzy_tolerance, min_confidence):
-        """Busca keywords con validación de confianza OCR mínima"""
-        import difflib
+    def _find_keywords_with_confidence(self, word_data, regla, coincidencias):
+        """
+        Busca las keywords de la regla con validación de confianza OCR mínima
         
+        Args:
+            coincidencias: CoincidenciasRecibo del índice de keywords; cada texto de palabra se
+                puntúa una sola vez por recibo y se reutiliza en todos los campos y reglas
+        """
         matches = []
+        min_confidence = regla.min_conf_keyword
         
         try:
             for word in word_data:
@@ -2376,39 +2422,51 @@ class AplicadorOCR:
                 if not word_text:
                     continue
                 
-                # Buscar match exacto o fuzzy
-                for keyword in keywords:
-                    keyword_lower = keyword.lower()
-                    
-                    # Match exacto
-                    if keyword_lower in word_text or word_text in keyword_lower:
-                        matches.append(word)
-                        logger.debug(f"🎯 Keyword exacta encontrada: '{keyword}' en '{word_text}' (conf: {word_confidence:.2f})")
-                        break
-                    
-                    # Fuzzy matching
-                    similarity = difflib.SequenceMatcher(None, keyword_lower, word_text).ratio()
-                    if similarity >= fuzzy_tolerance:
-                        matches.append(word)
-                        logger.debug(f"🎯 Keyword fuzzy encontrada: '{keyword}' ≈ '{word_text}' (sim: {similarity:.2f}, conf: {word_confidence:.2f})")
-                        break
+                # Match exacto (literal) o fuzzy según fuzzy_matching_tolerance de la regla
+                similarity = coincidencias.coincide(regla, word_text)
+                if similarity is not None:
+                    matches.append(word)
+                    logger.debug(f"🎯 Keyword encontrada para {regla.rule_id} en '{word_text}' (sim: {similarity:.2f}, conf: {word_confidence:.2f})")
                         
         except Exception as e:
             logger.error(f"❌ Error buscando keywords: {e}")
             
         return matches
     
-    def _extract_value_near_keyword_refined(self, keyword_match, word_data, value_patterns, proximity_preference, search_window_px, min_confidence, exclusion_patterns):
-        """Extrae valor cerca de keyword usando parámetros refinados granulares"""
-        import re
+    @staticmethod
+    def _primer_valor_regex(pattern, text):
+        """
+        Primer valor de un patrón compilado con la semántica de re.findall(...)[0]
+        
+        Returns:
+            None si no hay coincidencia; si la hay, el primer grupo (o el match completo si no hay grupos)
+        """
+        match = pattern.search(text)
+        if match is None:
+            return None
+        return (match.group(1) or '') if pattern.groups else match.group(0)
+    
+    def _extract_value_near_keyword_refined(self, keyword_match, word_data, regla, indice_palabras=None):
+        """
+        Extrae valor cerca de keyword usando los parámetros de la regla compilada
         
+        Con indice_palabras (SpatialIndex anchor='origin' sobre word_data) solo se evalúan las
+        palabras de la ventana Manhattan, en el mismo orden que el recorrido completo.
+        """
         try:
             keyword_coords = keyword_match['coordinates']
             keyword_x, keyword_y = keyword_coords[0], keyword_coords[1]
+            search_window_px = regla.search_window_px
+            min_confidence = regla.min_conf_value
+            
+            if indice_palabras is not None:
+                window_words = [word_data[i] for i in indice_palabras.within_manhattan(keyword_x, keyword_y, search_window_px)]
+            else:
+                window_words = word_data
             
             # Filtrar palabras dentro de la ventana de búsqueda
             candidate_words = []
-            for word in word_data:
+            for word in window_words:
                 if word == keyword_match:
                     continue
                     
@@ -2429,28 +2487,22 @@ class AplicadorOCR:
                         })
             
             # Ordenar candidatos según preferencia de proximidad
-            sorted_candidates = self._sort_candidates_by_proximity_preference(candidate_words, proximity_preference)
+            sorted_candidates = self._sort_candidates_by_proximity_preference(candidate_words, regla.proximity_preference)
             
             # Aplicar patrones regex y validar exclusiones
             for candidate in sorted_candidates:
                 word_text = candidate['word'].get('text', '').strip()
                 
                 # Verificar exclusiones
-                if self._contains_exclusion_patterns(word_text, exclusion_patterns):
+                if regla.excluido(word_text):
                     continue
                 
-                # Aplicar patrones de valor
-                for pattern in value_patterns:
-                    try:
-                        matches = re.findall(pattern, word_text, re.IGNORECASE)
-                        if matches:
-                            # Tomar el primer grupo capturado o el match completo
-                            extracted = matches[0] if isinstance(matches[0], str) else matches[0][0] if matches[0] else word_text
-                            logger.debug(f"📝 Valor extraído con patrón '{pattern}': '{extracted}'")
-                            return extracted.strip()
-                    except Exception as e:
-                        logger.warning(f"⚠️ Error en regex pattern '{pattern}': {e}")
-                        continue
+                # Aplicar patrones de valor (el primer patrón que coincide decide)
+                for pattern in regla.value_patterns:
+                    extracted = self._primer_valor_regex(pattern, word_text)
+                    if extracted is not None:
+                        logger.debug(f"📝 Valor extraído con patrón '{pattern.pattern}': '{extracted}'")
+                        return extracted.strip()
             
             return ""
             
@@ -2492,83 +2544,52 @@ class AplicadorOCR:
             # Ordenar solo por distancia (any)
             return sorted(candidates, key=lambda c: c['distance'])
     
-    def _contains_exclusion_patterns(self, text, exclusion_patterns):
-        """Verifica si el texto contiene algún patrón de exclusión"""
-        text_lower = text.lower()
-        for pattern in exclusion_patterns:
-            if pattern.lower() in text_lower:
-                logger.debug(f"❌ Texto rechazado por exclusión '{pattern}': '{text}'")
-                return True
-        return False
-    
     def _all_coordinates_are_zero(self, word_data):
         """Verifica si todas las coordenadas están en [0,0,0,0] (caché hit)"""
         if not word_data:
             return True
         
-        for word in word_data:
-            coords = word.get('coordinates', [0, 0, 0, 0])
-            if coords != [0, 0, 0, 0]:
-                return False
-        
-        return True
+        tabla = word_data if isinstance(word_data, WordTable) else WordTable.from_words(word_data)
+        return tabla.all_coordinates_zero()
     
-    def _extract_value_from_text_fallback(self, full_text, keywords, value_patterns, exclusion_patterns):
+    def _extract_value_from_text_fallback(self, full_text, regla):
         """
         MANDATO CRÍTICO: Extracción por texto plano cuando coordenadas no están disponibles
         REASON: Fallback para casos de caché hit con coordenadas [0,0,0,0]
         IMPACT: Permite extracción correcta del campo "referencia" incluso con caché
         """
-        import re
-        
         try:
             # MANDATO 5/X: Búsqueda directa de patrones sin keywords (para teléfonos aislados)
-            if not keywords or keywords == [""]:
+            if regla.patrones_directos:
                 logger.debug("📱 MANDATO 5/X: Búsqueda directa de patrones sin keywords")
-                for pattern in value_patterns:
-                    try:
-                        matches = re.findall(pattern, full_text, re.IGNORECASE)
-                        if matches:
-                            extracted = matches[0] if isinstance(matches[0], str) else matches[0][0] if matches[0] else ""
-                            # Verificar exclusiones
-                            if not self._contains_exclusion_patterns(extracted, exclusion_patterns):
-                                logger.info(f"📱 MANDATO 5/X COMPLETADO: Teléfono extraído '{extracted}' con patrón directo '{pattern}'")
-                                return extracted.strip()
-                    except Exception as e:
-                        logger.warning(f"⚠️ Error en regex pattern directo '{pattern}': {e}")
-                        continue
+                for pattern in regla.value_patterns:
+                    extracted = self._primer_valor_regex(pattern, full_text)
+                    if extracted is not None:
+                        # Verificar exclusiones
+                        if not regla.excluido(extracted):
+                            logger.info(f"📱 MANDATO 5/X COMPLETADO: Teléfono extraído '{extracted}' con patrón directo '{pattern.pattern}'")
+                            return extracted.strip()
             
             # Buscar keywords en el texto completo (método original)
             text_lower = full_text.lower()
             
-            for keyword in keywords:
-                if not keyword:  # Skip empty keywords
+            for keyword, keyword_lower in regla.keywords_texto:
+                # Buscar keyword en texto
+                keyword_pos = text_lower.find(keyword_lower)
+                if keyword_pos == -1:
                     continue
-                    
-                keyword_lower = keyword.lower()
                 
-                # Buscar keyword en texto
-                if keyword_lower in text_lower:
-                    # Encontrar posición de la keyword
-                    keyword_pos = text_lower.find(keyword_lower)
-                    
-                    # Extraer texto después de la keyword (ventana de búsqueda)
-                    text_after_keyword = full_text[keyword_pos + len(keyword):keyword_pos + len(keyword) + 200]
-                    
-                    # Aplicar patrones regex para extraer valor
-                    for pattern in value_patterns:
-                        try:
-                            matches = re.findall(pattern, text_after_keyword, re.IGNORECASE)
-                            if matches:
-                                extracted = matches[0] if isinstance(matches[0], str) else matches[0][0] if matches[0] else ""
-                                
-                                # Verificar exclusiones
-                                if not self._contains_exclusion_patterns(extracted, exclusion_patterns):
-                                    logger.debug(f"📝 FALLBACK: Valor extraído '{extracted}' con patrón '{pattern}' después de keyword '{keyword}'")
-                                    return extracted.strip()
-                        except Exception as e:
-                            logger.warning(f"⚠️ Error en regex pattern fallback '{pattern}': {e}")
-                            continue
+                # Extraer texto después de la keyword (ventana de búsqueda)
+                text_after_keyword = full_text[keyword_pos + len(keyword):keyword_pos + len(keyword) + 200]
+                
+                # Aplicar patrones regex para extraer valor
+                for pattern in regla.value_patterns:
+                    extracted = self._primer_valor_regex(pattern, text_after_keyword)
+                    if extracted is not None:
+                        # Verificar exclusiones
+                        if not regla.excluido(extracted):
+                            logger.debug(f"📝 FALLBACK: Valor extraído '{extracted}' con patrón '{pattern.pattern}' después de keyword '{keyword}'")
+                            return extracted.strip()
             
             return ""
             
@@ -2702,6 +2723,7 @@ class AplicadorOCR:
         try:
             tolerance_h = global_settings.get('coordinate_tolerance', {}).get('horizontal', 50)
             tolerance_v = global_settings.get('coordinate_tolerance', {}).get('vertical', 20)
+            indice_palabras = None
             
             # Buscar keywords en las palabras detectadas
             for keyword in keywords:
@@ -2716,9 +2738,12 @@ class AplicadorOCR:
                         is_match = keyword.lower() in word_text
                     
                     if is_match:
+                        # Índice espacial construido una sola vez, con el primer keyword encontrado
+                        if indice_palabras is None:
+                            indice_palabras = spatial_processor.SpatialIndex(word_data, anchor='origin')
                         # Buscar valores cercanos espacialmente
                         nearby_value = self._find_nearby_value_by_patterns(
-                            word, word_data, patterns, tolerance_h, tolerance_v
+                            word, word_data, patterns, tolerance_h, tolerance_v, indice_palabras
                         )
                         if nearby_value:
                             return nearby_value
@@ -2729,8 +2754,8 @@ class AplicadorOCR:
             logger.warning(f"⚠️ Error en proximidad espacial: {e}")
             return None
     
-    def _find_nearby_value_by_patterns(self, anchor_word, word_data, patterns, tolerance_h, tolerance_v):
-        """Busca valores cercanos que coincidan con los patrones"""
+    def _find_nearby_value_by_patterns(self, anchor_word, word_data, patterns, tolerance_h, tolerance_v, indice_palabras=None):
+        """Busca valores cercanos que coincidan con los patrones (indice_palabras: SpatialIndex anchor='origin')"""
         try:
             anchor_coords = anchor_word.get('coordinates', [0, 0, 0, 0])
             if anchor_coords == [0, 0, 0, 0]:
@@ -2738,9 +2763,16 @@ class AplicadorOCR:
             
             anchor_x, anchor_y = anchor_coords[0], anchor_coords[1]
             
+            if indice_palabras is not None:
+                window_words = [word_data[i] for i in indice_palabras.in_box(
+                    anchor_x - tolerance_h, anchor_y - tolerance_v, anchor_x + tolerance_h, anchor_y + tolerance_v
+                )]
+            else:
+                window_words = word_data
+            
             # Buscar palabras cercanas espacialmente
             nearby_words = []
-            for word in word_data:
+            for word in window_words:
                 if word == anchor_word:
                     continue
                     
@@ -2875,9 +2907,12 @@ class AplicadorOCR:
         extracted_fields = []
         unmapped_segments = []
         
+        # Índice espacial (centros de caja) compartido por todos los campos
+        indice_palabras = spatial_processor.SpatialIndex(word_data, anchor='center')
+        
         # Procesar cada campo definido
         for field_name, keywords in pos_config['field_keywords'].items():
-            field_result = self._find_field_by_proximity(word_data, field_name, keywords, pos_config)
+            field_result = self._find_field_by_proximity(word_data, field_name, keywords, pos_config, indice_palabras)
             
             if field_result:
                 extracted_fields.append(field_result)
@@ -2911,7 +2946,7 @@ class AplicadorOCR:
         
         return extracted_fields, unmapped_segments
 
-    def _find_field_by_proximity(self, word_data, field_name, keywords, pos_config):
+    def _find_field_by_proximity(self, word_data, field_name, keywords, pos_config, indice_palabras=None):
         """
         FIX: Busca un campo específico usando proximidad y keywords contextuales
         REASON: Implementar lógica flexible de mapeo que maneja diferentes layouts de recibos
@@ -2932,7 +2967,7 @@ class AplicadorOCR:
             for keyword in keywords:
                 if keyword.lower() in label_text:
                     # Buscar valor asociado por proximidad
-                    value_candidate = self._find_nearest_value(word_data, i, tolerance)
+                    value_candidate = self._find_nearest_value(word_data, i, tolerance, indice_palabras)
                     
                     if value_candidate:
                         # Calcular score basado en confianza y proximidad
@@ -2960,16 +2995,30 @@ class AplicadorOCR:
         
         return best_match
 
-    def _find_nearest_value(self, word_data, label_index, tolerance):
+    def _find_nearest_value(self, word_data, label_index, tolerance, indice_palabras=None):
         """
         FIX: Encuentra el valor más cercano a un label basado en tolerancia posicional
         REASON: Manejar layouts donde valores están abajo, a la derecha, o cerca del label
         IMPACT: Mapeo flexible que funciona con diferentes diseños de recibos
+        
+        Con indice_palabras (SpatialIndex anchor='center') se consulta el vecino más cercano
+        que cumple la tolerancia en lugar de recorrer todas las palabras.
         """
         label_coords = word_data[label_index]['coordinates']
         label_x_center = (label_coords[0] + label_coords[2]) / 2
         label_y_center = (label_coords[1] + label_coords[3]) / 2
         
+        if indice_palabras is not None and len(indice_palabras) == len(word_data):
+            def dentro_de_tolerancia(i):
+                word_x_center, word_y_center = indice_palabras.points[i]
+                diagonal_dist = ((word_x_center - label_x_center) ** 2 + (word_y_center - label_y_center) ** 2) ** 0.5
+                return (abs(word_x_center - label_x_center) <= tolerance['horizontal'] or
+                        abs(word_y_center - label_y_center) <= tolerance['vertical'] or
+                        diagonal_dist <= tolerance['diagonal'])
+            
+            nearest = indice_palabras.nearest(label_x_center, label_y_center, dentro_de_tolerancia, exclude=label_index)
+            return word_data[nearest] if nearest is not None else None
+        
         best_candidate = None
         min_distance = float('inf')
         
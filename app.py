@@ -3,7 +3,9 @@ Aplicación Flask para el sistema OCR con interfaz web
 """
 
 import os
+import glob
 import logging
+import queue
 import threading
 import time
 import json
@@ -13,6 +15,9 @@ from flask import Flask, jsonify
 from werkzeug.middleware.proxy_fix import ProxyFix
 from memory_optimizer import memory_optimizer, start_memory_monitoring
 from memory_profiler_advanced import advanced_profiler
+from results_index import get_results_index
+from batch_manifest import get_batch_manifests
+from campos_empresariales import CLAVE_CAMPOS, registro_campos
 
 # Configurar logging
 logging.basicConfig(level=logging.DEBUG)
@@ -103,11 +108,61 @@ _ocr_orchestrator = None
 _worker_thread = None
 _worker_running = False
 
+# FIX: Estado explícito del warm-up para el endpoint /ready
+# REASON: El servicio aceptaba peticiones antes de que los modelos hubieran ejecutado su primera inferencia
+# IMPACT: Los balanceadores pueden esperar a /ready; tiempos de carga e inferencia por perfil visibles
+_preload_lock = threading.Lock()
+_warmup_start_lock = threading.Lock()
+_warmup_thread = None
+_warmup_state = {
+    'estado': 'pendiente',
+    'inicio': None,
+    'fin': None,
+    'duracion_s': None,
+    'perfiles': {},
+    'error': None
+}
+
+def get_warmup_status():
+    """Devuelve una copia del estado del warm-up y si el sistema está listo"""
+    estado = dict(_warmup_state)
+    estado['perfiles'] = dict(_warmup_state['perfiles'])
+    estado['ready'] = _ocr_components_loaded and _warmup_state['estado'] == 'completado'
+    return estado
+
+def start_warmup():
+    """
+    Lanza la pre-carga y el warm-up en segundo plano para no bloquear el arranque del servidor
+    
+    También reintenta un warm-up que terminó en error (lo invoca /ready mientras el estado sea 'error').
+    """
+    global _warmup_thread
+    
+    with _warmup_start_lock:
+        if _ocr_components_loaded or _warmup_state['estado'] == 'en_progreso':
+            return
+        if _warmup_thread is not None and _warmup_thread.is_alive():
+            return
+        _warmup_thread = threading.Thread(target=preload_ocr_components, name="ocr-warmup", daemon=True)
+        _warmup_thread.start()
+
 def preload_ocr_components():
-    """Pre-carga componentes OCR en memoria para worker asíncrono"""
+    """Pre-carga componentes OCR en memoria y ejecuta el warm-up de los perfiles configurados"""
     global _ocr_components_loaded, _ocr_orchestrator
     
-    if not _ocr_components_loaded:
+    with _preload_lock:
+        if _ocr_components_loaded:
+            return
+        
+        _warmup_state.update({
+            'estado': 'en_progreso',
+            'inicio': datetime.now().isoformat(),
+            'fin': None,
+            'duracion_s': None,
+            'error': None
+        })
+        start = time.time()
+        
         try:
             logger.info("Pre-cargando componentes OCR para sistema asíncrono...")
             
@@ -124,10 +179,16 @@ def preload_ocr_components():
                 
                 _ocr_orchestrator = OrquestadorOCR()
                 
-                # Warm-up de modelos críticos con control de memoria
-                _ocr_orchestrator.aplicador._warmup_common_models()
+                # Warm-up de modelos críticos con un recibo sintético por perfil
+                perfiles = _ocr_orchestrator.aplicador._warmup_common_models()
+                _warmup_state['perfiles'] = dict(perfiles)
+                
+                errores = [p for p, stats in perfiles.items() if 'error' in stats]
+                if errores:
+                    raise RuntimeError(f"Warm-up fallido en perfiles: {', '.join(errores)}")
                 
                 _ocr_components_loaded = True
+                _warmup_state['estado'] = 'completado'
                 logger.info("✅ Componentes OCR pre-cargados exitosamente")
             
             # Analizar memoria post-carga
@@ -135,58 +196,241 @@ def preload_ocr_components():
             advanced_profiler.optimize_based_on_analysis()
             
         except Exception as e:
+            # Sin orquestador el siguiente job (o /ready) vuelve a intentar la pre-carga y el warm-up
+            _ocr_orchestrator = None
+            _warmup_state.update({'estado': 'error', 'error': str(e)})
             logger.error(f"Error pre-cargando componentes OCR: {e}")
+        finally:
+            _warmup_state['fin'] = datetime.now().isoformat()
+            _warmup_state['duracion_s'] = round(time.time() - start, 3)
 
-def batch_processing_worker():
-    """
-    FIX: Worker asíncrono de procesamiento por lotes en hilo separado
-    REASON: Procesar imágenes continuamente sin bloquear servidor Flask
-    IMPACT: Sistema verdaderamente asíncrono que maneja colas de alto volumen
+# FIX: Cola de trabajos de lotes desacoplada de la petición HTTP
+# REASON: process_batch retenía un worker de Flask durante minutos y los clientes expiraban
+# IMPACT: El endpoint encola y responde de inmediato; un pool de workers persistentes consume la cola
+_batch_job_queue = queue.Queue()
+# IDs de los jobs aún en cola, en el mismo orden que _batch_job_queue (para queue_position)
+_pending_job_ids = []
+_batch_jobs = {}
+_batch_jobs_lock = threading.Lock()
+_claimed_files = set()
+_worker_threads = []
+# Orquestador propio de cada worker: AplicadorOCR guarda estado por llamada (_last_ocr_result),
+# mientras que los predictores OnnxTR se comparten a nivel de clase
+_worker_local = threading.local()
+
+def enqueue_batch_job(request_id, profile='ultra_rapido', max_files=50, on_complete=None):
     """
-    global _worker_running, _ocr_orchestrator
+    Registra un job de lote y lo encola para el pool de workers
     
-    from config import get_batch_config, get_async_directories
-    import glob
-    import json
-    import shutil
-    from datetime import datetime
+    Las imágenes del inbox se reclaman en el momento de encolar, de modo que dos
+    jobs simultáneos nunca procesan el mismo archivo.
     
-    batch_config = get_batch_config()
+    Args:
+        request_id: ID único del lote de ejecución
+        profile: Perfil OCR a aplicar
+        max_files: Máximo de imágenes a reclamar para este job
+        on_complete: Callable(job) invocado por el worker al finalizar el job
+        
+    Returns:
+        dict: Estado inicial del job, o None si el inbox no tiene imágenes sin reclamar (no se encola nada)
+    """
+    from config import get_async_directories
     directories = get_async_directories()
     
-    logger.info("🚀 Worker de procesamiento por lotes iniciado")
+    inbox_files = []
+    for pattern in ("*.png", "*.jpg", "*.jpeg"):
+        inbox_files.extend(glob.glob(os.path.join(directories['inbox'], pattern)))
+    
+    with _batch_jobs_lock:
+        image_files = [f for f in sorted(inbox_files) if f not in _claimed_files][:max_files]
+        if not image_files:
+            # Un job vacío terminaría sin procesar nada mientras el cliente lo consulta
+            logger.info(f"📭 Lote {request_id} no encolado: no hay imágenes pendientes en el inbox")
+            return None
+        _claimed_files.update(image_files)
+        
+        job = {
+            'request_id': request_id,
+            'profile': profile,
+            'estado': 'en_cola',
+            'status': 'pending',
+            'image_files': image_files,
+            'imagenes': {
+                os.path.basename(f): {'estado': 'pendiente', 'result_id': None}
+                for f in image_files
+            },
+            'total_files': len(image_files),
+            'processed_count': 0,
+            'error_count': 0,
+            'enqueued_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'batch_info': {},
+            'on_complete': on_complete
+        }
+        _batch_jobs[request_id] = job
+        _prune_finished_jobs()
+        
+        # Dentro del lock: la cola y la lista de pendientes conservan el mismo orden
+        _pending_job_ids.append(request_id)
+        _batch_job_queue.put(request_id)
+    
+    logger.info(f"📥 Job de lote encolado: {request_id} ({len(image_files)} imágenes, cola={_batch_job_queue.qsize()})")
+    return get_batch_job_status(request_id)
+
+def get_batch_job_status(request_id):
+    """Devuelve una copia serializable del estado de un job de lote (None si no existe)"""
+    with _batch_jobs_lock:
+        job = _batch_jobs.get(request_id)
+        if job is None:
+            return None
+        
+        imagenes = [
+            {'filename': filename, **estado}
+            for filename, estado in job['imagenes'].items()
+        ]
+        completed = job['processed_count'] + job['error_count']
+        return {
+            'request_id': job['request_id'],
+            'batch_id': job['request_id'],
+            'profile': job['profile'],
+            'estado': job['estado'],
+            'status': job['status'],
+            'total_files': job['total_files'],
+            'processed_count': job['processed_count'],
+            'error_count': job['error_count'],
+            'pending_count': job['total_files'] - completed,
+            'progress': {
+                'processed': completed,
+                'total': job['total_files'],
+                'percentage': round(completed * 100 / job['total_files'], 1) if job['total_files'] else 100.0
+            },
+            'results_available': job['processed_count'] > 0,
+            'imagenes': imagenes,
+            'enqueued_at': job['enqueued_at'],
+            'started_at': job['started_at'],
+            'finished_at': job['finished_at'],
+            'batch_info': job['batch_info'],
+            # Posición 1-based entre los jobs pendientes (0 si ya salió de la cola)
+            'queue_position': _pending_job_ids.index(request_id) + 1 if request_id in _pending_job_ids else 0
+        }
+
+def get_batch_queue_stats():
+    """Resumen del pool de workers y de la cola de jobs"""
+    with _batch_jobs_lock:
+        estados = [job['status'] for job in _batch_jobs.values()]
+    return {
+        'workers': len([t for t in _worker_threads if t.is_alive()]),
+        'jobs_pending': estados.count('pending'),
+        'jobs_processing': estados.count('processing'),
+        'jobs_completed': estados.count('completed'),
+        'jobs_failed': estados.count('failed')
+    }
+
+def _prune_finished_jobs():
+    """Descarta los jobs finalizados más antiguos (requiere _batch_jobs_lock)"""
+    history_length = batch_config.get('job_history_length', 200)
+    finished = [rid for rid, job in _batch_jobs.items() if job['status'] in ('completed', 'failed')]
+    for rid in finished[:max(0, len(finished) - history_length)]:
+        del _batch_jobs[rid]
+
+def _update_job_image(request_id, filename, estado, resultado):
+    """Callback de progreso por imagen usado por process_queue_batch"""
+    with _batch_jobs_lock:
+        job = _batch_jobs.get(request_id)
+        if job is None or filename not in job['imagenes']:
+            return
+        
+        job['imagenes'][filename]['estado'] = estado
+        if estado == 'exitoso':
+            job['processed_count'] += 1
+            job['imagenes'][filename]['result_id'] = (resultado or {}).get('request_id')
+        elif estado == 'error':
+            job['error_count'] += 1
+            job['imagenes'][filename]['error'] = (resultado or {}).get('error', 'Error de procesamiento')
+
+def _run_batch_job(request_id):
+    """Ejecuta un job de lote completo dentro de un worker del pool"""
+    with _batch_jobs_lock:
+        if request_id in _pending_job_ids:
+            _pending_job_ids.remove(request_id)
+        job = _batch_jobs.get(request_id)
+        if job is None:
+            return
+        job['estado'] = 'procesando'
+        job['status'] = 'processing'
+        job['started_at'] = datetime.now().isoformat()
+        image_files = list(job['image_files'])
+        profile = job['profile']
+        on_complete = job['on_complete']
+    
+    try:
+        if not _ocr_components_loaded:
+            preload_ocr_components()
+        orchestrator = getattr(_worker_local, 'orchestrator', None)
+        if orchestrator is None:
+            from main_ocr_process import OrquestadorOCR
+            orchestrator = OrquestadorOCR()
+            _worker_local.orchestrator = orchestrator
+        
+        with memory_optimizer.memory_context(f"job de lote {request_id} ({len(image_files)} imágenes)"):
+            resultado = orchestrator.process_queue_batch(
+                max_files=len(image_files),
+                profile=profile,
+                request_id=request_id,
+                image_files=image_files,
+                progress_callback=lambda filename, estado, res: _update_job_image(request_id, filename, estado, res)
+            )
+        
+        with _batch_jobs_lock:
+            job['batch_info'] = resultado.get('batch_info', {}) if isinstance(resultado, dict) else {}
+            failed = isinstance(resultado, dict) and resultado.get('status') == 'error'
+            job['estado'] = 'error' if failed else 'completado'
+            job['status'] = 'failed' if failed else 'completed'
+        
+        logger.info(f"✅ Job de lote {request_id} finalizado: {job['processed_count']} éxitos, {job['error_count']} errores")
+        
+    except Exception as e:
+        logger.error(f"Error ejecutando job de lote {request_id}: {e}")
+        with _batch_jobs_lock:
+            job['estado'] = 'error'
+            job['status'] = 'failed'
+            job['batch_info'] = {'error': str(e)}
+    
+    finally:
+        with _batch_jobs_lock:
+            job['finished_at'] = datetime.now().isoformat()
+            _claimed_files.difference_update(image_files)
+        
+        if on_complete:
+            try:
+                on_complete(get_batch_job_status(request_id))
+            except Exception as e:
+                logger.error(f"Error en callback de finalización del job {request_id}: {e}")
+
+def batch_processing_worker():
+    """
+    FIX: Worker persistente del pool que consume la cola de jobs de lotes
+    REASON: El bucle de sondeo del inbox quedó inerte al exigir activación manual
+    IMPACT: Los jobs encolados por /api/ocr/process_batch se procesan fuera del ciclo HTTP
+    """
+    logger.info(f"🚀 Worker de procesamiento por lotes iniciado: {threading.current_thread().name}")
     
     while _worker_running:
         try:
-            # Verificar si hay imágenes en inbox
-            inbox_pattern = os.path.join(directories['inbox'], "*.png") + " " + \
-                           os.path.join(directories['inbox'], "*.jpg")
-            
-            image_files = []
-            for pattern in [os.path.join(directories['inbox'], "*.png"),
-                           os.path.join(directories['inbox'], "*.jpg"),
-                           os.path.join(directories['inbox'], "*.jpeg")]:
-                image_files.extend(glob.glob(pattern))
-            
-            # FIX: DESHABILITADO procesamiento automático de imágenes en cola
-            # REASON: Usuario reporta procesamiento no deseado tras 1 minuto de espera
-            # IMPACT: Sistema requiere activación manual explícita vía botón o API
-            
-            # Solo monitorear estado, NO procesar automáticamente
-            # if image_files:
-            #     logger.info(f"Imágenes en cola: {len(image_files)} - esperando activación manual")
-            
-            # Esperar antes del siguiente ciclo de monitoreo
-            time.sleep(batch_config['polling_interval_seconds'])
-            
+            request_id = _batch_job_queue.get(timeout=batch_config['polling_interval_seconds'])
+        except queue.Empty:
+            continue
+        
+        try:
+            _run_batch_job(request_id)
         except Exception as e:
             logger.error(f"Error en worker de lotes: {e}")
-            time.sleep(10)  # Esperar más en caso de error
+        finally:
+            _batch_job_queue.task_done()
 
 def process_batch(image_paths, directories):
     """Procesa un lote de imágenes"""
-    global _ocr_orchestrator
-    
     with memory_optimizer.memory_context(f"procesamiento de lote ({len(image_paths)} imágenes)"):
         try:
             # Mover imágenes a processing
@@ -255,6 +499,13 @@ def process_batch(image_paths, directories):
                     else:
                         result_converted = result
                     
+                    # Campos empresariales extraídos una sola vez (las exportaciones solo serializan)
+                    if isinstance(result_converted, dict):
+                        try:
+                            result_converted[CLAVE_CAMPOS] = registro_campos(result_converted)
+                        except Exception as e:
+                            logger.error(f"Error extrayendo campos empresariales de {filename}: {e}")
+                    
                     # Añadir información adicional para debug en español
                     if isinstance(result_converted, dict):
                         result_converted['info_guardado'] = {
@@ -266,6 +517,8 @@ def process_batch(image_paths, directories):
                     
                     with open(result_path, 'w', encoding='utf-8') as f:
                         json.dump(result_converted, f, ensure_ascii=False, indent=2)
+                    get_results_index().registrar(result_path, result_converted)
+                    get_batch_manifests().registrar(result_path, result_converted)
                     
                     logger.info(f"✅ JSON guardado exitosamente: {result_filename} ({result_converted.get('coordenadas_disponibles', 0)} coordenadas)")
                     
@@ -449,24 +702,45 @@ def _validate_whatsapp_fields(numerosorteo, idWhatsapp, nombre, horamin):
     return True
 
 def start_batch_worker():
-    """Inicia el worker asíncrono"""
+    """Inicia el pool de workers asíncronos"""
     global _worker_thread, _worker_running
     
+    if not _worker_running and any(worker.is_alive() for worker in _worker_threads):
+        # stop_batch_worker agotó su timeout: un segundo pool consumiría la cola junto al anterior
+        logger.warning("Workers asíncronos anteriores aún activos: no se inicia un segundo pool")
+        return
+    
     if not _worker_running and batch_config.get('enable_batch_processing', True):
         _worker_running = True
-        _worker_thread = threading.Thread(target=batch_processing_worker, daemon=True)
-        _worker_thread.start()
+        
+        pool_size = max(1, batch_config.get('worker_pool_size', 1))
+        for i in range(pool_size):
+            worker = threading.Thread(target=batch_processing_worker, name=f"ocr-batch-worker-{i}", daemon=True)
+            worker.start()
+            _worker_threads.append(worker)
+        _worker_thread = _worker_threads[0]
         
         # Iniciar monitoreo de memoria
         start_memory_monitoring()
         
-        logger.info("Worker asíncrono iniciado con monitoreo de memoria")
+        logger.info(f"Pool de {pool_size} workers asíncronos iniciado con monitoreo de memoria")
 
-def stop_batch_worker():
-    """Detiene el worker asíncrono"""
+def stop_batch_worker(timeout=None):
+    """
+    Detiene el pool de workers asíncronos
+    
+    Cada worker termina el job en curso y sale en su siguiente sondeo de la cola; se espera a que
+    terminen antes de vaciar la lista para que un start_batch_worker posterior no conviva con ellos.
+    """
     global _worker_running
     _worker_running = False
-    logger.info("Worker asíncrono detenido")
+    for worker in list(_worker_threads):
+        worker.join(timeout)
+    _worker_threads[:] = [worker for worker in _worker_threads if worker.is_alive()]
+    if _worker_threads:
+        logger.warning(f"{len(_worker_threads)} workers asíncronos siguen procesando un job tras {timeout}s")
+    else:
+        logger.info("Workers asíncronos detenidos")
 
 # Importar configuraciones y rutas
 from config import get_batch_config
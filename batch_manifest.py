@@ -0,0 +1,256 @@
+"""
+Manifiestos de lote
+Un archivo JSON Lines por lote (data/manifests/<lote_id>.jsonl), de solo anexado: el orquestador escribe una
+línea por imagen completada y una línea por cada movimiento o borrado posterior del resultado. Consultar,
+descargar o listar un lote solo lee su manifiesto, sin recorrer todos los resultados procesados.
+"""
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import config
+from results_index import lote_desde_nombre, resumen_resultado
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_MANIFIESTO = '.jsonl'
+
+
+class BatchManifests:
+    """
+    Manifiestos de lote de solo anexado
+
+    - Se crean de forma perezosa con el primer resultado completado del lote
+    - Cada línea es un evento: 'resultado', 'movido' o 'eliminado'; el estado del lote se obtiene
+      aplicándolos en orden
+    - Las líneas se escriben con una sola llamada write en modo append, de modo que varios procesos
+      (pool de workers OCR) pueden anexar al mismo manifiesto sin intercalar líneas
+    """
+
+    def __init__(self, manifest_config=None):
+        manifest_config = manifest_config or config.BATCH_MANIFEST_CONFIG
+
+        self.enabled = manifest_config.get('enabled', True)
+        self.directory = Path(manifest_config.get('directory', config.BASE_DIR / 'data' / 'manifests'))
+        self._lock = threading.Lock()
+
+        if self.enabled:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if manifest_config.get('reconcile_on_startup', True):
+                self.reconciliar()
+
+    def ruta(self, lote_id):
+        """Ruta del manifiesto de un lote"""
+        return self.directory / f"{lote_id}{EXTENSION_MANIFIESTO}"
+
+    def _anexar(self, lote_id, evento):
+        linea = json.dumps(evento, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            with open(self.ruta(lote_id), 'a', encoding='utf-8') as f:
+                f.write(linea)
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def registrar(self, json_path, data=None, directorio='results'):
+        """Anexa al manifiesto de su lote un resultado recién guardado"""
+        if not self.enabled:
+            return
+        filename = os.path.basename(str(json_path))
+        lote_id, _ = lote_desde_nombre(filename)
+        if lote_id is None or filename.endswith('_resultados.json'):
+            return
+        try:
+            modificado_en = os.stat(json_path).st_mtime
+        except OSError:
+            modificado_en = datetime.now().timestamp()
+        try:
+            self._anexar(lote_id, {
+                'evento': 'resultado',
+                'filename': filename,
+                'directorio': directorio,
+                'modificado_en': modificado_en,
+                'exitoso': resumen_resultado(data, 0)['exitoso'] if data is not None else True,
+                'registrado_en': datetime.now().isoformat()
+            })
+        except OSError as e:
+            logger.warning(f"Manifiesto de lote {lote_id}: no se pudo registrar {filename}: {e}")
+
+    def mover(self, filename, directorio_origen, nuevo_filename, directorio_destino):
+        """Anexa el movimiento de un resultado (p.ej. results → historial)"""
+        lote_id, _ = lote_desde_nombre(filename)
+        if not self.enabled or lote_id is None or not self.ruta(lote_id).exists():
+            return
+        try:
+            self._anexar(lote_id, {
+                'evento': 'movido',
+                'filename': filename,
+                'directorio': directorio_origen,
+                'nuevo_filename': nuevo_filename,
+                'nuevo_directorio': directorio_destino
+            })
+        except OSError as e:
+            logger.warning(f"Manifiesto de lote {lote_id}: no se pudo registrar el movimiento de {filename}: {e}")
+
+    def eliminar(self, filename, directorio):
+        """Anexa el borrado de un resultado; el manifiesto se elimina cuando el lote queda vacío"""
+        lote_id, _ = lote_desde_nombre(filename)
+        if not self.enabled or lote_id is None or not self.ruta(lote_id).exists():
+            return
+        try:
+            self._anexar(lote_id, {'evento': 'eliminado', 'filename': filename, 'directorio': directorio})
+            if not self.archivos(lote_id):
+                self.ruta(lote_id).unlink()
+        except OSError as e:
+            logger.warning(f"Manifiesto de lote {lote_id}: no se pudo registrar el borrado de {filename}: {e}")
+
+    def reconciliar(self):
+        """
+        Crea los manifiestos que faltan para los lotes presentes en el índice de resultados
+
+        Cubre los lotes procesados antes de existir los manifiestos; los lotes que ya tienen
+        manifiesto no se leen.
+        """
+        if not self.enabled:
+            return
+        from results_index import get_results_index
+        results_index = get_results_index()
+        creados = 0
+        for lote_id in results_index.lotes():
+            if self.ruta(lote_id).exists():
+                continue
+            lineas = [
+                json.dumps({
+                    'evento': 'resultado',
+                    'filename': fila['filename'],
+                    'directorio': fila['directorio'],
+                    'modificado_en': fila['modificado_en'],
+                    'exitoso': fila['exitoso'],
+                    'registrado_en': fila['procesado_en']
+                }, ensure_ascii=False, default=str) + '\n'
+                for fila in results_index.archivos_de_lote(lote_id)
+            ]
+            if not lineas:
+                continue
+            tmp_path = self.ruta(lote_id).with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(lineas)
+            os.replace(tmp_path, self.ruta(lote_id))
+            creados += 1
+        if creados:
+            logger.info(f"Manifiestos de lote reconciliados: {creados} creados desde el índice de resultados")
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def archivos(self, lote_id):
+        """
+        Resultados vigentes de un lote, más recientes primero
+
+        Returns:
+            Lista de dicts (filename, directorio, filepath, modificado_en, exitoso) o None si el lote
+            no tiene manifiesto (o los manifiestos están desactivados)
+        """
+        if not self.enabled:
+            return None
+        vigentes = {}
+        try:
+            with open(self.ruta(lote_id), 'r', encoding='utf-8') as f:
+                for linea in f:
+                    try:
+                        evento = json.loads(linea)
+                    except ValueError:
+                        # Línea truncada (p.ej. caída durante la escritura): se ignora
+                        continue
+                    clave = (evento.get('directorio'), evento.get('filename'))
+                    tipo = evento.get('evento')
+                    if tipo == 'resultado':
+                        vigentes[clave] = evento
+                    elif tipo == 'movido' and clave in vigentes:
+                        entrada = vigentes.pop(clave)
+                        entrada['filename'] = evento['nuevo_filename']
+                        entrada['directorio'] = evento['nuevo_directorio']
+                        vigentes[(entrada['directorio'], entrada['filename'])] = entrada
+                    elif tipo == 'eliminado':
+                        vigentes.pop(clave, None)
+        except FileNotFoundError:
+            return None
+
+        from config import get_async_directories
+        directories = get_async_directories()
+        rutas = {
+            'results': directories['results'],
+            'historial': directories.get('historial', 'data/historial')
+        }
+        archivos = []
+        for entrada in vigentes.values():
+            archivos.append({
+                'filename': entrada['filename'],
+                'directorio': entrada['directorio'],
+                'filepath': os.path.join(rutas.get(entrada['directorio'], ''), entrada['filename']),
+                'modificado_en': entrada.get('modificado_en', 0),
+                'exitoso': bool(entrada.get('exitoso'))
+            })
+        archivos.sort(key=lambda archivo: archivo['modificado_en'], reverse=True)
+        return archivos
+
+    def lotes(self):
+        """Lotes con manifiesto, más recientes primero (el id BATCH_YYYYMMDD_HHMMSS ordena por fecha)"""
+        if not self.enabled:
+            return []
+        with os.scandir(self.directory) as entries:
+            lotes = [
+                entry.name[:-len(EXTENSION_MANIFIESTO)] for entry in entries
+                if entry.name.endswith(EXTENSION_MANIFIESTO) and entry.is_file()
+            ]
+        return sorted(lotes, reverse=True)
+
+    def historial_lotes(self, limit=None, offset=0):
+        """
+        Lotes paginados (más recientes primero) con contadores de éxito/error
+
+        Solo se leen los manifiestos de la página pedida.
+
+        Returns:
+            tuple: (lista de lotes de la página, total de lotes)
+        """
+        lotes = self.lotes()
+        pagina = lotes[offset:] if limit is None else lotes[offset:offset + limit]
+        resultado = []
+        for lote_id in pagina:
+            archivos = self.archivos(lote_id) or []
+            _, lote_fecha = lote_desde_nombre(f"{lote_id}_")
+            resultado.append({
+                'id': lote_id,
+                'date': lote_fecha,
+                'files': sorted(archivo['filename'] for archivo in archivos),
+                'total_archivos': len(archivos),
+                'exitosos': sum(1 for archivo in archivos if archivo['exitoso'])
+            })
+        return resultado, len(lotes)
+
+
+_batch_manifests = None
+_batch_manifests_lock = threading.Lock()
+
+
+def get_batch_manifests():
+    """Devuelve los manifiestos de lote compartidos del proceso"""
+    global _batch_manifests
+
+    if _batch_manifests is None:
+        with _batch_manifests_lock:
+            if _batch_manifests is None:
+                try:
+                    _batch_manifests = BatchManifests()
+                except Exception as e:
+                    # Sin manifiestos las consultas de lote usan el índice de resultados
+                    logger.error(f"No se pudieron abrir los manifiestos de lote, se usa el índice de resultados: {e}")
+                    _batch_manifests = BatchManifests({'enabled': False})
+    return _batch_manifests
@@ -0,0 +1,1191 @@
+"""
+Campos empresariales de los recibos procesados
+Se extraen una sola vez al procesar la imagen y se guardan en el JSON de resultado con una versión de
+esquema; las exportaciones (extract_results, historial, descarga de lotes) solo serializan, salvo los
+resultados anteriores a la versión actual, que se extraen y se guardan la primera vez que se leen. Cuando
+cambian las reglas de extracción, un job explícito recalcula los campos de los resultados guardados.
+"""
+
+import os
+import re
+import json
+import logging
+import tempfile
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# FIX: Versión del esquema de campos empresariales persistidos
+# REASON: Las exportaciones ya no reextraen; hay que saber qué resultados se extrajeron con reglas antiguas
+# IMPACT: Incrementar al cambiar las reglas de este módulo y lanzar el job de reextracción
+CAMPOS_SCHEMA_VERSION = 1
+
+# Clave del JSON de resultado donde se guarda el registro versionado
+CLAVE_CAMPOS = 'campos_empresariales'
+
+
+def registro_campos(result_data):
+    """
+    Extrae los campos empresariales de un resultado y los envuelve en el registro versionado
+
+    Returns:
+        dict: {'schema_version', 'fecha_extraccion', 'campos'}
+    """
+    return {
+        'schema_version': CAMPOS_SCHEMA_VERSION,
+        'fecha_extraccion': datetime.now().isoformat(),
+        'campos': extraer_campos_empresariales(result_data, texto_completo_resultado(result_data))
+    }
+
+
+def campos_persistidos(result_data):
+    """Campos empresariales guardados en el resultado ({} si se procesó antes de persistirlos)"""
+    registro = result_data.get(CLAVE_CAMPOS) if isinstance(result_data, dict) else None
+    if isinstance(registro, dict) and isinstance(registro.get('campos'), dict):
+        return registro['campos']
+    return {}
+
+
+def campos_vigentes(result_data):
+    """True si el resultado tiene campos extraídos con la versión de esquema actual"""
+    registro = result_data.get(CLAVE_CAMPOS) if isinstance(result_data, dict) else None
+    return isinstance(registro, dict) and registro.get('schema_version') == CAMPOS_SCHEMA_VERSION
+
+
+def actualizar_campos_en_lectura(result_data, json_path, directorio='results'):
+    """
+    Garantiza que result_data tenga campos empresariales vigentes antes de exportarlo
+
+    FIX: Los resultados sin campos (o de otro esquema) se extraen y se persisten al leerlos
+    REASON: Los JSON escritos antes de persistir los campos se exportaban con referencia/monto/cédula vacíos
+            hasta que un operador lanzara POST /api/results/reextract
+    IMPACT: La primera exportación actualiza cada resultado antiguo; las siguientes solo serializan
+
+    Returns:
+        bool: True si hubo que extraer los campos (el llamador invalida los consolidados de su lote)
+    """
+    if campos_vigentes(result_data):
+        return False
+    result_data[CLAVE_CAMPOS] = registro_campos(result_data)
+    try:
+        from results_index import get_results_index
+        _guardar_resultado(json_path, result_data)
+        get_results_index().registrar(json_path, result_data, directorio=directorio)
+    except Exception as e:
+        # La exportación usa los campos recién extraídos aunque no se hayan podido guardar
+        logger.warning(f"No se pudieron persistir los campos empresariales de {json_path}: {e}")
+    return True
+
+
+def normalizar_monto_venezolano(monto_str):
+    """
+    MANDATO FASE 2: Normalización de montos de los campos empresariales
+    PROBLEMA: "210,00" convertido a "2706102.00"
+    SOLUCIÓN: Detectar y normalizar formato venezolano correctamente
+    """
+    try:
+        # Limpiar espacios y caracteres no numéricos excepto comas y puntos
+        monto_limpio = re.sub(r'[^\d.,]', '', monto_str)
+        
+        # DETECCIÓN ESPECÍFICA: Formato venezolano con coma como separador decimal
+        if ',' in monto_limpio and monto_limpio.count(',') == 1:
+            partes = monto_limpio.split(',')
+            # Verificar que la parte decimal tenga exactamente 2 dígitos (formato venezolano)
+            if len(partes) == 2 and partes[1].isdigit() and len(partes[1]) == 2:
+                # Formato venezolano confirmado: 210,00 → 210.00
+                parte_entera = partes[0].replace('.', '')  # Eliminar puntos de miles si existen
+                parte_decimal = partes[1]
+                monto_normalizado = f"{parte_entera}.{parte_decimal}"
+                logger.info(f"🏆 MANDATO FASE 2: Monto venezolano normalizado: {monto_str} → {monto_normalizado}")
+                return monto_normalizado
+        
+        # Formato internacional: eliminar puntos de miles, convertir coma a punto decimal
+        if '.' in monto_limpio and ',' in monto_limpio:
+            # Formato 1.234,56 → 1234.56
+            monto_normalizado = monto_limpio.replace('.', '').replace(',', '.')
+            return monto_normalizado
+        
+        # Solo números con puntos (posible formato miles): 1.234 → 1234
+        if '.' in monto_limpio and not ',' in monto_limpio:
+            # Verificar si es separador de miles o decimal
+            partes = monto_limpio.split('.')
+            if len(partes) == 2 and len(partes[1]) == 2:
+                # Probable decimal: 210.00
+                return monto_limpio
+            else:
+                # Probable separador de miles: 1.234 → 1234
+                return monto_limpio.replace('.', '')
+        
+        # Solo números enteros
+        return monto_limpio
+        
+    except Exception as e:
+        logger.warning(f"Error normalizando monto '{monto_str}': {e}")
+        return monto_str
+
+
+def texto_completo_resultado(result_data):
+    """
+    FIX: Extrae el texto completo desde diferentes ubicaciones posibles en result_data
+    REASON: Texto puede estar en diferentes campos según la estructura del resultado
+    IMPACT: Extracción consistente de texto para análisis empresarial
+    """
+    if not isinstance(result_data, dict):
+        return ""
+    
+    # Buscar texto en diferentes ubicaciones posibles
+    text_sources = [
+        result_data.get('datos_extraidos', {}).get('texto_completo', ''),
+        result_data.get('texto_extraido', ''),
+        result_data.get('texto_completo', ''),
+        result_data.get('ocr_data', {}).get('texto_completo', ''),
+        result_data.get('text', ''),
+        result_data.get('full_text', '')
+    ]
+    
+    for text in text_sources:
+        if text and isinstance(text, str) and len(text.strip()) > 0:
+            return text.strip()
+    
+    return ""
+
+
+def extraer_campos_empresariales(result_data, texto_completo):
+    """
+    FIX: Extracción inteligente de campos empresariales específicos desde OCR
+    REASON: Mapeo automático de campos empresariales desde datos estructurados de OCR
+    IMPACT: Campos empresariales extraídos automáticamente cuando están disponibles
+    """
+    import re
+    
+    # Inicializar campos empresariales
+    campos = {
+        'otro': '',
+        'referencia': '',
+        'bancoorigen': '',
+        'monto': '',
+        'cedula': '',
+        'telefono': '',
+        'banco_destino': '',
+        'pago_fecha': '',
+        'concepto': '',
+        'caption': '',  # FIX: Agregar caption explícitamente
+        'nombre_beneficiario': '',  # FIX: NUEVO CAMPO CRÍTICO - MANDATO REFINAMIENTO
+        'confidence': 0,
+        'total_words': 0
+    }
+    
+    # FIX: Extraer estadísticas técnicas desde estructura real de datos
+    # REASON: estadisticas_ocr no existe, datos están directamente en result_data
+    # IMPACT: Extracción correcta de confidence y total_words reales
+    if isinstance(result_data, dict):
+        datos_extraidos = result_data.get('datos_extraidos', {})
+        
+        # FIX: Calcular estadísticas desde palabras_detectadas reales
+        palabras_detectadas = datos_extraidos.get('palabras_detectadas', [])
+        if palabras_detectadas:
+            # Calcular confianza promedio real
+            confidencias = [p.get('confianza', 0) for p in palabras_detectadas if isinstance(p, dict)]
+            if confidencias:
+                campos['confidence'] = round(sum(confidencias) / len(confidencias), 3)
+                campos['total_words'] = len(palabras_detectadas)
+        
+        # MANDATO CRÍTICO #2: INTEGRACIÓN DIRECTA DE LÓGICA DE ORO COORDENADAS
+        # REASON: Usar campos texto_total_ocr y concepto_empresarial ya procesados por lógica de oro
+        # IMPACT: Texto estructurado y concepto refinado automáticamente disponibles
+        texto_total_ocr_coordenadas = datos_extraidos.get('texto_total_ocr', '')
+        concepto_empresarial_refinado = datos_extraidos.get('concepto_empresarial', '')
+        texto_completo_local = datos_extraidos.get('texto_completo', '')
+        
+        # PRIORIDAD MÁXIMA: Usar texto ordenado por coordenadas si está disponible
+        if texto_total_ocr_coordenadas:
+            campos['texto_total_ocr'] = texto_total_ocr_coordenadas
+            logger.info(f"🏗️ LÓGICA DE ORO APLICADA: {len(texto_total_ocr_coordenadas)} caracteres ordenados por coordenadas")
+        else:
+            # Fallback al texto tradicional
+            campos['texto_total_ocr'] = texto_completo_local
+            logger.info(f"📄 Texto tradicional usado: {len(texto_completo_local)} caracteres")
+        
+        # MANDATO CRÍTICO #2: USO DIRECTO DE CONCEPTO EMPRESARIAL REFINADO
+        # REASON: Aplicar concepto ya procesado por lógica de oro con patrones empresariales
+        # IMPACT: Concepto ultra-conciso sin ruido, máximo 50 caracteres, núcleo semántico puro
+        if concepto_empresarial_refinado:
+            campos['concepto'] = concepto_empresarial_refinado
+            logger.info(f"🎯 CONCEPTO EMPRESARIAL REFINADO: '{concepto_empresarial_refinado}'")
+        elif not campos['concepto']:
+            # FALLBACK: Extracción tradicional como respaldo
+            texto_para_concepto = texto_total_ocr_coordenadas or texto_completo_local
+            if texto_para_concepto:
+                # PRIORIDAD MÁXIMA: Códigos y números de proyecto/referencia específicos
+                concepto_patterns = [
+                    r'(?:Concepto|CONCEPTO)[:=]?\s*([A-Z0-9\s]{3,25})',   # Códigos como "4 15 D 107"
+                    r'(?:Por|Para)[:=]?\s*([A-Za-z0-9\s]{5,30})',         # "Por: Pago Servicios"
+                    r'(?:Motivo|MOTIVO)[:=]?\s*([A-Za-z\s]{5,30})',       # Motivo conciso
+                    r'(Pago\s+(?:Móvil|Movil|de\s+\w+))',                # "Pago Móvil", "Pago de Servicios"
+                    r'(Transferencia\s+(?:a\s+\w+|Bancaria))',            # "Transferencia Bancaria"
+                    r'(Envío?\s+de\s+\w+)',                              # "Envío de Dinero"
+                    r'([A-Z0-9]{2,}\s+[A-Z0-9]{2,}\s+[A-Z0-9]{1,})',     # Códigos alfanuméricos separados
+                ]
+                
+                concepto_extraido = ""
+                for pattern in concepto_patterns:
+                    match = re.search(pattern, texto_para_concepto, re.IGNORECASE)
+                    if match:
+                        concepto_extraido = match.group(1).strip()
+                        # VALIDAR QUE NO SEA RUIDO (como "Crear Acceso directo")
+                        ruido_keywords = ['crear', 'acceso', 'directo', 'webpage', 'url', 'http', 'x', '-']
+                        texto_limpio = concepto_extraido.lower().replace(' ', '')
+                        if not any(ruido in texto_limpio for ruido in ruido_keywords):
+                            campos['concepto'] = concepto_extraido
+                            break
+                        else:
+                            concepto_extraido = ""  # Resetear si es ruido
+            
+            # FALLBACK ULTRA-ESPECÍFICO: Solo para casos extremos
+            if not concepto_extraido:
+                # Buscar códigos o números significativos aislados
+                codigo_match = re.search(r'([A-Z0-9]{2,}\s+[A-Z0-9]{2,}(?:\s+[A-Z0-9]{1,})?)', texto_completo_local)
+                if codigo_match:
+                    concepto_extraido = codigo_match.group(1).strip()
+            
+            # FALLBACK INTELIGENTE: Si no hay concepto específico, extraer frase relevante
+            if not concepto_extraido:
+                # Buscar primera frase que contenga información financiera
+                frases_relevantes = [
+                    r'([^.]*(?:Bs|bolivares|monto|transferencia|pago|envio)[^.]{0,30})',
+                    r'([A-Z][^.]{20,60}(?:realizada|enviado|operacion)[^.]{0,20})',
+                ]
+                
+                for pattern in frases_relevantes:
+                    match = re.search(pattern, texto_completo_local, re.IGNORECASE)
+                    if match:
+                        concepto_extraido = match.group(1).strip()
+                        break
+                
+                # ÚLTIMO FALLBACK: Primeras palabras significativas (no todo el texto)
+                if not concepto_extraido and len(texto_completo_local) > 20:
+                    palabras = texto_completo_local.split()[:15]  # Máximo 15 palabras
+                    concepto_extraido = ' '.join(palabras)
+            
+            campos['concepto'] = concepto_extraido[:100] if concepto_extraido else "Transacción financiera"
+        
+        # FIX: EXTRACCIÓN AVANZADA CON COORDENADAS Y PROXIMIDAD INTELIGENTE
+        # REASON: Usar coordenadas geométricas para mapeo preciso de campos empresariales
+        # IMPACT: Extracción robusta que maneja diferentes layouts y reduce falsos positivos
+        palabras_detectadas = datos_extraidos.get('palabras_detectadas', [])
+        if palabras_detectadas:
+            # Aplicar extracción inteligente basada en coordenadas
+            campos_coordenadas = _extract_with_coordinate_proximity(palabras_detectadas, texto_completo_local)
+            for campo, valor in campos_coordenadas.items():
+                if valor and not campos.get(campo):
+                    campos[campo] = valor
+            
+            # FIX: EXTRACCIÓN CRÍTICA BASADA EN COORDENADAS REALES DE ONNXTR
+            # REASON: Aprovechar coordenadas geométricas para mapeo espacial preciso
+            # IMPACT: Elimina falsos positivos y mejora precisión de campos empresariales
+            campos_onnxtr = _extract_onnxtr_enterprise_fields(palabras_detectadas, texto_completo_local)
+            for campo, valor in campos_onnxtr.items():
+                if valor and not campos.get(campo):
+                    campos[campo] = valor
+                elif valor and campo in ['caption', 'otro']:  # Sobrescribir caption y otro siempre
+                    campos[campo] = valor
+        
+        # MANDATO CRÍTICO #3: DETECCIÓN DIRECTA DE BANCO DESTINO CON CÓDIGOS BANCARIOS  
+        # REASON: "Bancoc 0105 - BANCO MERCANIIL" debe extraer "BANCO MERCANTIL" como banco_destino
+        # IMPACT: Implementación directa de códigos bancarios en función de extracción empresarial
+        if not campos.get('banco_destino') and texto_completo_local:
+            # TABLA DE CÓDIGOS BANCARIOS VENEZOLANOS (FUENTE DE ALTA FIABILIDAD)
+            codigos_bancarios = {
+                '0102': 'BANCO DE VENEZUELA',
+                '0105': 'BANCO MERCANTIL', 
+                '0108': 'BBVA PROVINCIAL',
+                '0115': 'BANCO EXTERIOR',
+                '0134': 'BANESCO',
+                '0172': 'BANCAMIGA',
+                '0191': 'BANCO NACIONAL DE CREDITO'
+            }
+            
+            bancoorigen_actual = campos.get('bancoorigen', '')
+            
+            # BÚSQUEDA POR CÓDIGO BANCARIO CON MÁXIMA PRIORIDAD
+            for codigo, nombre_banco in codigos_bancarios.items():
+                if codigo in texto_completo_local and nombre_banco != bancoorigen_actual:
+                    campos['banco_destino'] = nombre_banco
+                    break
+        
+        # Buscar también en extracted_fields_positional como fallback
+        extracted_fields = datos_extraidos.get('extracted_fields_positional', {})
+        if extracted_fields:
+            for campo in ['referencia', 'monto', 'bancoorigen', 'cedula', 'telefono', 'banco_destino', 'pago_fecha']:
+                valor = extracted_fields.get(campo, '')
+                if valor and not campos.get(campo):
+                    campos[campo] = valor
+            
+        # FIX: Buscar también en datos_financieros como fallback
+        datos_financieros = datos_extraidos.get('datos_financieros', {})
+        if datos_financieros and not campos['monto']:
+            campos['monto'] = datos_financieros.get('monto', '')
+            campos['referencia'] = datos_financieros.get('referencia', campos['referencia'])
+            
+        # FIX: Extraer bancoorigen desde texto si no está en campos estructurados
+        if not campos['bancoorigen'] and texto_completo_local:
+            # Buscar patrón "Banco : XXXX" o "BANCO XXXX"
+            import re
+            banco_match = re.search(r'[Bb]anco\s*[:=]?\s*([A-Z][A-Z\s]+)', texto_completo_local)
+            if banco_match:
+                campos['bancoorigen'] = banco_match.group(1).strip()
+    
+    # FIX CRÍTICO: PRESERVAR caption original de metadatosEntrada
+    # REASON: Caption debe mantenerse exacto como fue ingresado originalmente
+    # IMPACT: Integridad total del campo caption desde entrada hasta salida
+    # CAUSA RAÍZ: Código anterior sobrescribía caption original con valores generados automáticamente
+    
+    # ✅ PRESERVAR caption original - NO SOBRESCRIBIR
+    # Solo generar caption automático si realmente no existe (None o vacío)
+    if not campos.get('caption') or campos['caption'].strip() == '':
+        if 'PagomovilBDV' in texto_completo:
+            campos['caption'] = 'Pago Móvil BDV'
+        elif 'Transferencia' in texto_completo:
+            campos['caption'] = 'Transferencia Bancaria'
+        elif 'Envio' in texto_completo:
+            campos['caption'] = 'Envío de Dinero'
+        elif 'Operacion' in texto_completo and 'Banco' in texto_completo:
+            campos['caption'] = 'Operación Bancaria'
+        elif any(term in texto_completo for term in ['Bs', 'bolivares', 'Banco']):
+            campos['caption'] = 'Transacción Financiera'
+    
+    # FIX: Análisis mejorado de texto completo con patrones empresariales específicos
+    # REASON: Extraer datos desde texto cuando no están en campos estructurados
+    # IMPACT: Mejora significativa en población de campos empresariales
+    if texto_completo:
+        import re
+        
+        # FIX: Buscar monto con patrones venezolanos específicos
+        if not campos['monto']:
+            monto_patterns = [
+                r'(\d{1,3}(?:[,\.]\d{2,3})*(?:[,\.]\d{2})?\s*Bs)',  # 104,54 Bs
+                r'Bs\.?\s*(\d{1,3}(?:[,\.]\d{2,3})*(?:[,\.]\d{2})?)',  # Bs 104,54
+                r'(\d{1,3}(?:[,\.]\d{2,3})*(?:[,\.]\d{2})?)\s*bolivares',  # 104,54 bolivares
+            ]
+            for pattern in monto_patterns:
+                match = re.search(pattern, texto_completo, re.IGNORECASE)
+                if match:
+                    campos['monto'] = match.group(1) if 'Bs' in match.group(0) else match.group(0)
+                    break
+        
+        # FIX: EXTRACCIÓN CRÍTICA DE REFERENCIA - MANDATO REFINAMIENTO  
+        # REASON: Priorizar secuencias numéricas largas cerca de palabras clave
+        # IMPACT: Corrección de "Fecha" → "48311146148" y "0000120" → "000012071"
+        if not campos['referencia']:
+            ref_patterns = [
+                r'(?:Operacion|OPERACION)\s*[:;=]?\s*(\d{8,15})',     # Operacion : 003039387344
+                r'(?:Referencia|REFERENCIA)\s*[:;=]?\s*(\d{8,15})',   # REFERENCIA : 190018901378
+                r'(?:Ref|REF)\s*[:;=]?\s*(\d{8,15})',                # Ref: 003039387344
+                r'(?:NUMERO DE REFERENCIA)\s*[:;=]?\s*(\d{8,15})',    # NUMERO DE REFERENCIA : 190018901378
+                r'(\d{10,15})',                                       # Números largos directos
+                r'(\d{8,12})'                                        # Números medianos como fallback
+            ]
+            
+            # Buscar con prioridad espacial - números cerca de palabras clave
+            for pattern in ref_patterns:
+                matches = re.finditer(pattern, texto_completo, re.IGNORECASE)
+                for match in matches:
+                    referencia_num = match.group(1)
+                    # Validar que es número puro y longitud apropiada
+                    if referencia_num.isdigit() and 8 <= len(referencia_num) <= 15:
+                        # Verificar que no es teléfono (no empieza con 04, +58)
+                        if not referencia_num.startswith(('04', '58')):
+                            campos['referencia'] = referencia_num
+                            break
+                if campos.get('referencia'):
+                    break
+        
+        # FIX: EXTRACCIÓN CRÍTICA DE CÉDULA - MANDATO REFINAMIENTO
+        # REASON: Fortalecer patrones regex para formatos V-27061025, 27.061.025
+        # IMPACT: Corrección de cédulas vacías → extracción correcta con puntos y guiones
+        if not campos['cedula']:
+            cedula_patterns = [
+                r'(?:Identificacion|C\.?I\.?|cedula|RIF|BENEFICIARIO)\s*[:=]?\s*([VvEe]?-?\d{1,2}\.?\d{3}\.?\d{3})',  # V-27.061.025
+                r'([VvEe]-?\d{1,2}\.?\d{3}\.?\d{3})',                                                                # V-27.061.025 directo
+                r'([VvEe]-?\d{7,9})',                                                                               # V-27061025
+                r'(\d{1,2}\.?\d{3}\.?\d{3})',                                                                       # 27.061.025
+                r'(\d{7,9})',                                                                                       # 27061025 directo
+            ]
+            for pattern in cedula_patterns:
+                matches = re.finditer(pattern, texto_completo, re.IGNORECASE)
+                for match in matches:
+                    cedula_str = match.group(1)
+                    # Validar longitud apropiada después de limpiar
+                    cedula_digits = re.sub(r'[^\d]', '', cedula_str)
+                    if 7 <= len(cedula_digits) <= 9:
+                        # Verificar que no es teléfono (no empieza con 04, 02)
+                        if not cedula_digits.startswith(('04', '02', '58')):
+                            campos['cedula'] = cedula_str
+                            break
+                if campos.get('cedula'):
+                    break
+        
+        # MANDATO CRÍTICO #1: FUNCIÓN TELEFONO CONSOLIDADA CON VALIDACIÓN ESTRICTA
+        # REASON: Esta función secundaria ignoraba validación venezolana causando asignación incorrecta
+        # IMPACT: ELIMINACIÓN de asignación sin validación - solo prefijos venezolanos válidos
+        if not campos['telefono']:
+            # VALIDACIÓN ESTRICTA: Solo prefijos de operadores celulares venezolanos
+            prefijos_validos = ['0412', '0416', '0426', '0414', '0424']
+            
+            telefono_patterns = [
+                r'Destino\s*[:=]?\s*(\d{11})',  # Destino : 04125318244
+                r'(04\d{9})',  # 04125318244 directo - solo con prefijo 04
+                r'(\+58\d{10})',  # +58 seguido de 10 dígitos
+            ]
+            
+            telefono_validado = False
+            for pattern in telefono_patterns:
+                match = re.search(pattern, texto_completo)
+                if match:
+                    telefono_str = re.sub(r'[^\d+]', '', match.group(1))
+                    
+                    # VALIDACIÓN BINARIA OBLIGATORIA: APLICAR MISMAS REGLAS
+                    cumple_internacional = telefono_str.startswith('+58') and len(telefono_str) == 13
+                    cumple_nacional = len(telefono_str) == 11 and any(telefono_str.startswith(p) for p in prefijos_validos)
+                    
+                    if cumple_internacional:
+                        # Convertir formato internacional a nacional
+                        telefono_nacional = '0' + telefono_str[3:]
+                        if any(telefono_nacional.startswith(prefijo) for prefijo in prefijos_validos):
+                            campos['telefono'] = telefono_nacional
+                            telefono_validado = True
+                            break
+                    elif cumple_nacional:
+                        # Verificar que NO es la referencia ya extraída
+                        if telefono_str != campos.get('referencia', ''):
+                            campos['telefono'] = telefono_str
+                            telefono_validado = True
+                            break
+                    else:
+                        # MANDATO CRÍTICO: RECHAZO ABSOLUTO - NO asignar
+                        # El número no cumple con prefijos venezolanos válidos
+                        continue
+                
+                if telefono_validado:
+                    break
+        
+        # FIX: REFINAMIENTO CRÍTICO - Buscar fecha con patrones mejorados que manejan espacios
+        # REASON: Los patrones anteriores no detectaban fechas con espacios como "20/06/ 2025"
+        # IMPACT: Extracción precisa de fechas venezolanas con espacios
+        if not campos['pago_fecha']:
+            fecha_patterns = [
+                r'Fecha\s*[:=]?\s*(\d{1,2}/\d{1,2}/\s*\d{4})',  # Fecha : 20/06/ 2025 (con espacios)
+                r'(\d{1,2}/\d{1,2}/\s*\d{4})',                 # 20/06/ 2025 directo (con espacios)
+                r'(\d{1,2}/\d{1,2}/\d{4})',                    # 20/06/2025 sin espacios
+                r'(\d{4}-\d{2}-\d{2})',                        # 2025-06-20 formato ISO
+            ]
+            for pattern in fecha_patterns:
+                match = re.search(pattern, texto_completo)
+                if match:
+                    fecha_str = match.group(1).replace(' ', '')  # Eliminar espacios adicionales
+                    campos['pago_fecha'] = fecha_str
+                    break
+    
+    return campos
+
+
+def _extract_with_coordinate_proximity(palabras_detectadas, texto_completo):
+    """
+    FIX: Extracción inteligente usando coordenadas y proximidad espacial
+    REASON: Mejorar precisión de extracción aprovechando información posicional
+    IMPACT: Reduce falsos positivos y mejora mapeo de campos en diferentes layouts
+    """
+    import re
+    
+    campos_extraidos = {
+        'referencia': '',
+        'monto': '',
+        'bancoorigen': '',
+        'cedula': '',
+        'telefono': '',
+        'banco_destino': '',
+        'pago_fecha': ''
+    }
+    
+    if not palabras_detectadas:
+        return campos_extraidos
+    
+    # Convertir palabras a estructura con coordenadas válidas
+    words_with_coords = []
+    for palabra in palabras_detectadas:
+        if isinstance(palabra, dict):
+            coords = palabra.get('coordinates', [0, 0, 0, 0])
+            if len(coords) == 4 and sum(coords) > 0:  # Coordenadas válidas
+                words_with_coords.append({
+                    'text': palabra.get('texto', ''),
+                    'confidence': palabra.get('confianza', 0),
+                    'coords': coords
+                })
+    
+    if not words_with_coords:
+        return campos_extraidos
+    
+    # FIX: PATRONES DE EXTRACCIÓN CON VALIDACIÓN ESPACIAL
+    # REASON: Combinar regex con proximidad espacial para máxima precisión
+    # IMPACT: Extracción robusta que maneja variaciones de layout
+    
+    # 1. EXTRACCIÓN DE REFERENCIA/OPERACIÓN (ajustado para 12 dígitos como 003039387344)
+    ref_keywords = ['operacion', 'referencia', 'ref', 'op', 'numero']
+    referencia = _find_field_by_spatial_proximity(words_with_coords, ref_keywords, r'\d{12}')
+    if referencia:
+        campos_extraidos['referencia'] = referencia
+    
+    # 2. EXTRACCIÓN DE MONTO VENEZOLANO
+    monto_keywords = ['monto', 'total', 'bs', 'bolivares']
+    monto = _find_field_by_spatial_proximity(words_with_coords, monto_keywords, r'\d{1,3}(?:[,\.]\d{2,3})*(?:[,\.]\d{2})?')
+    if monto:
+        campos_extraidos['monto'] = monto
+    
+    # 3. EXTRACCIÓN DE BANCO
+    banco_keywords = ['banco', 'bco', 'entidad']
+    banco = _find_field_by_spatial_proximity(words_with_coords, banco_keywords, r'[A-Z][A-Z\s]+')
+    if banco:
+        campos_extraidos['bancoorigen'] = banco
+        campos_extraidos['banco_destino'] = banco  # Misma entidad en muchos casos
+    
+    # 4. EXTRACCIÓN DE CÉDULA (7-8 dígitos)
+    cedula_keywords = ['identificacion', 'ci', 'cedula', 'v-']
+    cedula = _find_field_by_spatial_proximity(words_with_coords, cedula_keywords, r'^[VE]?\d{7,8}$')
+    if cedula:
+        campos_extraidos['cedula'] = cedula
+    
+    # 5. EXTRACCIÓN DE TELÉFONO (11 dígitos específicamente)
+    telefono_keywords = ['destino', 'telefono', 'tel', 'movil']
+    telefono = _find_field_by_spatial_proximity(words_with_coords, telefono_keywords, r'^0\d{10}$')
+    if telefono:
+        campos_extraidos['telefono'] = telefono
+    
+    # 6. EXTRACCIÓN DE FECHA
+    fecha_keywords = ['fecha', 'date', 'dia']
+    fecha = _find_field_by_spatial_proximity(words_with_coords, fecha_keywords, r'\d{1,2}/\d{1,2}/\d{4}')
+    if fecha:
+        campos_extraidos['pago_fecha'] = fecha
+    
+    return campos_extraidos
+
+
+def _find_field_by_spatial_proximity(words_with_coords, keywords, value_pattern):
+    """
+    FIX: Busca un campo específico usando proximidad espacial entre keyword y valor
+    REASON: Mapeo inteligente que considera posición física de elementos en documento
+    IMPACT: Extracción precisa que maneja diferentes layouts de documentos financieros
+    """
+    import re
+    
+    # Buscar keywords en las palabras
+    keyword_positions = []
+    for i, word in enumerate(words_with_coords):
+        word_text = word['text'].lower()
+        for keyword in keywords:
+            if keyword.lower() in word_text:
+                keyword_positions.append({
+                    'index': i,
+                    'coords': word['coords'],
+                    'keyword': keyword,
+                    'confidence': word['confidence']
+                })
+    
+    if not keyword_positions:
+        return None
+    
+    # Para cada keyword encontrado, buscar valores cercanos
+    best_match = None
+    best_score = 0
+    
+    for kw_pos in keyword_positions:
+        kw_coords = kw_pos['coords']
+        kw_center_x = (kw_coords[0] + kw_coords[2]) / 2
+        kw_center_y = (kw_coords[1] + kw_coords[3]) / 2
+        
+        # Buscar palabras cercanas que coincidan con el patrón
+        for i, word in enumerate(words_with_coords):
+            if abs(i - kw_pos['index']) > 5:  # Límite de proximidad por índice
+                continue
+                
+            if re.search(value_pattern, word['text']):
+                word_coords = word['coords']
+                word_center_x = (word_coords[0] + word_coords[2]) / 2
+                word_center_y = (word_coords[1] + word_coords[3]) / 2
+                
+                # Calcular distancia espacial
+                distance = ((kw_center_x - word_center_x) ** 2 + (kw_center_y - word_center_y) ** 2) ** 0.5
+                
+                # Score basado en proximidad y confianza
+                proximity_score = max(0, 100 - distance)  # Máximo 100 si están en mismo lugar
+                confidence_score = (kw_pos['confidence'] + word['confidence']) / 2
+                total_score = proximity_score * confidence_score
+                
+                if total_score > best_score:
+                    best_score = total_score
+                    best_match = word['text']
+    
+    return best_match
+
+
+def _extract_onnxtr_enterprise_fields(palabras_detectadas, texto_completo):
+    """
+    FIX: EXTRACCIÓN EMPRESARIAL AVANZADA CON COORDENADAS ONNXTR REALES Y VALIDACIÓN INTELIGENTE
+    REASON: Implementar algoritmo híbrido que combina análisis contextual y espacial para máxima precisión
+    IMPACT: Elimina falsos positivos y mejora dramáticamente la extracción de campos empresariales críticos
+    """
+    import re
+    
+    campos_extraidos = {
+        'referencia': '',
+        'monto': '',
+        'bancoorigen': '',
+        'cedula': '',
+        'telefono': '',
+        'banco_destino': '',
+        'pago_fecha': '',
+        'caption': '',
+        'otro': ''
+    }
+    
+    if not palabras_detectadas or not texto_completo:
+        return campos_extraidos
+    
+    # FIX: EXTRACCIÓN INTELIGENTE DE REFERENCIA/OPERACIÓN - MANDATO REFINAMIENTO
+    # REASON: Buscar patrones específicos de operación con validación numérica
+    # IMPACT: Extracción precisa de números de operación de 8-15 dígitos
+    ref_patterns = [
+        r'(?:Operacion|OPERACION)\s*[:;=]?\s*(\d{8,15})',     # Operacion : 003039387344
+        r'(?:NUMERO DE REFERENCIA)\s*[:;=]?\s*(\d{8,15})',    # NUMERO DE REFERENCIA : 190018901378  
+        r'(?:Referencia|REFERENCIA)\s*[:;=]?\s*(\d{8,15})',   # REFERENCIA : 190018901378
+        r'(?:Ref|REF)\s*[:;=]?\s*(\d{8,15})',                # Ref: 003039387344
+        r'(\d{10,15})',                                       # Números largos directos
+        r'(\d{8,12})'                                        # Números medianos como fallback
+    ]
+    
+    for pattern in ref_patterns:
+        matches = re.finditer(pattern, texto_completo, re.IGNORECASE)
+        for match in matches:
+            referencia_num = match.group(1)
+            # Validar que es número puro y longitud apropiada
+            if referencia_num.isdigit() and 8 <= len(referencia_num) <= 15:
+                # Verificar que no es teléfono (no empieza con 04, +58)
+                if not referencia_num.startswith(('04', '58')):
+                    campos_extraidos['referencia'] = referencia_num
+                    break
+        if campos_extraidos.get('referencia'):
+            break
+    
+    # FIX: EXTRACCIÓN CRÍTICA DE BANCO ORIGEN/DESTINO - MANDATO REFINAMIENTO  
+    # REASON: Implementar diccionario completo de códigos y acrónimos venezolanos
+    # IMPACT: Mapeo correcto de BDV, Mercantil, Provincial según mandato crítico
+    
+    # Diccionario empresarial AMPLIADO de bancos venezolanos (mandato crítico)
+    bank_mapping = {
+        # Códigos oficiales completos
+        '0102': 'BANCO DE VENEZUELA',
+        '0104': 'BANCO VENEZOLANO DE CREDITO', 
+        '0105': 'BANCO MERCANTIL',
+        '0108': 'BBVA PROVINCIAL',
+        '0114': 'BANCARIBE',
+        '0115': 'BANCO EXTERIOR',
+        '0134': 'BANESCO',
+        '0151': 'BANCO FONDO COMUN',
+        '0163': 'BANCO DEL TESORO',
+        '0171': 'BANCO ACTIVO',
+        '0172': 'BANCAMIGA BANCO UNIVERSAL',
+        '0174': 'BANPLUS',
+        '0191': 'BANCO NACIONAL DE CREDITO',
+        
+        # Acrónimos y nombres comerciales (mandato crítico)
+        'BDV': 'BANCO DE VENEZUELA',
+        'BNC': 'BANCO NACIONAL DE CREDITO',
+        'BFC': 'BANCO FONDO COMUN',
+        'BVC': 'BANCO VENEZOLANO DE CREDITO',
+        'BANESCO': 'BANESCO',
+        'MERCANTIL': 'BANCO MERCANTIL',
+        'PROVINCIAL': 'BBVA PROVINCIAL',
+        'BANCARIBE': 'BANCARIBE',
+        'EXTERIOR': 'BANCO EXTERIOR',
+        'ACTIVO': 'BANCO ACTIVO',
+        'BANCAMIGA': 'BANCAMIGA BANCO UNIVERSAL',
+        'BANPLUS': 'BANPLUS',
+        'R4': 'R4 BANCO MICROFINANCIERO',
+        
+        # Patrones adicionales detectados en OCR (mandato crítico)
+        'PAGOMOVILBDV': 'BANCO DE VENEZUELA',
+        'PAGOMOVIL BDV': 'BANCO DE VENEZUELA',
+        'PAGO MOVIL BDV': 'BANCO DE VENEZUELA',
+        'BANCO MERCANTIL N': 'BANCO MERCANTIL',
+        'BBVA': 'BBVA PROVINCIAL'
+    }
+    
+    # FIX: DETECCIÓN CRÍTICA DE ACRÓNIMOS INCRUSTADOS - MANDATO REFINAMIENTO CRÍTICO
+    # REASON: PagomovilBDV debe extraer "BANCO DE VENEZUELA" no "BANCO MERCANTIL"
+    # IMPACT: Corrección fundamental del algoritmo de extracción bancaria posicional
+    # PRIORIDAD: Primera detección de banco en documento define bancoorigen
+    
+    # 1. REGLA: PRIMER BANCO DETECTADO + ACRÓNIMOS INCRUSTADOS
+    bancoorigen_detectado = False
+    
+    # Detectar acrónimos incrustados con máxima prioridad
+    acronimos_incrustados = {
+        'PAGOMOVILBDV': 'BANCO DE VENEZUELA',
+        'PAGOMOVIL BDV': 'BANCO DE VENEZUELA', 
+        'PAGO MOVIL BDV': 'BANCO DE VENEZUELA',
+        'PAGOMOVILMERCANTIL': 'BANCO MERCANTIL',
+        'PAGOMOVILBANESCO': 'BANESCO',
+        'PAGOMOVILPROVINCIAL': 'BBVA PROVINCIAL'
+    }
+    
+    # Buscar acrónimos incrustados PRIMERO (máxima prioridad)
+    texto_upper = texto_completo.upper()
+    for acronimo, banco_oficial in acronimos_incrustados.items():
+        if acronimo in texto_upper:
+            campos_extraidos['bancoorigen'] = banco_oficial
+            # FIX: NO generar caption automático - preservar original
+            bancoorigen_detectado = True
+            logger.info(f"🏦 ACRÓNIMO INCRUSTADO detectado: {acronimo} → {banco_oficial}")
+            break
+    
+    # 2. REGLA: PRIMER BANCO DETECTADO ESPACIALMENTE (si no hay acrónimos)
+    if not bancoorigen_detectado:
+        # Buscar primera mención de banco en el texto usando diccionario completo
+        primeras_menciones = []
+        for codigo_banco, nombre_banco in bank_mapping.items():
+            # Buscar tanto el código como el nombre en el texto
+            for busqueda in [codigo_banco, nombre_banco]:
+                pos = texto_upper.find(busqueda.upper())
+                if pos != -1:
+                    primeras_menciones.append((pos, nombre_banco, busqueda))
+        
+        # Ordenar por posición y tomar la primera
+        if primeras_menciones:
+            primeras_menciones.sort(key=lambda x: x[0])  # Ordenar por posición
+            primer_banco = primeras_menciones[0][1]  # Nombre oficial del banco
+            campos_extraidos['bancoorigen'] = primer_banco
+            bancoorigen_detectado = True
+            logger.info(f"🏦 PRIMER BANCO DETECTADO: {primer_banco}")
+    
+    # 3. EXTRACCIÓN DE BANCO DESTINO (segundo banco mencionado)
+    if bancoorigen_detectado:
+        banco_destino_patterns = [
+            r'Banco\s*[:=]?\s*\d{4}\s*=\s*([A-Z\s]+[A-Z])',  # Banco : 0105 = BANCO MERCANTIL
+            r'BANCO\s+([A-Z\s]+[A-Z])',                       # BANCO MERCANTIL
+            r'(\d{4})\s*=\s*([A-Z\s]+BANCO[A-Z\s]*)',        # 0105 = BANCO MERCANTIL
+        ]
+        for pattern in banco_destino_patterns:
+            match = re.search(pattern, texto_completo, re.IGNORECASE)
+            if match:
+                if len(match.groups()) == 2:
+                    banco_nombre = match.group(2).strip()
+                else:
+                    banco_nombre = match.group(1).strip()
+                
+                # Verificar que es diferente al banco origen y es válido
+                if (len(banco_nombre) >= 8 and 
+                    banco_nombre != campos_extraidos['bancoorigen'] and
+                    'BANCO' in banco_nombre.upper()):
+                    campos_extraidos['banco_destino'] = banco_nombre
+                    break
+    
+    # MANDATO FASE 2 IMPLEMENTADO: EXTRACCIÓN Y NORMALIZACIÓN CRÍTICA DE MONTO VENEZOLANO
+    # PROBLEMA: "210,00" se convertía a "2706102.00" - SOLUCIÓN INTEGRAL
+    # IMPACTO: Normalización correcta de formato decimal venezolano
+    if not campos_extraidos['monto']:
+        monto_patterns = [
+            r'(\d{1,3}(?:\.\d{3})*,\d{2})\s*Bs',     # 210,00 Bs
+            r'Bs\.?\s*(\d{1,3}(?:\.\d{3})*,\d{2})',  # Bs 210,00
+            r'(\d{1,3}(?:[,.]\d{2,3})+)',             # 104,54 o 210,00
+            r'Se\s+Envio\s+\(Bs\s+(\d{1,3}(?:\.\d{3})*,\d{2})\)',  # Se Envio (Bs 210,00)
+        ]
+        for pattern in monto_patterns:
+            match = re.search(pattern, texto_completo)
+            if match:
+                monto_str = match.group(1)
+                # Validar que contiene números y formato válido
+                if re.search(r'\d+[,.]\d{2}', monto_str):
+                    # APLICAR NORMALIZACIÓN MANDATO FASE 2
+                    monto_normalizado = normalizar_monto_venezolano(monto_str)
+                    campos_extraidos['monto'] = monto_normalizado
+                    logger.info(f"✅ MANDATO FASE 2: Monto extraído y normalizado: {monto_normalizado}")
+                    break
+    
+    # FIX: EXTRACCIÓN CRÍTICA DE CÉDULA - MANDATO REFINAMIENTO
+    # REASON: Fortalecer patrones regex para formatos V-27061025, 27.061.025
+    # IMPACT: Corrección de cédulas vacías → extracción correcta con puntos y guiones
+    if not campos_extraidos['cedula']:
+        cedula_patterns = [
+            r'(?:Identificacion|C\.?I\.?|cedula|RIF|BENEFICIARIO)\s*[:=]?\s*([VvEe]?-?\d{1,2}\.?\d{3}\.?\d{3})',  # V-27.061.025
+            r'([VvEe]-?\d{1,2}\.?\d{3}\.?\d{3})',                                                                # V-27.061.025 directo
+            r'([VvEe]-?\d{7,9})',                                                                               # V-27061025
+            r'(\d{1,2}\.?\d{3}\.?\d{3})',                                                                       # 27.061.025
+            r'(\d{7,9})',                                                                                       # 27061025 directo
+        ]
+        for pattern in cedula_patterns:
+            matches = re.finditer(pattern, texto_completo, re.IGNORECASE)
+            for match in matches:
+                cedula_str = match.group(1)
+                # Validar longitud apropiada después de limpiar
+                cedula_digits = re.sub(r'[^\d]', '', cedula_str)
+                if 7 <= len(cedula_digits) <= 9:
+                    # Verificar que no es teléfono (no empieza con 04, 02) y no es la referencia ya extraída
+                    if not cedula_digits.startswith(('04', '02', '58')) and cedula_digits != campos_extraidos.get('referencia', ''):
+                        campos_extraidos['cedula'] = cedula_str
+                        break
+            if campos_extraidos.get('cedula'):
+                break
+    
+    # MANDATO CRÍTICO #1: VALIDACIÓN BINARIA OBLIGATORIA DE TELÉFONOS VENEZOLANOS
+    # REASON: 48311146148 persiste como teléfono - implementar RECHAZO ABSOLUTO
+    # IMPACT: PUNTO DE CONTROL ÚNICO con validación estricta según mandato #19
+    if not campos_extraidos['telefono']:
+        # VALIDACIÓN ESTRICTA: Solo prefijos de operadores celulares venezolanos
+        prefijos_validos = ['0412', '0416', '0426', '0414', '0424']
+        
+        telefono_patterns = [
+            # PRIORIDAD MÁXIMA: Keywords explícitas de teléfono
+            r'(?:Teléfono|TELF|Celular|Telf\.\s*Celular|telefono|celular|movil)\s*[:=]?\s*(\d{11})',
+            # PRIORIDAD MEDIA: Contexto de destino
+            r'(?:Destino|BENEFICIARIO)\s*[:=]?\s*(\d{11})',
+            # PRIORIDAD BAJA: Números de 11 dígitos que empiecen con 04
+            r'(04\d{9})',
+            # FORMATO INTERNACIONAL: +58 seguido de 10 dígitos
+            r'(\+58\d{10})',
+        ]
+        
+        # MANDATO CRÍTICO: VALIDACIÓN BINARIA OBLIGATORIA - RECHAZO ABSOLUTO
+        # CONDICIÓN DE ASIGNACIÓN: Solo asignar si cumple AMBAS condiciones obligatorias
+        telefono_validado = False
+        for pattern in telefono_patterns:
+            matches = re.finditer(pattern, texto_completo, re.IGNORECASE)
+            for match in matches:
+                telefono_raw = match.group(1)
+                telefono_str = re.sub(r'[^\d+]', '', telefono_raw)  # Limpiar completamente
+                
+                # VALIDACIÓN BINARIA OBLIGATORIA: AMBAS condiciones REQUERIDAS
+                cumple_internacional = telefono_str.startswith('+58') and len(telefono_str) == 13
+                cumple_nacional = len(telefono_str) == 11 and any(telefono_str.startswith(p) for p in prefijos_validos)
+                
+                if cumple_internacional:
+                    # Convertir formato internacional a nacional
+                    telefono_nacional = '0' + telefono_str[3:]
+                    if any(telefono_nacional.startswith(prefijo) for prefijo in prefijos_validos):
+                        campos_extraidos['telefono'] = telefono_nacional
+                        logger.info(f"📱 TELÉFONO VENEZOLANO VÁLIDO (internacional): {telefono_str} → {telefono_nacional}")
+                        telefono_validado = True
+                        break
+                elif cumple_nacional:
+                    # Verificar que NO es la referencia ya extraída
+                    if telefono_str != campos_extraidos.get('referencia', ''):
+                        campos_extraidos['telefono'] = telefono_str
+                        logger.info(f"📱 TELÉFONO VENEZOLANO VÁLIDO (nacional): {telefono_str}")
+                        telefono_validado = True
+                        break
+                else:
+                    # MANDATO CRÍTICO: RECHAZO ABSOLUTO - NO asignar a telefono
+                    # BAJO NINGUNA CIRCUNSTANCIA debe ser asignado a datosbeneficiario.telefono
+                    logger.info(f"📱 NÚMERO RECHAZADO DEFINITIVAMENTE (no es teléfono venezolano): {telefono_str}")
+                    # Re-dirigir a referencia si cumple patrón y no se ha extraído
+                    if not campos_extraidos.get('referencia') and len(telefono_str) >= 8:
+                        campos_extraidos['referencia'] = telefono_str
+                        logger.info(f"📋 REDIRIGIDO A REFERENCIA: {telefono_str}")
+                        
+            if telefono_validado:
+                break
+    
+    # FIX: EXTRACCIÓN CRÍTICA DE FECHA DE PAGO - MANDATO REFINAMIENTO
+    # REASON: Buscar patrones específicos de fechas venezolanas con espacios
+    # IMPACT: Extracción precisa de fechas en formato DD/MM/YYYY  
+    if not campos_extraidos['pago_fecha']:
+        fecha_patterns = [
+            r'Fecha\s*[:=]?\s*(\d{1,2}/\d{1,2}/\s*\d{4})',  # Fecha : 20/06/ 2025
+            r'(\d{1,2}/\d{1,2}/\s*\d{4})',                 # 20/06/ 2025 directo
+            r'(\d{1,2}/\d{1,2}/\d{4})',                    # 20/06/2025 sin espacios
+            r'(\d{4}-\d{2}-\d{2})',                        # 2025-06-20 formato ISO
+        ]
+        for pattern in fecha_patterns:
+            match = re.search(pattern, texto_completo)
+            if match:
+                fecha_str = match.group(1).replace(' ', '')  # Eliminar espacios adicionales
+                campos_extraidos['pago_fecha'] = fecha_str
+                break
+    
+    # FIX: INFERENCIA AVANZADA DE BANCO DESTINO INTRABANCARIO - MANDATO OPTIMIZACIÓN CONTINUA  
+    # REASON: Implementar lógica de inferencia contextual según mandato #20
+    # IMPACT: Completa banco_destino cuando es transacción intrabancaria
+    # PROBLEMA RESUELTO: Llena banco_destino vacío cuando es mismo banco que bancoorigen
+    if campos_extraidos.get('bancoorigen') and not campos_extraidos.get('banco_destino'):
+        # REGLA DE INFERENCIA CONDICIONAL INTRABANCARIA
+        # Verificar contexto que sugiere transacción dentro del mismo banco
+        indicadores_intrabancarios = [
+            'Desde mi cuenta',
+            'a beneficiario Cuenta',
+            'Cuenta de Ahorro',
+            'mi cuenta',
+            'Envio de Tpago',
+            'Operacion realizada Desde',
+            'cuenta Se Envio'
+        ]
+        
+        # Buscar indicadores de transacción intrabancaria
+        es_intrabancario = any(indicador in texto_completo for indicador in indicadores_intrabancarios)
+        
+        # Verificar que solo se menciona un banco (el origen) sin banco destino explícito
+        banco_origen = campos_extraidos['bancoorigen']
+        menciones_banco_origen = texto_completo.upper().count(banco_origen.upper().split()[-1])  # Última palabra del banco
+        
+        # Si hay indicadores intrabancarios y solo se menciona el banco origen
+        if es_intrabancario and menciones_banco_origen >= 1:
+            # VERIFICAR: No hay mención explícita de otro banco diferente
+            otros_bancos_mencionados = False
+            for codigo_banco, nombre_banco in bank_mapping.items():
+                if nombre_banco != banco_origen and nombre_banco.upper() in texto_completo.upper():
+                    otros_bancos_mencionados = True
+                    break
+            
+            # FIX: EXTRACCIÓN ROBUSTA DE BANCO DESTINO EXPLÍCITO - MANDATO CORRECCIÓN CRÍTICA PUNTO #21
+            # REASON: Priorizar detección EXPLÍCITA de banco destino sobre inferencia intrabancaria
+            # IMPACT: Capturar bancos destino mencionados directamente en transacciones interbancarias
+            
+            # MANDATO CRÍTICO #3: DETECCIÓN EXPLÍCITA CON CÓDIGOS BANCARIOS Y FUZZY MATCHING
+            # REASON: Detectar "Bancoc 0105 - BANCO MERCANIIL" como "BANCO MERCANTIL"
+            # IMPACT: Prioridad máxima para códigos bancarios sobre inferencia intrabancaria
+            
+            # TABLA DE CÓDIGOS BANCARIOS VENEZOLANOS (FUENTE DE ALTA FIABILIDAD)
+            codigos_bancarios = {
+                '0102': 'BANCO DE VENEZUELA',
+                '0105': 'BANCO MERCANTIL', 
+                '0108': 'BBVA PROVINCIAL',
+                '0115': 'BANCO EXTERIOR',
+                '0134': 'BANESCO',
+                '0172': 'BANCAMIGA',
+                '0191': 'BANCO NACIONAL DE CREDITO'
+            }
+            
+            banco_destino_encontrado = False
+            
+            # PRIORIDAD MÁXIMA: BÚSQUEDA POR CÓDIGO BANCARIO
+            for codigo, nombre_banco in codigos_bancarios.items():
+                if codigo in texto_completo and nombre_banco != banco_origen:
+                    campos_extraidos['banco_destino'] = nombre_banco
+                    logger.info(f"🏦 BANCO DESTINO EXPLÍCITO detectado por código {codigo}: {nombre_banco}")
+                    banco_destino_encontrado = True
+                    break
+            
+            # PRIORIDAD ALTA: DETECCIÓN POR PATRONES CON FUZZY MATCHING
+            if not banco_destino_encontrado:
+                banco_destino_patterns = [
+                    r'Bancoc?\s+\d{4}\s*[-=]\s*([A-Z\s]+)',               # Bancoc 0105 - BANCO MERCANIIL
+                    r'Banco\s*[:=]?\s*(BANCO\s+[A-Z\s]+)',                # Banco: BANCO MERCANTIL
+                    r'destino\s*[:=]?\s*(BANCO\s+[A-Z\s]+)',              # destino: BANCO MERCANTIL  
+                    r'([A-Z\s]*BANCO\s+[A-Z\s]+)',                       # BANCO MERCANTIL directo
+                    r'(MERCANTIL|VENEZUELA|BANESCO|PROVINCIAL|EXTERIOR|BICENTENARIO|BBVA|BNC|BANCAMIGA)'  # Nombres directos
+                ]
+                
+                for pattern in banco_destino_patterns:
+                    matches = re.finditer(pattern, texto_completo, re.IGNORECASE)
+                    for match in matches:
+                        banco_candidato = match.group(1).strip().upper()
+                        
+                        # FUZZY MATCHING CON BANCOS CONOCIDOS
+                        mejor_match = None
+                        mejor_score = 0
+                        
+                        for banco_oficial in codigos_bancarios.values():
+                            # Algoritmo de similitud simple
+                            palabras_candidato = set(banco_candidato.split())
+                            palabras_oficial = set(banco_oficial.split())
+                            
+                            if palabras_candidato and palabras_oficial:
+                                interseccion = len(palabras_candidato & palabras_oficial)
+                                union = len(palabras_candidato | palabras_oficial)
+                                score = interseccion / union if union > 0 else 0
+                                
+                                # Bonus por coincidencias exactas
+                                if 'MERCANTIL' in banco_candidato and 'MERCANTIL' in banco_oficial:
+                                    score += 0.3
+                                elif 'VENEZUELA' in banco_candidato and 'VENEZUELA' in banco_oficial:
+                                    score += 0.3
+                                    
+                                if score > mejor_score and score >= 0.4:  # Umbral reducido
+                                    mejor_score = score
+                                    mejor_match = banco_oficial
+                        
+                        if mejor_match and mejor_match != banco_origen:
+                            campos_extraidos['banco_destino'] = mejor_match
+                            logger.info(f"🏦 BANCO DESTINO EXPLÍCITO detectado (fuzzy): {banco_candidato} → {mejor_match} (score: {mejor_score:.3f})")
+                            banco_destino_encontrado = True
+                            break
+                    
+                    if banco_destino_encontrado:
+                        break
+            
+            # PRIORIDAD SECUNDARIA: Si no hay otros bancos mencionados, es intrabancario
+            if not banco_destino_encontrado and not otros_bancos_mencionados:
+                campos_extraidos['banco_destino'] = banco_origen
+                logger.info(f"🏦 BANCO DESTINO INFERIDO (intrabancario): {banco_origen}")
+    
+    # FIX CRÍTICO: PRESERVAR caption original de metadatosEntrada
+    # REASON: Caption debe mantenerse exacto como fue ingresado originalmente
+    # IMPACT: Integridad total del campo caption desde entrada hasta salida
+    # CAUSA RAÍZ: Código anterior sobrescribía caption original con valores generados automáticamente
+    
+    # ✅ PRESERVAR caption original - NO SOBRESCRIBIR
+    # Solo generar caption automático si realmente no existe (None o vacío)
+    if not campos_extraidos.get('caption') or campos_extraidos['caption'].strip() == '':
+        if 'PagomovilBDV' in texto_completo:
+            campos_extraidos['caption'] = 'Pago Móvil BDV'
+        elif 'Transferencia' in texto_completo:
+            campos_extraidos['caption'] = 'Transferencia Bancaria'
+        elif 'Envio' in texto_completo:
+            campos_extraidos['caption'] = 'Envío de Dinero'
+        elif 'Operacion' in texto_completo and 'Banco' in texto_completo:
+            campos_extraidos['caption'] = 'Operación Bancaria'
+        elif any(term in texto_completo for term in ['Bs', 'bolivares', 'Banco']):
+            campos_extraidos['caption'] = 'Transacción Financiera'
+    
+    return campos_extraidos
+
+
+# ----------------------------------------------------------------------
+# Job de reextracción
+# ----------------------------------------------------------------------
+
+_estado_reextraccion = {'estado': 'inactivo'}
+_reextraccion_lock = threading.Lock()
+
+
+def _guardar_resultado(json_path, result_data):
+    """
+    Reescribe un JSON de resultado de forma atómica conservando su fecha de modificación
+
+    El temporal es único por escritura (en el mismo directorio, para que os.replace sea atómico): dos
+    reextracciones simultáneas o una escritura del lote en curso no comparten el mismo archivo .tmp.
+    """
+    stat_info = os.stat(json_path)
+    tmp_path = None
+    try:
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(json_path),
+                                         prefix=f".{os.path.basename(json_path)}.", suffix='.tmp',
+                                         delete=False) as f:
+            tmp_path = f.name
+            json.dump(result_data, f, indent=2, ensure_ascii=False)
+        # NamedTemporaryFile crea el archivo con 0600: se mantienen los permisos del resultado original
+        os.chmod(tmp_path, stat_info.st_mode & 0o777)
+        os.replace(tmp_path, json_path)
+        tmp_path = None
+    finally:
+        if tmp_path:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    # Se conserva la fecha de modificación: las exportaciones ordenan la llegada por ella
+    os.utime(json_path, (stat_info.st_atime, stat_info.st_mtime))
+
+
+def invalidar_consolidados(lotes):
+    """Borra los consolidados de lote guardados por la descarga cuyos resultados cambiaron de campos"""
+    if not lotes:
+        return
+    from results_index import get_results_index
+    results_index = get_results_index()
+    for fila in results_index.listar(('results',)):
+        if fila['es_resumen'] and fila['filename'][:-len('_resultados.json')] in lotes:
+            try:
+                os.remove(fila['filepath'])
+            except OSError as e:
+                logger.warning(f"No se pudo borrar el consolidado obsoleto {fila['filepath']}: {e}")
+            results_index.eliminar(fila['filename'], fila['directorio'])
+
+
+def reextraer_resultados(forzar=False, progreso=None):
+    """
+    Recalcula los campos empresariales de los resultados guardados (results e historial)
+
+    Args:
+        forzar: Reextraer también los resultados que ya tienen la versión de esquema actual
+        progreso: Callable(dict) opcional con los contadores tras cada archivo
+
+    Returns:
+        dict: Contadores {'total', 'reextraidos', 'vigentes', 'errores'}
+    """
+    from results_index import get_results_index
+    results_index = get_results_index()
+
+    filas = [fila for fila in results_index.listar(('results', 'historial')) if not fila['es_resumen']]
+    contadores = {'total': len(filas), 'reextraidos': 0, 'vigentes': 0, 'errores': 0}
+    lotes_modificados = set()
+
+    for fila in filas:
+        json_path = fila['filepath']
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                result_data = json.load(f)
+            if not forzar and campos_vigentes(result_data):
+                contadores['vigentes'] += 1
+            else:
+                result_data[CLAVE_CAMPOS] = registro_campos(result_data)
+                _guardar_resultado(json_path, result_data)
+                results_index.registrar(json_path, result_data, directorio=fila['directorio'])
+                contadores['reextraidos'] += 1
+                if fila['lote_id']:
+                    lotes_modificados.add(fila['lote_id'])
+        except Exception as e:
+            logger.error(f"Reextracción: error en {json_path}: {e}")
+            contadores['errores'] += 1
+        if progreso:
+            progreso(dict(contadores))
+
+    invalidar_consolidados(lotes_modificados)
+
+    logger.info(f"Reextracción de campos empresariales (esquema v{CAMPOS_SCHEMA_VERSION}): {contadores}")
+    return contadores
+
+
+def _ejecutar_reextraccion(forzar):
+    def actualizar(contadores):
+        with _reextraccion_lock:
+            _estado_reextraccion.update(contadores)
+
+    try:
+        contadores = reextraer_resultados(forzar=forzar, progreso=actualizar)
+        with _reextraccion_lock:
+            _estado_reextraccion.update(contadores, estado='completado')
+    except Exception as e:
+        logger.error(f"Error en el job de reextracción: {e}")
+        with _reextraccion_lock:
+            _estado_reextraccion.update(estado='error', error=str(e))
+    finally:
+        with _reextraccion_lock:
+            _estado_reextraccion['fin'] = datetime.now().isoformat()
+
+
+def iniciar_reextraccion(forzar=False):
+    """
+    Lanza el job de reextracción en segundo plano (uno a la vez)
+
+    Returns:
+        tuple: (estado del job, True si se inició ahora / False si ya estaba en curso)
+    """
+    with _reextraccion_lock:
+        if _estado_reextraccion.get('estado') == 'en_curso':
+            return dict(_estado_reextraccion), False
+        _estado_reextraccion.clear()
+        _estado_reextraccion.update({
+            'estado': 'en_curso',
+            'schema_version': CAMPOS_SCHEMA_VERSION,
+            'forzar': forzar,
+            'inicio': datetime.now().isoformat(),
+            'fin': None
+        })
+        estado = dict(_estado_reextraccion)
+    threading.Thread(target=_ejecutar_reextraccion, args=(forzar,), name="reextraccion-campos", daemon=True).start()
+    return estado, True
+
+
+def get_estado_reextraccion():
+    """Copia del estado del último job de reextracción"""
+    with _reextraccion_lock:
+        return dict(_estado_reextraccion)
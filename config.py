@@ -30,10 +30,11 @@ ONNXTR_CONFIG = {
     'recognition_model': 'crnn_vgg16_bn',  # Modelo de reconocimiento optimizado para CPU
     'use_gpu': False,  # Forzar uso de CPU solamente
     'quantized_models': True,  # Usar modelos cuantizados de 8 bits para mejor rendimiento
-    'batch_size': 1,  # Tamaño de lote para procesar imágenes
+    'batch_size': 2,  # Páginas por ejecución del modelo de detección
     'confidence_threshold': 0.6,  # Umbral de confianza para OnnxTR (equivalente a 60% de Tesseract)
     'detection_threshold': 0.7,  # Umbral para detección de texto
-    'recognition_batch_size': 4,  # Lote para reconocimiento de texto (reducido de 16 a 4)
+    'recognition_batch_size': 32,  # Recortes de palabra por ejecución de reconocimiento (32x128 px cada uno)
+    'batch_documents_per_call': 8,  # Documentos entregados juntos al predictor en extraer_texto_batch
     'preserve_aspect_ratio': True,  # Preservar proporción de aspecto
     'symmetric_pad': True,  # Relleno simétrico
     'assume_straight_pages': True,  # Asumir páginas rectas (optimización para screenshots)
@@ -50,8 +51,8 @@ ONNXTR_CONFIG = {
             'assume_straight_pages': True,
             'onnx_providers': ['CPUExecutionProvider'],
             'optimization_level': 'basic',
-            'batch_size': 1,
-            'recognition_batch_size': 2,  # Muy reducido para mínima memoria
+            'batch_size': 2,
+            'recognition_batch_size': 32,  # Recortes pequeños: lotes grandes amortizan cada ejecución ONNX
             'max_image_size': 1024  # Limitar tamaño de imagen
         },
         # FIX: Perfil rápido balanceado para uso general
@@ -132,10 +133,48 @@ OCR_CACHE_CONFIG = {
     'cache_dir': str(CACHE_DIR),
     'max_cache_size_mb': 100,  # Máximo 100MB de caché para entorno de 4GB RAM
     'cache_ttl_hours': 24,  # Tiempo de vida del caché (24 horas)
-    'hash_algorithm': 'md5',  # Algoritmo de hash para identificar imágenes
+    'hash_algorithm': 'blake2b',  # Algoritmo de hash para identificar imágenes (hashlib, lectura por bloques)
+    'hash_chunk_bytes': 1024 * 1024,  # Tamaño de bloque al hashear archivos
     'cache_results': True,  # Cachear resultados completos de OCR
     'cache_processed_images': False,  # No cachear imágenes procesadas para ahorrar espacio
-    'cleanup_on_startup': True  # Limpiar caché expirado al iniciar
+    'cleanup_on_startup': True,  # Limpiar caché expirado al iniciar
+    # FIX: Caché acotada de dos niveles (LRU en memoria + SQLite)
+    # REASON: Un JSON por entrada sin límite de tamaño y TTL comprobado solo al leer
+    # IMPACT: Aciertos repetidos en microsegundos y directorio de caché con tamaño acotado
+    'db_filename': 'ocr_cache.sqlite3',  # Almacén persistente dentro de cache_dir
+    'memory_max_entries': 256,  # Entradas en el nivel LRU en memoria (por proceso)
+    'sweep_interval_seconds': 600,  # Frecuencia del barrido de TTL en segundo plano
+    'eviction_low_water_fraction': 0.9,  # Al superar el límite se desaloja hasta esta fracción de max_cache_size_mb
+    # FIX: Índice perceptual (dHash) para recibos reenviados y recodificados
+    # REASON: Un mismo pago reenviado por WhatsApp cambia de bytes y nunca acertaba en caché
+    # IMPACT: Reutiliza el OCR previo solo si la miniatura lo confirma; siempre marca el posible pago duplicado
+    'near_duplicate': {
+        'enabled': True,
+        'max_hamming_distance': 4,  # Bits distintos (de 64) para considerar candidato
+        'max_visual_difference': 10.0,  # Diferencia máxima por bloque de la miniatura 128x160 para reutilizar OCR
+        'max_flag_difference': 30.0  # Hasta aquí se marca como posible duplicado (p.ej. reenvío redimensionado) pero se repite el OCR
+    }
+}
+
+# FIX: Índice persistente de resultados para los listados del dashboard
+# REASON: Cada consulta de listado/historial hacía listdir y json.load de todos los resultados
+# IMPACT: Listados como consultas indexadas y paginadas sobre SQLite, sin abrir los JSON
+RESULTS_INDEX_CONFIG = {
+    'enabled': True,
+    'db_path': str(BASE_DIR / "data" / "results_index.sqlite3"),
+    'preview_chars': 200,  # Longitud de la vista previa de texto almacenada
+    'reconcile_on_startup': True,  # Indexar JSON nuevos/modificados y purgar filas huérfanas al abrir
+    'default_page_size': 100,  # Elementos por página si la petición no indica limit
+    'max_page_size': 1000
+}
+
+# FIX: Manifiesto por lote con los resultados completados (una línea JSON por imagen)
+# REASON: La pertenencia a un lote se deducía con startswith sobre todos los resultados y agrupando por minuto
+# IMPACT: Consulta, descarga e historial de un lote leen solo su manifiesto: O(lote) en lugar de O(todos los archivos)
+BATCH_MANIFEST_CONFIG = {
+    'enabled': True,
+    'directory': str(BASE_DIR / "data" / "manifests"),
+    'reconcile_on_startup': True  # Crear los manifiestos que falten para lotes ya presentes en el índice de resultados
 }
 
 # FIX: Configuración de detección y optimización CPU específica
@@ -282,6 +321,30 @@ IMAGE_QUALITY_THRESHOLDS = {
     'text_density_min': 0.1
 }
 
+# FIX: Resolución de análisis del validador
+# REASON: El sesgo (HoughLines) y la simetría (matchTemplate) no necesitan la resolución completa
+# IMPACT: Esos diagnósticos se calculan sobre una copia reducida por pirámide; 0 = resolución completa
+VALIDATION_CONFIG = {
+    'analysis_max_dimension': 800  # Lado máximo (px) de la copia de análisis
+}
+
+# FIX: Triaje rápido previo a validación y mejora
+# REASON: Las capturas bancarias nítidas pasaban por el validador y la secuencia completa de mejora sin necesitarlo
+# IMPACT: Las capturas limpias van directo al OCR con los píxeles originales; el resto sigue la ruta completa
+# Desactivado por defecto: la ruta directa cambia los píxeles que recibe el OCR y todavía no se ha comparado
+# la salida OCR de ambas rutas sobre test_images_200. Activarlo solo tras esa comparación.
+FAST_PATH_TRIAGE_CONFIG = {
+    'enabled': False,
+    'thumbnail_max_dimension': 256,  # Lado máximo de la miniatura (pirámide) sobre la que se decide
+    'min_dimension': 200,  # Lado menor mínimo de la imagen original
+    'min_aspect_ratio': 1.15,  # Alto / ancho: capturas móviles verticales
+    'palette_levels': 8,  # Niveles de gris más frecuentes que forman la paleta
+    'min_palette_fraction': 0.75,  # Fracción mínima de píxeles en la paleta (colores planos de interfaz)
+    'max_noise': 4.0,  # Media máxima de |miniatura - mediana 3x3|
+    'min_contrast': 15,  # Desviación mínima de la miniatura
+    'min_brightness': 80  # Por debajo la mejora invierte la imagen (tema oscuro): se deja en la ruta completa
+}
+
 # FIX: Configuración avanzada de preprocesamiento con conservación extrema  
 # REASON: Implementar nuevas técnicas más allá del simple upscaling
 # IMPACT: Mejora significativa en calidad OCR y confianza de extracción
@@ -433,7 +496,12 @@ TEMP_FILE_CONFIG = {
     'prefix': 'ocr_process_',
     'image_format': 'png',
     'keep_temp_files': False,  # Cambiar a True para depuración
-    'max_temp_age_hours': 4
+    'max_temp_age_hours': 4,
+    # FIX: Espacio de trabajo aislado por job en tmpfs
+    # REASON: La mejora escribía en un imagen_mejorada.png fijo del CWD que los workers concurrentes pisaban
+    # IMPACT: Cada imagen procesada tiene su propio directorio en memoria, eliminado al terminar
+    'scratch_root': '/dev/shm',  # tmpfs; si no existe o no es escribible se usa temp/scratch
+    'scratch_prefix': 'ocr_job_'
 }
 
 # Configuración del servidor web
@@ -529,6 +597,19 @@ def get_async_directories():
     
     return directories
 
+@lru_cache(maxsize=8)
+def get_scratch_root():
+    """
+    Directorio raíz para los espacios de trabajo por job
+    
+    Usa tmpfs (TEMP_FILE_CONFIG['scratch_root']) cuando existe y es escribible; si no, temp/scratch.
+    """
+    scratch_root = Path(TEMP_FILE_CONFIG.get('scratch_root') or TEMP_DIR / "scratch")
+    if not (scratch_root.is_dir() and os.access(scratch_root, os.W_OK)):
+        scratch_root = TEMP_DIR / "scratch"
+    scratch_root.mkdir(parents=True, exist_ok=True)
+    return scratch_root
+
 @lru_cache(maxsize=8)
 def get_validation_config():
     """Cache para configuración de validación de recibos"""
@@ -557,10 +638,22 @@ BATCH_PROCESSING_CONFIG = {
     'batch_timeout_seconds': 60,  # Tiempo máximo para formar un lote
     'polling_interval_seconds': 5,  # Frecuencia de monitoreo del inbox
     'max_concurrent_batches': 2,  # Máximo de lotes simultáneos
+    'worker_pool_size': 2,  # Workers persistentes consumiendo la cola de jobs (cada imagen usa su propio espacio de trabajo)
+    'job_history_length': 200,  # Jobs finalizados conservados para consulta de estado
     'enable_batch_processing': True,  # Flag para habilitar/deshabilitar batching
     'processing_order': 'fifo',  # Orden de procesamiento (FIFO)
     'retry_failed_images': True,  # Reintentar imágenes fallidas
     'max_retries': 3,  # Máximo intentos por imagen
+    # FIX: Modo de ejecución multiproceso con un predictor OnnxTR por proceso
+    # REASON: El bucle secuencial con 2 hilos intra-op deja ociosa la mayoría de núcleos en servidores grandes
+    # IMPACT: Lotes distribuidos entre N procesos con modelos precalentados en cada uno
+    'process_pool': {
+        'enabled': False,  # Cada proceso carga sus propios modelos (~160MB): habilitar solo con RAM suficiente
+        'workers': 0,  # Número de procesos (0 = núcleos lógicos / threads_per_worker)
+        'threads_per_worker': 2,  # intra_op_num_threads de ONNX Runtime por proceso
+        'warmup_profiles': ['ultra_rapido'],  # Perfiles precargados al arrancar cada proceso
+        'start_method': 'spawn'  # spawn evita heredar hilos de Flask y sesiones ONNX del padre
+    },
     'auto_optimization': {
         'enabled': True,
         'cpu_threshold_high': 80,  # CPU% para reducir lote
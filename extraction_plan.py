@@ -0,0 +1,250 @@
+"""
+Plan compilado de reglas de extracción
+Convierte config/extraction_rules.json en objetos preparados una sola vez: reglas ordenadas por prioridad,
+regex compiladas, keywords normalizadas y exclusiones precalculadas
+"""
+
+import re
+import logging
+from collections import Counter
+from difflib import SequenceMatcher
+
+logger = logging.getLogger(__name__)
+
+
+def _compilar_patrones(patrones, flags, contexto):
+    """Compila una lista de regex descartando (y registrando una sola vez) las inválidas"""
+    compilados = []
+    for patron in patrones or []:
+        try:
+            compilados.append(re.compile(patron, flags))
+        except re.error as e:
+            logger.warning(f"⚠️ Regex inválido en {contexto}: '{patron}' - {e}")
+    return tuple(compilados)
+
+
+class ReglaCompilada:
+    """Regla individual lista para aplicarse sin reinterpretar el JSON"""
+
+    __slots__ = (
+        'rule_id', 'keywords', 'keywords_norm', 'keywords_texto', 'sin_keywords', 'patrones_directos',
+        'fuzzy_tolerance', 'proximity_preference',
+        'search_window_px', 'value_patterns', 'value_patterns_exactos', 'min_conf_keyword', 'min_conf_value',
+        'exclusiones', 'region_priority', 'spatial_search_config', 'priority',
+        'keyword_ids', 'keyword_universal'
+    )
+
+    def __init__(self, rule):
+        self.rule_id = rule.get('rule_id', 'SIN_ID')
+        self.keywords = tuple(rule.get('keywords', []))
+        # Formas en minúsculas para comparar contra palabras OCR (una keyword "" coincide con cualquier palabra)
+        self.keywords_norm = tuple(k.lower() for k in self.keywords)
+        # Búsqueda en texto plano: (original, minúsculas) sin las vacías
+        self.keywords_texto = tuple((k, k.lower()) for k in self.keywords if k)
+        # Sin keywords la regla busca sus patrones directamente en el texto; con solo "" también en el fallback
+        self.sin_keywords = not self.keywords
+        self.patrones_directos = not self.keywords or self.keywords == ('',)
+        self.fuzzy_tolerance = rule.get('fuzzy_matching_tolerance', 0.8)
+        self.proximity_preference = rule.get('proximity_preference', 'any')
+        self.search_window_px = rule.get('search_window_relative_px', 100)
+        contexto = f"regla {self.rule_id}"
+        # Búsqueda de valores: sin distinguir mayúsculas. Validación espacial: re.match tal cual
+        self.value_patterns = _compilar_patrones(rule.get('value_regex_patterns', []), re.IGNORECASE, contexto)
+        self.value_patterns_exactos = _compilar_patrones(rule.get('value_regex_patterns', []), 0, contexto)
+        self.min_conf_keyword = rule.get('min_ocr_confidence_keyword', 0.7)
+        self.min_conf_value = rule.get('min_ocr_confidence_value', 0.75)
+        self.exclusiones = tuple(p.lower() for p in rule.get('exclusion_patterns', []))
+        self.region_priority = tuple(rule.get('region_priority', ['body', 'header', 'footer']))
+        spatial = rule.get('spatial_search_config')
+        self.spatial_search_config = spatial if spatial and spatial.get('enabled', False) else None
+        self.priority = rule.get('priority', 0)
+        # Asignados por IndiceKeywords al construir el plan
+        self.keyword_ids = ()
+        self.keyword_universal = '' in self.keywords_norm
+
+    def excluido(self, texto):
+        """True si el texto contiene alguno de los patrones de exclusión de la regla"""
+        if not self.exclusiones:
+            return False
+        texto_lower = texto.lower()
+        return any(patron in texto_lower for patron in self.exclusiones)
+
+
+# Puntuación de una coincidencia literal (keyword dentro de la palabra o palabra dentro de la keyword):
+# supera cualquier fuzzy_matching_tolerance
+COINCIDENCIA_EXACTA = float('inf')
+
+
+class IndiceKeywords:
+    """
+    Índice de todas las keywords del plan para emparejarlas con palabras OCR
+
+    - Literales: trie de keywords (keyword contenida en la palabra) y mapa de subcadenas de keywords
+      (palabra contenida en la keyword), sin recorrer keyword por keyword
+    - Fuzzy: antes de calcular SequenceMatcher.ratio() se descartan pares cuya cota superior
+      (por longitudes y por multiconjunto de caracteres) no alcanza la tolerancia mínima que
+      usa esa keyword en alguna regla. Las cotas son exactas: no cambian el resultado
+    """
+
+    _FIN = object()
+
+    def __init__(self, reglas):
+        self.keywords = []
+        self.tolerancia_min = []
+        ids = {}
+        for regla in reglas:
+            keyword_ids = []
+            for keyword in regla.keywords_norm:
+                if not keyword:
+                    continue
+                kid = ids.get(keyword)
+                if kid is None:
+                    kid = ids[keyword] = len(self.keywords)
+                    self.keywords.append(keyword)
+                    self.tolerancia_min.append(regla.fuzzy_tolerance)
+                else:
+                    self.tolerancia_min[kid] = min(self.tolerancia_min[kid], regla.fuzzy_tolerance)
+                if kid not in keyword_ids:
+                    keyword_ids.append(kid)
+            regla.keyword_ids = tuple(keyword_ids)
+
+        self._longitudes = [len(k) for k in self.keywords]
+        self._caracteres = [Counter(k) for k in self.keywords]
+
+        # Trie para "keyword in palabra"
+        self._trie = {}
+        for kid, keyword in enumerate(self.keywords):
+            nodo = self._trie
+            for caracter in keyword:
+                nodo = nodo.setdefault(caracter, {})
+            nodo[self._FIN] = kid
+
+        # Subcadenas de cada keyword para "palabra in keyword" (keywords cortas: tamaño acotado)
+        self._subcadenas = {}
+        for kid, keyword in enumerate(self.keywords):
+            n = len(keyword)
+            for i in range(n):
+                for j in range(i + 1, n + 1):
+                    self._subcadenas.setdefault(keyword[i:j], set()).add(kid)
+
+    def _literales(self, palabra):
+        """Ids de keywords contenidas en la palabra o que contienen la palabra"""
+        encontrados = set(self._subcadenas.get(palabra, ()))
+        trie, fin = self._trie, self._FIN
+        for inicio in range(len(palabra)):
+            nodo = trie
+            for caracter in palabra[inicio:]:
+                nodo = nodo.get(caracter)
+                if nodo is None:
+                    break
+                kid = nodo.get(fin)
+                if kid is not None:
+                    encontrados.add(kid)
+        return encontrados
+
+    def puntuar(self, palabra):
+        """
+        Puntuación de la palabra (ya en minúsculas) contra cada keyword relevante
+
+        Returns:
+            dict id_keyword -> similitud; solo incluye keywords que alcanzan su tolerancia mínima
+        """
+        puntuaciones = dict.fromkeys(self._literales(palabra), COINCIDENCIA_EXACTA)
+        largo = len(palabra)
+        caracteres = None
+        matcher = None
+        for kid, keyword in enumerate(self.keywords):
+            if kid in puntuaciones:
+                continue
+            tolerancia = self.tolerancia_min[kid]
+            total = largo + self._longitudes[kid]
+            # ratio = 2*M/total con M <= longitud menor y M <= caracteres en común
+            if 2.0 * min(largo, self._longitudes[kid]) < tolerancia * total:
+                continue
+            if caracteres is None:
+                caracteres = Counter(palabra)
+            comunes = sum((caracteres & self._caracteres[kid]).values())
+            if 2.0 * comunes < tolerancia * total:
+                continue
+            if matcher is None:
+                # La palabra es la secuencia b: su índice interno se construye una sola vez
+                matcher = SequenceMatcher(None, '', palabra)
+            matcher.set_seq1(keyword)
+            similitud = matcher.ratio()
+            if similitud >= tolerancia:
+                puntuaciones[kid] = similitud
+        return puntuaciones
+
+    def nuevo_recibo(self):
+        """Caché de coincidencias para un recibo, compartida por todos los campos y reglas"""
+        return CoincidenciasRecibo(self)
+
+
+class CoincidenciasRecibo:
+    """Puntuaciones palabra-keyword de un recibo, calculadas una sola vez por texto de palabra"""
+
+    __slots__ = ('indice', '_por_palabra')
+
+    def __init__(self, indice):
+        self.indice = indice
+        self._por_palabra = {}
+
+    def puntuaciones(self, palabra):
+        resultado = self._por_palabra.get(palabra)
+        if resultado is None:
+            resultado = self._por_palabra[palabra] = self.indice.puntuar(palabra)
+        return resultado
+
+    def coincide(self, regla, palabra):
+        """Similitud de la mejor keyword de la regla que coincide con la palabra, o None"""
+        if regla.keyword_universal:
+            return COINCIDENCIA_EXACTA
+        puntuaciones = self.puntuaciones(palabra)
+        tolerancia = regla.fuzzy_tolerance
+        for kid in regla.keyword_ids:
+            similitud = puntuaciones.get(kid)
+            if similitud is not None and similitud >= tolerancia:
+                return similitud
+        return None
+
+
+class CampoCompilado:
+    """Campo con sus reglas ya ordenadas por prioridad (mayor primero)"""
+
+    __slots__ = ('field_name', 'reglas', 'validation', 'field_config')
+
+    def __init__(self, field_config):
+        self.field_name = field_config.get('field_name')
+        # sorted() es estable: a igual prioridad se respeta el orden del archivo
+        self.reglas = tuple(
+            ReglaCompilada(rule)
+            for rule in sorted(field_config.get('rules', []), key=lambda r: r.get('priority', 0), reverse=True)
+        )
+        self.validation = field_config.get('validation', {})
+        # Campos sin reglas refinadas siguen el motor legacy con su configuración original
+        self.field_config = field_config
+
+
+class PlanExtraccion:
+    """
+    Plan inmutable de extracción para una versión concreta del archivo de reglas
+
+    Se construye una vez por carga de reglas; la extracción por recibo solo recorre objetos preparados.
+    """
+
+    __slots__ = ('campos', 'global_settings', 'regiones_habilitadas', 'total_reglas', 'indice_keywords')
+
+    def __init__(self, rules_data):
+        rules_data = rules_data or {}
+        self.campos = tuple(
+            CampoCompilado(field_config)
+            for field_config in rules_data.get('extraction_rules', [])
+            if field_config.get('field_name')
+        )
+        self.global_settings = rules_data.get('global_settings', {}) or {}
+        self.regiones_habilitadas = self.global_settings.get('region_analysis', {}).get('enabled', False)
+        self.total_reglas = sum(len(campo.reglas) for campo in self.campos)
+        self.indice_keywords = IndiceKeywords(regla for campo in self.campos for regla in campo.reglas)
+
+    def __bool__(self):
+        return bool(self.campos)
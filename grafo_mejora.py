@@ -0,0 +1,125 @@
+"""
+Grafo de operaciones de la cadena de mejora
+La secuencia de MejoradorOCR se describe como una lista de operaciones y se ejecuta sobre buffers
+preasignados: la imagen de entrada (compartida con ImageFeatures) solo se lee, el resultado se escribe en
+un único array nuevo y los pasos posteriores trabajan en el mismo sitio. Las convoluciones lineales
+consecutivas se fusionan en una sola cuando no pueden saturar (ver fusionable).
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+CONVOLUCION = 'convolucion'
+INVERSION = 'inversion'
+
+
+def _simetrico(kernel):
+    """Simétrico respecto a ambos ejes: compone igual con el borde por reflexión de filter2D"""
+    return kernel.shape[0] % 2 == 1 and kernel.shape[1] % 2 == 1 and \
+        np.array_equal(kernel, kernel[::-1, :]) and np.array_equal(kernel, kernel[:, ::-1])
+
+
+def fusionable(kernel):
+    """
+    Kernel que se puede fundir con sus vecinos: simétrico, sin coeficientes negativos y de suma <= 1
+
+    Así su salida sobre uint8 queda siempre en [0, 255] y filter2D no recorta el resultado intermedio; un kernel
+    con sobreoscilación (p. ej. el de nitidez de la cadena) sí satura y debe ejecutarse por separado.
+    """
+    return _simetrico(kernel) and kernel.min() >= 0 and kernel.sum() <= 1 + 1e-9
+
+
+def componer_kernels(primero, segundo):
+    """
+    Kernel único equivalente a filtrar con primero y después con segundo (convolución completa 2D)
+
+    Returns:
+        np.ndarray float64 de forma (h1 + h2 - 1, w1 + w2 - 1)
+    """
+    h1, w1 = primero.shape
+    h2, w2 = segundo.shape
+    compuesto = np.zeros((h1 + h2 - 1, w1 + w2 - 1), dtype=np.float64)
+    for i in range(h2):
+        for j in range(w2):
+            compuesto[i:i + h1, j:j + w1] += segundo[i, j] * primero
+    return compuesto
+
+
+class GrafoMejora:
+    """
+    Cadena de operaciones de mejora sobre imágenes uint8 en escala de grises
+
+    Operaciones:
+        - convolucion(nombre, kernel): filter2D con saturación a uint8
+        - inversion(nombre): 255 - x, en el mismo buffer
+    """
+
+    def __init__(self):
+        self.operaciones = []
+
+    def convolucion(self, nombre, kernel):
+        self.operaciones.append({'tipo': CONVOLUCION, 'nombre': nombre, 'kernel': np.asarray(kernel)})
+        return self
+
+    def inversion(self, nombre):
+        self.operaciones.append({'tipo': INVERSION, 'nombre': nombre})
+        return self
+
+    def fusionar(self):
+        """
+        Etapas de ejecución: convoluciones consecutivas con kernels fusionables se funden en una sola
+
+        Con kernels simétricos la composición es exacta también en los bordes (reflexión 101) y, al no poder
+        saturar, la única diferencia con aplicarlas por separado es que no se redondea a uint8 entre ellas
+        (como mucho 1 nivel de gris).
+        """
+        etapas = []
+        for operacion in self.operaciones:
+            anterior = etapas[-1] if etapas else None
+            if (operacion['tipo'] == CONVOLUCION and anterior is not None and anterior['tipo'] == CONVOLUCION
+                    and fusionable(anterior['kernel']) and fusionable(operacion['kernel'])):
+                anterior['kernel'] = componer_kernels(anterior['kernel'], operacion['kernel'])
+                anterior['nombre'] = f"{anterior['nombre']}+{operacion['nombre']}"
+                continue
+            etapas.append(dict(operacion))
+        return etapas
+
+    def ejecutar(self, imagen, buffer_temporal=None, observador=None):
+        """
+        Ejecuta la cadena fusionada
+
+        Args:
+            imagen: Imagen uint8 de entrada; no se modifica
+            buffer_temporal: Callable(shape, dtype) que entrega un buffer reutilizable, necesario solo
+                cuando dos convoluciones no fusionables van seguidas
+            observador: Callable(nombre, imagen) invocado tras cada etapa (p.ej. para guardar pasos)
+
+        Returns:
+            tuple: (imagen resultado en un array nuevo, tiempos por etapa en ms)
+        """
+        salida = np.empty_like(imagen)
+        actual = imagen
+        tiempos = {}
+
+        for etapa in self.fusionar():
+            inicio = time.perf_counter()
+            if etapa['tipo'] == CONVOLUCION:
+                if actual is salida:
+                    # filter2D no puede leer y escribir el mismo buffer: se lee de una copia temporal
+                    temporal = buffer_temporal(salida.shape, salida.dtype) if buffer_temporal else np.empty_like(salida)
+                    np.copyto(temporal, salida)
+                    actual = temporal
+                cv2.filter2D(actual, -1, etapa['kernel'], dst=salida)
+            else:
+                cv2.bitwise_not(actual, dst=salida)
+            actual = salida
+            tiempos[etapa['nombre']] = round((time.perf_counter() - inicio) * 1000, 3)
+
+            if observador:
+                observador(etapa['nombre'], salida)
+
+        if actual is not salida:
+            np.copyto(salida, actual)
+        return salida, tiempos
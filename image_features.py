@@ -0,0 +1,109 @@
+"""
+Características de análisis por imagen compartidas entre validación y mejora
+El orquestador crea un ImageFeatures por recibo y lo entrega a ValidadorOCR y MejoradorOCR: la escala de
+grises, los bordes Canny, el histograma, las estadísticas globales, la varianza del Laplaciano, los
+suavizados, las imágenes integrales y la copia reducida de análisis se calculan una sola vez, la primera vez
+que algún paso los pide.
+"""
+
+import cv2
+import numpy as np
+
+
+class ImageFeatures:
+    """
+    Caché perezosa de características de una imagen (siempre sobre su versión en escala de grises)
+
+    Los arrays devueltos son compartidos: los pasos que modifican la imagen deben trabajar sobre una copia.
+
+    Args:
+        image: Imagen BGR de OpenCV o ya en escala de grises
+    """
+
+    __slots__ = ('gray', '_cache')
+
+    def __init__(self, image):
+        self.gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        self._cache = {}
+
+    def _memo(self, clave, calcular):
+        valor = self._cache.get(clave)
+        if valor is None:
+            valor = self._cache[clave] = calcular()
+        return valor
+
+    @property
+    def shape(self):
+        return self.gray.shape
+
+    @property
+    def histogram(self) -> np.ndarray:
+        """Histograma de 256 niveles (float32, forma (256,)) como el de cv2.calcHist"""
+        return self._memo('histogram', lambda: cv2.calcHist([self.gray], [0], None, [256], [0, 256]).flatten())
+
+    @property
+    def mean(self) -> float:
+        return self._memo('mean', lambda: float(np.mean(self.gray)))
+
+    @property
+    def std(self) -> float:
+        return self._memo('std', lambda: float(np.std(self.gray)))
+
+    @property
+    def rango_dinamico(self) -> float:
+        def calcular():
+            minimo, maximo, _, _ = cv2.minMaxLoc(self.gray)
+            return float(maximo - minimo)
+        return self._memo('rango_dinamico', calcular)
+
+    @property
+    def edges(self) -> np.ndarray:
+        """Bordes Canny (50, 150)"""
+        return self._memo('edges', lambda: cv2.Canny(self.gray, 50, 150))
+
+    @property
+    def blur_variance(self) -> float:
+        """Varianza del Laplaciano (medida de nitidez)"""
+        return self._memo('blur_variance', lambda: float(cv2.Laplacian(self.gray, cv2.CV_64F).var()))
+
+    def gaussian_blur(self, ksize: int) -> np.ndarray:
+        """Suavizado gaussiano (ksize x ksize, sigma automático)"""
+        return self._memo(('gaussian_blur', ksize), lambda: cv2.GaussianBlur(self.gray, (ksize, ksize), 0))
+
+    def median_blur(self, ksize: int) -> np.ndarray:
+        return self._memo(('median_blur', ksize), lambda: cv2.medianBlur(self.gray, ksize))
+
+    @property
+    def integrales(self):
+        """
+        Imágenes integrales (suma, suma de cuadrados) en float64, de forma (alto + 1, ancho + 1)
+
+        Permiten la media y la desviación de cualquier ventana con cuatro accesos.
+        """
+        return self._memo('integrales', lambda: cv2.integral2(self.gray, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F))
+
+    def reducida(self, lado_maximo):
+        """
+        Copia reducida por pirámide (cv2.pyrDown sucesivos) cuyo lado mayor no supera lado_maximo
+
+        Returns:
+            ImageFeatures de la copia reducida (el propio objeto si ya cabe o lado_maximo es 0/None)
+        """
+        if not lado_maximo or max(self.gray.shape) <= lado_maximo:
+            return self
+
+        def calcular():
+            reducida = self.gray
+            while max(reducida.shape) > lado_maximo:
+                reducida = cv2.pyrDown(reducida)
+            return ImageFeatures(reducida)
+        return self._memo(('reducida', lado_maximo), calcular)
+
+    def metricas(self):
+        """Métricas básicas en el formato de MejoradorOCR._calcular_metricas_imagen"""
+        return {
+            'brillo_promedio': self.mean,
+            'contraste': self.std,
+            'nitidez': self.blur_variance,
+            'rango_dinamico': self.rango_dinamico
+        }
@@ -14,12 +14,20 @@ import re
 from pathlib import Path
 from datetime import datetime
 import uuid
+import cv2
+from contextlib import contextmanager
 
 # Importar módulos del sistema
 import config
 from validador_ocr import ValidadorOCR
 from mejora_ocr import MejoradorOCR
+from image_features import ImageFeatures
+from triaje_ocr import get_triaje, RUTA_DIRECTA
 from aplicador_ocr import AplicadorOCR
+from results_index import get_results_index
+from batch_manifest import get_batch_manifests
+from campos_empresariales import CLAVE_CAMPOS, registro_campos
+from spatial_processor import LineLayout
 
 # Configurar logging
 # FIX: Configuración directa para evitar problemas con tipos de datos en LOGGING_CONFIG
@@ -103,32 +111,46 @@ class OrquestadorOCR:
             # Preparar arrays de imágenes procesadas
             processed_images = []
             valid_indices = []
+            decisiones_triaje = []
             
             for i, image_path in enumerate(image_paths):
                 try:
+                    # Decodificar una sola vez; el array viaja en memoria hasta el OCR por lotes
+                    original_array = self._cargar_imagen(image_path)
+                    if original_array is None:
+                        continue
+                    
+                    # Características de análisis compartidas por triaje, validación y mejora
+                    features = ImageFeatures(original_array)
+                    
+                    # Triaje rápido: las capturas limpias pasan al OCR con sus píxeles originales
+                    triaje = get_triaje().evaluar(features)
+                    if triaje['ruta'] == RUTA_DIRECTA:
+                        processed_images.append(original_array)
+                        valid_indices.append(i)
+                        decisiones_triaje.append(triaje)
+                        continue
+                    
+                    inicio_preprocesamiento = time.time()
+                    
                     # Validar imagen
-                    validation_result = self.validador.analizar_imagen(image_path)
+                    validation_result = self.validador.analizar_imagen(
+                        image_path, image_array=original_array, features=features
+                    )
                     
                     if not validation_result.get('error'):
                         # Mejorar imagen usando el método procesar_imagen
                         mejora_result = self.mejorador.procesar_imagen(
-                            image_path, validation_result, profile, save_steps=False
+                            image_path, validation_result, profile, save_steps=False, image_array=original_array,
+                            features=features
                         )
                         
-                        if mejora_result.get('imagen_mejorada_path'):
-                            # Cargar imagen como array NumPy
-                            import cv2
-                            img_array = cv2.imread(mejora_result['imagen_mejorada_path'], cv2.IMREAD_COLOR)
-                            if img_array is not None:
-                                processed_images.append(img_array)
-                                valid_indices.append(i)
-                        else:
-                            # Usar imagen original si mejora falla
-                            import cv2
-                            img_array = cv2.imread(image_path, cv2.IMREAD_COLOR)
-                            if img_array is not None:
-                                processed_images.append(img_array)
-                                valid_indices.append(i)
+                        # Usar imagen original si mejora falla
+                        img_array = mejora_result.get('imagen_mejorada_array')
+                        processed_images.append(img_array if img_array is not None else original_array)
+                        valid_indices.append(i)
+                        triaje['tiempo_preprocesamiento'] = round(time.time() - inicio_preprocesamiento, 3)
+                        decisiones_triaje.append(triaje)
                                 
                 except Exception as e:
                     logger.error(f"Error procesando imagen {i}: {e}")
@@ -154,6 +176,8 @@ class OrquestadorOCR:
                     final_result = self._process_batch_result_with_positioning(
                         result, caption_text, metadata, image_paths[original_index]
                     )
+                    final_result['triaje'] = decisiones_triaje[idx]
+                    get_triaje().registrar(decisiones_triaje[idx])
                     
                     batch_results.append(final_result)
             
@@ -199,13 +223,18 @@ class OrquestadorOCR:
             word_data = ocr_result.get('word_data', [])
             full_text = ocr_result.get('full_raw_ocr_text', '')
             
-            # Aplicar extracción posicional inteligente
-            extracted_fields, unmapped_segments = self.aplicador._extract_fields_with_positioning(
-                word_data, full_text, caption_text
-            )
+            # Campos extraídos por el OCR del lote con el mismo post-proceso que extraer_texto
+            extracted_fields = ocr_result.get('extracted_fields') or {}
+            valores_mapeados = {valor for valor in extracted_fields.values() if valor}
+            unmapped_segments = [
+                {'text': word['text'], 'confidence': word['confidence'], 'coordinates': word['coordinates']}
+                for word in word_data if word.get('text') and word['text'] not in valores_mapeados
+            ]
             
-            # Validar campos extraídos
-            processing_status, error_reason = self.aplicador._validate_extracted_fields(extracted_fields)
+            # Validar campos extraídos (el validador trabaja con la lista {field_name, value})
+            processing_status, error_reason = self.aplicador._validate_extracted_fields([
+                {'field_name': campo, 'value': valor} for campo, valor in extracted_fields.items() if valor
+            ])
             
             # Generar request_id
             request_id = self._generate_request_id_from_metadata(metadata)
@@ -390,10 +419,16 @@ class OrquestadorOCR:
             import time
             start_time = time.time()
             
+            # La imagen se decodifica una vez y el array recorre las tres etapas en memoria
+            image_array = self._cargar_imagen(image_path)
+            if image_array is None:
+                raise Exception(f"No se puede cargar la imagen: {image_path}")
+            features = ImageFeatures(image_array)
+            
             # ETAPA 1: Validación y diagnóstico
             logger.info("ETAPA 1: Validación y diagnóstico de imagen")
             resultado_completo['etapas']['1_validacion'] = self._ejecutar_validacion(
-                image_path, temp_dir, save_intermediate
+                image_path, temp_dir, save_intermediate, image_array, features
             )
             
             if 'error' in resultado_completo['etapas']['1_validacion']:
@@ -403,7 +438,7 @@ class OrquestadorOCR:
             logger.info("ETAPA 2: Mejora y preprocesamiento adaptativo")
             resultado_completo['etapas']['2_mejora'] = self._ejecutar_mejora(
                 image_path, resultado_completo['etapas']['1_validacion']['diagnostico'],
-                profile, temp_dir, save_intermediate
+                profile, temp_dir, save_intermediate, image_array, features
             )
             
             if 'error' in resultado_completo['etapas']['2_mejora']:
@@ -411,10 +446,11 @@ class OrquestadorOCR:
             
             # ETAPA 3: Aplicación de OCR
             logger.info("ETAPA 3: Aplicación de OCR y extracción de datos")
-            imagen_mejorada = resultado_completo['etapas']['2_mejora']['imagen_mejorada']
+            imagen_mejorada_array = resultado_completo['etapas']['2_mejora'].pop('imagen_mejorada_array', None)
             deteccion_inteligente = resultado_completo['etapas']['1_validacion']['diagnostico'].get('deteccion_inteligente', {})
             resultado_completo['etapas']['3_ocr'] = self._ejecutar_ocr(
-                imagen_mejorada, language, temp_dir, save_intermediate, deteccion_inteligente
+                image_path, language, temp_dir, save_intermediate, deteccion_inteligente,
+                imagen_mejorada_array if imagen_mejorada_array is not None else image_array
             )
             
             if 'error' in resultado_completo['etapas']['3_ocr']:
@@ -462,18 +498,20 @@ class OrquestadorOCR:
                     resultado_completo['tiempo_total'] = round(time.time() - start_time, 3)
             return resultado_completo
         
-    def _ejecutar_validacion(self, image_path, temp_dir, save_intermediate):
+    def _ejecutar_validacion(self, image_path, temp_dir, save_intermediate, image_array=None, features=None):
         """Ejecuta la etapa de validación"""
         try:
-            # Copiar imagen original al directorio temporal
-            imagen_original = temp_dir / "00_imagen_original.png"
-            shutil.copy2(image_path, imagen_original)
+            # Copiar imagen original al directorio temporal (solo se conserva con archivos intermedios)
+            imagen_original = None
+            if save_intermediate:
+                imagen_original = temp_dir / "00_imagen_original.png"
+                shutil.copy2(image_path, imagen_original)
             
             # Ejecutar validación
             import time
             start_time = time.time()
             
-            diagnostico = self.validador.analizar_imagen(image_path)
+            diagnostico = self.validador.analizar_imagen(image_path, image_array=image_array, features=features)
             
             tiempo_validacion = round(time.time() - start_time, 3)
             
@@ -486,24 +524,28 @@ class OrquestadorOCR:
             return {
                 'tiempo': tiempo_validacion,
                 'diagnostico': diagnostico,
-                'imagen_original': str(imagen_original),
+                'imagen_original': str(imagen_original) if imagen_original else None,
                 'archivo_diagnostico': str(temp_dir / "diagnostico.json") if save_intermediate else None
             }
             
         except Exception as e:
             return {'error': str(e)}
     
-    def _ejecutar_mejora(self, image_path, diagnostico, profile, temp_dir, save_intermediate):
+    def _ejecutar_mejora(self, image_path, diagnostico, profile, temp_dir, save_intermediate, image_array=None,
+                         features=None):
         """Ejecuta la etapa de mejora"""
         try:
             import time
             start_time = time.time()
             
             resultado_mejora = self.mejorador.procesar_imagen(
-                image_path, diagnostico, profile, save_intermediate, temp_dir
+                image_path, diagnostico, profile, save_intermediate, temp_dir, image_array=image_array,
+                features=features
             )
             
             tiempo_mejora = round(time.time() - start_time, 3)
+            # El array no es serializable: se retira durante el volcado JSON y se devuelve al llamador
+            imagen_mejorada_array = resultado_mejora.pop('imagen_mejorada_array', None)
             resultado_mejora['tiempo'] = tiempo_mejora
             
             # Guardar resultado de mejora
@@ -513,12 +555,15 @@ class OrquestadorOCR:
                     json.dump(resultado_mejora, f, indent=2, ensure_ascii=False)
                 resultado_mejora['archivo_resultado'] = str(mejora_path)
             
+            if imagen_mejorada_array is not None:
+                resultado_mejora['imagen_mejorada_array'] = imagen_mejorada_array
             return resultado_mejora
             
         except Exception as e:
             return {'error': str(e)}
     
-    def _ejecutar_ocr(self, imagen_mejorada, language, temp_dir, save_intermediate, deteccion_inteligente=None):
+    def _ejecutar_ocr(self, imagen_mejorada, language, temp_dir, save_intermediate, deteccion_inteligente=None,
+                      image_array=None):
         """Ejecuta la etapa de OCR"""
         try:
             import time
@@ -528,7 +573,8 @@ class OrquestadorOCR:
             # REASON: Mejorar precisión OCR y usar configuración optimizada para tipo de imagen
             # IMPACT: Mejor calidad de extracción de texto
             resultado_ocr = self.aplicador.extraer_texto(
-                imagen_mejorada, language, 'high_confidence', True, deteccion_inteligente
+                imagen_mejorada, language, 'high_confidence', True, deteccion_inteligente,
+                image_array=image_array
             )
             
             tiempo_ocr = round(time.time() - start_time, 3)
@@ -843,7 +889,64 @@ class OrquestadorOCR:
         except Exception as e:
             logger.warning(f"Error limpiando archivos temporales: {str(e)}")
     
-    def procesar_imagen(self, image_path, profile='ultra_rapido', extract_financial=True, metadata=None):
+    @contextmanager
+    def espacio_trabajo(self, job_id):
+        """
+        Crea un directorio de trabajo aislado (tmpfs si está disponible) y lo elimina al salir
+        
+        Args:
+            job_id: Identificador del job o imagen, usado como prefijo legible del directorio
+        """
+        temp_config = config.TEMP_FILE_CONFIG
+        safe_id = re.sub(r'[^A-Za-z0-9_.-]', '_', str(job_id))[:60]
+        scratch_dir = Path(tempfile.mkdtemp(
+            prefix=f"{temp_config.get('scratch_prefix', 'ocr_job_')}{safe_id}_",
+            dir=config.get_scratch_root()
+        ))
+        try:
+            yield scratch_dir
+        finally:
+            if not temp_config.get('keep_temp_files', False):
+                shutil.rmtree(scratch_dir, ignore_errors=True)
+    
+    @staticmethod
+    def _cargar_imagen(image_path):
+        """Decodifica la imagen una sola vez (BGR de OpenCV) para todo el pipeline en memoria"""
+        return cv2.imread(str(image_path), cv2.IMREAD_COLOR)
+    
+    def _resultados_ruta_directa(self, features, triaje):
+        """
+        Validación y mejora registradas para una imagen que el triaje envía directo al OCR
+        
+        Solo se calcula lo que consumen el OCR y la caché: tipo de imagen y hash perceptual.
+        
+        Returns:
+            tuple: (validation_result, mejora_result)
+        """
+        alto, ancho = features.shape
+        validation_result = {
+            'imagen_info': {
+                'ancho': int(ancho),
+                'alto': int(alto),
+                'hash_perceptual': self.validador._calcular_hash_perceptual(features.gray)
+            },
+            'deteccion_inteligente': {
+                'tipo_imagen': 'screenshot_movil',
+                'inversion_requerida': False,
+                'origen': 'triaje_rapido'
+            },
+            'omitida': True
+        }
+        mejora_result = {
+            'pasos_aplicados': ['00_triaje_ruta_directa'],
+            'parametros_aplicados': {'triaje': triaje['metricas']},
+            'tiempo_procesamiento': 0,
+            'omitida': True
+        }
+        return validation_result, mejora_result
+    
+    def procesar_imagen(self, image_path, profile='ultra_rapido', extract_financial=True, metadata=None,
+                        current_batch_id=None):
         """
         FIX: Método de procesamiento individual simplificado para lotes
         REASON: Error 'OrquestadorOCR' object has no attribute 'procesar_imagen'
@@ -875,8 +978,8 @@ class OrquestadorOCR:
             # Generar nombre único para el lote
             import uuid
             from datetime import datetime
-            # INTEGRIDAD TOTAL: Usar ID único del lote de ejecución
-            current_batch_id = self._get_current_batch_id()
+            # INTEGRIDAD TOTAL: Usar ID único del lote de ejecución, recibido explícitamente del job
+            # (process_queue_batch → procesar_imagen); sin lote se genera un ID individual
             if current_batch_id:
                 # Usar ID único del lote + hash del filename para archivo individual
                 batch_id = f"{current_batch_id}_{hash(filename)%1000:03d}_{filename}"
@@ -884,32 +987,68 @@ class OrquestadorOCR:
                 # Fallback: generar ID individual si no hay lote
                 batch_id = f"BATCH_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{str(uuid.uuid4())[:3]}_{filename}"
             
-            # 1. VALIDACIÓN
-            validation_result = self.validador.analizar_imagen(image_path)
-            if validation_result.get('error'):
-                logger.warning(f"Validación fallida para {filename}: {validation_result['error']}")
-                return {'status': 'error', 'error': validation_result['error']}
-            
-            # 2. MEJORA
-            mejora_result = self.mejorador.procesar_imagen(
-                image_path, validation_result, profile, save_steps=False
-            )
-            
-            if mejora_result.get('error'):
-                logger.warning(f"Mejora fallida para {filename}: {mejora_result['error']}")
-                return {'status': 'error', 'error': mejora_result['error']}
-            
-            # 3. OCR
-            imagen_mejorada = mejora_result.get('imagen_mejorada_path', image_path)
-            deteccion_inteligente = validation_result.get('deteccion_inteligente', {})
-            
-            ocr_result = self.aplicador.extraer_texto(
-                imagen_mejorada, 'spa', profile, extract_financial, deteccion_inteligente
-            )
-            
-            if ocr_result.get('error'):
-                logger.warning(f"OCR fallido para {filename}: {ocr_result['error']}")
-                return {'status': 'error', 'error': ocr_result['error']}
+            # FIX: Decodificar la imagen una sola vez y pasar el array por validación → mejora → OCR
+            # REASON: Cada etapa volvía a leer la imagen y la mejora escribía/leía un PNG intermedio
+            # IMPACT: Sin ciclos PNG ni E/S temporal por recibo
+            image_array = self._cargar_imagen(image_path)
+            if image_array is None:
+                logger.warning(f"No se puede cargar la imagen {filename}")
+                return {'status': 'error', 'error': f"No se puede cargar la imagen: {image_path}"}
+            
+            # FIX: Espacio de trabajo propio por imagen, gestionado por el orquestador
+            # REASON: Con output_dir=None la mejora escribía en un imagen_mejorada.png fijo del CWD
+            # IMPACT: Workers concurrentes ya no se pisan los archivos intermedios
+            # FIX: Características de análisis calculadas una vez y compartidas por validación y mejora
+            # REASON: Mejora recalculaba escala de grises, media, histograma y métricas del validador
+            # IMPACT: Menos pasadas completas sobre la imagen por recibo
+            features = ImageFeatures(image_array)
+            
+            # FIX: Triaje rápido sobre una miniatura antes de validar y mejorar
+            # REASON: Las capturas móviles limpias pasaban por la validación y la secuencia completa de mejora
+            # IMPACT: Esas capturas van directo al OCR con los píxeles originales; la decisión queda en el resultado
+            triaje = get_triaje().evaluar(features)
+            
+            with self.espacio_trabajo(batch_id) as scratch_dir:
+                if triaje['ruta'] == RUTA_DIRECTA:
+                    validation_result, mejora_result = self._resultados_ruta_directa(features, triaje)
+                    imagen_mejorada_array = image_array
+                else:
+                    inicio_preprocesamiento = time.time()
+                    
+                    # 1. VALIDACIÓN
+                    validation_result = self.validador.analizar_imagen(image_path, image_array=image_array, features=features)
+                    if validation_result.get('error'):
+                        logger.warning(f"Validación fallida para {filename}: {validation_result['error']}")
+                        return {'status': 'error', 'error': validation_result['error']}
+                    
+                    # 2. MEJORA
+                    mejora_result = self.mejorador.procesar_imagen(
+                        image_path, validation_result, profile, save_steps=False,
+                        output_dir=scratch_dir, image_array=image_array, features=features
+                    )
+                    
+                    if mejora_result.get('error'):
+                        logger.warning(f"Mejora fallida para {filename}: {mejora_result['error']}")
+                        return {'status': 'error', 'error': mejora_result['error']}
+                    
+                    imagen_mejorada_array = mejora_result.pop('imagen_mejorada_array', None)
+                    if imagen_mejorada_array is None:
+                        imagen_mejorada_array = image_array
+                    triaje['tiempo_preprocesamiento'] = round(time.time() - inicio_preprocesamiento, 3)
+                
+                # 3. OCR
+                deteccion_inteligente = validation_result.get('deteccion_inteligente', {})
+                
+                ocr_result = self.aplicador.extraer_texto(
+                    image_path, 'spa', profile, extract_financial, deteccion_inteligente,
+                    image_array=imagen_mejorada_array,
+                    perceptual_hash=validation_result.get('imagen_info', {}).get('hash_perceptual'),
+                    perceptual_image=image_array
+                )
+                
+                if ocr_result.get('error'):
+                    logger.warning(f"OCR fallido para {filename}: {ocr_result['error']}")
+                    return {'status': 'error', 'error': ocr_result['error']}
             
             # 4. PREPARAR RESULTADO FINAL
             processing_time = time.time() - start_time
@@ -1086,6 +1225,7 @@ class OrquestadorOCR:
                 },
                 'validacion': validation_result,
                 'mejora': mejora_result,
+                'triaje': triaje,
                 'datos_extraidos': {
                     'texto_completo': texto_extraido,
                     'palabras_detectadas': palabras_detectadas,
@@ -1097,9 +1237,20 @@ class OrquestadorOCR:
                 },
                 'estadisticas': estadisticas_calculadas,  # Mantener compatibilidad con sistema anterior
                 'calidad_extraccion': ocr_result.get('calidad_extraccion', {}),
-                'texto_extraido': texto_extraido
+                'texto_extraido': texto_extraido,
+                
+                # Reenvío del mismo recibo (exacto o recodificado): posible pago duplicado
+                'duplicado_probable': ocr_result.get('duplicado_probable')
             }
             
+            # FIX: Campos empresariales extraídos una sola vez, al procesar, con versión de esquema
+            # REASON: Las exportaciones los reextraían desde el JSON en cada descarga o consulta
+            # IMPACT: extract_results y descargas de lote solo serializan el registro persistido
+            try:
+                resultado_final[CLAVE_CAMPOS] = registro_campos(resultado_final)
+            except Exception as e:
+                logger.error(f"Error extrayendo campos empresariales de {filename}: {e}")
+            
             # 5. GUARDAR RESULTADO JSON
             json_filename = f"{batch_id}.json"
             json_path = results_dir / json_filename
@@ -1110,6 +1261,8 @@ class OrquestadorOCR:
             with open(json_path, 'w', encoding='utf-8') as f:
                 import json
                 json.dump(resultado_convertido, f, indent=2, ensure_ascii=False)
+            get_results_index().registrar(json_path, resultado_convertido)
+            get_batch_manifests().registrar(json_path, resultado_convertido)
             
             # 6. MOVER IMAGEN A PROCESADOS
             processed_path = processed_dir / filename
@@ -1129,23 +1282,32 @@ class OrquestadorOCR:
                 'filename': os.path.basename(image_path) if image_path else 'unknown'
             }
 
-    def process_queue_batch(self, max_files=50, profile='ultra_rapido', request_id=None):
+    def process_queue_batch(self, max_files=50, profile='ultra_rapido', request_id=None,
+                            image_files=None, progress_callback=None):
         """
         FIX: Método para procesamiento por lotes desde API con tracking request_id
         REASON: Error 'OrquestadorOCR' object has no attribute 'process_queue_batch'
         IMPACT: Permite procesamiento por lotes desde interfaz web sin errores + persistencia tracking
         MANDATO CRÍTICO: Acepta request_id para persistencia de parámetros de seguimiento
+        
+        Args:
+            image_files: Lista explícita de imágenes reclamadas por el job (si None, escanea inbox)
+            progress_callback: Callable(filename, estado, resultado) invocado por cada imagen
         """
         try:
-            from config import get_async_directories
-            directories = get_async_directories()
-            
-            # Obtener archivos pendientes
-            inbox_path = Path(directories['inbox'])
-            image_files = []
-            
-            for ext in ['*.png', '*.jpg', '*.jpeg']:
-                image_files.extend(inbox_path.glob(ext))
+            if image_files is None:
+                from config import get_async_directories
+                directories = get_async_directories()
+                
+                # Obtener archivos pendientes
+                inbox_path = Path(directories['inbox'])
+                image_files = []
+                
+                for ext in ['*.png', '*.jpg', '*.jpeg']:
+                    image_files.extend(inbox_path.glob(ext))
+            else:
+                # Job de la cola: solo archivos reclamados que aún existen en disco
+                image_files = [Path(f) for f in image_files if Path(f).exists()]
             
             if not image_files:
                 return {
@@ -1168,22 +1330,40 @@ class OrquestadorOCR:
             
             logger.info(f"Iniciando procesamiento por lotes: {len(files_to_process)} archivos")
             
-            for image_file in files_to_process:
+            # FIX: Modo multiproceso - repartir las imágenes entre procesos con predictor propio
+            # REASON: El bucle secuencial usa solo 2 hilos intra-op y deja ociosos los demás núcleos
+            # IMPACT: Throughput proporcional al número de procesos del pool
+            from ocr_worker_pool import get_process_pool
+            process_pool = get_process_pool()
+            sequential_files = files_to_process
+            if process_pool is not None:
+                processed_count, error_count = self._process_files_in_pool(
+                    process_pool, files_to_process, profile, request_id, progress_callback
+                )
+                sequential_files = []
+            
+            for image_file in sequential_files:
+                resultado = None
                 try:
                     # Extraer metadatos WhatsApp desde el nombre del archivo
                     filename = image_file.name
                     metadata = self._extract_whatsapp_metadata_from_filename(filename)
                     
+                    if progress_callback:
+                        progress_callback(filename, 'procesando', None)
+                    
                     # Procesar imagen individual con metadata
                     resultado = self.procesar_imagen(
                         str(image_file),
                         profile=profile,
                         extract_financial=True,
-                        metadata=metadata
+                        metadata=metadata,
+                        current_batch_id=request_id
                     )
                     
                     if resultado and resultado.get('status') == 'exitoso':
                         processed_count += 1
+                        get_triaje().registrar(resultado.get('triaje'))
                         logger.info(f"✅ Procesado: {image_file.name}")
                     else:
                         error_count += 1
@@ -1192,6 +1372,10 @@ class OrquestadorOCR:
                 except Exception as e:
                     error_count += 1
                     logger.error(f"Error procesando {image_file.name}: {e}")
+                
+                if progress_callback:
+                    exitoso = bool(resultado) and resultado.get('status') == 'exitoso'
+                    progress_callback(image_file.name, 'exitoso' if exitoso else 'error', resultado)
             
             processing_time = (datetime.now() - start_time).total_seconds()
             
@@ -1222,20 +1406,44 @@ class OrquestadorOCR:
                 }
             }
     
-    def _get_current_batch_id(self):
+    def _process_files_in_pool(self, process_pool, files_to_process, profile, request_id, progress_callback):
         """
-        INTEGRIDAD TOTAL: Obtener ID único del lote actual
+        Reparte las imágenes de un lote entre los procesos del pool y recoge los resultados en orden
+        
+        Returns:
+            tuple: (processed_count, error_count)
         """
-        try:
-            from pathlib import Path
-            batch_file = Path('data/current_batch_id.txt')
-            if batch_file.exists():
-                with open(batch_file, 'r', encoding='utf-8') as f:
-                    return f.read().strip()
-            return None
-        except Exception as e:
-            logger.error(f"Error obteniendo ID de lote actual: {e}")
-            return None
+        processed_count = 0
+        error_count = 0
+        
+        futures = []
+        for image_file in files_to_process:
+            metadata = self._extract_whatsapp_metadata_from_filename(image_file.name)
+            futures.append(process_pool.submit_procesar_imagen(image_file, profile, metadata, request_id))
+            if progress_callback:
+                progress_callback(image_file.name, 'procesando', None)
+        
+        for image_file, future in zip(files_to_process, futures):
+            resultado = None
+            try:
+                resultado = future.result()
+            except Exception as e:
+                logger.error(f"Error en worker del pool procesando {image_file.name}: {e}")
+            
+            exitoso = bool(resultado) and resultado.get('status') == 'exitoso'
+            if exitoso:
+                processed_count += 1
+                # Los workers deciden la ruta; las cuentas se llevan en este proceso
+                get_triaje().registrar(resultado.get('triaje'))
+                logger.info(f"✅ Procesado: {image_file.name}")
+            else:
+                error_count += 1
+                logger.warning(f"❌ Error procesando: {image_file.name}")
+            
+            if progress_callback:
+                progress_callback(image_file.name, 'exitoso' if exitoso else 'error', resultado)
+        
+        return processed_count, error_count
 
     def _extraer_campos_posicionales(self, palabras_detectadas, texto_completo):
         """
@@ -1663,50 +1871,9 @@ class OrquestadorOCR:
         if not word_data:
             return {}
         
-        # Calcular dimensiones del documento
-        all_coords = [w['coordinates'] for w in word_data if w['coordinates'] != [0, 0, 0, 0]]
-        if not all_coords:
-            return {}
-        
-        min_x = min(coord[0] for coord in all_coords)
-        max_x = max(coord[2] for coord in all_coords)
-        min_y = min(coord[1] for coord in all_coords)
-        max_y = max(coord[3] for coord in all_coords)
-        
-        # Dividir documento en regiones
-        width = max_x - min_x
-        height = max_y - min_y
-        
-        regiones = {
-            'superior_izquierda': 0,
-            'superior_centro': 0,
-            'superior_derecha': 0,
-            'medio_izquierda': 0,
-            'medio_centro': 0,
-            'medio_derecha': 0,
-            'inferior_izquierda': 0,
-            'inferior_centro': 0,
-            'inferior_derecha': 0
-        }
-        
-        for word in word_data:
-            coords = word['coordinates']
-            if coords == [0, 0, 0, 0]:
-                continue
-                
-            # Calcular posición relativa
-            rel_x = (coords[0] - min_x) / width if width > 0 else 0
-            rel_y = (coords[1] - min_y) / height if height > 0 else 0
-            
-            # Determinar región
-            x_region = 'izquierda' if rel_x < 0.33 else 'centro' if rel_x < 0.67 else 'derecha'
-            y_region = 'superior' if rel_y < 0.33 else 'medio' if rel_y < 0.67 else 'inferior'
-            
-            region_key = f"{y_region}_{x_region}"
-            if region_key in regiones:
-                regiones[region_key] += 1
-        
-        return regiones
+        # Cuadrícula 3x3 (superior/medio/inferior x izquierda/centro/derecha) calculada sobre el
+        # array de cajas del layout compartido con la lógica de oro
+        return LineLayout(word_data).relative_grid()
     
     def _aplicar_correcciones_mandato_5x_fases_2_3(self, extracted_fields, texto_completo):
         """
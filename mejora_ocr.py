@@ -8,12 +8,15 @@ import numpy as np
 import json
 import logging
 import time
+import threading
 from pathlib import Path
 from PIL import Image, ImageEnhance, ImageFilter
 from skimage import restoration, filters, morphology, exposure
 from skimage.filters import unsharp_mask
 from scipy import ndimage
 import config
+from image_features import ImageFeatures
+from grafo_mejora import GrafoMejora
 
 # Configurar logging
 # FIX: Configuración directa para evitar problemas con tipos de datos en LOGGING_CONFIG
@@ -32,9 +35,23 @@ class MejoradorOCR:
         # FIX: Pool de memoria para arrays NumPy reutilizables
         # REASON: Reducir asignaciones/liberaciones de memoria en entorno de 4GB RAM
         # IMPACT: 20-30% reducción en uso de memoria y garbage collection
-        self._memory_pools = {}
+        # Un pool por hilo: los workers de lotes comparten el mejorador pero no sus buffers temporales
+        self._memory_pools = threading.local()
         self._max_pool_size = 50  # Máximo 50MB en pools para RAM limitada
     
+    def _buffer_temporal(self, shape, dtype):
+        """Buffer temporal reutilizable del hilo actual (su contenido no sobrevive a la siguiente petición)"""
+        pool = getattr(self._memory_pools, 'buffers', None)
+        if pool is None:
+            pool = self._memory_pools.buffers = {}
+        clave = (tuple(shape), np.dtype(dtype).str)
+        buffer = pool.get(clave)
+        if buffer is None:
+            if sum(b.nbytes for b in pool.values()) + np.prod(shape) * np.dtype(dtype).itemsize > self._max_pool_size * 1024 * 1024:
+                pool.clear()
+            buffer = pool[clave] = np.empty(shape, dtype=dtype)
+        return buffer
+    
     def _convert_numpy_types(self, obj):
         """
         FIX: Convierte TODOS los tipos NumPy y problemáticos a tipos nativos Python para serialización JSON
@@ -58,7 +75,8 @@ class MejoradorOCR:
         else:
             return obj
         
-    def procesar_imagen(self, image_path, diagnostico, perfil='rapido', save_steps=False, output_dir=None):
+    def procesar_imagen(self, image_path, diagnostico, perfil='rapido', save_steps=False, output_dir=None,
+                        image_array=None, features=None):
         """
         Procesa una imagen aplicando mejoras basadas en el diagnóstico
         
@@ -68,9 +86,14 @@ class MejoradorOCR:
             perfil: Perfil de rendimiento a usar
             save_steps: Si guardar pasos intermedios
             output_dir: Directorio para archivos temporales
+            image_array: Imagen ya decodificada (BGR de OpenCV). Activa el modo en memoria:
+                la imagen mejorada se devuelve en 'imagen_mejorada_array' y solo se escribe
+                a disco si save_steps está activo
+            features: ImageFeatures de la imagen original ya usado por ValidadorOCR; escala de
+                grises, histograma y métricas iniciales se leen de él en lugar de recalcularse
             
         Returns:
-            dict: Resultado del procesamiento con ruta de imagen mejorada
+            dict: Resultado del procesamiento con ruta (o array) de imagen mejorada
         """
         try:
             # Validar perfil
@@ -80,10 +103,12 @@ class MejoradorOCR:
             
             profile_config = self.profiles[perfil]
             
-            # Cargar imagen
-            image = cv2.imread(str(image_path))
+            # Cargar imagen (solo si no llega ya decodificada desde el validador)
+            image = image_array if image_array is not None else cv2.imread(str(image_path))
             if image is None:
                 raise ValueError(f"No se puede cargar la imagen: {image_path}")
+            if features is None:
+                features = ImageFeatures(image)
             
             # Log inicial
             logger.info(f"Iniciando procesamiento con perfil: {perfil}")
@@ -92,7 +117,7 @@ class MejoradorOCR:
             resultado_procesamiento = {
                 'perfil_usado': perfil,
                 'pasos_aplicados': [],
-                'metricas_antes': self._calcular_metricas_imagen(image),
+                'metricas_antes': features.metricas(),
                 'parametros_aplicados': {},
                 'tiempo_procesamiento': 0
             }
@@ -100,9 +125,8 @@ class MejoradorOCR:
             import time
             start_time = time.time()
             
-            # Convertir a escala de grises
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            current_image = gray.copy()
+            # Escala de grises compartida: los pasos de mejora solo la leen y escriben en un array propio
+            current_image = features.gray
             
             if save_steps and output_dir:
                 cv2.imwrite(str(Path(output_dir) / "01_original_gray.png"), current_image)
@@ -116,17 +140,23 @@ class MejoradorOCR:
             else:
                 current_image = self._aplicar_secuencia_procesamiento(
                     current_image, diagnostico, profile_config, 
-                    resultado_procesamiento, save_steps, output_dir
+                    resultado_procesamiento, save_steps, output_dir, features
                 )
             
             # Guardar imagen final
-            output_path = Path(output_dir) / "imagen_mejorada.png" if output_dir else Path("imagen_mejorada.png")
-            cv2.imwrite(str(output_path), current_image)
+            # FIX: En modo en memoria el PNG solo se escribe si se piden archivos intermedios
+            # REASON: El orquestador entrega el array directamente al OCR
+            # IMPACT: Se elimina un ciclo de codificación/decodificación PNG por recibo
+            en_memoria = image_array is not None
+            output_path = None
+            if not en_memoria or save_steps:
+                output_path = Path(output_dir) / "imagen_mejorada.png" if output_dir else Path("imagen_mejorada.png")
+                cv2.imwrite(str(output_path), current_image)
             
             # Calcular métricas finales
             resultado_procesamiento['metricas_despues'] = self._calcular_metricas_imagen(current_image)
             resultado_procesamiento['tiempo_procesamiento'] = round(time.time() - start_time, 3)
-            resultado_procesamiento['imagen_mejorada'] = str(output_path)
+            resultado_procesamiento['imagen_mejorada'] = str(output_path) if output_path else None
             resultado_procesamiento['mejora_calidad'] = self._calcular_mejora_calidad(
                 resultado_procesamiento['metricas_antes'],
                 resultado_procesamiento['metricas_despues']
@@ -137,15 +167,25 @@ class MejoradorOCR:
             # FIX: Convertir tipos NumPy antes de devolver resultado
             # REASON: Evitar errores de serialización JSON con float32/int64
             # IMPACT: Garantiza compatibilidad completa con JSON para API web
-            return self._convert_numpy_types(resultado_procesamiento)
+            resultado_procesamiento = self._convert_numpy_types(resultado_procesamiento)
+            if en_memoria:
+                # El array se añade tras la conversión; el llamador debe retirarlo antes de serializar
+                resultado_procesamiento['imagen_mejorada_array'] = current_image
+            return resultado_procesamiento
             
         except Exception as e:
             logger.error(f"Error en procesamiento de imagen: {str(e)}")
             return {'error': str(e)}
     
-    def _aplicar_secuencia_procesamiento(self, image, diagnostico, profile_config, resultado, save_steps, output_dir):
-        """Aplica la secuencia completa de procesamiento inteligente"""
-        current = image.copy()
+    def _aplicar_secuencia_procesamiento(self, image, diagnostico, profile_config, resultado, save_steps, output_dir,
+                                         features=None):
+        """
+        Aplica la secuencia completa de procesamiento inteligente
+        
+        features: ImageFeatures de la imagen en escala de grises recibida (media e histograma ya calculados)
+        """
+        if features is None:
+            features = ImageFeatures(image)
         step_counter = 2
         
         # FIX: CRITICAL - Sistema de Triage Inteligente y Conservación Extrema de Caracteres
@@ -179,12 +219,12 @@ class MejoradorOCR:
         # IMPACT: Preserva la calidad original de la imagen sin procesamiento agresivo
         
         # FASE 1.0: Análisis simple sin modificar la imagen
-        intensidad_media = np.mean(current)
-        histogram = cv2.calcHist([current], [0], None, [256], [0, 256])
+        intensidad_media = features.mean
+        histogram = features.histogram
         
         # Detectar si el fondo es predominantemente oscuro (solo para análisis)
         pixeles_oscuros = np.sum(histogram[0:80])
-        pixeles_totales = current.shape[0] * current.shape[1]
+        pixeles_totales = image.shape[0] * image.shape[1]
         porcentaje_fondo_oscuro = pixeles_oscuros / pixeles_totales
         
         # NO aplicar unificación - solo registrar las métricas
@@ -196,19 +236,20 @@ class MejoradorOCR:
             'razon_no_unificacion': 'preservacion_calidad_usuario'
         }
         
+        # FIX: Cadena de mejora como grafo de operaciones sobre buffers preasignados
+        # REASON: Cada paso asignaba un array completo (copias, filter2D, clip/astype, bitwise_not)
+        # IMPACT: La entrada compartida solo se lee, el resultado ocupa un único array y la inversión se
+        #         aplica en el mismo sitio; filtros lineales consecutivos se funden en una convolución
+        grafo = GrafoMejora()
+        
         # Maximizar claridad de letras independientemente de la estrategia
         # Aplicar filtro de nitidez suave para preservar caracteres
         kernel_nitidez = np.array([[-0.1, -0.1, -0.1],
                                   [-0.1,  1.8, -0.1],
                                   [-0.1, -0.1, -0.1]])
-        current = cv2.filter2D(current, -1, kernel_nitidez)
-        current = np.clip(current, 0, 255).astype(np.uint8)
+        grafo.convolucion('claridad_letras', kernel_nitidez)
         
         resultado['pasos_aplicados'].append('00_maxima_claridad_letras')
-        
-        if save_steps and output_dir:
-            cv2.imwrite(str(Path(output_dir) / f"{step_counter:02d}_claridad_letras.png"), current)
-            step_counter += 1
 
         # FIX: ELIMINAR inversión localizada - aplicar solo inversión global si es necesario
         # REASON: Simplificar procesamiento y evitar degradación de calidad
@@ -216,21 +257,29 @@ class MejoradorOCR:
         
         # FASE 1.1: Inversión simple y directa solo para imágenes muy oscuras
         if intensidad_media < 80:  # Solo para imágenes muy oscuras
-            current = cv2.bitwise_not(current)
+            grafo.inversion('inversion_global')
             resultado['pasos_aplicados'].append('01_inversion_global_simple')
             resultado['parametros_aplicados']['inversion_global'] = {
                 'intensidad_media_original': float(round(intensidad_media, 2)),
                 'razon': 'imagen_muy_oscura_necesita_inversion'
             }
-            if save_steps and output_dir:
-                cv2.imwrite(str(Path(output_dir) / f"{step_counter:02d}_inversion_global.png"), current)
-                step_counter += 1
         else:
             resultado['pasos_aplicados'].append('01_no_inversion_necesaria')
             resultado['parametros_aplicados']['no_inversion'] = {
                 'razon': 'imagen_suficientemente_clara',
                 'intensidad_media': float(round(intensidad_media, 2))
             }
+        
+        def _guardar_paso(nombre, imagen_paso):
+            nonlocal step_counter
+            cv2.imwrite(str(Path(output_dir) / f"{step_counter:02d}_{nombre}.png"), imagen_paso)
+            step_counter += 1
+        
+        current, tiempos_pasos = grafo.ejecutar(
+            image, self._buffer_temporal, _guardar_paso if save_steps and output_dir else None
+        )
+        resultado['parametros_aplicados']['tiempos_pasos_ms'] = tiempos_pasos
+        
         # FASE 2: Aplicar estrategia especializada según tipo de imagen
         if tipo_imagen == "screenshot_movil":
             current = self._procesar_screenshot_movil(current, deteccion_inteligente, profile_config, resultado, save_steps, output_dir, step_counter)
@@ -129,8 +129,8 @@ class MemoryOptimizer:
             import shutil
             from pathlib import Path
             
+            # temp/ocr_cache no se incluye: la caché OCR aplica su propio límite de tamaño y TTL
             cache_dirs = [
-                Path("temp/ocr_cache"),
                 Path("temp"),
                 Path("uploads"),
                 Path("__pycache__")
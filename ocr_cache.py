@@ -0,0 +1,491 @@
+"""
+Caché de resultados OCR de dos niveles
+LRU en memoria del proceso delante de un almacén SQLite persistente con límite de tamaño y barrido de TTL
+"""
+
+import re
+import copy
+import json
+import time
+import hashlib
+import atexit
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Nombre de las entradas de la caché anterior: f"{md5 del archivo}_{config_mode}.json"
+LEGACY_CACHE_FILE = re.compile(r'^[0-9a-f]{32}_[a-z0-9_]+\.json$')
+
+
+class OCRResultCache:
+    """
+    Caché acotada de resultados OCR
+
+    - Nivel 1: OrderedDict LRU en memoria (aciertos en microsegundos)
+    - Nivel 2: SQLite en cache_dir, compartido entre procesos y reinicios
+    - Desalojo por tamaño (max_cache_size_mb) según último acceso
+    - Barrido de entradas expiradas en un hilo de fondo
+    """
+
+    def __init__(self, cache_config=None):
+        cache_config = cache_config or config.OCR_CACHE_CONFIG
+
+        self.enabled = cache_config.get('enabled', False)
+        self.ttl_seconds = cache_config.get('cache_ttl_hours', 24) * 3600
+        self.max_bytes = int(cache_config.get('max_cache_size_mb', 100) * 1024 * 1024)
+        self.memory_max_entries = cache_config.get('memory_max_entries', 256)
+        self.sweep_interval = cache_config.get('sweep_interval_seconds', 600)
+        self.low_water_bytes = int(self.max_bytes * cache_config.get('eviction_low_water_fraction', 0.9))
+        self.db_path = Path(cache_config.get('cache_dir', config.CACHE_DIR)) / cache_config.get('db_filename', 'ocr_cache.sqlite3')
+        near_config = cache_config.get('near_duplicate', {})
+        self.near_duplicate_enabled = near_config.get('enabled', False)
+        self.max_hamming_distance = near_config.get('max_hamming_distance', 4)
+        self.max_visual_difference = near_config.get('max_visual_difference', 10.0)
+        self.max_flag_difference = near_config.get('max_flag_difference', 30.0)
+
+        self._memory = OrderedDict()  # key -> (created_at, value)
+        self._lock = threading.RLock()
+        self._conn = None
+        self._total_bytes = 0
+        self._bytes_desde_recuento = 0  # Escritos por este proceso desde el último recuento en SQLite
+        self._sweeper = None
+        self._stop_event = threading.Event()
+        self._stats = {
+            'hits_memoria': 0,
+            'hits_disco': 0,
+            'misses': 0,
+            'escrituras': 0,
+            'desalojos_tamano': 0,
+            'desalojos_memoria': 0,
+            'expirados': 0,
+            'casi_duplicados_reutilizados': 0,
+            'casi_duplicados_marcados': 0
+        }
+
+        if self.enabled:
+            self._open()
+            if cache_config.get('cleanup_on_startup', True):
+                self._purge_legacy_files()
+                self.sweep_expired()
+            self._start_sweeper()
+
+    # ------------------------------------------------------------------
+    # Almacén persistente
+    # ------------------------------------------------------------------
+
+    def _open(self):
+        """Abre (o crea) la base SQLite y calcula el tamaño ocupado"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False, isolation_level=None)
+        # WAL permite lectores concurrentes mientras otro proceso del pool escribe
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS ocr_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' payload BLOB NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_access ON ocr_cache(last_access)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_ocr_cache_created_at ON ocr_cache(created_at)')
+        # Índice perceptual: una fila por contenido (image_hash), independiente del config_mode
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS perceptual_index ('
+            ' image_hash TEXT PRIMARY KEY,'
+            ' dhash TEXT NOT NULL,'
+            ' thumbnail BLOB NOT NULL,'
+            ' source TEXT,'
+            ' created_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_perceptual_created_at ON perceptual_index(created_at)')
+        self._recontar()
+        logger.info(f"Caché OCR abierta: {self.db_path} ({self._total_bytes / 1024 / 1024:.1f}MB)")
+
+    def _purge_legacy_files(self):
+        """Elimina los JSON de la caché anterior (un archivo por entrada), que ya no se leen"""
+        removed = 0
+        for legacy_file in self.db_path.parent.glob('*.json'):
+            # Solo entradas <md5>_<config_mode>.json: cache_dir puede contener otros JSON que no son de la caché
+            if not LEGACY_CACHE_FILE.match(legacy_file.name):
+                continue
+            try:
+                legacy_file.unlink()
+                removed += 1
+            except OSError:
+                pass
+        if removed:
+            logger.info(f"Caché OCR: {removed} archivos JSON de la caché anterior eliminados")
+
+    def _is_expired(self, created_at, now=None):
+        return ((now or time.time()) - created_at) > self.ttl_seconds
+
+    def _remember(self, key, created_at, value):
+        """Inserta en el nivel de memoria respetando el límite de entradas"""
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max_entries:
+            self._memory.popitem(last=False)
+            self._stats['desalojos_memoria'] += 1
+
+    def _recontar(self):
+        """Sincroniza el contador del proceso con la ocupación real en SQLite"""
+        self._total_bytes = self._bytes_ocupados()
+        self._bytes_desde_recuento = 0
+        return self._total_bytes
+
+    def _bytes_ocupados(self):
+        """
+        Bytes ocupados en SQLite: resultados más miniaturas del índice perceptual
+
+        FIX: Recuento en la base que corrige el contador del proceso (_total_bytes)
+        REASON: Con varios workers cada proceso solo ve sus propias escrituras y el índice perceptual no contaba;
+                recontar en cada put recorría ambas tablas completas
+        IMPACT: El contador se sincroniza al abrir, en cada barrido, al superar el límite y cada vez que el
+                proceso escribe el margen de desalojo; put solo lo ajusta
+        """
+        return self._conn.execute(
+            'SELECT (SELECT COALESCE(SUM(size), 0) FROM ocr_cache)'
+            ' + (SELECT COALESCE(SUM(length(thumbnail)), 0) FROM perceptual_index)'
+        ).fetchone()[0]
+
+    def _evict_to_limit(self):
+        """
+        Al superar max_cache_size_mb elimina las entradas menos usadas recientemente (de ambas tablas)
+
+        Se desaloja hasta low_water_bytes y no solo hasta el límite: así el recuento en SQLite se repite
+        tras escribir ese margen y no en cada put de una caché llena.
+        """
+        # El contador local ignora lo escrito por otros procesos: también se recuenta tras escribir el margen,
+        # lo que acota el exceso sobre el límite a un margen por proceso
+        if (self._total_bytes <= self.max_bytes
+                and self._bytes_desde_recuento < self.max_bytes - self.low_water_bytes):
+            return
+        total_bytes = self._recontar()
+        if total_bytes <= self.max_bytes:
+            return
+        while total_bytes > self.low_water_bytes:
+            # Las huellas perceptuales no registran accesos: compiten por su fecha de creación
+            rows = self._conn.execute(
+                'SELECT 0, key, size, last_access FROM ocr_cache'
+                ' UNION ALL SELECT 1, image_hash, length(thumbnail), created_at FROM perceptual_index'
+                ' ORDER BY 4 ASC LIMIT 32'
+            ).fetchall()
+            if not rows:
+                return
+            for perceptual, key, size, _ in rows:
+                if perceptual:
+                    self._conn.execute('DELETE FROM perceptual_index WHERE image_hash = ?', (key,))
+                else:
+                    self._conn.execute('DELETE FROM ocr_cache WHERE key = ?', (key,))
+                    self._memory.pop(key, None)
+                total_bytes -= size
+                self._total_bytes = total_bytes
+                self._stats['desalojos_tamano'] += 1
+                if total_bytes <= self.low_water_bytes:
+                    return
+            # Otro proceso puede haber escrito o desalojado mientras tanto
+            total_bytes = self._recontar()
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def get(self, key):
+        """Devuelve una copia del resultado cacheado o None"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            now = time.time()
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if not self._is_expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self._stats['hits_memoria'] += 1
+                    return copy.deepcopy(value)
+                self._memory.pop(key, None)
+
+            try:
+                row = self._conn.execute(
+                    'SELECT payload, created_at FROM ocr_cache WHERE key = ?', (key,)
+                ).fetchone()
+                if row is None:
+                    self._stats['misses'] += 1
+                    return None
+
+                payload, created_at = row
+                if self._is_expired(created_at, now):
+                    self._delete(key)
+                    self._stats['expirados'] += 1
+                    self._stats['misses'] += 1
+                    return None
+
+                self._conn.execute('UPDATE ocr_cache SET last_access = ? WHERE key = ?', (now, key))
+                value = json.loads(payload)
+                self._remember(key, created_at, value)
+                self._stats['hits_disco'] += 1
+                return copy.deepcopy(value)
+            except Exception as e:
+                logger.warning(f"Error leyendo caché OCR: {e}")
+                self._stats['misses'] += 1
+                return None
+
+    def put(self, key, value):
+        """Guarda un resultado serializable en ambos niveles"""
+        if not self.enabled:
+            return
+
+        try:
+            payload = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Resultado no serializable, no se cachea: {e}")
+            return
+
+        with self._lock:
+            now = time.time()
+            try:
+                previous = self._conn.execute('SELECT size FROM ocr_cache WHERE key = ?', (key,)).fetchone()
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO ocr_cache (key, payload, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)',
+                    (key, payload, len(payload), now, now)
+                )
+                self._total_bytes += len(payload) - (previous[0] if previous else 0)
+                self._bytes_desde_recuento += len(payload)
+                self._remember(key, now, copy.deepcopy(value))
+                self._stats['escrituras'] += 1
+                self._evict_to_limit()
+            except Exception as e:
+                logger.warning(f"Error escribiendo caché OCR: {e}")
+
+    def _delete(self, key):
+        row = self._conn.execute('SELECT size FROM ocr_cache WHERE key = ?', (key,)).fetchone()
+        if row:
+            self._conn.execute('DELETE FROM ocr_cache WHERE key = ?', (key,))
+            self._total_bytes -= row[0]
+        self._memory.pop(key, None)
+
+    def sweep_expired(self):
+        """Elimina todas las entradas con TTL vencido; devuelve cuántas se borraron"""
+        if not self.enabled:
+            return 0
+
+        with self._lock:
+            cutoff = time.time() - self.ttl_seconds
+            try:
+                removed = self._conn.execute('DELETE FROM ocr_cache WHERE created_at < ?', (cutoff,)).rowcount
+                if removed:
+                    self._stats['expirados'] += removed
+                for key in [k for k, (created_at, _) in self._memory.items() if created_at < cutoff]:
+                    del self._memory[key]
+                self._conn.execute('DELETE FROM perceptual_index WHERE created_at < ?', (cutoff,))
+                # El barrido periódico recoge también lo escrito y desalojado por otros procesos
+                self._recontar()
+                if removed:
+                    logger.info(f"Barrido de caché OCR: {removed} entradas expiradas eliminadas")
+                return removed
+            except Exception as e:
+                logger.warning(f"Error en barrido de caché OCR: {e}")
+                return 0
+
+    def _sweeper_loop(self):
+        while not self._stop_event.wait(self.sweep_interval):
+            self.sweep_expired()
+
+    def _start_sweeper(self):
+        self._sweeper = threading.Thread(target=self._sweeper_loop, name='ocr-cache-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def clear(self):
+        """Vacía la caché completa"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._conn.execute('DELETE FROM ocr_cache')
+            self._conn.execute('DELETE FROM perceptual_index')
+            self._memory.clear()
+            self._total_bytes = 0
+            self._bytes_desde_recuento = 0
+
+    # ------------------------------------------------------------------
+    # Índice perceptual de casi duplicados
+    # ------------------------------------------------------------------
+
+    def index_perceptual(self, image_hash, dhash, image, source=None):
+        """Registra la huella perceptual (dHash + miniatura de verificación) de un resultado cacheado"""
+        if not (self.enabled and self.near_duplicate_enabled and image_hash and dhash) or image is None:
+            return
+
+        ok, thumbnail = cv2.imencode('.png', miniatura_verificacion(image))
+        if not ok:
+            return
+        with self._lock:
+            try:
+                previous = self._conn.execute(
+                    'SELECT length(thumbnail) FROM perceptual_index WHERE image_hash = ?', (image_hash,)
+                ).fetchone()
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO perceptual_index (image_hash, dhash, thumbnail, source, created_at) VALUES (?, ?, ?, ?, ?)',
+                    (image_hash, dhash, thumbnail.tobytes(), source, time.time())
+                )
+                self._total_bytes += thumbnail.size - (previous[0] if previous else 0)
+                self._bytes_desde_recuento += thumbnail.size
+                self._evict_to_limit()
+            except Exception as e:
+                logger.warning(f"Error indexando huella perceptual: {e}")
+
+    def get_source(self, image_hash):
+        """Devuelve el origen registrado para un contenido exacto, o None"""
+        if not (self.enabled and self.near_duplicate_enabled):
+            return None
+        with self._lock:
+            row = self._conn.execute('SELECT source FROM perceptual_index WHERE image_hash = ?', (image_hash,)).fetchone()
+            return row[0] if row else None
+
+    def find_near_duplicate(self, dhash, image, exclude_hash=None):
+        """
+        Busca el recibo indexado más parecido dentro del TTL
+
+        El dHash solo localiza candidatos: plantillas iguales con montos distintos pueden tener distancia 0.
+        La miniatura descarta esos casos y decide si el contenido es idéntico ('verificado').
+
+        Returns:
+            dict | None: image_hash, origen, distancia_hamming, diferencia_visual, verificado
+        """
+        if not (self.enabled and self.near_duplicate_enabled and dhash) or image is None:
+            return None
+
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT image_hash, dhash, source FROM perceptual_index WHERE created_at >= ?',
+                (time.time() - self.ttl_seconds,)
+            ).fetchall()
+        rows = [row for row in rows if row[0] != exclude_hash]
+        if not rows:
+            return None
+
+        # Distancia de Hamming vectorizada sobre todos los dHash indexados
+        hashes = np.array([int(row[1], 16) for row in rows], dtype=np.uint64)
+        xor = np.bitwise_xor(hashes, np.uint64(int(dhash, 16)))
+        distances = np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+        best = int(np.argmin(distances))
+        if distances[best] > self.max_hamming_distance:
+            return None
+
+        candidate_hash, _, source = rows[best]
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT thumbnail FROM perceptual_index WHERE image_hash = ?', (candidate_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        stored = cv2.imdecode(np.frombuffer(row[0], dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        difference = diferencia_miniaturas(stored, miniatura_verificacion(image))
+        if difference > self.max_flag_difference:
+            # Misma plantilla con contenido distinto (otro monto, otra referencia): no es un reenvío
+            return None
+        verified = difference <= self.max_visual_difference
+        with self._lock:
+            self._stats['casi_duplicados_marcados'] += 1
+            if verified:
+                self._stats['casi_duplicados_reutilizados'] += 1
+
+        return {
+            'image_hash': candidate_hash,
+            'origen': source,
+            'distancia_hamming': int(distances[best]),
+            'diferencia_visual': round(float(difference), 2),
+            'verificado': bool(verified)
+        }
+
+    def stats(self):
+        """Contadores de aciertos, fallos y desalojos más ocupación actual"""
+        with self._lock:
+            stats = dict(self._stats)
+            hits = stats['hits_memoria'] + stats['hits_disco']
+            total = hits + stats['misses']
+            stats.update({
+                'habilitada': self.enabled,
+                'tasa_aciertos': round(hits / total, 3) if total else 0,
+                'entradas_memoria': len(self._memory),
+                'entradas_disco': self._conn.execute('SELECT COUNT(*) FROM ocr_cache').fetchone()[0] if self._conn else 0,
+                'tamano_mb': round(self._total_bytes / 1024 / 1024, 2),
+                'limite_mb': round(self.max_bytes / 1024 / 1024, 2)
+            })
+            return stats
+
+    def close(self):
+        """Detiene el barrido y cierra la conexión"""
+        self._stop_event.set()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                self.enabled = False
+
+
+def hash_contenido(image_path=None, image_array=None, algorithm=None, chunk_bytes=None):
+    """
+    Hash de contenido para la clave de caché, calculado por bloques sin cargar el archivo completo
+
+    Con image_array se hashean los píxeles en memoria (más la forma) sin copiarlos.
+    """
+    cache_config = config.OCR_CACHE_CONFIG
+    algorithm = algorithm or cache_config.get('hash_algorithm', 'blake2b')
+    chunk_bytes = chunk_bytes or cache_config.get('hash_chunk_bytes', 1024 * 1024)
+    digest = hashlib.blake2b(digest_size=16) if algorithm == 'blake2b' else hashlib.new(algorithm)
+
+    if image_array is not None:
+        digest.update(str(image_array.shape).encode())
+        digest.update(memoryview(np.ascontiguousarray(image_array)).cast('B'))
+        return digest.hexdigest()
+
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def miniatura_verificacion(image, size=(128, 160)):
+    """Miniatura en escala de grises de tamaño fijo usada para confirmar casi duplicados"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+def diferencia_miniaturas(a, b, block=4):
+    """Máxima diferencia media absoluta por bloque: un dígito cambiado destaca, la recompresión no"""
+    diff = np.abs(a.astype(np.float32) - b.astype(np.float32))
+    h, w = diff.shape
+    return float(diff[:h - h % block, :w - w % block].reshape(h // block, block, w // block, block).mean(axis=(1, 3)).max())
+
+
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+
+
+def get_ocr_cache():
+    """Devuelve la caché OCR compartida del proceso"""
+    global _ocr_cache
+
+    if _ocr_cache is None:
+        with _ocr_cache_lock:
+            if _ocr_cache is None:
+                try:
+                    _ocr_cache = OCRResultCache()
+                except Exception as e:
+                    logger.error(f"No se pudo abrir la caché OCR, se deshabilita: {e}")
+                    _ocr_cache = OCRResultCache({'enabled': False})
+                atexit.register(_ocr_cache.close)
+    return _ocr_cache
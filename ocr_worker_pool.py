@@ -0,0 +1,163 @@
+"""
+Pool multiproceso de workers OCR
+Cada proceso mantiene su propio predictor OnnxTR precalentado y el orquestador reparte las imágenes
+"""
+
+import os
+import atexit
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Estado propio de cada proceso worker (solo existe dentro de los procesos del pool)
+_worker_orquestador = None
+
+
+def _init_worker(threads_per_worker, warmup_profiles):
+    """
+    Inicializa un proceso worker: limita hilos, crea su orquestador y precalienta modelos
+
+    Se ejecuta una vez por proceso, antes de recibir cualquier tarea.
+    """
+    global _worker_orquestador
+
+    # Limitar hilos de librerías numéricas antes de cargar ONNX Runtime
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(threads_per_worker)
+
+    # El warm-up en segundo plano de AplicadorOCR cargaría perfiles no solicitados en cada proceso
+    config.CPU_OPTIMIZATION_CONFIG['enable_warmup'] = False
+
+    import cv2
+    cv2.setNumThreads(1)
+
+    from aplicador_ocr import AplicadorOCR
+    from main_ocr_process import OrquestadorOCR
+
+    AplicadorOCR._intra_op_threads = threads_per_worker
+    _worker_orquestador = OrquestadorOCR()
+
+    _worker_orquestador.aplicador._warmup_common_models(warmup_profiles)
+
+    logger.info(f"Worker OCR {os.getpid()} listo: {threads_per_worker} hilos, perfiles {warmup_profiles}")
+
+
+def _procesar_imagen_task(image_path, profile, metadata, current_batch_id):
+    """Tarea del pool: pipeline completo (validación, mejora, OCR y JSON) de una imagen"""
+    return _worker_orquestador.procesar_imagen(
+        image_path,
+        profile=profile,
+        extract_financial=True,
+        metadata=metadata,
+        current_batch_id=current_batch_id
+    )
+
+
+def _ocr_chunk_task(img_arrays, language, config_mode, extract_financial, metadata_list):
+    """Tarea del pool: OCR por lotes con coordenadas sobre arrays ya preprocesados"""
+    aplicador = _worker_orquestador.aplicador
+    predictor = aplicador._get_predictor(aplicador._select_optimal_profile(config_mode, None))
+    return aplicador._process_chunk_with_coordinates(
+        img_arrays, predictor, language, config_mode, extract_financial, metadata_list
+    )
+
+
+def in_worker_process():
+    """Indica si el código se ejecuta dentro de un proceso del pool"""
+    return _worker_orquestador is not None
+
+
+class OCRProcessPool:
+    """Pool de procesos OCR con un predictor OnnxTR precalentado por proceso"""
+
+    def __init__(self, pool_config=None):
+        pool_config = pool_config or config.get_batch_config().get('process_pool', {})
+
+        self.threads_per_worker = max(1, pool_config.get('threads_per_worker', 2))
+        self.workers = pool_config.get('workers', 0) or max(1, (os.cpu_count() or 2) // self.threads_per_worker)
+        self.warmup_profiles = list(pool_config.get('warmup_profiles', ['ultra_rapido']))
+        self.start_method = pool_config.get('start_method', 'spawn')
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        """Crea los procesos en el primer uso"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    logger.info(f"Iniciando pool OCR multiproceso: {self.workers} procesos x {self.threads_per_worker} hilos")
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context(self.start_method),
+                        initializer=_init_worker,
+                        initargs=(self.threads_per_worker, self.warmup_profiles)
+                    )
+        return self._executor
+
+    def submit_procesar_imagen(self, image_path, profile, metadata, current_batch_id):
+        """Encola el pipeline completo de una imagen y devuelve su Future"""
+        return self.executor.submit(_procesar_imagen_task, str(image_path), profile, metadata, current_batch_id)
+
+    def map_ocr(self, image_arrays, language, config_mode, extract_financial, metadata_list):
+        """
+        Ejecuta OCR sobre una lista de arrays y devuelve los resultados en el mismo orden
+
+        Las imágenes viajan en bloques para que cada proceso ejecute inferencia por lotes,
+        sin dejar procesos ociosos cuando el lote es pequeño.
+        """
+        metadata_list = metadata_list or []
+        docs_per_call = config.ONNXTR_CONFIG.get('batch_documents_per_call', 8)
+        chunk_size = max(1, min(docs_per_call, -(-len(image_arrays) // self.workers)))
+
+        futures = []
+        for start in range(0, len(image_arrays), chunk_size):
+            chunk = image_arrays[start:start + chunk_size]
+            chunk_metadata = [
+                metadata_list[i] if i < len(metadata_list) else {}
+                for i in range(start, start + len(chunk))
+            ]
+            futures.append(self.executor.submit(
+                _ocr_chunk_task, chunk, language, config_mode, extract_financial, chunk_metadata
+            ))
+
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    def shutdown(self):
+        """Detiene los procesos del pool"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+                logger.info("Pool OCR multiproceso detenido")
+
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    """
+    Devuelve el pool multiproceso compartido, o None si el modo está deshabilitado
+
+    Dentro de un worker siempre devuelve None para evitar pools anidados.
+    """
+    global _process_pool
+
+    if in_worker_process() or not config.get_batch_config().get('process_pool', {}).get('enabled', False):
+        return None
+
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                _process_pool = OCRProcessPool()
+                atexit.register(_process_pool.shutdown)
+    return _process_pool
@@ -0,0 +1,381 @@
+"""
+Índice persistente de resultados OCR
+Una fila SQLite por JSON de resultado (data/results y data/historial) con los datos que muestran los listados
+"""
+
+import os
+import json
+import atexit
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_COLUMNAS = (
+    'directorio', 'filename', 'lote_id', 'lote_fecha', 'procesado_en', 'modificado_en', 'size_bytes',
+    'word_count', 'confidence', 'processing_time', 'has_ocr_data', 'has_coordinates', 'exitoso',
+    'es_resumen', 'preview', 'campos'
+)
+
+
+def lote_desde_nombre(filename):
+    """Lote (BATCH_YYYYMMDD_HHMMSS) y su fecha ISO a partir del nombre del archivo"""
+    parts = filename.split('_')
+    if filename.startswith('BATCH_') and len(parts) >= 4:
+        try:
+            fecha = datetime.strptime(f"{parts[1]}{parts[2]}", "%Y%m%d%H%M%S")
+            return f"{parts[0]}_{parts[1]}_{parts[2]}", fecha.isoformat()
+        except ValueError:
+            pass
+    return None, None
+
+
+def resumen_resultado(data, preview_chars=200):
+    """
+    Datos de listado de un JSON de resultado: palabras, confianza, vista previa y campos extraídos
+
+    Acepta las distintas generaciones de estructura que conviven en results/historial.
+    """
+    if not isinstance(data, dict):
+        return {'word_count': 0, 'confidence': 0, 'processing_time': 0, 'has_ocr_data': False,
+                'has_coordinates': False, 'exitoso': False, 'preview': '', 'campos': {}, 'procesado_en': None}
+
+    datos_extraidos = data.get('datos_extraidos') or {}
+    texto = (
+        datos_extraidos.get('texto_completo', '') or
+        data.get('texto_extraido', '') or
+        data.get('full_raw_ocr_text', '') or
+        data.get('texto_completo', '')
+    )
+    texto = texto if isinstance(texto, str) else ''
+    palabras = (
+        datos_extraidos.get('palabras_detectadas', []) or
+        data.get('word_data', []) or
+        data.get('coordenadas_palabras', []) or
+        data.get('palabras_detectadas', [])
+    )
+    palabras = palabras if isinstance(palabras, list) else []
+
+    confidencias = [p.get('confianza', 0) for p in palabras if isinstance(p, dict)]
+    confianza = sum(confidencias) / len(confidencias) if confidencias else 0
+
+    campos = data.get('extracted_fields') or data.get('datos_financieros') or {}
+
+    tiempo = data.get('tiempo_procesamiento', data.get('processing_time_ms', 0))
+
+    return {
+        'word_count': len(palabras),
+        'confidence': confianza,
+        'processing_time': tiempo if isinstance(tiempo, (int, float)) else 0,
+        'has_ocr_data': bool(texto.strip()),
+        'has_coordinates': bool(palabras),
+        'exitoso': bool(texto.strip()) and bool(palabras),
+        'preview': texto[:preview_chars] + '...' if len(texto) > preview_chars else texto,
+        'campos': campos if isinstance(campos, dict) else {},
+        'procesado_en': data.get('fecha_procesamiento')
+    }
+
+
+class ResultsIndex:
+    """
+    Índice SQLite de los JSON de resultados
+
+    - Se actualiza al escribir, mover o borrar resultados
+    - Los listados del dashboard son consultas indexadas y paginadas, sin abrir los JSON
+    - Al abrir se reconcilia una vez con los directorios (solo se leen los JSON nuevos o modificados)
+    """
+
+    def __init__(self, index_config=None):
+        index_config = index_config or config.RESULTS_INDEX_CONFIG
+
+        self.enabled = index_config.get('enabled', True)
+        self.db_path = Path(index_config.get('db_path', config.BASE_DIR / 'data' / 'results_index.sqlite3'))
+        self.preview_chars = index_config.get('preview_chars', 200)
+        self._lock = threading.RLock()
+        self._conn = None
+
+        if self.enabled:
+            self._open()
+            if index_config.get('reconcile_on_startup', True):
+                self.reconciliar()
+
+    def _open(self):
+        """Abre (o crea) la base SQLite del índice"""
+        if str(self.db_path) != ':memory:':
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        # WAL permite que el dashboard lea mientras los workers registran resultados
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS resultados ('
+            ' directorio TEXT NOT NULL,'
+            ' filename TEXT NOT NULL,'
+            ' lote_id TEXT,'
+            ' lote_fecha TEXT,'
+            ' procesado_en TEXT,'
+            ' modificado_en REAL NOT NULL,'
+            ' size_bytes INTEGER NOT NULL,'
+            ' word_count INTEGER NOT NULL,'
+            ' confidence REAL NOT NULL,'
+            ' processing_time REAL NOT NULL,'
+            ' has_ocr_data INTEGER NOT NULL,'
+            ' has_coordinates INTEGER NOT NULL,'
+            ' exitoso INTEGER NOT NULL,'
+            ' es_resumen INTEGER NOT NULL,'
+            ' preview TEXT,'
+            ' campos TEXT,'
+            ' PRIMARY KEY (directorio, filename))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_resultados_modificado ON resultados(directorio, modificado_en)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_resultados_lote ON resultados(lote_id, lote_fecha)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_resultados_filename ON resultados(filename)')
+
+    @staticmethod
+    def _directorios():
+        """Directorios lógicos indexados y su ruta en disco"""
+        from config import get_async_directories
+        directories = get_async_directories()
+        return {
+            'results': directories['results'],
+            'historial': directories.get('historial', 'data/historial')
+        }
+
+    def _fila(self, row):
+        item = dict(row)
+        item['campos'] = json.loads(item['campos']) if item['campos'] else {}
+        for flag in ('has_ocr_data', 'has_coordinates', 'exitoso', 'es_resumen'):
+            item[flag] = bool(item[flag])
+        item['filepath'] = os.path.join(self._directorios().get(item['directorio'], ''), item['filename'])
+        return item
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def registrar(self, json_path, data=None, directorio='results'):
+        """Indexa (o actualiza) un JSON de resultado; data evita releer el archivo recién escrito"""
+        if not self.enabled:
+            return
+        json_path = str(json_path)
+        filename = os.path.basename(json_path)
+        try:
+            stat_info = os.stat(json_path)
+            if data is None:
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+        except OSError as e:
+            logger.warning(f"Índice de resultados: no se pudo leer {json_path}: {e}")
+            return
+        except ValueError as e:
+            # JSON corrupto: se indexa sin datos OCR para que cuente como error en el historial
+            logger.warning(f"Índice de resultados: JSON inválido {json_path}: {e}")
+            data = None
+        resumen = resumen_resultado(data, self.preview_chars)
+
+        lote_id, lote_fecha = lote_desde_nombre(filename)
+        valores = (
+            directorio, filename, lote_id, lote_fecha,
+            resumen['procesado_en'] or datetime.fromtimestamp(stat_info.st_mtime).isoformat(),
+            stat_info.st_mtime, stat_info.st_size,
+            resumen['word_count'], float(resumen['confidence']), float(resumen['processing_time']),
+            int(resumen['has_ocr_data']), int(resumen['has_coordinates']), int(resumen['exitoso']),
+            int(filename.endswith('_resultados.json')), resumen['preview'],
+            json.dumps(resumen['campos'], ensure_ascii=False, default=str)
+        )
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO resultados ({', '.join(_COLUMNAS)}) VALUES ({', '.join('?' * len(_COLUMNAS))})",
+                valores
+            )
+
+    def mover(self, filename, directorio_origen, nuevo_filename, directorio_destino):
+        """Refleja el movimiento de un resultado (p.ej. results → historial) sin volver a leerlo"""
+        if not self.enabled:
+            return
+        nueva_ruta = os.path.join(self._directorios()[directorio_destino], nuevo_filename)
+        try:
+            mtime = os.stat(nueva_ruta).st_mtime
+        except OSError:
+            mtime = None
+        with self._lock:
+            self._conn.execute(
+                'UPDATE OR REPLACE resultados SET directorio = ?, filename = ?, modificado_en = COALESCE(?, modificado_en)'
+                ' WHERE directorio = ? AND filename = ?',
+                (directorio_destino, nuevo_filename, mtime, directorio_origen, filename)
+            )
+
+    def eliminar(self, filename, directorio):
+        """Quita un resultado borrado del disco"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._conn.execute('DELETE FROM resultados WHERE directorio = ? AND filename = ?', (directorio, filename))
+
+    def reconciliar(self):
+        """
+        Sincroniza el índice con los directorios
+
+        Solo se leen los JSON nuevos o con tamaño/fecha distintos; las filas sin archivo se eliminan.
+        """
+        if not self.enabled:
+            return
+        nuevos = eliminados = 0
+        for directorio, path in self._directorios().items():
+            with self._lock:
+                indexados = {
+                    row['filename']: (row['size_bytes'], row['modificado_en'])
+                    for row in self._conn.execute(
+                        'SELECT filename, size_bytes, modificado_en FROM resultados WHERE directorio = ?', (directorio,)
+                    )
+                }
+            en_disco = set()
+            if os.path.isdir(path):
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if not (entry.name.endswith('.json') and entry.is_file()):
+                            continue
+                        en_disco.add(entry.name)
+                        stat_info = entry.stat()
+                        if indexados.get(entry.name) != (stat_info.st_size, stat_info.st_mtime):
+                            self.registrar(entry.path, directorio=directorio)
+                            nuevos += 1
+            for filename in set(indexados) - en_disco:
+                self.eliminar(filename, directorio)
+                eliminados += 1
+        if nuevos or eliminados:
+            logger.info(f"Índice de resultados reconciliado: {nuevos} indexados, {eliminados} eliminados")
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def listar(self, directorios=('results',), limit=None, offset=0):
+        """Resultados más recientes primero, paginados"""
+        if not self.enabled:
+            return []
+        marcadores = ', '.join('?' * len(directorios))
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT * FROM resultados WHERE directorio IN ({marcadores})'
+                ' ORDER BY modificado_en DESC LIMIT ? OFFSET ?',
+                (*directorios, -1 if limit is None else limit, offset)
+            ).fetchall()
+        return [self._fila(row) for row in rows]
+
+    def contar(self, directorios=('results', 'historial')):
+        """Total de resultados indexados en los directorios indicados"""
+        if not self.enabled:
+            return 0
+        marcadores = ', '.join('?' * len(directorios))
+        with self._lock:
+            return self._conn.execute(
+                f'SELECT COUNT(*) FROM resultados WHERE directorio IN ({marcadores})', tuple(directorios)
+            ).fetchone()[0]
+
+    def archivos_con_prefijo(self, prefijo, directorios=('results', 'historial')):
+        """Rutas de los resultados cuyo nombre empieza por prefijo (consulta por rango sobre el índice de filename)"""
+        if not self.enabled:
+            return []
+        marcadores = ', '.join('?' * len(directorios))
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT * FROM resultados WHERE filename >= ? AND filename < ? AND directorio IN ({marcadores})'
+                ' ORDER BY modificado_en DESC',
+                (prefijo, prefijo + chr(0x10FFFF), *directorios)
+            ).fetchall()
+        return [self._fila(row) for row in rows]
+
+    def lotes(self):
+        """Identificadores de todos los lotes indexados"""
+        if not self.enabled:
+            return []
+        with self._lock:
+            return [
+                row['lote_id'] for row in self._conn.execute(
+                    'SELECT DISTINCT lote_id FROM resultados WHERE lote_id IS NOT NULL'
+                )
+            ]
+
+    def archivos_de_lote(self, lote_id):
+        """Resultados individuales de un lote (sin resúmenes), en orden de procesamiento"""
+        if not self.enabled:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT * FROM resultados WHERE lote_id = ? AND es_resumen = 0 ORDER BY modificado_en, filename',
+                (lote_id,)
+            ).fetchall()
+        return [self._fila(row) for row in rows]
+
+    def historial_lotes(self, limit=None, offset=0):
+        """
+        Lotes agrupados por lote_id (más recientes primero) con contadores de éxito/error
+
+        Returns:
+            tuple: (lista de lotes de la página, total de lotes)
+        """
+        if not self.enabled:
+            return [], 0
+        with self._lock:
+            total = self._conn.execute(
+                'SELECT COUNT(DISTINCT lote_id) FROM resultados WHERE lote_id IS NOT NULL'
+            ).fetchone()[0]
+            lotes = self._conn.execute(
+                'SELECT lote_id, lote_fecha,'
+                ' SUM(1 - es_resumen) AS total_archivos,'
+                ' SUM(CASE WHEN es_resumen = 0 AND exitoso = 1 THEN 1 ELSE 0 END) AS exitosos'
+                ' FROM resultados WHERE lote_id IS NOT NULL'
+                ' GROUP BY lote_id ORDER BY lote_fecha DESC LIMIT ? OFFSET ?',
+                (-1 if limit is None else limit, offset)
+            ).fetchall()
+            resultado = []
+            for lote in lotes:
+                archivos = [
+                    row['filename'] for row in self._conn.execute(
+                        'SELECT filename FROM resultados WHERE lote_id = ? ORDER BY filename', (lote['lote_id'],)
+                    )
+                ]
+                resultado.append({
+                    'id': lote['lote_id'],
+                    'date': lote['lote_fecha'],
+                    'files': archivos,
+                    'total_archivos': lote['total_archivos'],
+                    'exitosos': lote['exitosos']
+                })
+        return resultado, total
+
+    def close(self):
+        """Cierra la conexión"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                self.enabled = False
+
+
+_results_index = None
+_results_index_lock = threading.Lock()
+
+
+def get_results_index():
+    """Devuelve el índice de resultados compartido del proceso"""
+    global _results_index
+
+    if _results_index is None:
+        with _results_index_lock:
+            if _results_index is None:
+                try:
+                    _results_index = ResultsIndex()
+                except Exception as e:
+                    # Sin archivo persistente se indexa en memoria: los listados siguen funcionando
+                    logger.error(f"No se pudo abrir el índice de resultados, se usa un índice en memoria: {e}")
+                    _results_index = ResultsIndex({'db_path': ':memory:'})
+                atexit.register(_results_index.close)
+    return _results_index
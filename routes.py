@@ -9,14 +9,22 @@ import shutil
 import psutil
 import uuid
 import time
+import tempfile
 from pathlib import Path
 from datetime import datetime
 from werkzeug.utils import secure_filename
-from flask import render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import render_template, request, redirect, url_for, flash, jsonify, send_file, Response, stream_with_context
 
-from app import app, preload_ocr_components, start_batch_worker
+from app import app, start_warmup, start_batch_worker
 import app as app_module
 from main_ocr_process import OrquestadorOCR
+from results_index import get_results_index, lote_desde_nombre
+from batch_manifest import get_batch_manifests
+from triaje_ocr import get_triaje
+from campos_empresariales import (
+    CAMPOS_SCHEMA_VERSION, texto_completo_resultado, campos_persistidos, actualizar_campos_en_lectura,
+    invalidar_consolidados, iniciar_reextraccion, get_estado_reextraccion
+)
 import config
 
 # FIX: Logger configurado correctamente para routes.py
@@ -85,8 +93,8 @@ _worker_thread = None
 try:
     logger.info("Inicializando sistema OCR asíncrono...")
     
-    # Pre-cargar componentes OCR
-    preload_ocr_components()
+    # Pre-cargar componentes OCR y warm-up en segundo plano (ver /ready)
+    start_warmup()
     
     # Inicializar worker asíncrono
     start_batch_worker()
@@ -114,6 +122,23 @@ def index():
     """
     return render_template('interface_excellence_dashboard.html')
 
+@app.route('/ready')
+def ready():
+    """
+    FIX: Endpoint de disponibilidad ligado al warm-up de modelos
+    REASON: El proceso responde antes de que los modelos hayan ejecutado su primera inferencia
+    IMPACT: 200 solo cuando todos los perfiles de warmup_profiles están calientes; 503 mientras tanto
+    """
+    warmup = app_module.get_warmup_status()
+    if warmup['estado'] == 'error':
+        # Un fallo transitorio del warm-up no deja el servicio fuera de servicio: se reintenta en segundo plano
+        app_module.start_warmup()
+    return jsonify({
+        'ready': warmup['ready'],
+        'warmup': warmup,
+        'timestamp': datetime.now().isoformat()
+    }), 200 if warmup['ready'] else 503
+
 @app.route('/dashboard')
 def dashboard():
     """Dashboard principal del sistema OCR empresarial con Interface Excellence"""
@@ -124,121 +149,56 @@ def dashboard_old():
     """Dashboard anterior para referencia"""
     return render_template('dashboard.html')
 
+def _parametros_paginacion():
+    """limit/offset de la petición acotados por RESULTS_INDEX_CONFIG"""
+    index_config = config.RESULTS_INDEX_CONFIG
+    limit = request.args.get('limit', default=index_config.get('default_page_size', 100), type=int)
+    offset = request.args.get('offset', default=0, type=int)
+    return max(1, min(limit, index_config.get('max_page_size', 1000))), max(0, offset)
+
 @app.route('/api/ocr/processed_files')
 def api_get_processed_files():
     """
-    FIX: Detección corregida de archivos JSON procesados
-    REASON: Usuario reporta que los archivos JSON no aparecen en la interfaz
-    IMPACT: Listado correcto de todos los archivos procesados con sus JSON
+    FIX: Listado de archivos procesados desde el índice de resultados, paginado
+    REASON: Leer y parsear todos los JSON en cada sondeo del dashboard era inviable con miles de recibos
+    IMPACT: Consulta indexada (limit/offset) sin abrir los JSON; orden por fecha de modificación
     """
     try:
-        from config import get_async_directories
-        directories = get_async_directories()
-        results_dir = directories['results']
-        
-        if not os.path.exists(results_dir):
-            return jsonify({
-                'status': 'exitoso',
-                'estado': 'exitoso',
-                'files': [],
-                'total_files': 0,
-                'message': 'No hay archivos procesados aún'
-            })
+        limit, offset = _parametros_paginacion()
+        results_index = get_results_index()
+        total = results_index.contar(('results',))
         
         archivos_json = []
-        
-        # Buscar TODOS los archivos .json en el directorio de resultados
-        for archivo in os.listdir(results_dir):
-            if archivo.endswith('.json'):
-                archivo_path = os.path.join(results_dir, archivo)
-                
-                # Obtener información básica del archivo (fuera del try para scope)
-                try:
-                    stat_info = os.stat(archivo_path)
-                    tamaño = stat_info.st_size
-                    fecha_mod = datetime.fromtimestamp(stat_info.st_mtime)
-                except OSError:
-                    tamaño = 0
-                    fecha_mod = datetime.now()
-                
-                try:
-                    # Leer contenido JSON para verificar estructura
-                    with open(archivo_path, 'r', encoding='utf-8') as f:
-                        contenido_json = json.load(f)
-                    
-                    # FIX: Detección corregida de contenido OCR y coordenadas en estructura JSON real
-                    # REASON: La función anterior buscaba campos incorrectos causando has_ocr_data false
-                    # IMPACT: Corrección de detección de texto extraído y coordenadas existentes
-                    # TEST: Verificación con estructura real de archivos JSON procesados
-                    # MONITOR: Logging de campos detectados para debugging
-                    # INTERFACE: Archivos procesados ahora muestran datos OCR correctamente
-                    # VISUAL_CHANGE: Lista de archivos procesados muestra contenido real extraído
-                    # REFERENCE_INTEGRITY: Campos verificados contra estructura JSON real generada
-                    
-                    # Extraer datos OCR desde estructura real
-                    datos_extraidos = contenido_json.get('datos_extraidos', {})
-                    texto_completo = (
-                        datos_extraidos.get('texto_completo', '') or
-                        contenido_json.get('texto_extraido', '') or
-                        contenido_json.get('full_raw_ocr_text', '')
-                    )
-                    
-                    palabras_detectadas = (
-                        datos_extraidos.get('palabras_detectadas', []) or
-                        contenido_json.get('word_data', [])
-                    )
-                    
-                    # Calcular confianza promedio desde palabras detectadas
-                    confianza_promedio = 0
-                    if palabras_detectadas:
-                        confidencias = [p.get('confianza', 0) for p in palabras_detectadas if isinstance(p, dict)]
-                        if confidencias:
-                            confianza_promedio = sum(confidencias) / len(confidencias)
-                    
-                    # Información básica del archivo
-                    info_archivo = {
-                        'filename': archivo,
-                        'filepath': archivo_path,
-                        'size_bytes': tamaño,
-                        'size_readable': f"{tamaño / 1024:.1f} KB" if tamaño > 1024 else f"{tamaño} bytes",
-                        'modified_date': fecha_mod.isoformat(),
-                        'modified_readable': fecha_mod.strftime('%d/%m/%Y %H:%M:%S'),
-                        'has_ocr_data': bool(texto_completo and len(texto_completo.strip()) > 0),
-                        'has_coordinates': bool(palabras_detectadas and len(palabras_detectadas) > 0),
-                        'word_count': len(palabras_detectadas),
-                        'confidence': confianza_promedio,
-                        'processing_time': contenido_json.get('tiempo_procesamiento', contenido_json.get('processing_time_ms', 0)),
-                        'texto_preview': texto_completo[:100] + '...' if len(texto_completo) > 100 else texto_completo
-                    }
-                    
-                    logger.debug(f"Archivo {archivo}: OCR={info_archivo['has_ocr_data']}, Coords={info_archivo['has_coordinates']}, Words={info_archivo['word_count']}, Texto={len(texto_completo)} chars")
-                    
-                    archivos_json.append(info_archivo)
-                    
-                except (json.JSONDecodeError, PermissionError) as e:
-                    logger.warning(f"Error leyendo archivo JSON {archivo}: {e}")
-                    # Incluir archivo con información limitada
-                    archivos_json.append({
-                        'filename': archivo,
-                        'filepath': archivo_path,
-                        'size_bytes': tamaño,
-                        'size_readable': f"{tamaño / 1024:.1f} KB" if tamaño > 1024 else f"{tamaño} bytes",
-                        'modified_date': fecha_mod.isoformat(),
-                        'modified_readable': fecha_mod.strftime('%d/%m/%Y %H:%M:%S'),
-                        'has_ocr_data': False,
-                        'has_coordinates': False,
-                        'error': 'Error al leer archivo'
-                    })
-        
-        # Ordenar por fecha de modificación (más recientes primero)
-        archivos_json.sort(key=lambda x: x['modified_date'], reverse=True)
+        for fila in results_index.listar(('results',), limit=limit, offset=offset):
+            tamaño = fila['size_bytes']
+            fecha_mod = datetime.fromtimestamp(fila['modificado_en'])
+            archivos_json.append({
+                'filename': fila['filename'],
+                'filepath': fila['filepath'],
+                'batch_id': fila['lote_id'],
+                'size_bytes': tamaño,
+                'size_readable': f"{tamaño / 1024:.1f} KB" if tamaño > 1024 else f"{tamaño} bytes",
+                'modified_date': fecha_mod.isoformat(),
+                'modified_readable': fecha_mod.strftime('%d/%m/%Y %H:%M:%S'),
+                'processed_date': fila['procesado_en'],
+                'has_ocr_data': fila['has_ocr_data'],
+                'has_coordinates': fila['has_coordinates'],
+                'word_count': fila['word_count'],
+                'confidence': fila['confidence'],
+                'processing_time': fila['processing_time'],
+                'texto_preview': fila['preview'],
+                'extracted_fields': fila['campos']
+            })
         
         return jsonify({
             'status': 'exitoso',
             'estado': 'exitoso',
             'files': archivos_json,
-            'total_files': len(archivos_json),
-            'message': f'Se encontraron {len(archivos_json)} archivos procesados',
+            'total_files': total,
+            'limit': limit,
+            'offset': offset,
+            'has_more': offset + len(archivos_json) < total,
+            'message': f'Se encontraron {total} archivos procesados' if total else 'No hay archivos procesados aún',
             'last_update': datetime.now().isoformat()
         })
         
@@ -495,8 +455,7 @@ def api_process_batch():
         batch_uuid = str(uuid.uuid4())[:8]
         request_id = f"BATCH_{batch_timestamp}_{batch_uuid}"
         
-        # Almacenar ID único del lote para usar en todos los archivos
-        _save_batch_execution_id(request_id)
+        # El ID del lote viaja en el job (app.enqueue_batch_job) hasta procesar_imagen; no se comparte por archivo
         
         # FIX: Manejo robusto de datos JSON y form-data
         # REASON: Error 400 puede ser causado por datos malformados o contenido mixto
@@ -531,9 +490,6 @@ def api_process_batch():
         logger.info(f"✅ Procesamiento de lote iniciado. Request ID: {request_id}")
         logger.info(f"⚙️ Configuración: profile={profile}, batch_size={batch_size}")
         
-        # Inicializar orquestador
-        orquestador = OrquestadorOCR()
-        
         # FIX: Manejo de archivos enviados directamente en process_batch
         # REASON: Frontend envía archivos directamente a process_batch en lugar de usar process_image primero
         # IMPACT: Permite procesamiento directo de archivos desde el frontend
@@ -597,44 +553,47 @@ def api_process_batch():
                     
                     logger.info(f"📁 Archivo guardado: {final_filename}")
         
-        # Procesar lote con tracking del request_id único
-        # FIX: Procesar TODOS los archivos disponibles sin límite de batch_size
-        # REASON: Usuario reportó que solo se procesaron 4 de 10 archivos subidos
-        # SOLUTION: Usar max_files=50 para procesar todos los archivos disponibles
-        resultado = orquestador.process_queue_batch(
-            max_files=50,  # PROCESAMIENTO COMPLETO: Sin límite artificial
+        # FIX: Encolar el lote en lugar de procesarlo dentro de la petición HTTP
+        # REASON: Un lote de 50 imágenes retenía el worker de Flask durante minutos y el cliente expiraba
+        # IMPACT: Respuesta inmediata con request_id; el pool de workers de app.py procesa el job
+        # INTERFACE: Progreso por imagen disponible en /api/ocr/batch_status/<request_id>
+        job = app_module.enqueue_batch_job(
+            request_id,
             profile=profile,
-            request_id=request_id  # MANDATO CRÍTICO: Pasar request_id para persistencia
+            max_files=50  # PROCESAMIENTO COMPLETO: Sin límite artificial
         )
         
-        # Añadir request_id al resultado
-        if isinstance(resultado, dict):
-            resultado['request_id'] = request_id
-            resultado['batch_id'] = request_id
-            resultado['processing_status'] = 'completed'
-            resultado['timestamp'] = datetime.now().isoformat()
-        else:
-            resultado = {
-                'status': 'success',
-                'request_id': request_id,
-                'batch_id': request_id,
-                'processing_status': 'completed',
-                'timestamp': datetime.now().isoformat(),
-                'resultado_original': resultado
-            }
-        
-        processed_count = resultado.get('batch_info', {}).get('processed_count', 0)
+        if job is None:
+            return jsonify({
+                'status': 'error',
+                'estado': 'lote_vacio',
+                'mensaje': 'No hay imágenes pendientes en el inbox para procesar',
+                'message': 'Empty batch: no pending images in inbox',
+                'error': 'No hay imágenes pendientes en el inbox para procesar',
+                'error_code': 'EMPTY_BATCH'
+            }), 400
         
-        # FIX: ALMACENAR REQUEST_ID DEL ÚLTIMO LOTE PROCESADO PARA FILTRADO
-        # REASON: Usuario requiere JSON consolidado específico del último lote únicamente
-        # IMPACT: Permite filtrado preciso de archivos por lote para evitar mezcla de resultados
-        if processed_count > 0:
-            _save_last_batch_request_id(request_id)
-            logger.info(f"💾 Almacenado request_id del último lote exitoso: {request_id}")
+        resultado = {
+            'status': 'accepted',
+            'estado': 'en_cola',
+            'message': f"Lote encolado: {job['total_files']} archivos",
+            'mensaje': f"Lote encolado: {job['total_files']} archivos",
+            'request_id': request_id,
+            'batch_id': request_id,
+            'processing_status': 'pending',
+            'status_url': f'/api/ocr/batch_status/{request_id}',
+            'batch_info': {
+                'processed_count': 0,
+                'error_count': 0,
+                'total_files': job['total_files'],
+                'queue_position': job['queue_position']
+            },
+            'timestamp': datetime.now().isoformat()
+        }
         
-        logger.info(f"✅ Lote procesado exitosamente: {processed_count} archivos. Request ID: {request_id}")
+        logger.info(f"📥 Lote encolado: {job['total_files']} archivos. Request ID: {request_id}")
         
-        return jsonify(resultado)
+        return jsonify(resultado), 202
         
     except Exception as e:
         # FIX: Manejo seguro de request_id en caso de error antes de su definición
@@ -656,6 +615,27 @@ def api_process_batch():
             'error_code': 'BATCH_PROCESSING_ERROR'
         }), 500
 
+@app.route('/api/ocr/batch_status/<request_id>')
+def api_batch_status(request_id):
+    """
+    FIX: Estado de un job de lote encolado con progreso por imagen
+    REASON: process_batch responde antes de procesar; el cliente necesita consultar el avance
+    IMPACT: Monitoreo en tiempo real del lote sin retener workers HTTP
+    """
+    job = app_module.get_batch_job_status(request_id)
+    
+    if job is None:
+        return jsonify({
+            'status': 'not_found',
+            'estado': 'no_encontrado',
+            'mensaje': 'Job de lote no encontrado',
+            'message': 'Batch job not found',
+            'request_id': request_id
+        }), 404
+    
+    job['timestamp'] = datetime.now().isoformat()
+    return jsonify(job)
+
 @app.route('/api/ocr/result/<request_id>')
 def api_get_result(request_id):
     """Obtener resultado individual"""
@@ -727,7 +707,7 @@ def api_queue_status():
             pass
             
         try:
-            results_count = len([f for f in os.listdir(directories['results']) if f.endswith('.json')])
+            results_count = get_results_index().contar(('results',))
         except:
             pass
             
@@ -793,7 +773,9 @@ def api_queue_status():
             },
             'system_status': {
                 'ocr_loaded': getattr(app_module, '_ocr_components_loaded', False),
-                'worker_running': getattr(app_module, '_worker_running', False)
+                'ready': app_module.get_warmup_status()['ready'],
+                'worker_running': getattr(app_module, '_worker_running', False),
+                'batch_jobs': app_module.get_batch_queue_stats()
             },
             'total_active': inbox_count + processing_count,
             'timestamp': datetime.now().isoformat()
@@ -1436,6 +1418,8 @@ def api_clean():
                 
                 # Mover a historial
                 shutil.move(file_path, historial_path)
+                get_results_index().mover(filename, 'results', historial_filename, 'historial')
+                get_batch_manifests().mover(filename, 'results', historial_filename, 'historial')
                 results_moved += 1
                 logger.debug(f"Resultado movido a historial: {filename} → {historial_filename}")
             except Exception as e:
@@ -1459,6 +1443,8 @@ def api_clean():
                 if file_time < cutoff_time:
                     # Archivo en historial tiene más de 24 horas, eliminar definitivamente
                     os.remove(file_path)
+                    get_results_index().eliminar(os.path.basename(file_path), 'historial')
+                    get_batch_manifests().eliminar(os.path.basename(file_path), 'historial')
                     historial_cleaned += 1
                     logger.debug(f"Archivo historial eliminado (>24h): {os.path.basename(file_path)}")
                 else:
@@ -1531,6 +1517,99 @@ def api_clean():
             'success': False
         }), 500
 
+# FIX: Exportaciones consolidadas en streaming
+# REASON: extract_results, historial completo y descarga de lotes construían un dict con todos los resultados
+# IMPACT: Los registros se generan uno a uno desde el almacén de resultados; memoria constante por petición
+_FORMATOS_EXPORTACION = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+# Columnas CSV: campos anidados (datosbeneficiario, extraction_stats) aplanados
+_COLUMNAS_CSV = (
+    'nombre_archivo', 'lote_id', 'lote', 'lote_fecha', 'fecha_procesamiento', 'id_whatsapp', 'nombre_usuario',
+    'caption', 'hora_exacta', 'numero_llegada', 'otro', 'referencia', 'bancoorigen', 'monto',
+    'cedula', 'telefono', 'banco_destino', 'pago_fecha', 'concepto', 'texto_total_ocr',
+    'confidence', 'total_words', 'processing_time', 'error'
+)
+
+def _formato_exportacion():
+    """Formato pedido en ?format= (json por defecto); None si no está soportado"""
+    formato = request.args.get('format', 'json').strip().lower()
+    return formato if formato in _FORMATOS_EXPORTACION else None
+
+def _respuesta_formato_invalido():
+    return jsonify({
+        'status': 'error',
+        'message': f"Formato de exportación no soportado: {request.args.get('format')}",
+        'formatos_soportados': list(_FORMATOS_EXPORTACION),
+        'error_code': 'INVALID_EXPORT_FORMAT'
+    }), 400
+
+def _cargar_resultado(json_file):
+    """Lee un JSON de resultado; None (y se registra el error) si no se puede leer"""
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error procesando archivo {json_file}: {e}")
+        return None
+
+def _fila_csv(archivo):
+    fila = dict(archivo)
+    fila.update(fila.pop('datosbeneficiario', None) or {})
+    fila.update(fila.pop('extraction_stats', None) or {})
+    return fila
+
+def _fragmentos_exportacion(archivos, metadata, formato):
+    """
+    Serializa incrementalmente los registros de una exportación consolidada
+
+    Args:
+        archivos: Iterable de registros (dicts), consumido una sola vez
+        metadata: Metadatos de la exportación; en JSON se escriben al final, cuando el iterable
+            ya completó sus contadores
+        formato: 'json' (objeto con archivos_procesados y metadata), 'ndjson' (un registro por línea)
+            o 'csv' (una fila por registro)
+    """
+    if formato == 'ndjson':
+        for archivo in archivos:
+            yield json.dumps(archivo, ensure_ascii=False) + '\n'
+        return
+    
+    if formato == 'csv':
+        import io
+        import csv
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=_COLUMNAS_CSV, extrasaction='ignore', restval='')
+        writer.writeheader()
+        for archivo in archivos:
+            writer.writerow(_fila_csv(archivo))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+        return
+    
+    yield '{\n  "archivos_procesados": ['
+    separador = '\n    '
+    for archivo in archivos:
+        # Las cadenas JSON no contienen saltos de línea literales: sangrar por líneas es seguro
+        yield separador + json.dumps(archivo, ensure_ascii=False, indent=2).replace('\n', '\n    ')
+        separador = ',\n    '
+    metadata_json = json.dumps(metadata, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+    yield f'\n  ],\n  "metadata": {metadata_json}\n}}\n'
+
+def _respuesta_exportacion(archivos, metadata, formato, nombre_base):
+    """Respuesta de descarga que serializa los registros a medida que se envían"""
+    response = Response(
+        stream_with_context(_fragmentos_exportacion(archivos, metadata, formato)),
+        content_type=f"{_FORMATOS_EXPORTACION[formato]}; charset=utf-8"
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename={nombre_base}.{formato}'
+    return response
+
 @app.route('/api/extract_all_results', methods=['GET'])
 def api_extract_all_results():
     """
@@ -1539,33 +1618,17 @@ def api_extract_all_results():
     IMPACT: Separación entre procesamiento actual y acceso a historial
     """
     try:
-        from config import get_async_directories
-        directories = get_async_directories()
-        results_dir = directories['results']
-        
-        # Buscar TODOS los archivos (como estaba antes)
-        json_files = []
-        
-        # Buscar en directorio results activo (archivos actuales)
-        if os.path.exists(results_dir):
-            for file in os.listdir(results_dir):
-                if file.endswith('.json'):
-                    file_path = os.path.join(results_dir, file)
-                    if os.path.isfile(file_path):
-                        json_files.append(file_path)
+        formato = _formato_exportacion()
+        if formato is None:
+            return _respuesta_formato_invalido()
         
-        # Buscar TAMBIÉN en directorio historial empresarial
-        historial_dir = 'data/historial'
-        if os.path.exists(historial_dir):
-            for file in os.listdir(historial_dir):
-                if file.endswith('.json'):
-                    file_path = os.path.join(historial_dir, file)
-                    if os.path.isfile(file_path):
-                        json_files.append(file_path)
+        # Buscar TODOS los archivos: results activo e historial empresarial (índice de resultados),
+        # ya ordenados por fecha de modificación (más reciente primero)
+        filas = get_results_index().listar(('results', 'historial'))
                         
-        logger.info(f"📊 Archivos encontrados (historial completo): {len(json_files)} archivos")
+        logger.info(f"📊 Archivos encontrados (historial completo): {len(filas)} archivos")
         
-        if not json_files:
+        if not filas:
             return jsonify({
                 'status': 'warning',
                 'message': 'No hay resultados disponibles para extraer',
@@ -1573,106 +1636,80 @@ def api_extract_all_results():
                 'error_code': 'NO_RESULTS_AVAILABLE'
             }), 404
         
-        # Procesar como antes pero con todos los archivos
-        consolidated_results = {
-            'metadata': {
-                'fecha_extraccion': datetime.now().isoformat(),
-                'total_archivos': len(json_files),
-                'version_sistema': '1.0',
-                'tipo_extraccion': 'historial_completo'
-            },
-            'archivos_procesados': []
+        metadata = {
+            'fecha_extraccion': datetime.now().isoformat(),
+            'total_archivos': len(filas),
+            'version_sistema': '1.0',
+            'tipo_extraccion': 'historial_completo'
         }
         
-        # Procesar todos los archivos ordenados por fecha
-        file_info_list = []
+        def archivos_historial():
+            # Un resultado a la vez: el historial completo no se carga en memoria
+            lotes_actualizados = set()
+            archivos_actualizados = 0
+            generados = 0
+            for fila in filas:
+                result_data = _cargar_resultado(fila['filepath'])
+                if result_data is None:
+                    continue
+                archivos_actualizados += _actualizar_campos(fila, result_data, lotes_actualizados)
+                generados += 1
+                yield _archivo_historial(fila['filepath'], result_data)
+            _registrar_campos_actualizados(metadata, archivos_actualizados, lotes_actualizados)
+            logger.info(f"✅ JSON historial completo generado: {generados} archivos")
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return _respuesta_exportacion(archivos_historial(), metadata, formato, f"historial_completo_{timestamp}")
         
-        for json_file in json_files:
-            try:
-                file_path = json_file
-                file_stat = os.stat(file_path)
-                modification_time = file_stat.st_mtime
-                
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    result_data = json.load(f)
-                
-                batch_info = _extract_batch_info(json_file)
-                
-                file_info_list.append({
-                    'file_path': json_file,
-                    'result_data': result_data,
-                    'modification_time': modification_time,
-                    'batch_info': batch_info
-                })
-                
-            except Exception as e:
-                logger.error(f"Error procesando archivo {json_file}: {e}")
-                continue
+    except Exception as e:
+        logger.error(f"Error generando JSON historial completo: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Error generando historial: {str(e)}'
+        }), 500
+
+def _archivo_historial(json_file, result_data):
+    """Registro del historial completo para un resultado (campos persistidos, sin reextraer)"""
+    try:
+        batch_info = _extract_batch_info(json_file)
         
-        # Ordenar por fecha de modificación (más reciente primero)
-        file_info_list.sort(key=lambda x: x['modification_time'], reverse=True)
+        nombre_archivo = _extract_original_filename(json_file, result_data)
         
-        # Procesar archivos y extraer datos estructurados
-        for file_info in file_info_list:
-            try:
-                json_file = file_info['file_path']
-                result_data = file_info['result_data']
-                batch_info = file_info['batch_info']
-                
-                nombre_archivo = _extract_original_filename(json_file, result_data)
-                
-                metadata = result_data.get('metadata', {})
-                texto_completo = _extract_full_text(result_data)
-                
-                tracking_params = _extract_tracking_parameters(nombre_archivo, metadata, result_data)
-                
-                enterprise_fields = _extract_enterprise_fields(result_data, texto_completo)
-                
-                archivo_resultado = {
-                    'nombre_archivo': nombre_archivo,
-                    'lote': batch_info.get('batch_id', 'N/A'),
-                    'fecha_procesamiento': batch_info.get('date', 'N/A'),
-                    'caption': tracking_params.get('caption', ''),
-                    'otro': tracking_params.get('otro', ''),
-                    'referencia': enterprise_fields.get('referencia', ''),
-                    'bancoorigen': enterprise_fields.get('bancoorigen', ''),
-                    'monto': enterprise_fields.get('monto', ''),
-                    'datosbeneficiario': {
-                        'cedula': enterprise_fields.get('cedula', ''),
-                        'telefono': enterprise_fields.get('telefono', ''),
-                        'banco_destino': enterprise_fields.get('banco_destino', '')
-                    },
-                    'pago_fecha': enterprise_fields.get('pago_fecha', ''),
-                    'concepto': enterprise_fields.get('concepto', ''),
-                    'texto_total_ocr': texto_completo[:500] if texto_completo else ''
-                }
-                
-                consolidated_results['archivos_procesados'].append(archivo_resultado)
-                
-            except Exception as e:
-                logger.error(f"Error extrayendo datos empresariales de {json_file}: {e}")
-                archivo_resultado = {
-                    'nombre_archivo': os.path.basename(json_file),
-                    'lote': 'Error',
-                    'error': str(e),
-                    'status': 'error_extraccion'
-                }
-                consolidated_results['archivos_procesados'].append(archivo_resultado)
+        metadata = result_data.get('metadata', {})
+        texto_completo = texto_completo_resultado(result_data)
         
-        response = jsonify(consolidated_results)
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        response.headers['Content-Disposition'] = f'attachment; filename=historial_completo_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+        tracking_params = _extract_tracking_parameters(nombre_archivo, metadata, result_data)
         
-        logger.info(f"✅ JSON historial completo generado: {len(consolidated_results['archivos_procesados'])} archivos")
+        # Campos extraídos al procesar la imagen: aquí solo se serializan
+        enterprise_fields = campos_persistidos(result_data)
         
-        return response
+        return {
+            'nombre_archivo': nombre_archivo,
+            'lote': batch_info.get('batch_id', 'N/A'),
+            'fecha_procesamiento': batch_info.get('date', 'N/A'),
+            'caption': tracking_params.get('caption', ''),
+            'otro': tracking_params.get('otro', ''),
+            'referencia': enterprise_fields.get('referencia', ''),
+            'bancoorigen': enterprise_fields.get('bancoorigen', ''),
+            'monto': enterprise_fields.get('monto', ''),
+            'datosbeneficiario': {
+                'cedula': enterprise_fields.get('cedula', ''),
+                'telefono': enterprise_fields.get('telefono', ''),
+                'banco_destino': enterprise_fields.get('banco_destino', '')
+            },
+            'pago_fecha': enterprise_fields.get('pago_fecha', ''),
+            'concepto': enterprise_fields.get('concepto', ''),
+            'texto_total_ocr': texto_completo[:500] if texto_completo else ''
+        }
         
     except Exception as e:
-        logger.error(f"Error generando JSON historial completo: {e}")
-        return jsonify({
-            'status': 'error',
-            'message': f'Error generando historial: {str(e)}'
-        }), 500
+        logger.error(f"Error extrayendo datos empresariales de {json_file}: {e}")
+        return {
+            'nombre_archivo': os.path.basename(json_file),
+            'lote': 'Error',
+            'error': str(e),
+            'status': 'error_extraccion'
+        }
 
 @app.route('/api/batches/download/<string:batch_id>', methods=['GET'])
 def api_download_batch_results(batch_id):
@@ -1685,49 +1722,33 @@ def api_download_batch_results(batch_id):
     try:
         from config import get_async_directories
         
+        formato = _formato_exportacion()
+        if formato is None:
+            return _respuesta_formato_invalido()
+        
         directories = get_async_directories()
         results_dir = directories['results']
-        historial_dir = directories.get('historial', 'data/historial')
         
         # Convención de nombre: [lote_id]_resultados.json
         cached_json_filename = f"{batch_id}_resultados.json"
         cached_json_path = os.path.join(results_dir, cached_json_filename)
         
-        # PASO 1: Intentar buscar archivo JSON previamente guardado
-        if os.path.exists(cached_json_path):
-            logger.info(f"📁 REUTILIZACIÓN: Archivo JSON encontrado para lote {batch_id}")
-            try:
-                with open(cached_json_path, 'r', encoding='utf-8') as f:
-                    cached_data = json.load(f)
-                
-                response = jsonify(cached_data)
-                response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                response.headers['Content-Disposition'] = f'attachment; filename=resultados_{batch_id}.json'
-                
-                logger.info(f"✅ REUTILIZACIÓN: JSON servido desde caché para lote {batch_id}")
-                return response
-                
-            except (json.JSONDecodeError, IOError) as e:
-                logger.warning(f"⚠️ Error leyendo JSON cacheado {cached_json_path}: {e}")
-                # Continuar con generación si el archivo está corrupto
-        
-        # PASO 2: Si no existe, generar JSON completo para el lote
-        logger.info(f"🔄 GENERACIÓN: Creando JSON para lote {batch_id}")
-        
-        # Buscar archivos del lote específico
-        batch_files = []
+        # PASO 1: Servir el JSON previamente guardado tal cual, sin cargarlo en memoria
+        if formato == 'json' and os.path.exists(cached_json_path):
+            logger.info(f"📁 REUTILIZACIÓN: JSON servido desde caché para lote {batch_id}")
+            return send_file(
+                os.path.abspath(cached_json_path),
+                as_attachment=True,
+                download_name=f"resultados_{batch_id}.json",
+                mimetype='application/json'
+            )
         
-        # Buscar en directorio results
-        if os.path.exists(results_dir):
-            for file in os.listdir(results_dir):
-                if file.endswith('.json') and file.startswith(batch_id):
-                    batch_files.append(os.path.join(results_dir, file))
+        # PASO 2: Si no existe, generar el lote desde los resultados individuales
+        logger.info(f"🔄 GENERACIÓN: Creando {formato} para lote {batch_id}")
         
-        # Buscar en directorio historial
-        if os.path.exists(historial_dir):
-            for file in os.listdir(historial_dir):
-                if file.endswith('.json') and file.startswith(batch_id):
-                    batch_files.append(os.path.join(historial_dir, file))
+        # Archivos del lote específico en results e historial (manifiesto del lote)
+        filas_lote = _archivos_de_lote(batch_id)
+        batch_files = [fila['filepath'] for fila in filas_lote]
         
         if not batch_files:
             logger.warning(f"❌ No se encontraron archivos para el lote {batch_id}")
@@ -1737,52 +1758,67 @@ def api_download_batch_results(batch_id):
                 'error_code': 'BATCH_NOT_FOUND'
             }), 404
         
-        # Generar JSON consolidado con estructura empresarial
-        consolidated_results = {
-            'metadata': {
-                'fecha_extraccion': datetime.now().isoformat(),
-                'total_archivos': len(batch_files),
-                'version_sistema': '1.0',
-                'tipo_extraccion': 'lote_especifico',
-                'lote_id': batch_id
-            },
-            'archivos_procesados': []
+        metadata = {
+            'fecha_extraccion': datetime.now().isoformat(),
+            'total_archivos': len(batch_files),
+            'version_sistema': '1.0',
+            'tipo_extraccion': 'lote_especifico',
+            'lote_id': batch_id
         }
         
-        for json_file in batch_files:
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
+        def archivos_lote():
+            lotes_actualizados = set()
+            archivos_actualizados = 0
+            for fila in filas_lote:
+                json_file = fila['filepath']
+                data = _cargar_resultado(json_file)
+                if data is None:
+                    continue
+                archivos_actualizados += _actualizar_campos(fila, data, lotes_actualizados)
                 # Extraer datos empresariales usando la misma lógica que extract_results
                 archivo_resultado = _extract_enterprise_data_from_json(data, json_file)
                 archivo_resultado['lote_id'] = batch_id
-                
-                consolidated_results['archivos_procesados'].append(archivo_resultado)
-                
-            except Exception as e:
-                logger.error(f"Error procesando archivo {json_file}: {e}")
-                continue
+                yield archivo_resultado
+            _registrar_campos_actualizados(metadata, archivos_actualizados, lotes_actualizados)
         
-        # PASO 3: Guardar JSON generado para reutilización futura
+        if formato != 'json':
+            return _respuesta_exportacion(archivos_lote(), metadata, formato, f"resultados_{batch_id}")
+        
+        # PASO 3: Escribir el JSON del lote en streaming a la caché y servirlo desde disco
+        tmp_path = None
         try:
             os.makedirs(results_dir, exist_ok=True)
-            with open(cached_json_path, 'w', encoding='utf-8') as f:
-                json.dump(consolidated_results, f, ensure_ascii=False, indent=2)
+            # Temporal único por petición en el mismo directorio: dos descargas simultáneas del mismo lote
+            # no escriben sobre el mismo archivo y os.replace sigue siendo atómico
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=results_dir,
+                                             prefix=f".{cached_json_filename}.", suffix='.tmp', delete=False) as f:
+                tmp_path = f.name
+                for fragmento in _fragmentos_exportacion(archivos_lote(), metadata, 'json'):
+                    f.write(fragmento)
+            os.replace(tmp_path, cached_json_path)
+            tmp_path = None
+            get_results_index().registrar(cached_json_path, {'metadata': metadata})
             
             logger.info(f"💾 CACHÉ: JSON guardado para reutilización futura: {cached_json_path}")
             
         except Exception as e:
             logger.warning(f"⚠️ Error guardando JSON en caché: {e}")
-            # Continuar sirviendo el JSON aunque no se pueda guardar
+            if tmp_path:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            # Servir el JSON en streaming aunque no se pueda guardar
+            return _respuesta_exportacion(archivos_lote(), metadata, 'json', f"resultados_{batch_id}")
         
         # PASO 4: Servir JSON recién generado
-        response = jsonify(consolidated_results)
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        response.headers['Content-Disposition'] = f'attachment; filename=resultados_{batch_id}.json'
-        
         logger.info(f"✅ GENERACIÓN: JSON servido para lote {batch_id} ({len(batch_files)} archivos)")
-        return response
+        return send_file(
+            os.path.abspath(cached_json_path),
+            as_attachment=True,
+            download_name=f"resultados_{batch_id}.json",
+            mimetype='application/json'
+        )
         
     except Exception as e:
         logger.error(f"❌ Error crítico en descarga de lote {batch_id}: {e}")
@@ -1795,171 +1831,44 @@ def api_download_batch_results(batch_id):
 @app.route('/api/batches/history', methods=['GET'])
 def api_get_batch_history():
     """
-    FIX: Endpoint para obtener historial completo de lotes con numeración correcta
-    REASON: Usuario necesita ver todos los lotes procesados con numeración secuencial
-    IMPACT: Dropdown de lotes muestra historial completo con números de lote
+    FIX: Historial de lotes leído de los manifiestos de lote, paginado
+    REASON: Agrupar y contar éxitos/errores abría cada JSON de results e historial en cada consulta
+    IMPACT: Solo se leen los manifiestos de la página (índice de resultados si están desactivados);
+            numeración y orden de llegada globales entre páginas
     """
     try:
-        from config import get_async_directories
-        import glob
-        
-        directories = get_async_directories()
-        results_dir = directories['results']
-        
-        # Obtener todos los archivos JSON de resultados
-        batch_files = {}
+        limit, offset = _parametros_paginacion()
+        batch_manifests = get_batch_manifests()
+        if batch_manifests.enabled:
+            batches, total_batches = batch_manifests.historial_lotes(limit=limit, offset=offset)
+        else:
+            batches, total_batches = get_results_index().historial_lotes(limit=limit, offset=offset)
         
-        # Buscar en directorio results activo
-        if os.path.exists(results_dir):
-            for file in os.listdir(results_dir):
-                if file.endswith('.json') and 'BATCH_' in file:
-                    file_path = os.path.join(results_dir, file)
-                    if os.path.isfile(file_path):
-                        # Extraer batch_prefix del nombre del archivo - CORREGIDO PARA MOSTRAR TODOS LOS ARCHIVOS
-                        try:
-                            parts = file.split('_')
-                            if len(parts) >= 4:
-                                # Usar solo las primeras 3 partes para agrupar por lote
-                                # Esto asegura que todos los archivos del mismo lote se muestren juntos
-                                batch_prefix = f"{parts[0]}_{parts[1]}_{parts[2]}"
-                                batch_date = datetime.strptime(parts[1], '%Y%m%d').date()
-                                batch_time = datetime.strptime(parts[2], '%H%M%S').time()
-                                
-                                # Usar batch_prefix para agrupar todos los archivos del mismo lote
-                                if batch_prefix not in batch_files:
-                                    batch_files[batch_prefix] = {
-                                        'id': batch_prefix,
-                                        'date': datetime.combine(batch_date, batch_time).isoformat(),
-                                        'files': []
-                                    }
-                                
-                                batch_files[batch_prefix]['files'].append(file)
-                        except (ValueError, IndexError):
-                            continue
-        
-        # Buscar en directorio historial
-        historial_dir = 'data/historial'
-        if os.path.exists(historial_dir):
-            for file in os.listdir(historial_dir):
-                if file.endswith('.json') and 'BATCH_' in file:
-                    file_path = os.path.join(historial_dir, file)
-                    if os.path.isfile(file_path):
-                        # Extraer batch_prefix del nombre del archivo - CORREGIDO PARA MOSTRAR TODOS LOS ARCHIVOS
-                        try:
-                            parts = file.split('_')
-                            if len(parts) >= 4:
-                                # Usar solo las primeras 3 partes para agrupar por lote
-                                # Esto asegura que todos los archivos del mismo lote se muestren juntos
-                                batch_prefix = f"{parts[0]}_{parts[1]}_{parts[2]}"
-                                batch_date = datetime.strptime(parts[1], '%Y%m%d').date()
-                                batch_time = datetime.strptime(parts[2], '%H%M%S').time()
-                                
-                                # Usar batch_prefix para agrupar todos los archivos del mismo lote
-                                if batch_prefix not in batch_files:
-                                    batch_files[batch_prefix] = {
-                                        'id': batch_prefix,
-                                        'date': datetime.combine(batch_date, batch_time).isoformat(),
-                                        'files': []
-                                    }
-                                
-                                batch_files[batch_prefix]['files'].append(file)
-                        except (ValueError, IndexError):
-                            continue
-        
-        # Convertir a lista y ordenar por fecha (más reciente primero)
-        batches = list(batch_files.values())
-        batches.sort(key=lambda x: x['date'], reverse=True)
-        
-        # Añadir numeración secuencial, orden de llegada y total de archivos
-        for index, batch in enumerate(batches):
-            batch['number'] = len(batches) - index  # Numeración inversa
-            # FIX: CORRECCIÓN CRÍTICA - Contar solo archivos procesados, no archivos de resumen
-            # REASON: totalFiles mostraba cantidad incorrecta incluyendo archivos _resultados.json
-            # IMPACT: Columna "Archivos" ahora muestra cantidad real de archivos procesados
-            actual_processed_files = [f for f in batch['files'] if not f.endswith('_resultados.json')]
-            batch['totalFiles'] = len(actual_processed_files)
+        for position, batch in enumerate(batches):
+            index = offset + position
+            batch['number'] = total_batches - index  # Numeración inversa
             # MANDATO: Añadir campo "Orden de Llegada" - último en llegar primero
             batch['ordenLlegada'] = index + 1  # 1 = más reciente, 2 = segundo más reciente, etc.
-            # Añadir timestamp de creación parseado para mejor visualización
             batch['timestampCreacion'] = batch['date']
             
-            # FIX: CORRECCIÓN CRÍTICA - Calcular successCount y errorCount para cada lote
-            # REASON: Frontend requiere campos successCount y errorCount que no existían
-            # IMPACT: Elimina valores "undefined" en columnas Exitosos y Errores del historial
-            # CAUSA RAÍZ: Backend no calculaba contadores de éxito/error por lote
-            success_count = 0
-            error_count = 0
-            
-            # Analizar cada archivo del lote para determinar éxito/error
-            for file_name in batch['files']:
-                # Si es un archivo "_resultados.json", contiene resumen del lote
-                if file_name.endswith('_resultados.json'):
-                    continue  # No contar archivos de resumen
-                
-                # Si es un archivo JSON individual procesado, verificar si tiene datos OCR
-                if file_name.endswith('.json'):
-                    file_path = os.path.join(results_dir, file_name)
-                    historial_path = os.path.join('data/historial', file_name)
-                    
-                    # Buscar archivo en directorio activo o historial
-                    actual_path = file_path if os.path.exists(file_path) else (historial_path if os.path.exists(historial_path) else None)
-                    
-                    if actual_path:
-                        try:
-                            with open(actual_path, 'r', encoding='utf-8') as f:
-                                file_data = json.load(f)
-                            
-                            # Verificar si el archivo tiene datos OCR válidos
-                            has_valid_ocr = False
-                            if isinstance(file_data, dict):
-                                # Verificar texto extraído
-                                texto_completo = file_data.get('datos_extraidos', {}).get('texto_completo', '') or \
-                                               file_data.get('texto_extraido', '') or \
-                                               file_data.get('texto_completo', '')
-                                
-                                # Verificar coordenadas
-                                palabras_detectadas = file_data.get('datos_extraidos', {}).get('palabras_detectadas', []) or \
-                                                    file_data.get('coordenadas_palabras', []) or \
-                                                    file_data.get('palabras_detectadas', [])
-                                
-                                has_valid_ocr = len(texto_completo.strip()) > 0 and len(palabras_detectadas) > 0
-                            
-                            if has_valid_ocr:
-                                success_count += 1
-                            else:
-                                error_count += 1
-                                
-                        except Exception as e:
-                            logger.debug(f"Error analizando archivo {file_name} para contadores: {e}")
-                            error_count += 1  # Archivo con error cuenta como error
-                    else:
-                        error_count += 1  # Archivo no encontrado cuenta como error
-            
-            # Asignar contadores calculados al lote
+            # Los archivos _resultados.json son resúmenes del lote y no cuentan como procesados
+            success_count = batch.pop('exitosos')
+            batch['totalFiles'] = batch.pop('total_archivos')
             batch['successCount'] = success_count
-            batch['errorCount'] = error_count
+            batch['errorCount'] = batch['totalFiles'] - success_count
+            batch['successRate'] = round((success_count / batch['totalFiles']) * 100, 1) if batch['totalFiles'] else 0
             
-            # Calcular tasa de éxito
-            total_processed = success_count + error_count
-            if total_processed > 0:
-                batch['successRate'] = round((success_count / total_processed) * 100, 1)
-            else:
-                batch['successRate'] = 0
-                
-            logger.debug(f"Lote {batch['id']}: Total={batch['totalFiles']}, Exitosos={success_count}, Errores={error_count}")
-            
-            # VALIDACIÓN: Verificar integridad de datos del lote
-            if batch['totalFiles'] != (success_count + error_count):
-                logger.warning(f"⚠️ Discrepancia en lote {batch['id']}: totalFiles={batch['totalFiles']}, procesados={success_count + error_count}")
-                # Corregir totalFiles para que coincida con archivos realmente analizados
-                batch['totalFiles'] = success_count + error_count
+            logger.debug(f"Lote {batch['id']}: Total={batch['totalFiles']}, Exitosos={success_count}, Errores={batch['errorCount']}")
         
-        logger.info(f"📊 Historial de lotes: {len(batches)} lotes encontrados")
+        logger.info(f"📊 Historial de lotes: {len(batches)} de {total_batches} lotes")
         
         return jsonify({
             'status': 'success',
             'batches': batches,
-            'total_batches': len(batches)
+            'total_batches': total_batches,
+            'limit': limit,
+            'offset': offset,
+            'has_more': offset + len(batches) < total_batches
         })
         
     except Exception as e:
@@ -1982,99 +1891,30 @@ def api_extract_results():
     REFERENCE_INTEGRITY: Estructura empresarial con campos obligatorios por archivo
     """
     try:
-        from config import get_async_directories
-        import tempfile
-        from flask import send_file
-        
-        directories = get_async_directories()
-        results_dir = directories['results']
-        
-        # Crear directorio de resultados si no existe
-        os.makedirs(results_dir, exist_ok=True)
-        
-        # Si el directorio estaba vacío, usar historial como fuente principal
-        if not os.path.exists(results_dir) or not os.listdir(results_dir):
-            logger.info(f"Directorio de resultados vacío, usando historial como fuente principal")
-            historial_dir = directories.get('historial', 'data/historial')
-            if os.path.exists(historial_dir):
-                results_dir = historial_dir
+        # FIX: Archivos del lote resueltos con su manifiesto
+        # REASON: Se filtraba por prefijo todo results e historial y, sin lote actual, se agrupaba por minuto
+        # IMPACT: Solo se lee el manifiesto del lote (O(lote)); el índice queda como respaldo sin manifiesto
         
-        # INTEGRIDAD TOTAL: Usar ID único del lote actual
-        current_batch_id = _get_current_batch_id_from_file()
-        json_files = []
+        # INTEGRIDAD TOTAL: Lote pedido por el cliente (?batch_id=). No se deduce del servidor: con varios
+        # workers de gunicorn el último lote de un proceso puede ser el de otro cliente
+        current_batch_id = request.args.get('batch_id')
+        filas_lote = []
         
         if current_batch_id:
-            # Buscar archivos del lote específico usando el ID único
             logger.info(f"📊 INTEGRIDAD TOTAL: Buscando archivos del lote único: {current_batch_id}")
-            
-            # Buscar archivos en AMBOS directorios con el ID único
-            all_json_files = []
-            
-            # Buscar en directorio results
-            if os.path.exists(results_dir):
-                for file in os.listdir(results_dir):
-                    if file.endswith('.json') and file.startswith(current_batch_id):
-                        file_path = os.path.join(results_dir, file)
-                        if os.path.isfile(file_path):
-                            all_json_files.append(file_path)
-            
-            # Buscar TAMBIÉN en historial (para archivos que se movieron automáticamente)
-            historial_dir = directories.get('historial', 'data/historial')
-            if os.path.exists(historial_dir):
-                for file in os.listdir(historial_dir):
-                    if file.endswith('.json') and file.startswith(current_batch_id):
-                        file_path = os.path.join(historial_dir, file)
-                        if os.path.isfile(file_path):
-                            all_json_files.append(file_path)
-            
-            json_files = all_json_files
-            logger.info(f"📊 INTEGRIDAD TOTAL: Encontrados {len(json_files)} archivos del lote único {current_batch_id}")
+            # Incluye historial (archivos que se movieron automáticamente)
+            filas_lote = _archivos_de_lote(current_batch_id)
+            logger.info(f"📊 INTEGRIDAD TOTAL: Encontrados {len(filas_lote)} archivos del lote único {current_batch_id}")
         else:
-            logger.warning("📊 No hay lote único configurado, usando fallback temporal")
-            # Fallback: buscar por proximidad temporal si no hay ID único
-            # [mantener código anterior como fallback]
-            all_json_files = []
-            
-            # Buscar en directorio results
-            if os.path.exists(results_dir):
-                for file in os.listdir(results_dir):
-                    if file.endswith('.json') and file.startswith('BATCH_'):
-                        file_path = os.path.join(results_dir, file)
-                        if os.path.isfile(file_path):
-                            all_json_files.append(file_path)
-            
-            # Buscar TAMBIÉN en historial (para archivos que se movieron automáticamente)
-            historial_dir = directories.get('historial', 'data/historial')
-            if os.path.exists(historial_dir):
-                for file in os.listdir(historial_dir):
-                    if file.endswith('.json') and file.startswith('BATCH_'):
-                        file_path = os.path.join(historial_dir, file)
-                        if os.path.isfile(file_path):
-                            all_json_files.append(file_path)
-            
-            # Agrupar archivos por proximidad temporal (mismo minuto de procesamiento)
-            if all_json_files:
-                file_timestamps = []
-                for file_path in all_json_files:
-                    filename = os.path.basename(file_path)
-                    parts = filename.split('_')
-                    if len(parts) >= 3:
-                        timestamp = f"{parts[1]}_{parts[2]}"
-                        file_timestamps.append((timestamp, file_path))
-                
-                batch_groups = {}
-                for timestamp, file_path in file_timestamps:
-                    batch_minute = timestamp[:13]  # YYYYMMDD_HHMM
-                    if batch_minute not in batch_groups:
-                        batch_groups[batch_minute] = []
-                    batch_groups[batch_minute].append(file_path)
-                
-                if batch_groups:
-                    sorted_batches = sorted(batch_groups.keys(), reverse=True)
-                    if sorted_batches:
-                        latest_batch_minute = sorted_batches[0]
-                        json_files = batch_groups[latest_batch_minute]
-                        logger.info(f"📥 FALLBACK: Recuperando TODOS los archivos del último lote por ejecución: {latest_batch_minute} ({len(json_files)} archivos)")
+            logger.warning("📊 Petición sin batch_id, usando el último lote con manifiesto")
+            ultimos_lotes = get_batch_manifests().lotes() or [
+                lote['id'] for lote in get_results_index().historial_lotes(limit=1)[0]
+            ]
+            if ultimos_lotes:
+                filas_lote = _archivos_de_lote(ultimos_lotes[0])
+                logger.info(f"📥 FALLBACK: Recuperando TODOS los archivos del último lote: {ultimos_lotes[0]} ({len(filas_lote)} archivos)")
+        
+        json_files = [fila['filepath'] for fila in filas_lote]
         
         if not json_files:
             logger.info("📭 No hay archivos JSON disponibles")
@@ -2105,230 +1945,44 @@ def api_extract_results():
                 }
             }), 200
         
-        # FIX: Generar JSON consolidado empresarial con estructura específica requerida
-        # REASON: Usuario requiere formato consolidado con campos específicos empresariales
-        # IMPACT: Estructura empresarial lista para procesamiento posterior
-        consolidated_results = {
-            'metadata': {
-                'fecha_extraccion': datetime.now().isoformat(),
-                'total_archivos': len(json_files),
-                'version_sistema': '1.0',
-                'tipo_extraccion': 'consolidado_empresarial'
-            },
-            'archivos_procesados': []
+        # FIX: JSON consolidado empresarial generado en streaming (json, ndjson o csv)
+        # REASON: Se cargaban todos los JSON del lote en un único dict y se volcaba a un temporal; con miles
+        #         de recibos el RSS superaba MemoryOptimizer.max_memory_mb
+        # IMPACT: Cada resultado se abre, se serializa y se libera; memoria constante con cualquier tamaño de lote
+        formato = _formato_exportacion()
+        if formato is None:
+            return _respuesta_formato_invalido()
+        
+        metadata = {
+            'fecha_extraccion': datetime.now().isoformat(),
+            'total_archivos': len(json_files),
+            'version_sistema': '1.0',
+            'tipo_extraccion': 'consolidado_empresarial'
         }
         
         # FIX: ORDENAMIENTO POR FECHA DE PROCESAMIENTO (MAYOR A MENOR)
         # REASON: Usuario requiere que el último procesado aparezca primero
-        # IMPACT: Lista ordenada con archivos más recientes al inicio
-        file_info_list = []
-        
-        for json_file in json_files:
-            try:
-                file_path = json_file
-                file_stat = os.stat(file_path)
-                modification_time = file_stat.st_mtime
-                
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    result_data = json.load(f)
-                
-                # Extraer información del lote desde el nombre del archivo
-                batch_info = _extract_batch_info(json_file)
-                
-                file_info_list.append({
-                    'file_path': json_file,
-                    'result_data': result_data,
-                    'modification_time': modification_time,
-                    'batch_info': batch_info
-                })
-                
-            except Exception as e:
-                logger.error(f"Error procesando archivo {json_file}: {e}")
-                continue
-        
-        # Ordenar por fecha de modificación (más reciente primero)
-        file_info_list.sort(key=lambda x: x['modification_time'], reverse=True)
-        
-        # Procesar archivos ordenados y extraer datos estructurados
-        # FIX: ORDENAMIENTO INVERSO PARA CAMPO NUMERO_LLEGADA
-        # REASON: Último procesado debe tener el número mayor (orden inverso al procesamiento)
-        # IMPACT: Campo 'numero_llegada' muestra orden correcto (último=mayor número)
-        total_archivos = len(file_info_list)
-        
-        for index, file_info in enumerate(file_info_list):
-            try:
-                json_file = file_info['file_path']
-                result_data = file_info['result_data']
-                batch_info = file_info['batch_info']
-                
-                # Extraer nombre de archivo original
-                nombre_archivo = _extract_original_filename(json_file, result_data)
-                
-                # Extraer metadatos WhatsApp si están disponibles
-                metadata = result_data.get('metadata', {})
-                
-                # ✅ PRESERVAR CAPTION ORIGINAL DE METADATOS - CORRECCIÓN CRÍTICA FINAL
-                # REASON: Caption debe mantenerse exacto como fue ingresado por el usuario
-                # IMPACT: Integridad total del campo caption desde entrada hasta salida
-                # CAUSA RAÍZ: Sistema estaba sobrescribiendo caption original con valores generados
-                
-                # BUSCAR caption original en la ubicación correcta (metadata.caption)
-                caption_original = metadata.get('caption', '').strip()
-                
-                if caption_original:
-                    logger.info(f"📋 Caption original preservado desde metadata: '{caption_original}'")
-                    caption = caption_original
-                else:
-                    # Solo generar caption automático si realmente no existe
-                    # Extraer texto completo para análisis automático
-                    texto_completo = _extract_full_text(result_data)
-                    
-                    if 'PagomovilBDV' in texto_completo:
-                        caption = 'Pago Móvil BDV'
-                    elif 'Transferencia' in texto_completo:
-                        caption = 'Transferencia Bancaria'
-                    elif 'Envio' in texto_completo:
-                        caption = 'Envío de Dinero'
-                    elif 'Operacion' in texto_completo and 'Banco' in texto_completo:
-                        caption = 'Operación Bancaria'
-                    elif any(term in texto_completo for term in ['Bs', 'bolivares', 'Banco']):
-                        caption = 'Transacción Financiera'
-                    else:
-                        caption = 'Documento Procesado'
-                    
-                    logger.info(f"📋 Caption generado automáticamente (no existía original): '{caption}'")
-                
-                # Extraer texto completo para análisis
-                texto_completo = _extract_full_text(result_data)
-                
-                # FIX: Extracción inteligente de campos empresariales específicos
-                # REASON: Mapeo de campos empresariales desde OCR estructurado
-                # IMPACT: Campos empresariales extraídos automáticamente cuando están disponibles
-                campos_empresariales = _extract_enterprise_fields(result_data, texto_completo)
-                
-                # FIX: AGREGAR INFORMACIÓN DEL LOTE AL ARCHIVO
-                # REASON: Usuario requiere saber a qué lote pertenece cada archivo
-                # IMPACT: Campo 'lote' visible en lista de procesamientos
-                lote_info = batch_info.get('lote_id', 'N/A')
-                lote_fecha = batch_info.get('fecha_procesamiento', 'N/A')
-                
-                # MANDATO CRÍTICO BACKEND #1: Extracción de parámetros de seguimiento desde metadata/filename
-                # REASON: Frontend necesita parámetros de entrada (codigo_sorteo, id_whatsapp, etc.) en respuesta
-                # IMPACT: Sistema completo de seguimiento para correlación frontend-backend
-                tracking_params = _extract_tracking_parameters(nombre_archivo, metadata, result_data)
-                
-                # FIX: CORRECCIÓN ORDENAMIENTO NUMERO_LLEGADA (ORDEN INVERSO)
-                # REASON: Último procesado debe tener el número mayor dentro del lote
-                # IMPACT: Campo 'numero_llegada' refleja orden inverso de procesamiento
-                numero_llegada_corregido = total_archivos - index  # Último archivo = número mayor
-                tracking_params['numero_llegada'] = numero_llegada_corregido
-                
-                # ✅ CORRECCIÓN CRÍTICA CAPTION: Usar caption preservado en lugar de tracking_params
-                # REASON: Variable caption ya contiene valor correcto preservado desde metadata
-                # IMPACT: Caption original se mantiene íntegro en JSON del historial
-                # CAUSA RAÍZ: tracking_params['caption'] no preservaba correctamente el valor original
-                if caption:
-                    tracking_params['caption'] = caption
-                
-                # Pequeña pausa para evitar 100% CPU usage
-                import time
-                time.sleep(0.01)  # 10ms pausa para eficiencia de créditos
-                
-                # MANDATO CRÍTICO #2: Inclusión obligatoria de texto_total_ocr y concepto redefinido
-                # REASON: Campo texto_total_ocr AUSENTE violaba mandato estructural  
-                # IMPACT: Campo texto_total_ocr incluido con texto completo + concepto conciso separado
-                # INTEGRIDAD TOTAL: Campo codigo_sorteo removido según solicitud del usuario
-                archivo_consolidado = {
-                    'nombre_archivo': nombre_archivo,
-                    'id_whatsapp': tracking_params.get('id_whatsapp', ''),      # MANDATO: Parámetro de seguimiento
-                    'nombre_usuario': tracking_params.get('nombre_usuario', ''), # MANDATO: Parámetro de seguimiento
-                    'caption': tracking_params.get('caption', ''),              # ✅ CORRECCIÓN CRÍTICA: Usar caption preservado
-                    'hora_exacta': tracking_params.get('hora_exacta', ''),      # MANDATO: Parámetro de seguimiento
-                    'numero_llegada': tracking_params.get('numero_llegada', 0), # MANDATO: Parámetro de seguimiento NUEVO
-                    'otro': campos_empresariales.get('otro', ''),
-                    'referencia': campos_empresariales.get('referencia', ''),
-                    'bancoorigen': campos_empresariales.get('bancoorigen', ''),
-                    'monto': campos_empresariales.get('monto', ''),
-                    'datosbeneficiario': {
-                        'cedula': campos_empresariales.get('cedula', ''),
-                        'telefono': campos_empresariales.get('telefono', ''),
-                        'banco_destino': campos_empresariales.get('banco_destino', '')
-                    },
-                    'pago_fecha': campos_empresariales.get('pago_fecha', ''),
-                    'concepto': campos_empresariales.get('concepto', ''),
-                    'texto_total_ocr': texto_completo,  # MANDATO #22: Campo obligatorio con texto completo
-                    # NUEVO: Información del lote
-                    'lote_id': lote_info,
-                    'lote_fecha': lote_fecha,
-                    # Campos técnicos adicionales
-                    'extraction_stats': {
-                        'confidence': campos_empresariales.get('confidence', 0),
-                        'total_words': campos_empresariales.get('total_words', 0),
-                        'processing_time': result_data.get('tiempo_procesamiento', 0)
-                    }
-                }
-                
-                consolidated_results['archivos_procesados'].append(archivo_consolidado)
-                logger.debug(f"Archivo procesado: {nombre_archivo} - {len(texto_completo)} chars")
-                
-            except Exception as file_error:
-                logger.error(f"Error procesando archivo {json_file}: {file_error}")
-                # FIX: Incluir archivos con error en resultado final con campos en blanco
-                # REASON: Usuario requiere que todos los archivos aparezcan aunque tengan errores
-                # IMPACT: Estructura completa sin omitir archivos problemáticos
-                archivo_error = {
-                    'nombre_archivo': os.path.basename(json_file).replace('.json', ''),
-                    'caption': '',
-                    'otro': '',
-                    'referencia': '',
-                    'bancoorigen': '',
-                    'monto': '',
-                    'datosbeneficiario': {
-                        'cedula': '',
-                        'telefono': '',
-                        'banco_destino': ''
-                    },
-                    'pago_fecha': '',
-                    'concepto': '',
-                    'texto_total_ocr': '',  # MANDATO #22: Campo obligatorio incluso en errores
-                    'extraction_stats': {
-                        'confidence': 0,
-                        'total_words': 0,
-                        'processing_time': 0,
-                        'error': str(file_error)
-                    }
-                }
-                consolidated_results['archivos_procesados'].append(archivo_error)
-        
-        # Crear archivo JSON temporal para descarga
-        temp_json = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json', encoding='utf-8')
-        
-        try:
-            # Escribir JSON consolidado con formato legible
-            import json as json_module
-            json_module.dump(consolidated_results, temp_json, ensure_ascii=False, indent=2)
-            temp_json.close()
-            
-            # Generar nombre descriptivo para el archivo JSON
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            json_filename = f"resultados_consolidados_{timestamp}.json"
-            
-            logger.info(f"✅ JSON consolidado generado exitosamente: {len(json_files)} archivos")
-            logger.info(f"📊 Estadísticas consolidadas: {consolidated_results['metadata']}")
-            
-            # Retornar archivo JSON consolidado para descarga
-            return send_file(
-                temp_json.name,
-                as_attachment=True,
-                download_name=json_filename,
-                mimetype='application/json'
-            )
-            
-        except Exception as json_error:
-            # Limpiar archivo temporal en caso de error
-            if os.path.exists(temp_json.name):
-                os.unlink(temp_json.name)
-            raise json_error
+        # IMPACT: Lista ordenada con archivos más recientes al inicio (fechas del índice, sin abrir los JSON)
+        filas_lote = sorted(filas_lote, key=lambda fila: fila['modificado_en'], reverse=True)
+        
+        def archivos_consolidados():
+            # FIX: ORDENAMIENTO INVERSO PARA CAMPO NUMERO_LLEGADA
+            # REASON: Último procesado debe tener el número mayor (orden inverso al procesamiento)
+            # IMPACT: Campo 'numero_llegada' muestra orden correcto (último=mayor número)
+            total_archivos = len(filas_lote)
+            lotes_actualizados = set()
+            archivos_actualizados = 0
+            for index, fila in enumerate(filas_lote):
+                result_data = _cargar_resultado(fila['filepath'])
+                if result_data is None:
+                    continue
+                archivos_actualizados += _actualizar_campos(fila, result_data, lotes_actualizados)
+                yield _archivo_consolidado(fila['filepath'], result_data, total_archivos - index)
+            _registrar_campos_actualizados(metadata, archivos_actualizados, lotes_actualizados)
+            logger.info(f"✅ JSON consolidado generado exitosamente: {total_archivos} archivos")
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return _respuesta_exportacion(archivos_consolidados(), metadata, formato, f"resultados_consolidados_{timestamp}")
             
     except Exception as e:
         logger.error(f"Error crítico en extract_results consolidado: {e}")
@@ -2338,6 +1992,150 @@ def api_extract_results():
             'error_code': 'EXTRACT_CONSOLIDATED_ERROR'
         }), 500
 
+def _archivo_consolidado(json_file, result_data, numero_llegada):
+    """
+    Registro del JSON consolidado empresarial para un resultado (solo serializa los campos persistidos)
+    
+    Un error en el archivo devuelve el registro con campos en blanco: ningún archivo se omite.
+    """
+    try:
+        # Extraer información del lote desde el nombre del archivo
+        batch_info = _extract_batch_info(json_file)
+        
+        # Extraer nombre de archivo original
+        nombre_archivo = _extract_original_filename(json_file, result_data)
+        
+        # Extraer metadatos WhatsApp si están disponibles
+        metadata = result_data.get('metadata', {})
+        
+        # ✅ PRESERVAR CAPTION ORIGINAL DE METADATOS - CORRECCIÓN CRÍTICA FINAL
+        # REASON: Caption debe mantenerse exacto como fue ingresado por el usuario
+        # IMPACT: Integridad total del campo caption desde entrada hasta salida
+        # CAUSA RAÍZ: Sistema estaba sobrescribiendo caption original con valores generados
+        
+        # BUSCAR caption original en la ubicación correcta (metadata.caption)
+        caption_original = metadata.get('caption', '').strip()
+        
+        if caption_original:
+            logger.info(f"📋 Caption original preservado desde metadata: '{caption_original}'")
+            caption = caption_original
+        else:
+            # Solo generar caption automático si realmente no existe
+            # Extraer texto completo para análisis automático
+            texto_completo = texto_completo_resultado(result_data)
+            
+            if 'PagomovilBDV' in texto_completo:
+                caption = 'Pago Móvil BDV'
+            elif 'Transferencia' in texto_completo:
+                caption = 'Transferencia Bancaria'
+            elif 'Envio' in texto_completo:
+                caption = 'Envío de Dinero'
+            elif 'Operacion' in texto_completo and 'Banco' in texto_completo:
+                caption = 'Operación Bancaria'
+            elif any(term in texto_completo for term in ['Bs', 'bolivares', 'Banco']):
+                caption = 'Transacción Financiera'
+            else:
+                caption = 'Documento Procesado'
+            
+            logger.info(f"📋 Caption generado automáticamente (no existía original): '{caption}'")
+        
+        # Extraer texto completo para análisis
+        texto_completo = texto_completo_resultado(result_data)
+        
+        # FIX: Campos empresariales extraídos una sola vez al procesar la imagen
+        # REASON: Reextraer en cada descarga repetía el trabajo del orquestador por cada archivo del lote
+        # IMPACT: La exportación solo serializa; /api/results/reextract los recalcula si cambian las reglas
+        campos_empresariales = campos_persistidos(result_data)
+        
+        # FIX: AGREGAR INFORMACIÓN DEL LOTE AL ARCHIVO
+        # REASON: Usuario requiere saber a qué lote pertenece cada archivo
+        # IMPACT: Campo 'lote' visible en lista de procesamientos
+        lote_info = batch_info.get('lote_id', 'N/A')
+        lote_fecha = batch_info.get('fecha_procesamiento', 'N/A')
+        
+        # MANDATO CRÍTICO BACKEND #1: Extracción de parámetros de seguimiento desde metadata/filename
+        # REASON: Frontend necesita parámetros de entrada (codigo_sorteo, id_whatsapp, etc.) en respuesta
+        # IMPACT: Sistema completo de seguimiento para correlación frontend-backend
+        tracking_params = _extract_tracking_parameters(nombre_archivo, metadata, result_data)
+        
+        # FIX: CORRECCIÓN ORDENAMIENTO NUMERO_LLEGADA (ORDEN INVERSO)
+        # REASON: Último procesado debe tener el número mayor dentro del lote
+        # IMPACT: Campo 'numero_llegada' refleja orden inverso de procesamiento
+        tracking_params['numero_llegada'] = numero_llegada  # Último archivo = número mayor
+        
+        # ✅ CORRECCIÓN CRÍTICA CAPTION: Usar caption preservado en lugar de tracking_params
+        # REASON: Variable caption ya contiene valor correcto preservado desde metadata
+        # IMPACT: Caption original se mantiene íntegro en JSON del historial
+        # CAUSA RAÍZ: tracking_params['caption'] no preservaba correctamente el valor original
+        if caption:
+            tracking_params['caption'] = caption
+        
+        # MANDATO CRÍTICO #2: Inclusión obligatoria de texto_total_ocr y concepto redefinido
+        # REASON: Campo texto_total_ocr AUSENTE violaba mandato estructural  
+        # IMPACT: Campo texto_total_ocr incluido con texto completo + concepto conciso separado
+        # INTEGRIDAD TOTAL: Campo codigo_sorteo removido según solicitud del usuario
+        archivo_consolidado = {
+            'nombre_archivo': nombre_archivo,
+            'id_whatsapp': tracking_params.get('id_whatsapp', ''),      # MANDATO: Parámetro de seguimiento
+            'nombre_usuario': tracking_params.get('nombre_usuario', ''), # MANDATO: Parámetro de seguimiento
+            'caption': tracking_params.get('caption', ''),              # ✅ CORRECCIÓN CRÍTICA: Usar caption preservado
+            'hora_exacta': tracking_params.get('hora_exacta', ''),      # MANDATO: Parámetro de seguimiento
+            'numero_llegada': tracking_params.get('numero_llegada', 0), # MANDATO: Parámetro de seguimiento NUEVO
+            'otro': campos_empresariales.get('otro', ''),
+            'referencia': campos_empresariales.get('referencia', ''),
+            'bancoorigen': campos_empresariales.get('bancoorigen', ''),
+            'monto': campos_empresariales.get('monto', ''),
+            'datosbeneficiario': {
+                'cedula': campos_empresariales.get('cedula', ''),
+                'telefono': campos_empresariales.get('telefono', ''),
+                'banco_destino': campos_empresariales.get('banco_destino', '')
+            },
+            'pago_fecha': campos_empresariales.get('pago_fecha', ''),
+            'concepto': campos_empresariales.get('concepto', ''),
+            'texto_total_ocr': texto_completo,  # MANDATO #22: Campo obligatorio con texto completo
+            # NUEVO: Información del lote
+            'lote_id': lote_info,
+            'lote_fecha': lote_fecha,
+            # Campos técnicos adicionales
+            'extraction_stats': {
+                'confidence': campos_empresariales.get('confidence', 0),
+                'total_words': campos_empresariales.get('total_words', 0),
+                'processing_time': result_data.get('tiempo_procesamiento', 0)
+            }
+        }
+        
+        logger.debug(f"Archivo procesado: {nombre_archivo} - {len(texto_completo)} chars")
+        return archivo_consolidado
+        
+    except Exception as file_error:
+        logger.error(f"Error procesando archivo {json_file}: {file_error}")
+        # FIX: Incluir archivos con error en resultado final con campos en blanco
+        # REASON: Usuario requiere que todos los archivos aparezcan aunque tengan errores
+        # IMPACT: Estructura completa sin omitir archivos problemáticos
+        archivo_error = {
+            'nombre_archivo': os.path.basename(json_file).replace('.json', ''),
+            'caption': '',
+            'otro': '',
+            'referencia': '',
+            'bancoorigen': '',
+            'monto': '',
+            'datosbeneficiario': {
+                'cedula': '',
+                'telefono': '',
+                'banco_destino': ''
+            },
+            'pago_fecha': '',
+            'concepto': '',
+            'texto_total_ocr': '',  # MANDATO #22: Campo obligatorio incluso en errores
+            'extraction_stats': {
+                'confidence': 0,
+                'total_words': 0,
+                'processing_time': 0,
+                'error': str(file_error)
+            }
+        }
+        return archivo_error
+
 def _extract_enterprise_data_from_json(data, json_file_path):
     """
     MANDATO: Función auxiliar para extraer datos empresariales desde archivo JSON
@@ -2350,12 +2148,11 @@ def _extract_enterprise_data_from_json(data, json_file_path):
         # Extraer metadatos de WhatsApp desde el nombre del archivo
         metadatos_whatsapp = _extract_whatsapp_metadata(filename)
         
-        # Usar la función existente para extraer campos empresariales
         datos_extraidos = data.get('datos_extraidos', {})
         texto_completo = datos_extraidos.get('texto_completo', '')
         
-        # Extraer campos empresariales usando la función existente
-        campos_empresariales = _extract_enterprise_fields(data, texto_completo)
+        # Campos empresariales persistidos al procesar la imagen
+        campos_empresariales = campos_persistidos(data)
         
         # ✅ CORRECCIÓN CRÍTICA CAPTION: Preservar caption original desde metadata JSON
         # REASON: Caption debe mantenerse exacto como fue ingresado por el usuario
@@ -2410,6 +2207,60 @@ def _extract_enterprise_data_from_json(data, json_file_path):
             'status': 'error_extraccion'
         }
 
+def _archivos_de_lote(batch_id):
+    """
+    Resultados individuales de un lote (results e historial), más recientes primero
+    
+    Se leen del manifiesto del lote; los lotes sin manifiesto se resuelven por prefijo en el índice.
+    batch_id puede ser el lote (BATCH_YYYYMMDD_HHMMSS) o el id de ejecución con sufijo.
+    """
+    lote_id = lote_desde_nombre(f"{batch_id}_")[0] or batch_id
+    archivos = get_batch_manifests().archivos(lote_id)
+    if archivos is None:
+        return [fila for fila in get_results_index().archivos_con_prefijo(batch_id) if not fila['es_resumen']]
+    return [archivo for archivo in archivos if archivo['filename'].startswith(batch_id)]
+
+def _actualizar_campos(fila, result_data, lotes_actualizados):
+    """
+    Extrae y persiste los campos empresariales de un resultado anterior al esquema actual
+
+    Returns:
+        bool: True si se actualizó (su lote se anota en lotes_actualizados)
+    """
+    # Los consolidados de lote guardados por la descarga no son resultados individuales
+    if fila.get('es_resumen') or not actualizar_campos_en_lectura(result_data, fila['filepath'], fila['directorio']):
+        return False
+    lote_id = lote_desde_nombre(fila['filename'])[0]
+    if lote_id:
+        lotes_actualizados.add(lote_id)
+    return True
+
+def _registrar_campos_actualizados(metadata, archivos_actualizados, lotes_actualizados):
+    """Anota en los metadatos cuántos resultados se actualizaron al leerlos e invalida los consolidados de sus lotes"""
+    metadata['campos_schema_version'] = CAMPOS_SCHEMA_VERSION
+    if archivos_actualizados:
+        metadata['archivos_campos_actualizados'] = archivos_actualizados
+        logger.info(f"🔄 {archivos_actualizados} resultados actualizados a campos empresariales "
+                    f"v{CAMPOS_SCHEMA_VERSION} durante la exportación")
+        invalidar_consolidados(lotes_actualizados)
+
+@app.route('/api/results/reextract', methods=['POST'])
+def api_reextract_results():
+    """
+    FIX: Job explícito de reextracción de campos empresariales
+    REASON: Las exportaciones ya no reextraen; al cambiar las reglas hay que recalcular los resultados guardados
+    IMPACT: Un único recorrido en segundo plano reescribe los campos versionados de results e historial
+    """
+    forzar = request.args.get('force', 'false').lower() in ('1', 'true', 'si', 'sí')
+    estado, iniciado = iniciar_reextraccion(forzar=forzar)
+    estado['iniciado'] = iniciado
+    return jsonify(estado), 202 if iniciado else 409
+
+@app.route('/api/results/reextract', methods=['GET'])
+def api_reextract_status():
+    """Estado del último job de reextracción de campos empresariales"""
+    return jsonify(get_estado_reextraccion())
+
 def _extract_whatsapp_metadata(filename):
     """
     MANDATO: Extraer metadatos de WhatsApp desde nombre de archivo
@@ -2686,970 +2537,6 @@ def _extract_original_filename(json_file, result_data):
     
     return json_name
 
-def _extract_full_text(result_data):
-    """
-    FIX: Extrae el texto completo desde diferentes ubicaciones posibles en result_data
-    REASON: Texto puede estar en diferentes campos según la estructura del resultado
-    IMPACT: Extracción consistente de texto para análisis empresarial
-    """
-    if not isinstance(result_data, dict):
-        return ""
-    
-    # Buscar texto en diferentes ubicaciones posibles
-    text_sources = [
-        result_data.get('datos_extraidos', {}).get('texto_completo', ''),
-        result_data.get('texto_extraido', ''),
-        result_data.get('texto_completo', ''),
-        result_data.get('ocr_data', {}).get('texto_completo', ''),
-        result_data.get('text', ''),
-        result_data.get('full_text', '')
-    ]
-    
-    for text in text_sources:
-        if text and isinstance(text, str) and len(text.strip()) > 0:
-            return text.strip()
-    
-    return ""
-
-def _extract_enterprise_fields(result_data, texto_completo):
-    """
-    FIX: Extracción inteligente de campos empresariales específicos desde OCR
-    REASON: Mapeo automático de campos empresariales desde datos estructurados de OCR
-    IMPACT: Campos empresariales extraídos automáticamente cuando están disponibles
-    """
-    import re
-    
-    # Inicializar campos empresariales
-    campos = {
-        'otro': '',
-        'referencia': '',
-        'bancoorigen': '',
-        'monto': '',
-        'cedula': '',
-        'telefono': '',
-        'banco_destino': '',
-        'pago_fecha': '',
-        'concepto': '',
-        'caption': '',  # FIX: Agregar caption explícitamente
-        'nombre_beneficiario': '',  # FIX: NUEVO CAMPO CRÍTICO - MANDATO REFINAMIENTO
-        'confidence': 0,
-        'total_words': 0
-    }
-    
-    # FIX: Extraer estadísticas técnicas desde estructura real de datos
-    # REASON: estadisticas_ocr no existe, datos están directamente en result_data
-    # IMPACT: Extracción correcta de confidence y total_words reales
-    if isinstance(result_data, dict):
-        datos_extraidos = result_data.get('datos_extraidos', {})
-        
-        # FIX: Calcular estadísticas desde palabras_detectadas reales
-        palabras_detectadas = datos_extraidos.get('palabras_detectadas', [])
-        if palabras_detectadas:
-            # Calcular confianza promedio real
-            confidencias = [p.get('confianza', 0) for p in palabras_detectadas if isinstance(p, dict)]
-            if confidencias:
-                campos['confidence'] = round(sum(confidencias) / len(confidencias), 3)
-                campos['total_words'] = len(palabras_detectadas)
-        
-        # MANDATO CRÍTICO #2: INTEGRACIÓN DIRECTA DE LÓGICA DE ORO COORDENADAS
-        # REASON: Usar campos texto_total_ocr y concepto_empresarial ya procesados por lógica de oro
-        # IMPACT: Texto estructurado y concepto refinado automáticamente disponibles
-        texto_total_ocr_coordenadas = datos_extraidos.get('texto_total_ocr', '')
-        concepto_empresarial_refinado = datos_extraidos.get('concepto_empresarial', '')
-        texto_completo_local = datos_extraidos.get('texto_completo', '')
-        
-        # PRIORIDAD MÁXIMA: Usar texto ordenado por coordenadas si está disponible
-        if texto_total_ocr_coordenadas:
-            campos['texto_total_ocr'] = texto_total_ocr_coordenadas
-            logger.info(f"🏗️ LÓGICA DE ORO APLICADA: {len(texto_total_ocr_coordenadas)} caracteres ordenados por coordenadas")
-        else:
-            # Fallback al texto tradicional
-            campos['texto_total_ocr'] = texto_completo_local
-            logger.info(f"📄 Texto tradicional usado: {len(texto_completo_local)} caracteres")
-        
-        # MANDATO CRÍTICO #2: USO DIRECTO DE CONCEPTO EMPRESARIAL REFINADO
-        # REASON: Aplicar concepto ya procesado por lógica de oro con patrones empresariales
-        # IMPACT: Concepto ultra-conciso sin ruido, máximo 50 caracteres, núcleo semántico puro
-        if concepto_empresarial_refinado:
-            campos['concepto'] = concepto_empresarial_refinado
-            logger.info(f"🎯 CONCEPTO EMPRESARIAL REFINADO: '{concepto_empresarial_refinado}'")
-        elif not campos['concepto']:
-            # FALLBACK: Extracción tradicional como respaldo
-            texto_para_concepto = texto_total_ocr_coordenadas or texto_completo_local
-            if texto_para_concepto:
-                # PRIORIDAD MÁXIMA: Códigos y números de proyecto/referencia específicos
-                concepto_patterns = [
-                    r'(?:Concepto|CONCEPTO)[:=]?\s*([A-Z0-9\s]{3,25})',   # Códigos como "4 15 D 107"
-                    r'(?:Por|Para)[:=]?\s*([A-Za-z0-9\s]{5,30})',         # "Por: Pago Servicios"
-                    r'(?:Motivo|MOTIVO)[:=]?\s*([A-Za-z\s]{5,30})',       # Motivo conciso
-                    r'(Pago\s+(?:Móvil|Movil|de\s+\w+))',                # "Pago Móvil", "Pago de Servicios"
-                    r'(Transferencia\s+(?:a\s+\w+|Bancaria))',            # "Transferencia Bancaria"
-                    r'(Envío?\s+de\s+\w+)',                              # "Envío de Dinero"
-                    r'([A-Z0-9]{2,}\s+[A-Z0-9]{2,}\s+[A-Z0-9]{1,})',     # Códigos alfanuméricos separados
-                ]
-                
-                concepto_extraido = ""
-                for pattern in concepto_patterns:
-                    match = re.search(pattern, texto_para_concepto, re.IGNORECASE)
-                    if match:
-                        concepto_extraido = match.group(1).strip()
-                        # VALIDAR QUE NO SEA RUIDO (como "Crear Acceso directo")
-                        ruido_keywords = ['crear', 'acceso', 'directo', 'webpage', 'url', 'http', 'x', '-']
-                        texto_limpio = concepto_extraido.lower().replace(' ', '')
-                        if not any(ruido in texto_limpio for ruido in ruido_keywords):
-                            campos['concepto'] = concepto_extraido
-                            break
-                        else:
-                            concepto_extraido = ""  # Resetear si es ruido
-            
-            # FALLBACK ULTRA-ESPECÍFICO: Solo para casos extremos
-            if not concepto_extraido:
-                # Buscar códigos o números significativos aislados
-                codigo_match = re.search(r'([A-Z0-9]{2,}\s+[A-Z0-9]{2,}(?:\s+[A-Z0-9]{1,})?)', texto_completo_local)
-                if codigo_match:
-                    concepto_extraido = codigo_match.group(1).strip()
-            
-            # FALLBACK INTELIGENTE: Si no hay concepto específico, extraer frase relevante
-            if not concepto_extraido:
-                # Buscar primera frase que contenga información financiera
-                frases_relevantes = [
-                    r'([^.]*(?:Bs|bolivares|monto|transferencia|pago|envio)[^.]{0,30})',
-                    r'([A-Z][^.]{20,60}(?:realizada|enviado|operacion)[^.]{0,20})',
-                ]
-                
-                for pattern in frases_relevantes:
-                    match = re.search(pattern, texto_completo_local, re.IGNORECASE)
-                    if match:
-                        concepto_extraido = match.group(1).strip()
-                        break
-                
-                # ÚLTIMO FALLBACK: Primeras palabras significativas (no todo el texto)
-                if not concepto_extraido and len(texto_completo_local) > 20:
-                    palabras = texto_completo_local.split()[:15]  # Máximo 15 palabras
-                    concepto_extraido = ' '.join(palabras)
-            
-            campos['concepto'] = concepto_extraido[:100] if concepto_extraido else "Transacción financiera"
-        
-        # FIX: EXTRACCIÓN AVANZADA CON COORDENADAS Y PROXIMIDAD INTELIGENTE
-        # REASON: Usar coordenadas geométricas para mapeo preciso de campos empresariales
-        # IMPACT: Extracción robusta que maneja diferentes layouts y reduce falsos positivos
-        palabras_detectadas = datos_extraidos.get('palabras_detectadas', [])
-        if palabras_detectadas:
-            # Aplicar extracción inteligente basada en coordenadas
-            campos_coordenadas = _extract_with_coordinate_proximity(palabras_detectadas, texto_completo_local)
-            for campo, valor in campos_coordenadas.items():
-                if valor and not campos.get(campo):
-                    campos[campo] = valor
-            
-            # FIX: EXTRACCIÓN CRÍTICA BASADA EN COORDENADAS REALES DE ONNXTR
-            # REASON: Aprovechar coordenadas geométricas para mapeo espacial preciso
-            # IMPACT: Elimina falsos positivos y mejora precisión de campos empresariales
-            campos_onnxtr = _extract_onnxtr_enterprise_fields(palabras_detectadas, texto_completo_local)
-            for campo, valor in campos_onnxtr.items():
-                if valor and not campos.get(campo):
-                    campos[campo] = valor
-                elif valor and campo in ['caption', 'otro']:  # Sobrescribir caption y otro siempre
-                    campos[campo] = valor
-        
-        # MANDATO CRÍTICO #3: DETECCIÓN DIRECTA DE BANCO DESTINO CON CÓDIGOS BANCARIOS  
-        # REASON: "Bancoc 0105 - BANCO MERCANIIL" debe extraer "BANCO MERCANTIL" como banco_destino
-        # IMPACT: Implementación directa de códigos bancarios en función de extracción empresarial
-        if not campos.get('banco_destino') and texto_completo_local:
-            # TABLA DE CÓDIGOS BANCARIOS VENEZOLANOS (FUENTE DE ALTA FIABILIDAD)
-            codigos_bancarios = {
-                '0102': 'BANCO DE VENEZUELA',
-                '0105': 'BANCO MERCANTIL', 
-                '0108': 'BBVA PROVINCIAL',
-                '0115': 'BANCO EXTERIOR',
-                '0134': 'BANESCO',
-                '0172': 'BANCAMIGA',
-                '0191': 'BANCO NACIONAL DE CREDITO'
-            }
-            
-            bancoorigen_actual = campos.get('bancoorigen', '')
-            
-            # BÚSQUEDA POR CÓDIGO BANCARIO CON MÁXIMA PRIORIDAD
-            for codigo, nombre_banco in codigos_bancarios.items():
-                if codigo in texto_completo_local and nombre_banco != bancoorigen_actual:
-                    campos['banco_destino'] = nombre_banco
-                    break
-        
-        # Buscar también en extracted_fields_positional como fallback
-        extracted_fields = datos_extraidos.get('extracted_fields_positional', {})
-        if extracted_fields:
-            for campo in ['referencia', 'monto', 'bancoorigen', 'cedula', 'telefono', 'banco_destino', 'pago_fecha']:
-                valor = extracted_fields.get(campo, '')
-                if valor and not campos.get(campo):
-                    campos[campo] = valor
-            
-        # FIX: Buscar también en datos_financieros como fallback
-        datos_financieros = datos_extraidos.get('datos_financieros', {})
-        if datos_financieros and not campos['monto']:
-            campos['monto'] = datos_financieros.get('monto', '')
-            campos['referencia'] = datos_financieros.get('referencia', campos['referencia'])
-            
-        # FIX: Extraer bancoorigen desde texto si no está en campos estructurados
-        if not campos['bancoorigen'] and texto_completo_local:
-            # Buscar patrón "Banco : XXXX" o "BANCO XXXX"
-            import re
-            banco_match = re.search(r'[Bb]anco\s*[:=]?\s*([A-Z][A-Z\s]+)', texto_completo_local)
-            if banco_match:
-                campos['bancoorigen'] = banco_match.group(1).strip()
-    
-    # FIX CRÍTICO: PRESERVAR caption original de metadatosEntrada
-    # REASON: Caption debe mantenerse exacto como fue ingresado originalmente
-    # IMPACT: Integridad total del campo caption desde entrada hasta salida
-    # CAUSA RAÍZ: Código anterior sobrescribía caption original con valores generados automáticamente
-    
-    # ✅ PRESERVAR caption original - NO SOBRESCRIBIR
-    # Solo generar caption automático si realmente no existe (None o vacío)
-    if not campos.get('caption') or campos['caption'].strip() == '':
-        if 'PagomovilBDV' in texto_completo:
-            campos['caption'] = 'Pago Móvil BDV'
-        elif 'Transferencia' in texto_completo:
-            campos['caption'] = 'Transferencia Bancaria'
-        elif 'Envio' in texto_completo:
-            campos['caption'] = 'Envío de Dinero'
-        elif 'Operacion' in texto_completo and 'Banco' in texto_completo:
-            campos['caption'] = 'Operación Bancaria'
-        elif any(term in texto_completo for term in ['Bs', 'bolivares', 'Banco']):
-            campos['caption'] = 'Transacción Financiera'
-    
-    # FIX: Análisis mejorado de texto completo con patrones empresariales específicos
-    # REASON: Extraer datos desde texto cuando no están en campos estructurados
-    # IMPACT: Mejora significativa en población de campos empresariales
-    if texto_completo:
-        import re
-        
-        # FIX: Buscar monto con patrones venezolanos específicos
-        if not campos['monto']:
-            monto_patterns = [
-                r'(\d{1,3}(?:[,\.]\d{2,3})*(?:[,\.]\d{2})?\s*Bs)',  # 104,54 Bs
-                r'Bs\.?\s*(\d{1,3}(?:[,\.]\d{2,3})*(?:[,\.]\d{2})?)',  # Bs 104,54
-                r'(\d{1,3}(?:[,\.]\d{2,3})*(?:[,\.]\d{2})?)\s*bolivares',  # 104,54 bolivares
-            ]
-            for pattern in monto_patterns:
-                match = re.search(pattern, texto_completo, re.IGNORECASE)
-                if match:
-                    campos['monto'] = match.group(1) if 'Bs' in match.group(0) else match.group(0)
-                    break
-        
-        # FIX: EXTRACCIÓN CRÍTICA DE REFERENCIA - MANDATO REFINAMIENTO  
-        # REASON: Priorizar secuencias numéricas largas cerca de palabras clave
-        # IMPACT: Corrección de "Fecha" → "48311146148" y "0000120" → "000012071"
-        if not campos['referencia']:
-            ref_patterns = [
-                r'(?:Operacion|OPERACION)\s*[:;=]?\s*(\d{8,15})',     # Operacion : 003039387344
-                r'(?:Referencia|REFERENCIA)\s*[:;=]?\s*(\d{8,15})',   # REFERENCIA : 190018901378
-                r'(?:Ref|REF)\s*[:;=]?\s*(\d{8,15})',                # Ref: 003039387344
-                r'(?:NUMERO DE REFERENCIA)\s*[:;=]?\s*(\d{8,15})',    # NUMERO DE REFERENCIA : 190018901378
-                r'(\d{10,15})',                                       # Números largos directos
-                r'(\d{8,12})'                                        # Números medianos como fallback
-            ]
-            
-            # Buscar con prioridad espacial - números cerca de palabras clave
-            for pattern in ref_patterns:
-                matches = re.finditer(pattern, texto_completo, re.IGNORECASE)
-                for match in matches:
-                    referencia_num = match.group(1)
-                    # Validar que es número puro y longitud apropiada
-                    if referencia_num.isdigit() and 8 <= len(referencia_num) <= 15:
-                        # Verificar que no es teléfono (no empieza con 04, +58)
-                        if not referencia_num.startswith(('04', '58')):
-                            campos['referencia'] = referencia_num
-                            break
-                if campos.get('referencia'):
-                    break
-        
-        # FIX: EXTRACCIÓN CRÍTICA DE CÉDULA - MANDATO REFINAMIENTO
-        # REASON: Fortalecer patrones regex para formatos V-27061025, 27.061.025
-        # IMPACT: Corrección de cédulas vacías → extracción correcta con puntos y guiones
-        if not campos['cedula']:
-            cedula_patterns = [
-                r'(?:Identificacion|C\.?I\.?|cedula|RIF|BENEFICIARIO)\s*[:=]?\s*([VvEe]?-?\d{1,2}\.?\d{3}\.?\d{3})',  # V-27.061.025
-                r'([VvEe]-?\d{1,2}\.?\d{3}\.?\d{3})',                                                                # V-27.061.025 directo
-                r'([VvEe]-?\d{7,9})',                                                                               # V-27061025
-                r'(\d{1,2}\.?\d{3}\.?\d{3})',                                                                       # 27.061.025
-                r'(\d{7,9})',                                                                                       # 27061025 directo
-            ]
-            for pattern in cedula_patterns:
-                matches = re.finditer(pattern, texto_completo, re.IGNORECASE)
-                for match in matches:
-                    cedula_str = match.group(1)
-                    # Validar longitud apropiada después de limpiar
-                    cedula_digits = re.sub(r'[^\d]', '', cedula_str)
-                    if 7 <= len(cedula_digits) <= 9:
-                        # Verificar que no es teléfono (no empieza con 04, 02)
-                        if not cedula_digits.startswith(('04', '02', '58')):
-                            campos['cedula'] = cedula_str
-                            break
-                if campos.get('cedula'):
-                    break
-        
-        # MANDATO CRÍTICO #1: FUNCIÓN TELEFONO CONSOLIDADA CON VALIDACIÓN ESTRICTA
-        # REASON: Esta función secundaria ignoraba validación venezolana causando asignación incorrecta
-        # IMPACT: ELIMINACIÓN de asignación sin validación - solo prefijos venezolanos válidos
-        if not campos['telefono']:
-            # VALIDACIÓN ESTRICTA: Solo prefijos de operadores celulares venezolanos
-            prefijos_validos = ['0412', '0416', '0426', '0414', '0424']
-            
-            telefono_patterns = [
-                r'Destino\s*[:=]?\s*(\d{11})',  # Destino : 04125318244
-                r'(04\d{9})',  # 04125318244 directo - solo con prefijo 04
-                r'(\+58\d{10})',  # +58 seguido de 10 dígitos
-            ]
-            
-            telefono_validado = False
-            for pattern in telefono_patterns:
-                match = re.search(pattern, texto_completo)
-                if match:
-                    telefono_str = re.sub(r'[^\d+]', '', match.group(1))
-                    
-                    # VALIDACIÓN BINARIA OBLIGATORIA: APLICAR MISMAS REGLAS
-                    cumple_internacional = telefono_str.startswith('+58') and len(telefono_str) == 13
-                    cumple_nacional = len(telefono_str) == 11 and any(telefono_str.startswith(p) for p in prefijos_validos)
-                    
-                    if cumple_internacional:
-                        # Convertir formato internacional a nacional
-                        telefono_nacional = '0' + telefono_str[3:]
-                        if any(telefono_nacional.startswith(prefijo) for prefijo in prefijos_validos):
-                            campos['telefono'] = telefono_nacional
-                            telefono_validado = True
-                            break
-                    elif cumple_nacional:
-                        # Verificar que NO es la referencia ya extraída
-                        if telefono_str != campos.get('referencia', ''):
-                            campos['telefono'] = telefono_str
-                            telefono_validado = True
-                            break
-                    else:
-                        # MANDATO CRÍTICO: RECHAZO ABSOLUTO - NO asignar
-                        # El número no cumple con prefijos venezolanos válidos
-                        continue
-                
-                if telefono_validado:
-                    break
-        
-        # FIX: REFINAMIENTO CRÍTICO - Buscar fecha con patrones mejorados que manejan espacios
-        # REASON: Los patrones anteriores no detectaban fechas con espacios como "20/06/ 2025"
-        # IMPACT: Extracción precisa de fechas venezolanas con espacios
-        if not campos['pago_fecha']:
-            fecha_patterns = [
-                r'Fecha\s*[:=]?\s*(\d{1,2}/\d{1,2}/\s*\d{4})',  # Fecha : 20/06/ 2025 (con espacios)
-                r'(\d{1,2}/\d{1,2}/\s*\d{4})',                 # 20/06/ 2025 directo (con espacios)
-                r'(\d{1,2}/\d{1,2}/\d{4})',                    # 20/06/2025 sin espacios
-                r'(\d{4}-\d{2}-\d{2})',                        # 2025-06-20 formato ISO
-            ]
-            for pattern in fecha_patterns:
-                match = re.search(pattern, texto_completo)
-                if match:
-                    fecha_str = match.group(1).replace(' ', '')  # Eliminar espacios adicionales
-                    campos['pago_fecha'] = fecha_str
-                    break
-    
-    return campos
-
-def _extract_with_coordinate_proximity(palabras_detectadas, texto_completo):
-    """
-    FIX: Extracción inteligente usando coordenadas y proximidad espacial
-    REASON: Mejorar precisión de extracción aprovechando información posicional
-    IMPACT: Reduce falsos positivos y mejora mapeo de campos en diferentes layouts
-    """
-    import re
-    
-    campos_extraidos = {
-        'referencia': '',
-        'monto': '',
-        'bancoorigen': '',
-        'cedula': '',
-        'telefono': '',
-        'banco_destino': '',
-        'pago_fecha': ''
-    }
-    
-    if not palabras_detectadas:
-        return campos_extraidos
-    
-    # Convertir palabras a estructura con coordenadas válidas
-    words_with_coords = []
-    for palabra in palabras_detectadas:
-        if isinstance(palabra, dict):
-            coords = palabra.get('coordinates', [0, 0, 0, 0])
-            if len(coords) == 4 and sum(coords) > 0:  # Coordenadas válidas
-                words_with_coords.append({
-                    'text': palabra.get('texto', ''),
-                    'confidence': palabra.get('confianza', 0),
-                    'coords': coords
-                })
-    
-    if not words_with_coords:
-        return campos_extraidos
-    
-    # FIX: PATRONES DE EXTRACCIÓN CON VALIDACIÓN ESPACIAL
-    # REASON: Combinar regex con proximidad espacial para máxima precisión
-    # IMPACT: Extracción robusta que maneja variaciones de layout
-    
-    # 1. EXTRACCIÓN DE REFERENCIA/OPERACIÓN (ajustado para 12 dígitos como 003039387344)
-    ref_keywords = ['operacion', 'referencia', 'ref', 'op', 'numero']
-    referencia = _find_field_by_spatial_proximity(words_with_coords, ref_keywords, r'\d{12}')
-    if referencia:
-        campos_extraidos['referencia'] = referencia
-    
-    # 2. EXTRACCIÓN DE MONTO VENEZOLANO
-    monto_keywords = ['monto', 'total', 'bs', 'bolivares']
-    monto = _find_field_by_spatial_proximity(words_with_coords, monto_keywords, r'\d{1,3}(?:[,\.]\d{2,3})*(?:[,\.]\d{2})?')
-    if monto:
-        campos_extraidos['monto'] = monto
-    
-    # 3. EXTRACCIÓN DE BANCO
-    banco_keywords = ['banco', 'bco', 'entidad']
-    banco = _find_field_by_spatial_proximity(words_with_coords, banco_keywords, r'[A-Z][A-Z\s]+')
-    if banco:
-        campos_extraidos['bancoorigen'] = banco
-        campos_extraidos['banco_destino'] = banco  # Misma entidad en muchos casos
-    
-    # 4. EXTRACCIÓN DE CÉDULA (7-8 dígitos)
-    cedula_keywords = ['identificacion', 'ci', 'cedula', 'v-']
-    cedula = _find_field_by_spatial_proximity(words_with_coords, cedula_keywords, r'^[VE]?\d{7,8}$')
-    if cedula:
-        campos_extraidos['cedula'] = cedula
-    
-    # 5. EXTRACCIÓN DE TELÉFONO (11 dígitos específicamente)
-    telefono_keywords = ['destino', 'telefono', 'tel', 'movil']
-    telefono = _find_field_by_spatial_proximity(words_with_coords, telefono_keywords, r'^0\d{10}$')
-    if telefono:
-        campos_extraidos['telefono'] = telefono
-    
-    # 6. EXTRACCIÓN DE FECHA
-    fecha_keywords = ['fecha', 'date', 'dia']
-    fecha = _find_field_by_spatial_proximity(words_with_coords, fecha_keywords, r'\d{1,2}/\d{1,2}/\d{4}')
-    if fecha:
-        campos_extraidos['pago_fecha'] = fecha
-    
-    return campos_extraidos
-
-def _find_field_by_spatial_proximity(words_with_coords, keywords, value_pattern):
-    """
-    FIX: Busca un campo específico usando proximidad espacial entre keyword y valor
-    REASON: Mapeo inteligente que considera posición física de elementos en documento
-    IMPACT: Extracción precisa que maneja diferentes layouts de documentos financieros
-    """
-    import re
-    
-    # Buscar keywords en las palabras
-    keyword_positions = []
-    for i, word in enumerate(words_with_coords):
-        word_text = word['text'].lower()
-        for keyword in keywords:
-            if keyword.lower() in word_text:
-                keyword_positions.append({
-                    'index': i,
-                    'coords': word['coords'],
-                    'keyword': keyword,
-                    'confidence': word['confidence']
-                })
-    
-    if not keyword_positions:
-        return None
-    
-    # Para cada keyword encontrado, buscar valores cercanos
-    best_match = None
-    best_score = 0
-    
-    for kw_pos in keyword_positions:
-        kw_coords = kw_pos['coords']
-        kw_center_x = (kw_coords[0] + kw_coords[2]) / 2
-        kw_center_y = (kw_coords[1] + kw_coords[3]) / 2
-        
-        # Buscar palabras cercanas que coincidan con el patrón
-        for i, word in enumerate(words_with_coords):
-            if abs(i - kw_pos['index']) > 5:  # Límite de proximidad por índice
-                continue
-                
-            if re.search(value_pattern, word['text']):
-                word_coords = word['coords']
-                word_center_x = (word_coords[0] + word_coords[2]) / 2
-                word_center_y = (word_coords[1] + word_coords[3]) / 2
-                
-                # Calcular distancia espacial
-                distance = ((kw_center_x - word_center_x) ** 2 + (kw_center_y - word_center_y) ** 2) ** 0.5
-                
-                # Score basado en proximidad y confianza
-                proximity_score = max(0, 100 - distance)  # Máximo 100 si están en mismo lugar
-                confidence_score = (kw_pos['confidence'] + word['confidence']) / 2
-                total_score = proximity_score * confidence_score
-                
-                if total_score > best_score:
-                    best_score = total_score
-                    best_match = word['text']
-    
-    return best_match
-
-def _extract_onnxtr_enterprise_fields(palabras_detectadas, texto_completo):
-    """
-    FIX: EXTRACCIÓN EMPRESARIAL AVANZADA CON COORDENADAS ONNXTR REALES Y VALIDACIÓN INTELIGENTE
-    REASON: Implementar algoritmo híbrido que combina análisis contextual y espacial para máxima precisión
-    IMPACT: Elimina falsos positivos y mejora dramáticamente la extracción de campos empresariales críticos
-    """
-    import re
-    
-    campos_extraidos = {
-        'referencia': '',
-        'monto': '',
-        'bancoorigen': '',
-        'cedula': '',
-        'telefono': '',
-        'banco_destino': '',
-        'pago_fecha': '',
-        'caption': '',
-        'otro': ''
-    }
-    
-    if not palabras_detectadas or not texto_completo:
-        return campos_extraidos
-    
-    # FIX: EXTRACCIÓN INTELIGENTE DE REFERENCIA/OPERACIÓN - MANDATO REFINAMIENTO
-    # REASON: Buscar patrones específicos de operación con validación numérica
-    # IMPACT: Extracción precisa de números de operación de 8-15 dígitos
-    ref_patterns = [
-        r'(?:Operacion|OPERACION)\s*[:;=]?\s*(\d{8,15})',     # Operacion : 003039387344
-        r'(?:NUMERO DE REFERENCIA)\s*[:;=]?\s*(\d{8,15})',    # NUMERO DE REFERENCIA : 190018901378  
-        r'(?:Referencia|REFERENCIA)\s*[:;=]?\s*(\d{8,15})',   # REFERENCIA : 190018901378
-        r'(?:Ref|REF)\s*[:;=]?\s*(\d{8,15})',                # Ref: 003039387344
-        r'(\d{10,15})',                                       # Números largos directos
-        r'(\d{8,12})'                                        # Números medianos como fallback
-    ]
-    
-    for pattern in ref_patterns:
-        matches = re.finditer(pattern, texto_completo, re.IGNORECASE)
-        for match in matches:
-            referencia_num = match.group(1)
-            # Validar que es número puro y longitud apropiada
-            if referencia_num.isdigit() and 8 <= len(referencia_num) <= 15:
-                # Verificar que no es teléfono (no empieza con 04, +58)
-                if not referencia_num.startswith(('04', '58')):
-                    campos_extraidos['referencia'] = referencia_num
-                    break
-        if campos_extraidos.get('referencia'):
-            break
-    
-    # FIX: EXTRACCIÓN CRÍTICA DE BANCO ORIGEN/DESTINO - MANDATO REFINAMIENTO  
-    # REASON: Implementar diccionario completo de códigos y acrónimos venezolanos
-    # IMPACT: Mapeo correcto de BDV, Mercantil, Provincial según mandato crítico
-    
-    # Diccionario empresarial AMPLIADO de bancos venezolanos (mandato crítico)
-    bank_mapping = {
-        # Códigos oficiales completos
-        '0102': 'BANCO DE VENEZUELA',
-        '0104': 'BANCO VENEZOLANO DE CREDITO', 
-        '0105': 'BANCO MERCANTIL',
-        '0108': 'BBVA PROVINCIAL',
-        '0114': 'BANCARIBE',
-        '0115': 'BANCO EXTERIOR',
-        '0134': 'BANESCO',
-        '0151': 'BANCO FONDO COMUN',
-        '0163': 'BANCO DEL TESORO',
-        '0171': 'BANCO ACTIVO',
-        '0172': 'BANCAMIGA BANCO UNIVERSAL',
-        '0174': 'BANPLUS',
-        '0191': 'BANCO NACIONAL DE CREDITO',
-        
-        # Acrónimos y nombres comerciales (mandato crítico)
-        'BDV': 'BANCO DE VENEZUELA',
-        'BNC': 'BANCO NACIONAL DE CREDITO',
-        'BFC': 'BANCO FONDO COMUN',
-        'BVC': 'BANCO VENEZOLANO DE CREDITO',
-        'BANESCO': 'BANESCO',
-        'MERCANTIL': 'BANCO MERCANTIL',
-        'PROVINCIAL': 'BBVA PROVINCIAL',
-        'BANCARIBE': 'BANCARIBE',
-        'EXTERIOR': 'BANCO EXTERIOR',
-        'ACTIVO': 'BANCO ACTIVO',
-        'BANCAMIGA': 'BANCAMIGA BANCO UNIVERSAL',
-        'BANPLUS': 'BANPLUS',
-        'R4': 'R4 BANCO MICROFINANCIERO',
-        
-        # Patrones adicionales detectados en OCR (mandato crítico)
-        'PAGOMOVILBDV': 'BANCO DE VENEZUELA',
-        'PAGOMOVIL BDV': 'BANCO DE VENEZUELA',
-        'PAGO MOVIL BDV': 'BANCO DE VENEZUELA',
-        'BANCO MERCANTIL N': 'BANCO MERCANTIL',
-        'BBVA': 'BBVA PROVINCIAL'
-    }
-    
-    # FIX: DETECCIÓN CRÍTICA DE ACRÓNIMOS INCRUSTADOS - MANDATO REFINAMIENTO CRÍTICO
-    # REASON: PagomovilBDV debe extraer "BANCO DE VENEZUELA" no "BANCO MERCANTIL"
-    # IMPACT: Corrección fundamental del algoritmo de extracción bancaria posicional
-    # PRIORIDAD: Primera detección de banco en documento define bancoorigen
-    
-    # 1. REGLA: PRIMER BANCO DETECTADO + ACRÓNIMOS INCRUSTADOS
-    bancoorigen_detectado = False
-    
-    # Detectar acrónimos incrustados con máxima prioridad
-    acronimos_incrustados = {
-        'PAGOMOVILBDV': 'BANCO DE VENEZUELA',
-        'PAGOMOVIL BDV': 'BANCO DE VENEZUELA', 
-        'PAGO MOVIL BDV': 'BANCO DE VENEZUELA',
-        'PAGOMOVILMERCANTIL': 'BANCO MERCANTIL',
-        'PAGOMOVILBANESCO': 'BANESCO',
-        'PAGOMOVILPROVINCIAL': 'BBVA PROVINCIAL'
-    }
-    
-    # Buscar acrónimos incrustados PRIMERO (máxima prioridad)
-    texto_upper = texto_completo.upper()
-    for acronimo, banco_oficial in acronimos_incrustados.items():
-        if acronimo in texto_upper:
-            campos_extraidos['bancoorigen'] = banco_oficial
-            # FIX: NO generar caption automático - preservar original
-            bancoorigen_detectado = True
-            logger.info(f"🏦 ACRÓNIMO INCRUSTADO detectado: {acronimo} → {banco_oficial}")
-            break
-    
-    # 2. REGLA: PRIMER BANCO DETECTADO ESPACIALMENTE (si no hay acrónimos)
-    if not bancoorigen_detectado:
-        # Buscar primera mención de banco en el texto usando diccionario completo
-        primeras_menciones = []
-        for codigo_banco, nombre_banco in bank_mapping.items():
-            # Buscar tanto el código como el nombre en el texto
-            for busqueda in [codigo_banco, nombre_banco]:
-                pos = texto_upper.find(busqueda.upper())
-                if pos != -1:
-                    primeras_menciones.append((pos, nombre_banco, busqueda))
-        
-        # Ordenar por posición y tomar la primera
-        if primeras_menciones:
-            primeras_menciones.sort(key=lambda x: x[0])  # Ordenar por posición
-            primer_banco = primeras_menciones[0][1]  # Nombre oficial del banco
-            campos_extraidos['bancoorigen'] = primer_banco
-            bancoorigen_detectado = True
-            logger.info(f"🏦 PRIMER BANCO DETECTADO: {primer_banco}")
-    
-    # 3. EXTRACCIÓN DE BANCO DESTINO (segundo banco mencionado)
-    if bancoorigen_detectado:
-        banco_destino_patterns = [
-            r'Banco\s*[:=]?\s*\d{4}\s*=\s*([A-Z\s]+[A-Z])',  # Banco : 0105 = BANCO MERCANTIL
-            r'BANCO\s+([A-Z\s]+[A-Z])',                       # BANCO MERCANTIL
-            r'(\d{4})\s*=\s*([A-Z\s]+BANCO[A-Z\s]*)',        # 0105 = BANCO MERCANTIL
-        ]
-        for pattern in banco_destino_patterns:
-            match = re.search(pattern, texto_completo, re.IGNORECASE)
-            if match:
-                if len(match.groups()) == 2:
-                    banco_nombre = match.group(2).strip()
-                else:
-                    banco_nombre = match.group(1).strip()
-                
-                # Verificar que es diferente al banco origen y es válido
-                if (len(banco_nombre) >= 8 and 
-                    banco_nombre != campos_extraidos['bancoorigen'] and
-                    'BANCO' in banco_nombre.upper()):
-                    campos_extraidos['banco_destino'] = banco_nombre
-                    break
-    
-    # MANDATO FASE 2 IMPLEMENTADO: EXTRACCIÓN Y NORMALIZACIÓN CRÍTICA DE MONTO VENEZOLANO
-    # PROBLEMA: "210,00" se convertía a "2706102.00" - SOLUCIÓN INTEGRAL
-    # IMPACTO: Normalización correcta de formato decimal venezolano
-    if not campos_extraidos['monto']:
-        def normalizar_monto_venezolano_routes(monto_str):
-            """
-            MANDATO FASE 2: Normalización específica para routes.py
-            PROBLEMA: "210,00" convertido a "2706102.00"
-            SOLUCIÓN: Detectar y normalizar formato venezolano correctamente
-            """
-            try:
-                # Limpiar espacios y caracteres no numéricos excepto comas y puntos
-                monto_limpio = re.sub(r'[^\d.,]', '', monto_str)
-                
-                # DETECCIÓN ESPECÍFICA: Formato venezolano con coma como separador decimal
-                if ',' in monto_limpio and monto_limpio.count(',') == 1:
-                    partes = monto_limpio.split(',')
-                    # Verificar que la parte decimal tenga exactamente 2 dígitos (formato venezolano)
-                    if len(partes) == 2 and partes[1].isdigit() and len(partes[1]) == 2:
-                        # Formato venezolano confirmado: 210,00 → 210.00
-                        parte_entera = partes[0].replace('.', '')  # Eliminar puntos de miles si existen
-                        parte_decimal = partes[1]
-                        monto_normalizado = f"{parte_entera}.{parte_decimal}"
-                        logger.info(f"🏆 MANDATO FASE 2: Monto venezolano normalizado en routes.py: {monto_str} → {monto_normalizado}")
-                        return monto_normalizado
-                
-                # Formato internacional: eliminar puntos de miles, convertir coma a punto decimal
-                if '.' in monto_limpio and ',' in monto_limpio:
-                    # Formato 1.234,56 → 1234.56
-                    monto_normalizado = monto_limpio.replace('.', '').replace(',', '.')
-                    return monto_normalizado
-                
-                # Solo números con puntos (posible formato miles): 1.234 → 1234
-                if '.' in monto_limpio and not ',' in monto_limpio:
-                    # Verificar si es separador de miles o decimal
-                    partes = monto_limpio.split('.')
-                    if len(partes) == 2 and len(partes[1]) == 2:
-                        # Probable decimal: 210.00
-                        return monto_limpio
-                    else:
-                        # Probable separador de miles: 1.234 → 1234
-                        return monto_limpio.replace('.', '')
-                
-                # Solo números enteros
-                return monto_limpio
-                
-            except Exception as e:
-                logger.warning(f"Error normalizando monto en routes.py '{monto_str}': {e}")
-                return monto_str
-        
-        monto_patterns = [
-            r'(\d{1,3}(?:\.\d{3})*,\d{2})\s*Bs',     # 210,00 Bs
-            r'Bs\.?\s*(\d{1,3}(?:\.\d{3})*,\d{2})',  # Bs 210,00
-            r'(\d{1,3}(?:[,.]\d{2,3})+)',             # 104,54 o 210,00
-            r'Se\s+Envio\s+\(Bs\s+(\d{1,3}(?:\.\d{3})*,\d{2})\)',  # Se Envio (Bs 210,00)
-        ]
-        for pattern in monto_patterns:
-            match = re.search(pattern, texto_completo)
-            if match:
-                monto_str = match.group(1)
-                # Validar que contiene números y formato válido
-                if re.search(r'\d+[,.]\d{2}', monto_str):
-                    # APLICAR NORMALIZACIÓN MANDATO FASE 2
-                    monto_normalizado = normalizar_monto_venezolano_routes(monto_str)
-                    campos_extraidos['monto'] = monto_normalizado
-                    logger.info(f"✅ MANDATO FASE 2: Monto extraído y normalizado en routes.py: {monto_normalizado}")
-                    break
-    
-    # FIX: EXTRACCIÓN CRÍTICA DE CÉDULA - MANDATO REFINAMIENTO
-    # REASON: Fortalecer patrones regex para formatos V-27061025, 27.061.025
-    # IMPACT: Corrección de cédulas vacías → extracción correcta con puntos y guiones
-    if not campos_extraidos['cedula']:
-        cedula_patterns = [
-            r'(?:Identificacion|C\.?I\.?|cedula|RIF|BENEFICIARIO)\s*[:=]?\s*([VvEe]?-?\d{1,2}\.?\d{3}\.?\d{3})',  # V-27.061.025
-            r'([VvEe]-?\d{1,2}\.?\d{3}\.?\d{3})',                                                                # V-27.061.025 directo
-            r'([VvEe]-?\d{7,9})',                                                                               # V-27061025
-            r'(\d{1,2}\.?\d{3}\.?\d{3})',                                                                       # 27.061.025
-            r'(\d{7,9})',                                                                                       # 27061025 directo
-        ]
-        for pattern in cedula_patterns:
-            matches = re.finditer(pattern, texto_completo, re.IGNORECASE)
-            for match in matches:
-                cedula_str = match.group(1)
-                # Validar longitud apropiada después de limpiar
-                cedula_digits = re.sub(r'[^\d]', '', cedula_str)
-                if 7 <= len(cedula_digits) <= 9:
-                    # Verificar que no es teléfono (no empieza con 04, 02) y no es la referencia ya extraída
-                    if not cedula_digits.startswith(('04', '02', '58')) and cedula_digits != campos_extraidos.get('referencia', ''):
-                        campos_extraidos['cedula'] = cedula_str
-                        break
-            if campos_extraidos.get('cedula'):
-                break
-    
-    # MANDATO CRÍTICO #1: VALIDACIÓN BINARIA OBLIGATORIA DE TELÉFONOS VENEZOLANOS
-    # REASON: 48311146148 persiste como teléfono - implementar RECHAZO ABSOLUTO
-    # IMPACT: PUNTO DE CONTROL ÚNICO con validación estricta según mandato #19
-    if not campos_extraidos['telefono']:
-        # VALIDACIÓN ESTRICTA: Solo prefijos de operadores celulares venezolanos
-        prefijos_validos = ['0412', '0416', '0426', '0414', '0424']
-        
-        telefono_patterns = [
-            # PRIORIDAD MÁXIMA: Keywords explícitas de teléfono
-            r'(?:Teléfono|TELF|Celular|Telf\.\s*Celular|telefono|celular|movil)\s*[:=]?\s*(\d{11})',
-            # PRIORIDAD MEDIA: Contexto de destino
-            r'(?:Destino|BENEFICIARIO)\s*[:=]?\s*(\d{11})',
-            # PRIORIDAD BAJA: Números de 11 dígitos que empiecen con 04
-            r'(04\d{9})',
-            # FORMATO INTERNACIONAL: +58 seguido de 10 dígitos
-            r'(\+58\d{10})',
-        ]
-        
-        # MANDATO CRÍTICO: VALIDACIÓN BINARIA OBLIGATORIA - RECHAZO ABSOLUTO
-        # CONDICIÓN DE ASIGNACIÓN: Solo asignar si cumple AMBAS condiciones obligatorias
-        telefono_validado = False
-        for pattern in telefono_patterns:
-            matches = re.finditer(pattern, texto_completo, re.IGNORECASE)
-            for match in matches:
-                telefono_raw = match.group(1)
-                telefono_str = re.sub(r'[^\d+]', '', telefono_raw)  # Limpiar completamente
-                
-                # VALIDACIÓN BINARIA OBLIGATORIA: AMBAS condiciones REQUERIDAS
-                cumple_internacional = telefono_str.startswith('+58') and len(telefono_str) == 13
-                cumple_nacional = len(telefono_str) == 11 and any(telefono_str.startswith(p) for p in prefijos_validos)
-                
-                if cumple_internacional:
-                    # Convertir formato internacional a nacional
-                    telefono_nacional = '0' + telefono_str[3:]
-                    if any(telefono_nacional.startswith(prefijo) for prefijo in prefijos_validos):
-                        campos_extraidos['telefono'] = telefono_nacional
-                        logger.info(f"📱 TELÉFONO VENEZOLANO VÁLIDO (internacional): {telefono_str} → {telefono_nacional}")
-                        telefono_validado = True
-                        break
-                elif cumple_nacional:
-                    # Verificar que NO es la referencia ya extraída
-                    if telefono_str != campos_extraidos.get('referencia', ''):
-                        campos_extraidos['telefono'] = telefono_str
-                        logger.info(f"📱 TELÉFONO VENEZOLANO VÁLIDO (nacional): {telefono_str}")
-                        telefono_validado = True
-                        break
-                else:
-                    # MANDATO CRÍTICO: RECHAZO ABSOLUTO - NO asignar a telefono
-                    # BAJO NINGUNA CIRCUNSTANCIA debe ser asignado a datosbeneficiario.telefono
-                    logger.info(f"📱 NÚMERO RECHAZADO DEFINITIVAMENTE (no es teléfono venezolano): {telefono_str}")
-                    # Re-dirigir a referencia si cumple patrón y no se ha extraído
-                    if not campos_extraidos.get('referencia') and len(telefono_str) >= 8:
-                        campos_extraidos['referencia'] = telefono_str
-                        logger.info(f"📋 REDIRIGIDO A REFERENCIA: {telefono_str}")
-                        
-            if telefono_validado:
-                break
-    
-    # FIX: EXTRACCIÓN CRÍTICA DE FECHA DE PAGO - MANDATO REFINAMIENTO
-    # REASON: Buscar patrones específicos de fechas venezolanas con espacios
-    # IMPACT: Extracción precisa de fechas en formato DD/MM/YYYY  
-    if not campos_extraidos['pago_fecha']:
-        fecha_patterns = [
-            r'Fecha\s*[:=]?\s*(\d{1,2}/\d{1,2}/\s*\d{4})',  # Fecha : 20/06/ 2025
-            r'(\d{1,2}/\d{1,2}/\s*\d{4})',                 # 20/06/ 2025 directo
-            r'(\d{1,2}/\d{1,2}/\d{4})',                    # 20/06/2025 sin espacios
-            r'(\d{4}-\d{2}-\d{2})',                        # 2025-06-20 formato ISO
-        ]
-        for pattern in fecha_patterns:
-            match = re.search(pattern, texto_completo)
-            if match:
-                fecha_str = match.group(1).replace(' ', '')  # Eliminar espacios adicionales
-                campos_extraidos['pago_fecha'] = fecha_str
-                break
-    
-    # FIX: INFERENCIA AVANZADA DE BANCO DESTINO INTRABANCARIO - MANDATO OPTIMIZACIÓN CONTINUA  
-    # REASON: Implementar lógica de inferencia contextual según mandato #20
-    # IMPACT: Completa banco_destino cuando es transacción intrabancaria
-    # PROBLEMA RESUELTO: Llena banco_destino vacío cuando es mismo banco que bancoorigen
-    if campos_extraidos.get('bancoorigen') and not campos_extraidos.get('banco_destino'):
-        # REGLA DE INFERENCIA CONDICIONAL INTRABANCARIA
-        # Verificar contexto que sugiere transacción dentro del mismo banco
-        indicadores_intrabancarios = [
-            'Desde mi cuenta',
-            'a beneficiario Cuenta',
-            'Cuenta de Ahorro',
-            'mi cuenta',
-            'Envio de Tpago',
-            'Operacion realizada Desde',
-            'cuenta Se Envio'
-        ]
-        
-        # Buscar indicadores de transacción intrabancaria
-        es_intrabancario = any(indicador in texto_completo for indicador in indicadores_intrabancarios)
-        
-        # Verificar que solo se menciona un banco (el origen) sin banco destino explícito
-        banco_origen = campos_extraidos['bancoorigen']
-        menciones_banco_origen = texto_completo.upper().count(banco_origen.upper().split()[-1])  # Última palabra del banco
-        
-        # Si hay indicadores intrabancarios y solo se menciona el banco origen
-        if es_intrabancario and menciones_banco_origen >= 1:
-            # VERIFICAR: No hay mención explícita de otro banco diferente
-            otros_bancos_mencionados = False
-            for codigo_banco, nombre_banco in bank_mapping.items():
-                if nombre_banco != banco_origen and nombre_banco.upper() in texto_completo.upper():
-                    otros_bancos_mencionados = True
-                    break
-            
-            # FIX: EXTRACCIÓN ROBUSTA DE BANCO DESTINO EXPLÍCITO - MANDATO CORRECCIÓN CRÍTICA PUNTO #21
-            # REASON: Priorizar detección EXPLÍCITA de banco destino sobre inferencia intrabancaria
-            # IMPACT: Capturar bancos destino mencionados directamente en transacciones interbancarias
-            
-            # MANDATO CRÍTICO #3: DETECCIÓN EXPLÍCITA CON CÓDIGOS BANCARIOS Y FUZZY MATCHING
-            # REASON: Detectar "Bancoc 0105 - BANCO MERCANIIL" como "BANCO MERCANTIL"
-            # IMPACT: Prioridad máxima para códigos bancarios sobre inferencia intrabancaria
-            
-            # TABLA DE CÓDIGOS BANCARIOS VENEZOLANOS (FUENTE DE ALTA FIABILIDAD)
-            codigos_bancarios = {
-                '0102': 'BANCO DE VENEZUELA',
-                '0105': 'BANCO MERCANTIL', 
-                '0108': 'BBVA PROVINCIAL',
-                '0115': 'BANCO EXTERIOR',
-                '0134': 'BANESCO',
-                '0172': 'BANCAMIGA',
-                '0191': 'BANCO NACIONAL DE CREDITO'
-            }
-            
-            banco_destino_encontrado = False
-            
-            # PRIORIDAD MÁXIMA: BÚSQUEDA POR CÓDIGO BANCARIO
-            for codigo, nombre_banco in codigos_bancarios.items():
-                if codigo in texto_completo and nombre_banco != banco_origen:
-                    campos_extraidos['banco_destino'] = nombre_banco
-                    logger.info(f"🏦 BANCO DESTINO EXPLÍCITO detectado por código {codigo}: {nombre_banco}")
-                    banco_destino_encontrado = True
-                    break
-            
-            # PRIORIDAD ALTA: DETECCIÓN POR PATRONES CON FUZZY MATCHING
-            if not banco_destino_encontrado:
-                banco_destino_patterns = [
-                    r'Bancoc?\s+\d{4}\s*[-=]\s*([A-Z\s]+)',               # Bancoc 0105 - BANCO MERCANIIL
-                    r'Banco\s*[:=]?\s*(BANCO\s+[A-Z\s]+)',                # Banco: BANCO MERCANTIL
-                    r'destino\s*[:=]?\s*(BANCO\s+[A-Z\s]+)',              # destino: BANCO MERCANTIL  
-                    r'([A-Z\s]*BANCO\s+[A-Z\s]+)',                       # BANCO MERCANTIL directo
-                    r'(MERCANTIL|VENEZUELA|BANESCO|PROVINCIAL|EXTERIOR|BICENTENARIO|BBVA|BNC|BANCAMIGA)'  # Nombres directos
-                ]
-                
-                for pattern in banco_destino_patterns:
-                    matches = re.finditer(pattern, texto_completo, re.IGNORECASE)
-                    for match in matches:
-                        banco_candidato = match.group(1).strip().upper()
-                        
-                        # FUZZY MATCHING CON BANCOS CONOCIDOS
-                        mejor_match = None
-                        mejor_score = 0
-                        
-                        for banco_oficial in codigos_bancarios.values():
-                            # Algoritmo de similitud simple
-                            palabras_candidato = set(banco_candidato.split())
-                            palabras_oficial = set(banco_oficial.split())
-                            
-                            if palabras_candidato and palabras_oficial:
-                                interseccion = len(palabras_candidato & palabras_oficial)
-                                union = len(palabras_candidato | palabras_oficial)
-                                score = interseccion / union if union > 0 else 0
-                                
-                                # Bonus por coincidencias exactas
-                                if 'MERCANTIL' in banco_candidato and 'MERCANTIL' in banco_oficial:
-                                    score += 0.3
-                                elif 'VENEZUELA' in banco_candidato and 'VENEZUELA' in banco_oficial:
-                                    score += 0.3
-                                    
-                                if score > mejor_score and score >= 0.4:  # Umbral reducido
-                                    mejor_score = score
-                                    mejor_match = banco_oficial
-                        
-                        if mejor_match and mejor_match != banco_origen:
-                            campos_extraidos['banco_destino'] = mejor_match
-                            logger.info(f"🏦 BANCO DESTINO EXPLÍCITO detectado (fuzzy): {banco_candidato} → {mejor_match} (score: {mejor_score:.3f})")
-                            banco_destino_encontrado = True
-                            break
-                    
-                    if banco_destino_encontrado:
-                        break
-            
-            # PRIORIDAD SECUNDARIA: Si no hay otros bancos mencionados, es intrabancario
-            if not banco_destino_encontrado and not otros_bancos_mencionados:
-                campos_extraidos['banco_destino'] = banco_origen
-                logger.info(f"🏦 BANCO DESTINO INFERIDO (intrabancario): {banco_origen}")
-    
-    # FIX CRÍTICO: PRESERVAR caption original de metadatosEntrada
-    # REASON: Caption debe mantenerse exacto como fue ingresado originalmente
-    # IMPACT: Integridad total del campo caption desde entrada hasta salida
-    # CAUSA RAÍZ: Código anterior sobrescribía caption original con valores generados automáticamente
-    
-    # ✅ PRESERVAR caption original - NO SOBRESCRIBIR
-    # Solo generar caption automático si realmente no existe (None o vacío)
-    if not campos_extraidos.get('caption') or campos_extraidos['caption'].strip() == '':
-        if 'PagomovilBDV' in texto_completo:
-            campos_extraidos['caption'] = 'Pago Móvil BDV'
-        elif 'Transferencia' in texto_completo:
-            campos_extraidos['caption'] = 'Transferencia Bancaria'
-        elif 'Envio' in texto_completo:
-            campos_extraidos['caption'] = 'Envío de Dinero'
-        elif 'Operacion' in texto_completo and 'Banco' in texto_completo:
-            campos_extraidos['caption'] = 'Operación Bancaria'
-        elif any(term in texto_completo for term in ['Bs', 'bolivares', 'Banco']):
-            campos_extraidos['caption'] = 'Transacción Financiera'
-    
-    return campos_extraidos
-
 def _extract_tracking_parameters(nombre_archivo, metadata, result_data):
     """
     MANDATO CRÍTICO BACKEND: Extracción de parámetros de seguimiento desde filename y metadata
@@ -3768,41 +2655,6 @@ def _extract_tracking_parameters(nombre_archivo, metadata, result_data):
     
     return tracking_params
 
-def _save_last_batch_request_id(request_id):
-    """
-    FIX: Almacena el request_id del último lote procesado exitosamente
-    REASON: Necesario para filtrar archivos JSON por lote específico
-    IMPACT: Permite extracción consolidada específica del último lote únicamente
-    """
-    try:
-        state_file = 'data/last_batch_state.txt'
-        os.makedirs(os.path.dirname(state_file), exist_ok=True)
-        with open(state_file, 'w') as f:
-            f.write(f"{request_id}\n{datetime.now().isoformat()}")
-        logger.debug(f"📝 Estado almacenado: {request_id}")
-    except Exception as e:
-        logger.error(f"Error almacenando request_id: {e}")
-
-def _get_last_batch_request_id():
-    """
-    FIX: Recupera el request_id del último lote procesado exitosamente
-    REASON: Necesario para filtrar archivos JSON por lote específico
-    IMPACT: Permite extracción consolidada específica del último lote únicamente
-    """
-    try:
-        state_file = 'data/last_batch_state.txt'
-        if os.path.exists(state_file):
-            with open(state_file, 'r') as f:
-                lines = f.read().strip().split('\n')
-                if len(lines) >= 1:
-                    request_id = lines[0]
-                    logger.debug(f"📖 Estado recuperado: {request_id}")
-                    return request_id
-        return None
-    except Exception as e:
-        logger.error(f"Error recuperando request_id: {e}")
-        return None
-
 def validate_api_key(api_key):
     """
     FIX: Función para validar API keys en requests
@@ -4120,7 +2972,9 @@ def api_get_stats():
             'archivos': {
                 'en_cola': get_queue_count(),
                 'procesados': get_processed_count()
-            }
+            },
+            # Imágenes por ruta del triaje rápido (directo al OCR / validación + mejora)
+            'triaje': get_triaje().estadisticas()
         }
         
         return jsonify({
@@ -4154,9 +3008,12 @@ def get_cache_info():
                         cache_size += os.path.getsize(file_path)
                         cache_files += 1
         
+        from ocr_cache import get_ocr_cache
+        
         return {
             'archivos': cache_files,
-            'tamaño_mb': round(cache_size / (1024**2), 2)
+            'tamaño_mb': round(cache_size / (1024**2), 2),
+            'ocr_resultados': get_ocr_cache().stats()
         }
     except:
         return {'archivos': 0, 'tamaño_mb': 0}
@@ -4182,16 +3039,7 @@ def get_queue_count():
 def get_processed_count():
     """Obtener contador de archivos procesados"""
     try:
-        from config import get_async_directories
-        directories = get_async_directories()
-        
-        count = 0
-        for results_dir in [directories.get('results', ''), directories.get('historial', '')]:
-            if results_dir and os.path.exists(results_dir):
-                for file in os.listdir(results_dir):
-                    if file.endswith('.json'):
-                        count += 1
-        return count
+        return get_results_index().contar(('results', 'historial'))
     except:
         return 0
 
@@ -4453,49 +3301,5 @@ def serve_documentation():
             'mensaje': f'Error interno sirviendo documentación: {str(e)}'
         }), 500
 
-def _save_batch_execution_id(batch_id):
-    """
-    INTEGRIDAD TOTAL: Almacenar ID único del lote de ejecución
-    """
-    try:
-        batch_file = Path('data/current_batch_id.txt')
-        batch_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(batch_file, 'w', encoding='utf-8') as f:
-            f.write(batch_id)
-        
-        logger.info(f"📦 INTEGRIDAD TOTAL: ID único de lote almacenado: {batch_id}")
-        
-    except Exception as e:
-        logger.error(f"Error almacenando ID de lote: {e}")
-
-def _get_current_batch_execution_id():
-    """
-    INTEGRIDAD TOTAL: Obtener ID único del lote actual
-    """
-    try:
-        batch_file = Path('data/current_batch_id.txt')
-        if batch_file.exists():
-            with open(batch_file, 'r', encoding='utf-8') as f:
-                return f.read().strip()
-        return None
-    except Exception as e:
-        logger.error(f"Error obteniendo ID de lote actual: {e}")
-        return None
-
-def _get_current_batch_id_from_file():
-    """
-    INTEGRIDAD TOTAL: Obtener ID único del lote actual desde archivo
-    """
-    try:
-        batch_file = Path('data/current_batch_id.txt')
-        if batch_file.exists():
-            with open(batch_file, 'r', encoding='utf-8') as f:
-                return f.read().strip()
-        return None
-    except Exception as e:
-        logger.error(f"Error obteniendo ID de lote actual desde archivo: {e}")
-        return None
-
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -8,14 +8,168 @@ import re
 import math
 from typing import List, Dict, Any, Optional, Tuple
 
+import numpy as np
+
+from word_table import WordTable
+
 # Configurar logging
 logger = logging.getLogger(__name__)
 
 
+class LineLayout:
+    """
+    Estructura geométrica de un recibo: líneas, bloques y regiones, construida una sola vez
+
+    Las cajas válidas (4 coordenadas, distintas de [0, 0, 0, 0]) se cargan en un array NumPy y las
+    líneas se forman con un barrido ordenado por y1 con centroides acumulados: cada palabra se une a
+    la primera línea (en orden de creación) cuyo centro Y promedio está a <= y_tolerance de su centro.
+    Las líneas que ya no pueden recibir palabras se retiran del barrido, por lo que el coste es
+    prácticamente lineal en lugar de recalcular el promedio de todas las líneas por palabra.
+
+    Líneas, bloques, regiones y cuadrícula se calculan de forma perezosa y quedan cacheados.
+
+    Args:
+        words: Lista de palabras con 'coordinates' [x1, y1, x2, y2] o WordTable ya construida
+        y_tolerance: Tolerancia vertical entre el centro de la palabra y el centroide de la línea
+        block_gap: Separación vertical máxima entre líneas consecutivas del mismo bloque
+    """
+
+    def __init__(self, words, y_tolerance: float = 10, block_gap: float = 30):
+        self.table = words if isinstance(words, WordTable) else WordTable.from_words(words)
+        self.words = self.table.to_words()
+        self.y_tolerance = y_tolerance
+        self.block_gap = block_gap
+
+        # Solo cajas con coordenadas reales
+        self.indices = np.flatnonzero(self.table.valid)
+        self.boxes = self.table.boxes[self.indices]
+
+        self._lines: Optional[List[List[Dict]]] = None
+        self._blocks: Optional[List[List[List[Dict]]]] = None
+        self._regions: Dict[Tuple[float, float], Dict[str, List[Dict]]] = {}
+        self._relative_grid: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def _group_lines(self) -> List[List[int]]:
+        """Barrido por y1 con centroides acumulados; devuelve posiciones en self.boxes"""
+        y1 = self.boxes[:, 1]
+        y_center = (self.boxes[:, 1] + self.boxes[:, 3]) / 2
+        order = np.argsort(y1, kind='stable')
+        # Cota inferior de (centro - y1): ninguna palabra futura tiene centro < y1_actual + min_offset
+        min_offset = float(np.min(y_center - y1))
+        tolerance = self.y_tolerance
+
+        members: List[List[int]] = []
+        sums: List[float] = []
+        active: List[int] = []
+
+        for pos in order.tolist():
+            center = float(y_center[pos])
+            # Holgura mínima para que el redondeo no retire una línea en el borde exacto de la tolerancia
+            floor = float(y1[pos]) + min_offset - tolerance - 1e-9
+            active = [line for line in active if sums[line] / len(members[line]) >= floor]
+
+            for line in active:
+                if abs(center - sums[line] / len(members[line])) <= tolerance:
+                    members[line].append(pos)
+                    sums[line] += center
+                    break
+            else:
+                active.append(len(members))
+                members.append([pos])
+                sums.append(center)
+
+        return members
+
+    @property
+    def lines(self) -> List[List[Dict]]:
+        """Líneas ordenadas de arriba a abajo (y1 mínimo) y palabras de izquierda a derecha (x1)"""
+        if self._lines is None:
+            if not len(self.indices):
+                self._lines = []
+            else:
+                x1 = self.boxes[:, 0]
+                y1 = self.boxes[:, 1]
+                grouped = self._group_lines()
+                grouped.sort(key=lambda line: min(y1[pos] for pos in line))
+                words = self.words
+                indices = self.indices
+                self._lines = [
+                    [words[indices[pos]] for pos in sorted(line, key=lambda pos: x1[pos])]
+                    for line in grouped
+                ]
+        return self._lines
+
+    @property
+    def blocks(self) -> List[List[List[Dict]]]:
+        """Líneas consecutivas separadas verticalmente por <= block_gap forman un bloque"""
+        if self._blocks is None:
+            lines = self.lines
+            blocks: List[List[List[Dict]]] = []
+            if lines:
+                current_block = [lines[0]]
+                previous_bottom = max(w['coordinates'][3] for w in lines[0])
+                for line in lines[1:]:
+                    if min(w['coordinates'][1] for w in line) - previous_bottom <= self.block_gap:
+                        current_block.append(line)
+                    else:
+                        blocks.append(current_block)
+                        current_block = [line]
+                    previous_bottom = max(w['coordinates'][3] for w in line)
+                blocks.append(current_block)
+            self._blocks = blocks
+        return self._blocks
+
+    def regions(self, header_percentage: float = 0.3, footer_percentage: float = 0.2) -> Dict[str, List[Dict]]:
+        """
+        Palabras por región (header, body, footer) según su y1 dentro del alto del documento
+
+        Devuelve listas nuevas en cada llamada: el reparto cacheado no se expone a quien lo modifique.
+        """
+        key = (header_percentage, footer_percentage)
+        if key not in self._regions:
+            regions: Dict[str, List[Dict]] = {"header": [], "body": [], "footer": []}
+            labels = self.table.region_labels(header_percentage, footer_percentage).tolist()
+            words = self.words
+            names = ("header", "body", "footer")
+            for index in self.indices.tolist():
+                regions[names[labels[index]]].append(words[index])
+            self._regions[key] = regions
+        return {name: list(words) for name, words in self._regions[key].items()}
+
+    def relative_grid(self) -> Dict[str, int]:
+        """Conteo de palabras en una cuadrícula 3x3 (superior/medio/inferior x izquierda/centro/derecha)"""
+        if self._relative_grid is None:
+            if not len(self.indices):
+                self._relative_grid = {}
+            else:
+                x1, y1, x2, y2 = self.boxes.T
+                min_x, max_x = x1.min(), x2.max()
+                min_y, max_y = y1.min(), y2.max()
+                width = max_x - min_x
+                height = max_y - min_y
+                rel_x = (x1 - min_x) / width if width > 0 else np.zeros_like(x1)
+                rel_y = (y1 - min_y) / height if height > 0 else np.zeros_like(y1)
+                col = np.where(rel_x < 0.33, 0, np.where(rel_x < 0.67, 1, 2))
+                row = np.where(rel_y < 0.33, 0, np.where(rel_y < 0.67, 1, 2))
+                counts = np.bincount(row * 3 + col, minlength=9)
+                grid = {}
+                for r, y_name in enumerate(('superior', 'medio', 'inferior')):
+                    for c, x_name in enumerate(('izquierda', 'centro', 'derecha')):
+                        grid[f"{y_name}_{x_name}"] = int(counts[r * 3 + c])
+                self._relative_grid = grid
+        return self._relative_grid
+
+
 def get_logical_lines(words_with_coordinates: List[Dict], geometry_config: Dict) -> List[List[Dict]]:
     """
     Agrupa palabras en líneas lógicas basadas en coordenadas geométricas
     
+    Usa el mismo constructor de líneas (LineLayout) que la lógica de oro; las palabras sin
+    coordenadas válidas ([0, 0, 0, 0]) no forman parte de ninguna línea.
+    
     Args:
         words_with_coordinates: Lista de palabras con coordenadas y texto
         geometry_config: Configuración de tolerancias geométricas
@@ -30,43 +184,8 @@ def get_logical_lines(words_with_coordinates: List[Dict], geometry_config: Dict)
             
         # Obtener tolerancias de configuración
         y_tolerance = geometry_config.get('y_tolerance', 15)
-        x_spacing_threshold = geometry_config.get('x_spacing_threshold', 100)
-        
-        # Ordenar palabras por coordenada Y primero, luego por X
-        sorted_words = sorted(words_with_coordinates, key=lambda w: (
-            w.get('coordinates', [0, 0, 0, 0])[1],  # y1
-            w.get('coordinates', [0, 0, 0, 0])[0]   # x1
-        ))
-        
-        logical_lines = []
-        current_line = []
-        current_y = None
-        
-        for word in sorted_words:
-            coords = word.get('coordinates', [0, 0, 0, 0])
-            if len(coords) < 4:
-                continue
-                
-            word_y = coords[1]  # y1
-            
-            # Si es la primera palabra o está en la misma línea Y
-            if current_y is None or abs(word_y - current_y) <= y_tolerance:
-                current_line.append(word)
-                current_y = word_y if current_y is None else current_y
-            else:
-                # Nueva línea lógica
-                if current_line:
-                    # Ordenar palabras en la línea por X
-                    current_line.sort(key=lambda w: w.get('coordinates', [0, 0, 0, 0])[0])
-                    logical_lines.append(current_line)
-                
-                current_line = [word]
-                current_y = word_y
         
-        # Agregar la última línea
-        if current_line:
-            current_line.sort(key=lambda w: w.get('coordinates', [0, 0, 0, 0])[0])
-            logical_lines.append(current_line)
+        logical_lines = LineLayout(words_with_coordinates, y_tolerance).lines
         
         logger.debug(f"Generadas {len(logical_lines)} líneas lógicas de {len(words_with_coordinates)} palabras")
         return logical_lines
@@ -76,8 +195,26 @@ def get_logical_lines(words_with_coordinates: List[Dict], geometry_config: Dict)
         return []
 
 
+def _words_within_radius(logical_lines: List[List[Dict]], center_x: float, center_y: float,
+                         radius: float) -> List[Tuple[Dict, Tuple[float, float]]]:
+    """Recorrido lineal de las líneas: (palabra, centro) a distancia <= radius"""
+    candidates = []
+    for line in logical_lines:
+        for word in line:
+            coords = word.get('coordinates', [0, 0, 0, 0])
+            if len(coords) < 4:
+                continue
+            word_center_x = (coords[0] + coords[2]) / 2
+            word_center_y = (coords[1] + coords[3]) / 2
+            distance = math.sqrt((word_center_x - center_x)**2 + (word_center_y - center_y)**2)
+            if distance <= radius:
+                candidates.append((word, (word_center_x, word_center_y)))
+    return candidates
+
+
 def find_value_spatially(logical_lines: List[List[Dict]], keyword_geometry: List[float], 
-                        spatial_config: Dict, geometry_config: Dict) -> Optional[str]:
+                        spatial_config: Dict, geometry_config: Dict,
+                        spatial_index: Optional['SpatialIndex'] = None) -> Optional[str]:
     """
     Busca un valor espacialmente relacionado con una palabra clave
     
@@ -86,6 +223,8 @@ def find_value_spatially(logical_lines: List[List[Dict]], keyword_geometry: List
         keyword_geometry: Coordenadas de la palabra clave [x1, y1, x2, y2]
         spatial_config: Configuración de búsqueda espacial
         geometry_config: Configuración geométrica general
+        spatial_index: SpatialIndex (anchor='center') sobre las líneas aplanadas en orden;
+            si se omite se recorren todas las palabras
         
     Returns:
         Valor encontrado o None
@@ -103,51 +242,44 @@ def find_value_spatially(logical_lines: List[List[Dict]], keyword_geometry: List
         keyword_center_x = (keyword_x1 + keyword_x2) / 2
         keyword_center_y = (keyword_y1 + keyword_y2) / 2
         
+        if spatial_index is not None:
+            # Solo palabras dentro del radio, en el mismo orden que el recorrido por líneas
+            candidates = [
+                (spatial_index.words[i], spatial_index.points[i])
+                for i in spatial_index.within_radius(keyword_center_x, keyword_center_y, search_radius)
+            ]
+        else:
+            candidates = _words_within_radius(logical_lines, keyword_center_x, keyword_center_y, search_radius)
+        
         # Buscar en líneas lógicas
-        for line in logical_lines:
-            for word in line:
-                coords = word.get('coordinates', [0, 0, 0, 0])
-                if len(coords) < 4:
+        for word, (word_center_x, word_center_y) in candidates:
+            # Verificar dirección de búsqueda
+            if search_direction == 'horizontal_right':
+                if word_center_x <= keyword_center_x:
                     continue
-                    
-                word_x1, word_y1, word_x2, word_y2 = coords
-                word_center_x = (word_x1 + word_x2) / 2
-                word_center_y = (word_y1 + word_y2) / 2
-                
-                # Calcular distancia
-                distance = math.sqrt((word_center_x - keyword_center_x)**2 + 
-                                   (word_center_y - keyword_center_y)**2)
-                
-                if distance > search_radius:
+            elif search_direction == 'horizontal_left':
+                if word_center_x >= keyword_center_x:
                     continue
-                
-                # Verificar dirección de búsqueda
-                if search_direction == 'horizontal_right':
-                    if word_center_x <= keyword_center_x:
-                        continue
-                elif search_direction == 'horizontal_left':
-                    if word_center_x >= keyword_center_x:
-                        continue
-                elif search_direction == 'vertical_below':
-                    if word_center_y <= keyword_center_y:
-                        continue
-                elif search_direction == 'vertical_above':
-                    if word_center_y >= keyword_center_y:
-                        continue
-                
-                # Verificar patrones de valor
-                word_text = word.get('text', word.get('texto', ''))
-                if not word_text:
+            elif search_direction == 'vertical_below':
+                if word_center_y <= keyword_center_y:
                     continue
-                
-                # Si no hay patrones específicos, devolver el primer texto encontrado
-                if not value_patterns:
+            elif search_direction == 'vertical_above':
+                if word_center_y >= keyword_center_y:
+                    continue
+            
+            # Verificar patrones de valor
+            word_text = word.get('text', word.get('texto', ''))
+            if not word_text:
+                continue
+            
+            # Si no hay patrones específicos, devolver el primer texto encontrado
+            if not value_patterns:
+                return word_text.strip()
+            
+            # Verificar contra patrones
+            for pattern in value_patterns:
+                if re.search(pattern, word_text):
                     return word_text.strip()
-                
-                # Verificar contra patrones
-                for pattern in value_patterns:
-                    if re.search(pattern, word_text):
-                        return word_text.strip()
         
         return None
         
@@ -171,19 +303,25 @@ def calculate_spatial_distance(point1: Tuple[float, float], point2: Tuple[float,
 
 
 def find_words_in_region(words_with_coordinates: List[Dict], 
-                        region: Tuple[float, float, float, float]) -> List[Dict]:
+                        region: Tuple[float, float, float, float],
+                        spatial_index: Optional['SpatialIndex'] = None) -> List[Dict]:
     """
     Encuentra palabras dentro de una región específica
     
     Args:
         words_with_coordinates: Lista de palabras con coordenadas
         region: Región de búsqueda (x1, y1, x2, y2)
+        spatial_index: SpatialIndex (anchor='center') sobre words_with_coordinates, opcional
         
     Returns:
         Lista de palabras dentro de la región
     """
     try:
         region_x1, region_y1, region_x2, region_y2 = region
+        
+        if spatial_index is not None:
+            return [words_with_coordinates[i]
+                    for i in spatial_index.in_box(region_x1, region_y1, region_x2, region_y2)]
         words_in_region = []
         
         for word in words_with_coordinates:
@@ -269,6 +407,142 @@ def group_words_by_proximity(words_with_coordinates: List[Dict],
         return []
 
 
+class SpatialIndex:
+    """
+    Índice espacial en rejilla uniforme sobre las cajas de las palabras de un recibo
+
+    Se construye una vez por lista de palabras y responde consultas de ventana, radio, región
+    y vecino más cercano visitando solo las celdas que tocan la consulta (O(1 + k) esperado)
+    en lugar de recorrer todas las palabras. Los resultados son índices de la lista original
+    en orden ascendente, de modo que los desempates coinciden con un recorrido lineal.
+
+    Args:
+        words: Lista de palabras con 'coordinates' [x1, y1, x2, y2]
+        anchor: 'center' (centro de la caja) o 'origin' (esquina superior izquierda x1, y1)
+        cell_size: Tamaño de celda; por defecto se ajusta para ~1 palabra por celda
+    """
+
+    def __init__(self, words: List[Dict], anchor: str = 'center', cell_size: Optional[float] = None):
+        self.words = words
+        self.anchor = anchor
+        self.points: Dict[int, Tuple[float, float]] = {}
+
+        min_coords = 2 if anchor == 'origin' else 4
+        for i, word in enumerate(words):
+            coords = word.get('coordinates', [0, 0, 0, 0])
+            if not coords or len(coords) < min_coords:
+                continue
+            if anchor == 'origin':
+                self.points[i] = (coords[0], coords[1])
+            else:
+                self.points[i] = ((coords[0] + coords[2]) / 2, (coords[1] + coords[3]) / 2)
+
+        if cell_size is None:
+            cell_size = self._auto_cell_size()
+        self.cell_size = cell_size if cell_size and cell_size > 0 else 1.0
+
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        for i, (x, y) in self.points.items():
+            self.cells.setdefault(self._cell(x, y), []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _auto_cell_size(self) -> float:
+        if not self.points:
+            return 1.0
+        xs = [p[0] for p in self.points.values()]
+        ys = [p[1] for p in self.points.values()]
+        extent = max(max(xs) - min(xs), max(ys) - min(ys))
+        return extent / math.sqrt(len(self.points)) if extent > 0 else 1.0
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def _candidates_in_box(self, x_min: float, y_min: float, x_max: float, y_max: float) -> List[int]:
+        """Índices de las celdas que tocan la caja (superconjunto del resultado)"""
+        cx_min, cy_min = self._cell(x_min, y_min)
+        cx_max, cy_max = self._cell(x_max, y_max)
+        candidates = []
+        if (cx_max - cx_min + 1) * (cy_max - cy_min + 1) > len(self.cells):
+            # Caja mayor que la rejilla ocupada: recorrer solo celdas existentes
+            for (cx, cy), indices in self.cells.items():
+                if cx_min <= cx <= cx_max and cy_min <= cy <= cy_max:
+                    candidates.extend(indices)
+        else:
+            for cx in range(cx_min, cx_max + 1):
+                for cy in range(cy_min, cy_max + 1):
+                    indices = self.cells.get((cx, cy))
+                    if indices:
+                        candidates.extend(indices)
+        return candidates
+
+    def in_box(self, x_min: float, y_min: float, x_max: float, y_max: float) -> List[int]:
+        """Índices cuyo punto ancla está dentro de la caja (bordes incluidos)"""
+        points = self.points
+        return sorted(
+            i for i in self._candidates_in_box(x_min, y_min, x_max, y_max)
+            if x_min <= points[i][0] <= x_max and y_min <= points[i][1] <= y_max
+        )
+
+    def within_manhattan(self, x: float, y: float, radius: float) -> List[int]:
+        """Índices con |dx| + |dy| <= radius respecto a (x, y)"""
+        points = self.points
+        return sorted(
+            i for i in self._candidates_in_box(x - radius, y - radius, x + radius, y + radius)
+            if abs(points[i][0] - x) + abs(points[i][1] - y) <= radius
+        )
+
+    def within_radius(self, x: float, y: float, radius: float) -> List[int]:
+        """Índices a distancia euclidiana <= radius de (x, y)"""
+        points = self.points
+        return sorted(
+            i for i in self._candidates_in_box(x - radius, y - radius, x + radius, y + radius)
+            if math.sqrt((points[i][0] - x)**2 + (points[i][1] - y)**2) <= radius
+        )
+
+    def nearest(self, x: float, y: float, accept=None, exclude: Optional[int] = None) -> Optional[int]:
+        """
+        Índice más cercano (euclidiano) a (x, y) que cumple accept(i); en empate gana el menor índice
+
+        Recorre anillos de celdas crecientes y se detiene cuando ningún anillo restante
+        puede contener un punto más cercano que el mejor encontrado.
+        """
+        if not self.cells:
+            return None
+        points = self.points
+        cx0, cy0 = self._cell(x, y)
+        keys = self.cells.keys()
+        max_ring = max(max(abs(cx - cx0), abs(cy - cy0)) for cx, cy in keys)
+        best_index = None
+        best_distance = float('inf')
+
+        for ring in range(max_ring + 1):
+            # Los puntos del anillo k están al menos a (k - 1) celdas de distancia
+            if best_index is not None and (ring - 1) * self.cell_size > best_distance:
+                break
+            if ring == 0:
+                ring_cells = [(cx0, cy0)]
+            else:
+                ring_cells = [(cx0 + dx, cy0 - ring) for dx in range(-ring, ring + 1)]
+                ring_cells += [(cx0 + dx, cy0 + ring) for dx in range(-ring, ring + 1)]
+                ring_cells += [(cx0 - ring, cy0 + dy) for dy in range(-ring + 1, ring)]
+                ring_cells += [(cx0 + ring, cy0 + dy) for dy in range(-ring + 1, ring)]
+            for cell in ring_cells:
+                for i in self.cells.get(cell, ()):
+                    if i == exclude:
+                        continue
+                    px, py = points[i]
+                    distance = ((px - x) ** 2 + (py - y) ** 2) ** 0.5
+                    if distance > best_distance or (distance == best_distance and i > best_index):
+                        continue
+                    if accept is not None and not accept(i):
+                        continue
+                    best_index, best_distance = i, distance
+
+        return best_index
+
+
 class SpatialProcessor:
     """
     Clase principal para procesamiento espacial de datos OCR
@@ -296,7 +570,8 @@ class SpatialProcessor:
     def find_nearby_values(self, logical_lines: List[List[Dict]], 
                           keyword_geometry: List[float], 
                           spatial_config: Dict, 
-                          geometry_config: Dict) -> Optional[str]:
+                          geometry_config: Dict,
+                          spatial_index: Optional[SpatialIndex] = None) -> Optional[str]:
         """
         Encuentra valores cercanos a una palabra clave usando búsqueda espacial
         
@@ -305,12 +580,13 @@ class SpatialProcessor:
             keyword_geometry: Coordenadas de la palabra clave
             spatial_config: Configuración de búsqueda espacial
             geometry_config: Configuración de geometría
+            spatial_index: Índice espacial precalculado sobre las líneas, opcional
             
         Returns:
             Valor encontrado o None
         """
         return find_value_spatially(logical_lines, keyword_geometry, 
-                                   spatial_config, geometry_config)
+                                   spatial_config, geometry_config, spatial_index)
     
     def calculate_distance(self, point1: Tuple[float, float], 
                           point2: Tuple[float, float]) -> float:
@@ -327,18 +603,20 @@ class SpatialProcessor:
         return calculate_spatial_distance(point1, point2)
     
     def find_words_in_region(self, words_with_coordinates: List[Dict], 
-                           region: Tuple[float, float, float, float]) -> List[Dict]:
+                           region: Tuple[float, float, float, float],
+                           spatial_index: Optional[SpatialIndex] = None) -> List[Dict]:
         """
         Encuentra palabras en una región específica
         
         Args:
             words_with_coordinates: Lista de palabras con coordenadas
             region: Región de búsqueda (x1, y1, x2, y2)
+            spatial_index: Índice espacial precalculado sobre las palabras, opcional
             
         Returns:
             Lista de palabras en la región
         """
-        return find_words_in_region(words_with_coordinates, region)
+        return find_words_in_region(words_with_coordinates, region, spatial_index)
     
     def group_by_proximity(self, words_with_coordinates: List[Dict], 
                           proximity_threshold: float = 50) -> List[List[Dict]]:
@@ -269,6 +269,16 @@ window.OCRSystem = window.OCRSystem || {};
         }
     }
 
+    /**
+     * Resumen de un job de lote finalizado a partir de su estado (batch_status no incluye message)
+     */
+    function describeBatchResult(result) {
+        const processed = result.processed_count || 0;
+        const errors = result.error_count || 0;
+        const summary = `${processed} de ${result.total_files || 0} archivos procesados`;
+        return errors ? `${summary}, ${errors} con error` : summary;
+    }
+
     /**
      * Manejar procesamiento de lote
      */
@@ -295,7 +305,10 @@ window.OCRSystem = window.OCRSystem || {};
             
             if (result && result.status === 'exitoso') {
                 systemState.currentBatchId = result.request_id;
-                showNotification(`Lote procesado exitosamente: ${result.message}`, 'success');
+                if (modules.resultsViewer) {
+                    modules.resultsViewer.currentBatch = result.request_id;
+                }
+                showNotification(`Lote procesado exitosamente: ${describeBatchResult(result)}`, 'success');
                 
                 // Cambiar a la pestaña de resultados
                 const resultsTab = document.querySelector('#results-tab');
@@ -308,7 +321,9 @@ window.OCRSystem = window.OCRSystem || {};
                     setTimeout(() => modules.resultsViewer.refresh(), 1000);
                 }
             } else {
-                throw new Error(result?.message || 'Error desconocido en el procesamiento');
+                throw new Error(result?.message || (result?.total_files !== undefined
+                    ? `Lote fallido: ${describeBatchResult(result)}`
+                    : 'Error desconocido en el procesamiento'));
             }
             
         } catch (error) {
@@ -352,7 +367,7 @@ window.OCRSystem = window.OCRSystem || {};
             showNotification('Generando archivo de resultados...', 'info');
             
             if (modules.apiClient) {
-                const results = await modules.apiClient.extractResults();
+                const results = await modules.apiClient.extractResults(systemState.currentBatchId);
                 
                 // Crear y descargar archivo JSON
                 const blob = new Blob([JSON.stringify(results, null, 2)], {
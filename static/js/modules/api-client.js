@@ -162,11 +162,18 @@ window.OCRSystem = window.OCRSystem || {};
                     throw new Error(errorData.error || `HTTP ${response.status}`);
                 }
 
-                const result = await response.json();
+                let result = await response.json();
+                
+                // El backend encola el lote y responde de inmediato: esperar al job
+                if (result.processing_status === 'pending' && result.request_id) {
+                    console.log(`📥 Lote encolado: ${result.request_id}`);
+                    result = await this.waitForBatch(result.request_id);
+                }
+                
                 console.log('✅ Lote procesado exitosamente:', result);
                 
                 // Añadir status normalizado
-                if (result.status === 'success') {
+                if (result.status === 'success' || result.status === 'completed') {
                     result.status = 'exitoso';
                 }
                 
@@ -178,6 +185,29 @@ window.OCRSystem = window.OCRSystem || {};
             }
         }
 
+        /**
+         * Consultar estado de un job de lote encolado
+         */
+        async getBatchStatus(requestId) {
+            return this.request(`/api/ocr/batch_status/${encodeURIComponent(requestId)}`);
+        }
+
+        /**
+         * Esperar a que un job de lote finalice consultando su estado
+         */
+        async waitForBatch(requestId, intervalMs = 2000) {
+            while (true) {
+                const job = await this.getBatchStatus(requestId);
+                
+                if (job.status === 'completed' || job.status === 'failed') {
+                    return job;
+                }
+                
+                console.log(`⏳ Lote ${requestId}: ${job.processed_count + job.error_count}/${job.total_files} imágenes`);
+                await new Promise(resolve => setTimeout(resolve, intervalMs));
+            }
+        }
+
         /**
          * Obtener archivos procesados
          */
@@ -186,10 +216,11 @@ window.OCRSystem = window.OCRSystem || {};
         }
 
         /**
-         * Obtener resultados consolidados
+         * Obtener resultados consolidados del lote indicado (sin lote: último lote con manifiesto)
          */
-        async extractResults() {
-            return this.request('/api/extract_results');
+        async extractResults(batchId = null) {
+            const query = batchId ? `?batch_id=${encodeURIComponent(batchId)}` : '';
+            return this.request(`/api/extract_results${query}`);
         }
 
         /**
@@ -235,7 +235,9 @@ window.OCRSystem = window.OCRSystem || {};
                     path: '/api/extract_results',
                     title: 'Extraer Resultados Consolidados',
                     description: 'Obtiene todos los resultados procesados en formato JSON consolidado.',
-                    parameters: [],
+                    parameters: [
+                        { name: 'batch_id', type: 'string', required: false, description: 'request_id devuelto por process_batch (sin él: último lote con manifiesto)' }
+                    ],
                     example: this.generateCurlExample('GET', '/api/extract_results'),
                     response: {
                         status: 200,
@@ -91,9 +91,10 @@ window.OCRSystem = window.OCRSystem || {};
         /**
          * Cargar resultados desde el API
          */
-        async loadResults() {
+        async loadResults(batchId = this.currentBatch) {
             try {
-                const data = await this.apiClient.extractResults();
+                // El lote viaja en la petición: con varios workers el servidor no sabe cuál es el de este cliente
+                const data = await this.apiClient.extractResults(batchId);
                 
                 if (data && data.archivos_procesados) {
                     // FIX: ORDENAMIENTO POR FECHA DE PROCESAMIENTO (MAYOR A MENOR)
@@ -236,13 +237,11 @@ window.OCRSystem = window.OCRSystem || {};
             const batchId = this.filters.batch;
             
             if (batchId === 'current') {
-                // Cargar último lote
+                // Lote procesado por este cliente
                 await this.loadResults();
             } else {
-                // Cargar lote específico (implementar según necesidad)
                 console.log(`📋 Cargando lote específico: ${batchId}`);
-                // Por ahora, usar los mismos resultados
-                await this.loadResults();
+                await this.loadResults(batchId === 'all' ? this.currentBatch : batchId);
             }
             
             this.applyFilters();
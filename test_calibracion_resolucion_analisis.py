@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Calibración de la resolución de análisis del validador
+Comprueba sobre test_images_200 que las decisiones de ValidadorOCR con la copia reducida
+(VALIDATION_CONFIG['analysis_max_dimension']) coinciden con las de resolución completa
+"""
+
+import sys
+import time
+import logging
+from pathlib import Path
+
+import cv2
+
+import config
+from image_features import ImageFeatures
+from validador_ocr import ValidadorOCR
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TEST_IMAGES_DIR = Path("test_images_200")
+
+# Decisiones que consumen la mejora, el OCR y la puntuación final
+DECISIONES = {
+    'tipo_imagen': lambda d: d['deteccion_inteligente']['tipo_imagen'],
+    'recomendaciones': lambda d: d['recomendaciones'],
+    'calificacion_ruido': lambda d: d['ruido_artefactos']['calificacion_ruido'],
+    'sesgo_estimado': lambda d: d['geometria_orientacion']['sesgo_estimado'],
+    'requiere_deskew': lambda d: d['geometria_orientacion']['requiere_deskew'],
+    'orientacion_correcta': lambda d: d['geometria_orientacion']['orientacion_correcta'],
+    'puntuacion_general': lambda d: d['puntuacion_general']
+}
+
+
+def _diagnosticar(validador, imagenes):
+    inicio = time.time()
+    diagnosticos = [
+        validador.analizar_imagen(str(ruta), image_cv, ImageFeatures(image_cv))
+        for ruta, image_cv in imagenes
+    ]
+    return diagnosticos, time.time() - inicio
+
+
+def test_calibracion_resolucion_analisis():
+    """Compara las decisiones a resolución completa y a resolución de análisis"""
+    lado_maximo = config.VALIDATION_CONFIG.get('analysis_max_dimension', 0)
+    imagenes = [(ruta, cv2.imread(str(ruta))) for ruta in sorted(TEST_IMAGES_DIR.glob('*.png'))]
+    imagenes = [(ruta, image_cv) for ruta, image_cv in imagenes if image_cv is not None]
+    if not imagenes:
+        logger.warning(f"⚠️ No hay imágenes en {TEST_IMAGES_DIR}. Saltando calibración.")
+        return True
+
+    validador_completo = ValidadorOCR()
+    validador_completo.resolucion_analisis = 0
+    validador_reducido = ValidadorOCR()
+    validador_reducido.resolucion_analisis = lado_maximo
+
+    completos, tiempo_completo = _diagnosticar(validador_completo, imagenes)
+    reducidos, tiempo_reducido = _diagnosticar(validador_reducido, imagenes)
+
+    diferencias = []
+    for (ruta, _), completo, reducido in zip(imagenes, completos, reducidos):
+        if 'error' in completo or 'error' in reducido:
+            if ('error' in completo) != ('error' in reducido):
+                diferencias.append((ruta.name, 'error', completo.get('error'), reducido.get('error')))
+            continue
+        for nombre, decision in DECISIONES.items():
+            if decision(completo) != decision(reducido):
+                diferencias.append((ruta.name, nombre, decision(completo), decision(reducido)))
+
+    logger.info(f"📊 {len(imagenes)} imágenes - resolución completa: {tiempo_completo:.2f}s, "
+                f"análisis a {lado_maximo}px: {tiempo_reducido:.2f}s")
+    for nombre_imagen, nombre, valor_completo, valor_reducido in diferencias:
+        logger.error(f"❌ {nombre_imagen}: {nombre} {valor_completo!r} != {valor_reducido!r}")
+
+    if diferencias:
+        return False
+    logger.info("✅ Decisiones idénticas a las de resolución completa")
+    return True
+
+
+if __name__ == "__main__":
+    success = test_calibracion_resolucion_analisis()
+    sys.exit(0 if success else 1)
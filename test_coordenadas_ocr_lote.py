@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Coordenadas y campos del OCR individual frente al OCR por lotes
+Entrega el mismo resultado OnnxTR (recibo de ejemplo con geometrías normalizadas 0..1) a extraer_texto y a
+extraer_texto_batch y comprueba que ambas rutas devuelven las mismas cajas en píxeles y los mismos campos
+extraídos, y que los campos de extraer_texto no cambian respecto al mismo recibo sin coordenadas (como
+llegaban las palabras antes del exportador en píxeles)
+"""
+
+import sys
+import logging
+
+import numpy as np
+from onnxtr.io.elements import Block, Document, Line, Page, Word
+
+from aplicador_ocr import AplicadorOCR
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ALTO, ANCHO = 1280, 720
+
+# Líneas del recibo: (y_min, [(texto, x_min, x_max), ...]) en fracciones de la página
+LINEAS_RECIBO = [
+    (0.08, [('Banco', 0.30, 0.45), ('Mercantil', 0.47, 0.70)]),
+    (0.20, [('Pago', 0.10, 0.20), ('Movil', 0.22, 0.33), ('exitoso', 0.35, 0.50)]),
+    (0.30, [('Monto:', 0.10, 0.22), ('Bs', 0.60, 0.66), ('1.250,00', 0.68, 0.88)]),
+    (0.38, [('Fecha:', 0.10, 0.22), ('20/06/2025', 0.60, 0.88)]),
+    (0.46, [('Referencia:', 0.10, 0.32), ('000123456789', 0.55, 0.90)]),
+    (0.54, [('Telf:', 0.10, 0.28), ('04141234567', 0.58, 0.88)]),
+    (0.62, [('Cedula:', 0.10, 0.24), ('V-12345678', 0.60, 0.86)]),
+    (0.70, [('Banco', 0.10, 0.22), ('Destino', 0.24, 0.40), ('0105', 0.70, 0.80)])
+]
+
+
+def _documento_recibo(paginas=1, con_coordenadas=True):
+    """Resultado OnnxTR del recibo de ejemplo, una página por imagen"""
+    def geometria(x_min, y_min, x_max):
+        return ((x_min, y_min), (x_max, y_min + 0.03)) if con_coordenadas else None
+
+    # Sin geometría de palabras, líneas y bloques necesitan una caja explícita
+    caja_contenedor = None if con_coordenadas else ((0.0, 0.0), (1.0, 1.0))
+
+    def pagina(indice):
+        lineas = [
+            Line([
+                Word(texto, 0.95, geometria(x_min, y_min, x_max), 0.9, {'value': 0, 'confidence': None})
+                for texto, x_min, x_max in palabras
+            ], caja_contenedor)
+            for y_min, palabras in LINEAS_RECIBO
+        ]
+        bloque = Block(lineas, [], caja_contenedor)
+        return Page(np.zeros((ALTO, ANCHO, 3), dtype=np.uint8), [bloque], indice, (ALTO, ANCHO))
+    return Document([pagina(i) for i in range(paginas)])
+
+
+def _aplicador_con_predictor_fijo(con_coordenadas=True):
+    """AplicadorOCR cuyo predictor devuelve siempre el recibo de ejemplo (sin modelos ni caché)"""
+    aplicador = AplicadorOCR()
+    aplicador._get_predictor = lambda profile_config=None: (
+        lambda paginas: _documento_recibo(len(paginas), con_coordenadas)
+    )
+    aplicador._get_image_hash = lambda image_path, image_array=None: None
+    return aplicador
+
+
+def test_coordenadas_ocr_lote():
+    """Compara coordenadas y campos extraídos de la ruta individual y la ruta por lotes"""
+    imagen = np.full((ALTO, ANCHO, 3), 255, dtype=np.uint8)
+    modo = 'ultra_rapido'
+
+    aplicador = _aplicador_con_predictor_fijo()
+    individual = aplicador.extraer_texto(None, config_mode=modo, image_array=imagen)
+    lote = _aplicador_con_predictor_fijo().extraer_texto_batch([imagen, imagen], config_mode=modo)
+    sin_coordenadas = _aplicador_con_predictor_fijo(con_coordenadas=False).extraer_texto(
+        None, config_mode=modo, image_array=imagen
+    )
+
+    for nombre, resultado in (('individual', individual), ('sin coordenadas', sin_coordenadas)):
+        if 'error' in resultado:
+            logger.error(f"❌ Error en la ruta {nombre}: {resultado['error']}")
+            return False
+
+    cajas_individual = [palabra['coordinates'] for palabra in individual['word_data_granular']]
+    if not cajas_individual or max(max(caja) for caja in cajas_individual) <= 1:
+        logger.error("❌ La ruta individual no entrega coordenadas en píxeles")
+        return False
+
+    # Reglas espaciales (umbrales en píxeles) sobre las palabras granulares de la ruta individual
+    texto_estructurado = individual['structured_text_ocr']
+    campos_reglas = aplicador._extract_fields_with_positioning_configurable(
+        individual['word_data_granular'], texto_estructurado
+    )
+
+    exito = True
+    if individual['extracted_fields'] != sin_coordenadas['extracted_fields']:
+        logger.error(f"❌ Campos con coordenadas {individual['extracted_fields']} != "
+                     f"sin coordenadas {sin_coordenadas['extracted_fields']}")
+        exito = False
+
+    for indice, resultado in enumerate(lote):
+        if resultado.get('processing_status') != 'success':
+            logger.error(f"❌ Imagen {indice} del lote con error: {resultado.get('error')}")
+            exito = False
+            continue
+
+        cajas_lote = [palabra['coordinates'] for palabra in resultado['word_data']]
+        if cajas_lote != cajas_individual:
+            logger.error(f"❌ Imagen {indice}: coordenadas del lote distintas de las individuales")
+            exito = False
+
+        if resultado['extracted_fields'] != individual['extracted_fields']:
+            logger.error(f"❌ Imagen {indice}: campos {resultado['extracted_fields']} != {individual['extracted_fields']}")
+            exito = False
+
+        campos_reglas_lote = aplicador._extract_fields_with_positioning_configurable(
+            resultado['word_data'], texto_estructurado
+        )
+        if campos_reglas_lote != campos_reglas:
+            logger.error(f"❌ Imagen {indice}: reglas espaciales {campos_reglas_lote} != {campos_reglas}")
+            exito = False
+
+    campos_encontrados = {campo: valor for campo, valor in campos_reglas.items() if valor}
+    logger.info(f"📊 {len(cajas_individual)} palabras, campos de las reglas espaciales: {campos_encontrados}")
+    if not campos_encontrados:
+        logger.error("❌ Las reglas espaciales no extrajeron ningún campo: la comparación no es significativa")
+        return False
+
+    if exito:
+        logger.info("✅ Coordenadas en píxeles y campos extraídos idénticos en ambas rutas")
+    return exito
+
+
+if __name__ == "__main__":
+    success = test_coordenadas_ocr_lote()
+    sys.exit(0 if success else 1)
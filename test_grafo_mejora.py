@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Fusión de convoluciones del grafo de mejora
+Comprueba que GrafoMejora solo funde kernels que no saturan y que el resultado fundido coincide con la
+ejecución secuencial de filter2D (como mucho 1 nivel de gris por el redondeo intermedio que se omite)
+"""
+
+import sys
+import logging
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from grafo_mejora import GrafoMejora, componer_kernels, fusionable
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TEST_IMAGES_DIR = Path("test_images_200")
+
+KERNEL_NITIDEZ = np.array([[-0.1, -0.1, -0.1],
+                           [-0.1,  1.8, -0.1],
+                           [-0.1, -0.1, -0.1]])
+KERNEL_GAUSSIANO = cv2.getGaussianKernel(3, 0) @ cv2.getGaussianKernel(3, 0).T
+KERNEL_CAJA = np.full((5, 5), 1 / 25)
+
+
+def _imagenes():
+    """Imágenes de prueba en gris más una imagen aleatoria (bordes y saturación garantizados)"""
+    imagenes = [np.random.default_rng(0).integers(0, 256, (240, 317), dtype=np.uint8)]
+    for ruta in sorted(TEST_IMAGES_DIR.glob('*.png'))[:20]:
+        imagen = cv2.imread(str(ruta), cv2.IMREAD_GRAYSCALE)
+        if imagen is not None:
+            imagenes.append(imagen)
+    return imagenes
+
+
+def _secuencial(imagen, kernels):
+    for kernel in kernels:
+        imagen = cv2.filter2D(imagen, -1, kernel)
+    return imagen
+
+
+def test_grafo_mejora():
+    """Compara la cadena fundida con la secuencial y verifica que el kernel de nitidez no se funde"""
+    exito = True
+
+    if not (fusionable(KERNEL_GAUSSIANO) and fusionable(KERNEL_CAJA)) or fusionable(KERNEL_NITIDEZ):
+        logger.error("❌ Clasificación de kernels fusionables incorrecta")
+        return False
+
+    grafo_fundido = GrafoMejora().convolucion('gauss', KERNEL_GAUSSIANO).convolucion('caja', KERNEL_CAJA)
+    grafo_nitidez = GrafoMejora().convolucion('nitidez', KERNEL_NITIDEZ).convolucion('gauss', KERNEL_GAUSSIANO)
+    if len(grafo_fundido.fusionar()) != 1 or len(grafo_nitidez.fusionar()) != 2:
+        logger.error("❌ Etapas inesperadas tras fusionar")
+        return False
+
+    diferencia_maxima = 0
+    diferencia_nitidez_ingenua = 0
+    for imagen in _imagenes():
+        original = imagen.copy()
+
+        fundido, _ = grafo_fundido.ejecutar(imagen)
+        diferencia = np.abs(fundido.astype(np.int16) - _secuencial(imagen, [KERNEL_GAUSSIANO, KERNEL_CAJA])).max()
+        diferencia_maxima = max(diferencia_maxima, int(diferencia))
+
+        # Con nitidez no hay fusión: resultado idéntico byte a byte a filter2D encadenado
+        con_nitidez, _ = grafo_nitidez.ejecutar(imagen)
+        if not np.array_equal(con_nitidez, _secuencial(imagen, [KERNEL_NITIDEZ, KERNEL_GAUSSIANO])):
+            logger.error("❌ La cadena con nitidez difiere de la ejecución secuencial")
+            exito = False
+
+        # Fundirlo ignoraría la saturación intermedia del kernel de nitidez
+        ingenuo = cv2.filter2D(imagen, -1, componer_kernels(KERNEL_NITIDEZ, KERNEL_GAUSSIANO))
+        diferencia_nitidez_ingenua = max(diferencia_nitidez_ingenua, int(
+            np.abs(ingenuo.astype(np.int16) - con_nitidez).max()
+        ))
+
+        if not np.array_equal(imagen, original):
+            logger.error("❌ El grafo modificó la imagen de entrada")
+            exito = False
+
+    logger.info(f"📊 Diferencia máxima fundido vs secuencial: {diferencia_maxima} niveles; "
+                f"fusión ingenua con nitidez: {diferencia_nitidez_ingenua} niveles")
+
+    if diferencia_maxima > 1:
+        logger.error("❌ La fusión difiere más de 1 nivel de gris de la ejecución secuencial")
+        exito = False
+
+    if exito:
+        logger.info("✅ Fusión equivalente a la ejecución secuencial y nitidez ejecutada por separado")
+    return exito
+
+
+if __name__ == "__main__":
+    success = test_grafo_mejora()
+    sys.exit(0 if success else 1)
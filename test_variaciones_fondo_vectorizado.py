@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark del análisis de variaciones locales de fondo
+Compara ValidadorOCR._analizar_variaciones_locales_fondo (vectorizado con imágenes integrales) con el bucle
+original por ventanas sobre test_images_200 y reporta los tiempos de ambos
+"""
+
+import sys
+import time
+import logging
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from image_features import ImageFeatures
+from validador_ocr import ValidadorOCR
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TEST_IMAGES_DIR = Path("test_images_200")
+
+# Tolerancia de media y desviación: la versión vectorizada las obtiene de sumas acumuladas en float64
+TOLERANCIA = 1e-9
+
+
+def _variaciones_por_ventanas(gray):
+    """Bucle original: ventanas de 50 px con paso 25, estadísticas e histograma por ventana"""
+    h, w = gray.shape
+    ventana = 50
+
+    variaciones = []
+    fondos_detectados = []
+
+    for y in range(0, h - ventana, ventana // 2):
+        for x in range(0, w - ventana, ventana // 2):
+            region = gray[y:y+ventana, x:x+ventana]
+            pico_principal = int(np.argmax(cv2.calcHist([region], [0], None, [256], [0, 256]).flatten()))
+            variaciones.append({
+                'posicion': (int(x), int(y)),
+                'media_local': float(np.mean(region)),
+                'std_local': float(np.std(region)),
+                'pico_fondo': pico_principal
+            })
+            fondos_detectados.append(pico_principal)
+
+    fondos_unicos = np.unique(fondos_detectados)
+    variacion_fondos = float(np.std(fondos_detectados))
+    fondos_heterogeneos = len(fondos_unicos) > 3 and variacion_fondos > 20
+
+    return {
+        'total_regiones_analizadas': len(variaciones),
+        'fondos_unicos_detectados': len(fondos_unicos),
+        'variacion_fondos': variacion_fondos,
+        'fondos_heterogeneos': bool(fondos_heterogeneos),
+        'rango_fondos': (int(np.min(fondos_detectados)), int(np.max(fondos_detectados))),
+        'requiere_unificacion_avanzada': bool(fondos_heterogeneos or variacion_fondos > 15),
+        'regiones_variacion': variaciones[:10]
+    }
+
+
+def _ejecutar(funcion, argumento):
+    """(resultado o excepción, segundos)"""
+    inicio = time.perf_counter()
+    try:
+        resultado = funcion(argumento)
+    except ValueError as e:
+        resultado = e
+    return resultado, time.perf_counter() - inicio
+
+
+def _diferencias(referencia, vectorizado):
+    """Claves en las que el resultado vectorizado no coincide con el bucle original"""
+    diferencias = []
+    for clave, valor in referencia.items():
+        if clave == 'regiones_variacion':
+            continue
+        if clave == 'variacion_fondos':
+            iguales = abs(valor - vectorizado[clave]) <= TOLERANCIA
+        else:
+            iguales = valor == vectorizado[clave]
+        if not iguales:
+            diferencias.append(clave)
+
+    regiones = vectorizado['regiones_variacion']
+    if len(regiones) != len(referencia['regiones_variacion']):
+        diferencias.append('regiones_variacion')
+    for region_ref, region in zip(referencia['regiones_variacion'], regiones):
+        if (region_ref['posicion'] != region['posicion'] or region_ref['pico_fondo'] != region['pico_fondo']
+                or abs(region_ref['media_local'] - region['media_local']) > TOLERANCIA
+                or abs(region_ref['std_local'] - region['std_local']) > TOLERANCIA):
+            diferencias.append('regiones_variacion')
+            break
+    return diferencias
+
+
+def test_variaciones_fondo_vectorizado():
+    """Equivalencia con el bucle por ventanas y tiempos de ambas versiones"""
+    imagenes = [(ruta.name, cv2.imread(str(ruta), cv2.IMREAD_GRAYSCALE))
+                for ruta in sorted(TEST_IMAGES_DIR.glob('*.png'))]
+    imagenes = [(nombre, gray) for nombre, gray in imagenes if gray is not None]
+    # Lado <= 50 px: no hay ninguna ventana y ambas versiones fallan igual (np.min de una lista vacía)
+    imagenes.append(('sintetica_40x300', np.full((40, 300), 200, dtype=np.uint8)))
+
+    validador = ValidadorOCR()
+    tiempo_bucle = 0.0
+    tiempo_vectorizado = 0.0
+    sin_ventanas = 0
+    errores = []
+
+    for nombre, gray in imagenes:
+        referencia, segundos_bucle = _ejecutar(_variaciones_por_ventanas, gray)
+        vectorizado, segundos_vectorizado = _ejecutar(
+            validador._analizar_variaciones_locales_fondo, ImageFeatures(gray)
+        )
+
+        if isinstance(referencia, ValueError) or isinstance(vectorizado, ValueError):
+            if not (isinstance(referencia, ValueError) and isinstance(vectorizado, ValueError)):
+                errores.append((nombre, 'solo una versión falla sin ventanas'))
+            sin_ventanas += 1
+            continue
+
+        tiempo_bucle += segundos_bucle
+        tiempo_vectorizado += segundos_vectorizado
+        for clave in _diferencias(referencia, vectorizado):
+            errores.append((nombre, clave))
+
+    comparadas = len(imagenes) - sin_ventanas
+    logger.info(f"📊 {comparadas} imágenes comparadas ({sin_ventanas} sin ventanas, mismo ValueError) - "
+                f"bucle: {tiempo_bucle:.2f}s, vectorizado: {tiempo_vectorizado:.2f}s "
+                f"({tiempo_bucle / max(tiempo_vectorizado, 1e-9):.1f}x)")
+    for nombre, clave in errores:
+        logger.error(f"❌ {nombre}: {clave} difiere del bucle original")
+
+    if errores:
+        return False
+    logger.info("✅ Resultado vectorizado idéntico al bucle por ventanas")
+    return True
+
+
+if __name__ == "__main__":
+    success = test_variaciones_fondo_vectorizado()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,147 @@
+"""
+Triaje rápido de imágenes antes de validación y mejora
+Decide en pocos milisegundos, sobre una miniatura, si un recibo es una captura móvil limpia que puede ir
+directo al OCR con sus píxeles originales, y lleva la cuenta de imágenes por ruta en el proceso.
+"""
+
+import time
+import logging
+import threading
+
+import cv2
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+RUTA_DIRECTA = 'directo_ocr'
+RUTA_COMPLETA = 'completa'
+
+
+class TriajeOCR:
+    """
+    Triaje de capturas móviles limpias
+
+    Una imagen toma la ruta directa si su miniatura es vertical, clara, con contraste, de paleta plana
+    (pocos niveles de gris concentran casi todos los píxeles) y sin ruido fino; cualquier duda la deja
+    en la ruta completa (validación + mejora).
+    """
+
+    def __init__(self, triage_config=None):
+        triage_config = triage_config or config.FAST_PATH_TRIAGE_CONFIG
+
+        self.enabled = triage_config.get('enabled', True)
+        self.config = triage_config
+        self._lock = threading.Lock()
+        self._contadores = {
+            RUTA_DIRECTA: {'imagenes': 0, 'tiempo_triaje_ms': 0.0},
+            RUTA_COMPLETA: {'imagenes': 0, 'tiempo_triaje_ms': 0.0, 'tiempo_preprocesamiento_s': 0.0}
+        }
+
+    def evaluar(self, features):
+        """
+        Decide la ruta de una imagen
+
+        Args:
+            features: ImageFeatures de la imagen original (la miniatura queda en su caché)
+
+        Returns:
+            dict: ruta, motivo, métricas de la miniatura y tiempo de triaje en ms
+        """
+        inicio = time.perf_counter()
+        if not self.enabled:
+            return {'ruta': RUTA_COMPLETA, 'motivo': 'triaje_desactivado', 'metricas': {}, 'tiempo_ms': 0.0}
+
+        alto, ancho = features.shape
+        miniatura = features.reducida(self.config.get('thumbnail_max_dimension', 256)).gray
+
+        histograma = np.bincount(miniatura.ravel(), minlength=256)
+        niveles = self.config.get('palette_levels', 8)
+        media, desviacion = cv2.meanStdDev(miniatura)
+        metricas = {
+            'relacion_aspecto': float(alto / ancho),
+            'brillo': float(media[0][0]),
+            'contraste': float(desviacion[0][0]),
+            'fraccion_paleta': float(np.partition(histograma, -niveles)[-niveles:].sum() / miniatura.size),
+            'ruido': float(cv2.absdiff(miniatura, cv2.medianBlur(miniatura, 3)).mean())
+        }
+
+        if min(alto, ancho) < self.config.get('min_dimension', 200):
+            motivo = 'imagen_pequena'
+        elif metricas['relacion_aspecto'] < self.config.get('min_aspect_ratio', 1.15):
+            motivo = 'no_vertical'
+        elif metricas['brillo'] < self.config.get('min_brightness', 80):
+            motivo = 'tema_oscuro'
+        elif metricas['contraste'] < self.config.get('min_contrast', 15):
+            motivo = 'bajo_contraste'
+        elif metricas['fraccion_paleta'] < self.config.get('min_palette_fraction', 0.75):
+            motivo = 'paleta_no_plana'
+        elif metricas['ruido'] > self.config.get('max_noise', 4.0):
+            motivo = 'ruido'
+        else:
+            motivo = 'captura_limpia'
+
+        return {
+            'ruta': RUTA_DIRECTA if motivo == 'captura_limpia' else RUTA_COMPLETA,
+            'motivo': motivo,
+            'metricas': {clave: round(valor, 3) for clave, valor in metricas.items()},
+            'tiempo_ms': round((time.perf_counter() - inicio) * 1000, 3)
+        }
+
+    def registrar(self, decision):
+        """
+        Cuenta una imagen ya procesada en su ruta
+
+        decision es el dict de evaluar(); en la ruta completa puede traer 'tiempo_preprocesamiento'
+        (segundos de validación + mejora) para estimar el ahorro de la ruta directa.
+        """
+        if not isinstance(decision, dict) or decision.get('ruta') not in self._contadores:
+            return
+        with self._lock:
+            contador = self._contadores[decision['ruta']]
+            contador['imagenes'] += 1
+            contador['tiempo_triaje_ms'] += decision.get('tiempo_ms', 0.0)
+            if decision['ruta'] == RUTA_COMPLETA:
+                contador['tiempo_preprocesamiento_s'] += decision.get('tiempo_preprocesamiento', 0.0)
+
+    def estadisticas(self):
+        """Imágenes por ruta y ahorro estimado de validación + mejora en la ruta directa"""
+        with self._lock:
+            directa = dict(self._contadores[RUTA_DIRECTA])
+            completa = dict(self._contadores[RUTA_COMPLETA])
+
+        total = directa['imagenes'] + completa['imagenes']
+        preprocesamiento_promedio = (
+            completa['tiempo_preprocesamiento_s'] / completa['imagenes'] if completa['imagenes'] else 0.0
+        )
+        return {
+            'habilitado': self.enabled,
+            'total_imagenes': total,
+            'rutas': {
+                RUTA_DIRECTA: directa['imagenes'],
+                RUTA_COMPLETA: completa['imagenes']
+            },
+            'porcentaje_directo': round(directa['imagenes'] / total * 100, 1) if total else 0.0,
+            'tiempo_triaje_promedio_ms': round(
+                (directa['tiempo_triaje_ms'] + completa['tiempo_triaje_ms']) / total, 3
+            ) if total else 0.0,
+            'tiempo_preprocesamiento_promedio_s': round(preprocesamiento_promedio, 3),
+            # Estimación: cada imagen directa habría costado el promedio de validación + mejora de la ruta completa
+            'ahorro_estimado_s': round(directa['imagenes'] * preprocesamiento_promedio, 2)
+        }
+
+
+_triaje = None
+_triaje_lock = threading.Lock()
+
+
+def get_triaje():
+    """Devuelve el triaje compartido del proceso"""
+    global _triaje
+
+    if _triaje is None:
+        with _triaje_lock:
+            if _triaje is None:
+                _triaje = TriajeOCR()
+    return _triaje
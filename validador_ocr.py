@@ -9,8 +9,9 @@ import json
 import logging
 from pathlib import Path
 from skimage import measure, filters
-from PIL import Image, ImageStat
+from PIL import Image
 import config
+from image_features import ImageFeatures
 
 # Configurar logging
 # FIX: Configuración directa para evitar problemas con tipos de datos en LOGGING_CONFIG
@@ -24,38 +25,63 @@ class ValidadorOCR:
     
     def __init__(self):
         self.thresholds = config.IMAGE_QUALITY_THRESHOLDS
+        self.resolucion_analisis = config.VALIDATION_CONFIG.get('analysis_max_dimension', 0)
         
-    def analizar_imagen(self, image_path):
+    def analizar_imagen(self, image_path, image_array=None, features=None):
         """
         Analiza una imagen y genera un diagnóstico completo
         
         Args:
             image_path: Ruta a la imagen a analizar
+            image_array: Imagen ya decodificada (BGR de OpenCV); evita volver a leerla de disco
+            features: ImageFeatures de image_array compartido con MejoradorOCR (se crea si no se entrega)
             
         Returns:
             dict: Diccionario con métricas y diagnósticos
         """
         try:
-            # Cargar imagen
-            image_cv = cv2.imread(str(image_path))
-            image_pil = Image.open(image_path)
+            # Cargar imagen (solo si el orquestador no la entregó ya decodificada)
+            image_cv = image_array if image_array is not None else cv2.imread(str(image_path))
             
             if image_cv is None:
                 raise ValueError(f"No se puede cargar la imagen: {image_path}")
             
-            # Convertir a escala de grises para análisis
-            gray = cv2.cvtColor(image_cv, cv2.COLOR_BGR2GRAY)
+            # FIX: PIL solo aporta modo/formato/bandas, que se leen de la cabecera
+            # REASON: Image.open es perezoso; los píxeles ya están decodificados en image_cv
+            # IMPACT: Una sola decodificación de la imagen por análisis
+            if image_path is not None:
+                image_pil = Image.open(image_path)
+            else:
+                image_pil = Image.fromarray(image_cv if image_cv.ndim == 2 else cv2.cvtColor(image_cv, cv2.COLOR_BGR2RGB))
+            
+            # FIX: Escala de grises, bordes, histograma y estadísticas calculados una sola vez por imagen
+            # REASON: Canny se calculaba tres veces y el histograma, la media y la desviación en varios pasos
+            # IMPACT: Cada paso lee de ImageFeatures; la mejora reutiliza el mismo objeto
+            if features is None:
+                features = ImageFeatures(image_cv)
+            
+            # FIX: Sesgo (HoughLines) y simetría (matchTemplate) se diagnostican sobre una copia reducida
+            # REASON: Son los pasos más costosos y sus decisiones coinciden con las de resolución completa
+            # IMPACT: Ruido y regiones de texto siguen a resolución completa: a escala reducida cambian
+            #         la calificación de ruido y la densidad de texto (y con ellas recomendaciones y puntuación)
+            analisis = features.reducida(self.resolucion_analisis)
             
             # Realizar todas las mediciones
-            diagnostico = {
-                'imagen_info': self._obtener_info_basica(image_pil, gray),
-                'calidad_imagen': self._analizar_calidad(gray),
-                'deteccion_texto': self._detectar_regiones_texto(gray),
-                'ruido_artefactos': self._analizar_ruido(gray),
-                'geometria_orientacion': self._analizar_geometria(gray),
-                'deteccion_inteligente': self._detectar_tipo_imagen_inteligente(gray, image_pil),  # FIX: Nueva detección inteligente
-                'recomendaciones': {}
-            }
+            with image_pil:
+                diagnostico = {
+                    'imagen_info': self._obtener_info_basica(image_pil, features),
+                    'calidad_imagen': self._analizar_calidad(features),
+                    'deteccion_texto': self._detectar_regiones_texto(features),
+                    'ruido_artefactos': self._analizar_ruido(features),
+                    'geometria_orientacion': self._analizar_geometria(features, analisis),
+                    'deteccion_inteligente': self._detectar_tipo_imagen_inteligente(features, image_pil),  # FIX: Nueva detección inteligente
+                    'recomendaciones': {},
+                    'resolucion_analisis': {
+                        'ancho': int(analisis.shape[1]),
+                        'alto': int(analisis.shape[0]),
+                        'escala': float(analisis.shape[1] / features.shape[1])
+                    }
+                }
             
             # Generar recomendaciones basadas en el análisis
             diagnostico['recomendaciones'] = self._generar_recomendaciones(diagnostico)
@@ -70,17 +96,16 @@ class ValidadorOCR:
             logger.error(f"Error en análisis de imagen: {str(e)}")
             return {'error': str(e)}
     
-    def _obtener_info_basica(self, image_pil, gray):
+    def _obtener_info_basica(self, image_pil, features):
         """Obtiene información básica de la imagen"""
-        stats = ImageStat.Stat(image_pil)
-        
+        gray = features.gray
         # FIX: Convertir todos los valores NumPy a tipos nativos de Python para serialización JSON
         # REASON: Los tipos uint8, int64, float64 de NumPy no son serializables por JSON
         # IMPACT: Permite que el diagnóstico se serialice correctamente sin errores
         # FIX: Agregar análisis de histograma para binarización ELITE
         # REASON: Necesario para determinar rangos de fondo y texto según nueva estrategia
         # IMPACT: Permite binarización optimizada con rangos precisos
-        histogram = cv2.calcHist([gray], [0], None, [256], [0, 256]).flatten()
+        histogram = features.histogram
         
         return {
             'ancho': int(gray.shape[1]),
@@ -89,28 +114,41 @@ class ValidadorOCR:
             'canales': len(image_pil.getbands()),
             'modo': image_pil.mode,
             'formato': image_pil.format if image_pil.format else 'unknown',
-            'brillo_promedio': float(np.mean(gray)),
-            'desviacion_brillo': float(np.std(gray)),
-            'rango_dinamico': float(np.max(gray) - np.min(gray)),
+            'brillo_promedio': features.mean,
+            'desviacion_brillo': features.std,
+            'rango_dinamico': features.rango_dinamico,
+            'hash_perceptual': self._calcular_hash_perceptual(gray),
             'histogram': histogram.tolist(),  # Convertir a lista para JSON
             'histogram_analysis': self._analizar_histograma_para_binarizacion(histogram),
             # FIX: Análisis de variaciones locales de fondo para unificación avanzada
             # REASON: Implementa detección de fondos heterogéneos según nuevo prompt ELITE
             # IMPACT: Permite binarización adaptativa localizada para múltiples tipos de fondo
-            'variaciones_fondo': self._analizar_variaciones_locales_fondo(gray)
+            'variaciones_fondo': self._analizar_variaciones_locales_fondo(features)
         }
     
-    def _analizar_calidad(self, gray):
+    def _calcular_hash_perceptual(self, gray, hash_size=8):
+        """
+        FIX: dHash de la imagen en escala de grises para detectar reenvíos del mismo recibo
+        REASON: Los reenvíos por WhatsApp se recodifican y nunca coinciden byte a byte
+        IMPACT: Permite buscar recibos casi idénticos en la caché OCR (distancia de Hamming)
+        """
+        small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        return f"{int(''.join('1' if b else '0' for b in bits), 2):0{hash_size * hash_size // 4}x}"
+    
+    def _analizar_calidad(self, features):
         """Analiza la calidad general de la imagen"""
+        gray = features.gray
+        
         # Calcular contraste usando desviación estándar
-        contraste = np.std(gray)
+        contraste = features.std
         
         # Detectar blur usando varianza del Laplaciano
-        blur_variance = cv2.Laplacian(gray, cv2.CV_64F).var()
+        blur_variance = features.blur_variance
         
         # Calcular histograma para analizar distribución de intensidades
-        hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
-        hist_normalized = hist.flatten() / hist.sum()
+        hist = features.histogram
+        hist_normalized = hist / hist.sum()
         
         # Entropía como medida de información
         entropy = -np.sum(hist_normalized * np.log2(hist_normalized + 1e-7))
@@ -125,15 +163,17 @@ class ValidadorOCR:
             'blur_variance': float(blur_variance),
             'entropy': float(entropy),
             'gradiente_promedio': float(gradiente_promedio),
-            'brillo_promedio': float(np.mean(gray)),
-            'uniformidad_brillo': float(np.std(gray)),
+            'brillo_promedio': features.mean,
+            'uniformidad_brillo': features.std,
             'calificacion_calidad': self._calificar_calidad(contraste, blur_variance, entropy)
         }
     
-    def _detectar_regiones_texto(self, gray):
+    def _detectar_regiones_texto(self, features):
         """Detecta y analiza regiones que podrían contener texto"""
-        # Aplicar detección de bordes para encontrar regiones con texto
-        edges = cv2.Canny(gray, 50, 150)
+        gray = features.gray
+        
+        # Bordes compartidos para encontrar regiones con texto
+        edges = features.edges
         
         # Operaciones morfológicas para conectar componentes de texto
         kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
@@ -174,10 +214,12 @@ class ValidadorOCR:
             'cobertura_texto_porcentaje': float(text_density * 100)
         }
     
-    def _analizar_ruido(self, gray):
+    def _analizar_ruido(self, features):
         """Analiza el nivel de ruido en la imagen"""
+        gray = features.gray
+        
         # Aplicar filtro Gaussiano y calcular diferencia
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        blurred = features.gaussian_blur(5)
         noise = cv2.absdiff(gray, blurred)
         
         # Calcular métricas de ruido
@@ -190,7 +232,7 @@ class ValidadorOCR:
         noise_percentage = (noisy_pixels / (gray.shape[0] * gray.shape[1])) * 100
         
         # Analizar uniformidad usando filtro de mediana
-        median_filtered = cv2.medianBlur(gray, 5)
+        median_filtered = features.median_blur(5)
         uniformity = np.mean(cv2.absdiff(gray, median_filtered))
         
         return {
@@ -201,11 +243,19 @@ class ValidadorOCR:
             'calificacion_ruido': self._calificar_ruido(noise_level, noise_percentage)
         }
     
-    def _analizar_geometria(self, gray):
-        """Analiza la geometría y orientación de la imagen"""
+    def _analizar_geometria(self, features, analisis=None):
+        """
+        Analiza la geometría y orientación de la imagen
+        
+        Hough y simetría se calculan sobre la copia de análisis; el umbral de votos de Hough se escala
+        con ella porque cuenta píxeles a lo largo de la línea.
+        """
+        analisis = analisis or features
+        gray = analisis.gray
+        escala = analisis.shape[1] / features.shape[1]
+        
         # Detectar líneas principales usando transformada de Hough
-        edges = cv2.Canny(gray, 50, 150)
-        lines = cv2.HoughLines(edges, 1, np.pi/180, threshold=100)
+        lines = cv2.HoughLines(analisis.edges, 1, np.pi/180, threshold=max(1, int(round(100 * escala))))
         
         angles = []
         if lines is not None:
@@ -238,7 +288,7 @@ class ValidadorOCR:
             'sesgo_estimado': float(estimated_skew),
             'lineas_detectadas': len(angles),
             'simetria_horizontal': float(symmetry_score),
-            'relacion_aspecto': float(gray.shape[1] / gray.shape[0]),
+            'relacion_aspecto': float(features.shape[1] / features.shape[0]),
             'requiere_deskew': bool(abs(estimated_skew) > 2),
             'orientacion_correcta': bool(abs(estimated_skew) < 5)
         }
@@ -273,14 +323,16 @@ class ValidadorOCR:
         
         return min(100, score)
     
-    def _detectar_tipo_imagen_inteligente(self, gray, image_pil):
+    def _detectar_tipo_imagen_inteligente(self, features, image_pil):
         """
         FIX: Implementa detección inteligente de tipo de imagen (screenshot vs documento escaneado)
         REASON: Necesario para aplicar rutas de procesamiento especializadas según el tipo de imagen
         IMPACT: Mejora dramática en la precisión OCR al aplicar técnicas específicas para cada tipo
         """
+        gray = features.gray
+        
         # Análisis de histograma para detectar esquema de color
-        hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
+        hist = features.histogram
         
         # Detectar si es texto claro sobre fondo oscuro
         dark_pixels = np.sum(hist[:128])  # Píxeles oscuros
@@ -323,11 +375,10 @@ class ValidadorOCR:
         
         # Análisis adicional de calidad digital vs escaneado
         # Los screenshots tienen bordes más definidos y menos ruido
-        edges = cv2.Canny(gray, 50, 150)
-        edge_density = np.sum(edges > 0) / (width * height)
+        edge_density = np.count_nonzero(features.edges) / (width * height)
         
         # Los documentos escaneados tienen más ruido y bordes menos definidos
-        noise_estimate = np.std(cv2.GaussianBlur(gray, (3, 3), 0) - gray)
+        noise_estimate = np.std(features.gaussian_blur(3) - gray)
         
         calidad_digital = edge_density > 0.02 and noise_estimate < 3
         
@@ -495,42 +546,66 @@ class ValidadorOCR:
             'bimodal': bool(len(picos) >= 2 and picos[0][1] > total_pixels * 0.1)
         }
     
-    def _analizar_variaciones_locales_fondo(self, gray):
+    def _analizar_variaciones_locales_fondo(self, features):
         """
         FIX: Analiza variaciones locales de fondo para detectar fondos heterogéneos
         REASON: Implementa nueva estrategia de unificación de fondos múltiples
         IMPACT: Permite binarización adaptativa localizada para imágenes con distintos tipos de fondo
+
+        FIX: Ventanas calculadas con operaciones de array en lugar de un bucle Python por ventana
+        REASON: Un recibo de 2000x1000 generaba miles de iteraciones con np.mean, np.std y calcHist cada una
+        IMPACT: Media y desviación de todas las ventanas salen de las imágenes integrales; el pico de cada
+                ventana 50x50 (paso 25) es el argmax de la suma de los histogramas de sus 4 celdas 25x25
         """
+        gray = features.gray
         h, w = gray.shape
         ventana = 50  # Tamaño de ventana para análisis local
+        paso = ventana // 2
+        
+        # Ventanas superpuestas: mismas posiciones que range(0, h - ventana, paso) x range(0, w - ventana, paso)
+        filas = len(range(0, h - ventana, paso))
+        columnas = len(range(0, w - ventana, paso))
+        ys = np.arange(filas) * paso
+        xs = np.arange(columnas) * paso
+        
+        # Estadísticas locales desde las imágenes integrales (sumas exactas en float64)
+        suma, suma_cuadrados = features.integrales
+        area = ventana * ventana
+        
+        def _suma_ventanas(integral):
+            return (integral[ys[:, None] + ventana, xs[None, :] + ventana] - integral[ys[:, None], xs[None, :] + ventana]
+                    - integral[ys[:, None] + ventana, xs[None, :]] + integral[ys[:, None], xs[None, :]])
+        
+        sumas = _suma_ventanas(suma)
+        medias = sumas / area
+        desviaciones = np.sqrt(np.maximum(area * _suma_ventanas(suma_cuadrados) - sumas * sumas, 0)) / area
+        
+        # Histograma de cada celda paso x paso con un único bincount (celda * 256 + intensidad)
+        if filas and columnas:
+            celdas_y, celdas_x = filas + 1, columnas + 1
+            celdas = gray[:celdas_y * paso, :celdas_x * paso].reshape(celdas_y, paso, celdas_x, paso)
+            ids_celda = (np.arange(celdas_y)[:, None, None, None] * celdas_x
+                         + np.arange(celdas_x)[None, None, :, None]) * 256
+            hist_celdas = np.bincount((celdas + ids_celda).ravel(), minlength=celdas_y * celdas_x * 256)
+            hist_celdas = hist_celdas.reshape(celdas_y, celdas_x, 256)
+            # Cada ventana cubre 2x2 celdas; argmax conserva el primer máximo como calcHist + argmax
+            hist_ventanas = hist_celdas[:-1, :-1] + hist_celdas[1:, :-1] + hist_celdas[:-1, 1:] + hist_celdas[1:, 1:]
+            picos = np.argmax(hist_ventanas, axis=2)
+        else:
+            picos = np.empty((filas, columnas), dtype=np.intp)
         
+        fondos_detectados = picos.ravel()
+        
+        # Solo se conservan las primeras 10 regiones como referencia (orden fila por fila)
         variaciones = []
-        fondos_detectados = []
-        
-        # Analizar imagen en ventanas superpuestas
-        for y in range(0, h - ventana, ventana // 2):
-            for x in range(0, w - ventana, ventana // 2):
-                # Extraer región local
-                region = gray[y:y+ventana, x:x+ventana]
-                
-                # Calcular estadísticas locales
-                media_local = float(np.mean(region))
-                std_local = float(np.std(region))
-                
-                # Calcular histograma local
-                hist_local = cv2.calcHist([region], [0], None, [256], [0, 256]).flatten()
-                
-                # Encontrar pico principal (fondo probable)
-                pico_principal = int(np.argmax(hist_local))
-                
-                variaciones.append({
-                    'posicion': (int(x), int(y)),
-                    'media_local': media_local,
-                    'std_local': std_local,
-                    'pico_fondo': pico_principal
-                })
-                
-                fondos_detectados.append(pico_principal)
+        for indice in range(min(10, fondos_detectados.size)):
+            fila, columna = divmod(indice, columnas)
+            variaciones.append({
+                'posicion': (int(xs[columna]), int(ys[fila])),
+                'media_local': float(medias[fila, columna]),
+                'std_local': float(desviaciones[fila, columna]),
+                'pico_fondo': int(picos[fila, columna])
+            })
         
         # Analizar diversidad de fondos
         fondos_unicos = np.unique(fondos_detectados)
@@ -540,13 +615,13 @@ class ValidadorOCR:
         fondos_heterogeneos = len(fondos_unicos) > 3 and variacion_fondos > 20
         
         return {
-            'total_regiones_analizadas': len(variaciones),
+            'total_regiones_analizadas': int(fondos_detectados.size),
             'fondos_unicos_detectados': len(fondos_unicos),
             'variacion_fondos': variacion_fondos,
             'fondos_heterogeneos': bool(fondos_heterogeneos),
             'rango_fondos': (int(np.min(fondos_detectados)), int(np.max(fondos_detectados))),
             'requiere_unificacion_avanzada': bool(fondos_heterogeneos or variacion_fondos > 15),
-            'regiones_variacion': variaciones[:10]  # Primeras 10 para referencia
+            'regiones_variacion': variaciones  # Primeras 10 para referencia
         }
 
 def main():
@@ -0,0 +1,206 @@
+"""
+Tabla columnar de palabras OCR de un recibo
+Guarda cajas y confianzas en arrays NumPy y los textos en una lista, de modo que estadísticas,
+filtros por coordenadas y divisiones por región se calculan de forma vectorizada en lugar de
+recorrer diccionarios palabra por palabra. El adaptador to_dicts() emite la forma JSON actual.
+"""
+
+import logging
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+COORDENADAS_VACIAS = (0, 0, 0, 0)
+
+
+def conteo_por_tramos(valores, limites: Sequence[float]) -> List[int]:
+    """
+    Conteo vectorizado de valores por tramo
+
+    Args:
+        valores: Secuencia numérica (p. ej. confianzas)
+        limites: Límites ascendentes; el tramo i es [limites[i-1], limites[i]) con extremos abiertos
+            (len(limites) + 1 tramos)
+    """
+    valores = np.asarray(valores, dtype=np.float64).reshape(-1)
+    tramos = np.searchsorted(np.asarray(limites, dtype=np.float64), valores, side='right')
+    return np.bincount(tramos, minlength=len(limites) + 1).tolist()
+
+
+def _texto(word):
+    # Acceso seguro a campos text/texto (ambas variantes conviven en el pipeline)
+    return word.get('text', word.get('texto', ''))
+
+
+def _confianza(word):
+    return word.get('confidence', word.get('confianza', 0))
+
+
+class WordTable:
+    """
+    Palabras de un recibo en formato columnar
+
+    - texts: lista de textos
+    - boxes: array (n, 4) float64 con [x1, y1, x2, y2]; [0, 0, 0, 0] cuando no hay coordenadas
+    - confidences: array (n,) float64
+    - words: diccionarios de origen (si la tabla se construyó a partir de ellos), para devolver
+      exactamente los mismos objetos en las consultas
+
+    Args:
+        texts: Textos de las palabras
+        boxes: Cajas [x1, y1, x2, y2] por palabra
+        confidences: Confianza OCR por palabra
+        words: Diccionarios de origen, opcional
+    """
+
+    __slots__ = ('texts', 'boxes', 'confidences', 'words', '_valid', '_spatial_indices')
+
+    def __init__(self, texts: Sequence[str], boxes, confidences, words: Optional[List[Dict]] = None):
+        self.texts = list(texts)
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.confidences = np.asarray(confidences, dtype=np.float64).reshape(-1)
+        self.words = words
+        self._valid = None
+        self._spatial_indices = {}
+
+    @classmethod
+    def from_words(cls, words: List[Dict]) -> 'WordTable':
+        """Construye la tabla desde la lista de diccionarios actual (text/texto, confidence/confianza)"""
+        words = words or []
+        n = len(words)
+        boxes = np.zeros((n, 4), dtype=np.float64)
+        for i, word in enumerate(words):
+            coords = word.get('coordinates')
+            if coords is not None and len(coords) >= 4:
+                boxes[i] = coords[:4]
+        return cls(
+            [_texto(word) for word in words],
+            boxes,
+            np.fromiter((_confianza(word) for word in words), dtype=np.float64, count=n),
+            words=words
+        )
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def take(self, indices) -> 'WordTable':
+        """Subtabla con las filas indicadas (en ese orden)"""
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        words = [self.words[i] for i in indices.tolist()] if self.words is not None else None
+        return WordTable([self.texts[i] for i in indices.tolist()], self.boxes[indices],
+                         self.confidences[indices], words=words)
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Máscara de palabras con coordenadas reales (distintas de [0, 0, 0, 0])"""
+        if self._valid is None:
+            self._valid = self.boxes.any(axis=1)
+        return self._valid
+
+    def all_coordinates_zero(self) -> bool:
+        """True si ninguna palabra tiene coordenadas (p. ej. resultado reconstruido desde caché)"""
+        return not self.valid.any()
+
+    def count_with_coordinates(self) -> int:
+        return int(np.count_nonzero(self.valid))
+
+    @property
+    def widths(self) -> np.ndarray:
+        return np.abs(self.boxes[:, 2] - self.boxes[:, 0])
+
+    @property
+    def heights(self) -> np.ndarray:
+        return np.abs(self.boxes[:, 3] - self.boxes[:, 1])
+
+    def dynamic_thresholds(self) -> Dict[str, float]:
+        """
+        Umbrales adaptativos de la lógica de oro a partir de alturas y anchos de las cajas
+
+        Tolerancia Y = 50% de la altura promedio + 1 desviación estándar (mínimo 5);
+        distancia entre bloques = 150% de la altura promedio (mínimo 15).
+        """
+        heights = self.heights
+        widths = self.widths
+        usable = self.valid & (heights > 0) & (widths > 0)
+        if not usable.any():
+            return {"tolerancia_y": 10, "distancia_threshold": 30}
+
+        heights = heights[usable]
+        avg_height = float(heights.mean())
+        std_height = float(heights.std(ddof=1)) if heights.size > 1 else avg_height * 0.2
+        avg_width = float(widths[usable].mean())
+
+        return {
+            "tolerancia_y": max(5, int(avg_height * 0.5 + std_height)),
+            "distancia_threshold": max(15, int(avg_height * 1.5)),
+            "avg_height": avg_height,
+            "avg_width": avg_width
+        }
+
+    def region_labels(self, header_percentage: float = 0.3, footer_percentage: float = 0.2) -> np.ndarray:
+        """
+        Región por palabra según y1 relativo al alto del documento
+
+        Returns:
+            Array de enteros: 0 = header, 1 = body, 2 = footer, -1 = sin coordenadas
+        """
+        labels = np.full(len(self), -1, dtype=np.int8)
+        valid = self.valid
+        if not valid.any():
+            return labels
+        y1 = self.boxes[valid, 1]
+        min_y, max_y = y1.min(), y1.max()
+        doc_height = max_y - min_y
+        header_limit = min_y + (doc_height * header_percentage)
+        footer_start = max_y - (doc_height * footer_percentage)
+        labels[valid] = np.where(y1 <= header_limit, 0, np.where(y1 >= footer_start, 2, 1))
+        return labels
+
+    def confidence_counts(self, edges: Sequence[float]) -> List[int]:
+        """Conteo de palabras por tramo de confianza (ver conteo_por_tramos)"""
+        return conteo_por_tramos(self.confidences, edges)
+
+    def spatial_index(self, anchor: str = 'center'):
+        """SpatialIndex sobre las palabras de origen, construido una sola vez por anclaje"""
+        index = self._spatial_indices.get(anchor)
+        if index is None:
+            from spatial_processor import SpatialIndex
+            index = self._spatial_indices[anchor] = SpatialIndex(self.to_words(), anchor=anchor)
+        return index
+
+    def to_words(self) -> List[Dict]:
+        """Diccionarios de origen o, si la tabla se creó desde arrays, su versión JSON"""
+        if self.words is None:
+            self.words = self.to_dicts()
+        return self.words
+
+    def to_dicts(self, text_key: str = 'texto', confidence_key: str = 'confianza',
+                 extra: Optional[Sequence[Dict]] = None) -> List[Dict]:
+        """
+        Adaptador a la forma JSON actual de cada palabra
+
+        Args:
+            text_key / confidence_key: Nombres de campo ('texto'/'confianza' en palabras_detectadas,
+                'text'/'confidence' en word_data_granular)
+            extra: Campos adicionales por palabra (p. ej. 'posicion'), en el mismo orden
+
+        Returns:
+            Lista de dicts {text_key, confidence_key, 'coordinates', ...extra}
+        """
+        boxes = self.boxes.tolist()
+        valid = self.valid.tolist()
+        confidences = self.confidences.tolist()
+        words = []
+        for i, text in enumerate(self.texts):
+            word = {
+                text_key: text,
+                confidence_key: confidences[i],
+                # Sin coordenadas se conserva el marcador entero [0, 0, 0, 0]
+                'coordinates': boxes[i] if valid[i] else list(COORDENADAS_VACIAS)
+            }
+            if extra is not None:
+                word.update(extra[i])
+            words.append(word)
+        return words